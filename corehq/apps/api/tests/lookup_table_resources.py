@@ -1,6 +1,9 @@
 import json
 
+from casexml.apps.phone.tests.utils import call_fixture_generator
+
 from corehq.apps.api.tests.utils import APIResourceTest
+from corehq.apps.fixtures.fixturegenerators import item_lists
 from corehq.apps.fixtures.models import (
     FieldList,
     FixtureDataItem,
@@ -11,6 +14,8 @@ from corehq.apps.fixtures.resources.v0_1 import (
     LookupTableItemResource,
     LookupTableResource,
 )
+from corehq.apps.users.models import CommCareUser
+from corehq.util.test_utils import flag_enabled
 
 
 class TestLookupTableResource(APIResourceTest):
@@ -257,3 +262,30 @@ class TestLookupTableItemResource(APIResourceTest):
         self.assertEqual(data_item.fields['state_name'].field_list[0].field_value, 'Massachusetts')
         self.assertEqual(data_item.fields['state_name'].field_list[0].properties, {"lang": "en"})
         self.assertEqual(data_item.item_attributes, {"attribute1": "cool_attr_value"})
+
+    def _get_user_fixture(self, user):
+        with flag_enabled('FIXTURE_PAYLOAD_CACHE'):
+            return b''.join(call_fixture_generator(item_lists, user.to_ota_restore_user()))
+
+    def test_update_invalidates_fixture_cache(self):
+        data_item = self._create_data_item()
+        user = CommCareUser.create(self.domain.name, 'lookup-table-user', '***')
+        self.addCleanup(user.delete)
+        data_item.add_user(user)
+        self.addCleanup(data_item.remove_user, user)
+        self.assertNotIn(b'Massachusetts', self._get_user_fixture(user))
+
+        data_item_update = {
+            "data_type_id": self.data_type._id,
+            "fields": {
+                "fixture_property": {
+                    "field_list": [
+                        {"field_value": "Massachusetts", "properties": {"lang": "en"}},
+                    ]
+                }
+            },
+        }
+        response = self._assert_auth_post_resource(
+            self.single_endpoint(data_item._id), json.dumps(data_item_update), method="PUT")
+        self.assertEqual(response.status_code, 204)
+        self.assertIn(b'Massachusetts', self._get_user_fixture(user))
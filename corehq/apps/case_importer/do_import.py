@@ -1,5 +1,5 @@
 import uuid
-from collections import Counter, defaultdict, namedtuple
+from collections import Counter, defaultdict, deque, namedtuple
 
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
@@ -9,6 +9,7 @@ from couchdbkit import NoResultFound
 from casexml.apps.case.const import CASE_TAG_DATE_OPENED
 from casexml.apps.case.mock import CaseBlock, CaseBlockError
 from couchexport.export import SCALAR_NEVER_WAS
+from dimagi.utils.chunked import chunked
 from dimagi.utils.logging import notify_exception
 from soil.progress import set_task_progress
 
@@ -18,18 +19,29 @@ from corehq.apps.groups.models import Group
 from corehq.apps.hqcase.utils import submit_case_blocks
 from corehq.apps.locations.models import SQLLocation
 from corehq.apps.users.cases import get_wrapped_owner
+from corehq.apps.users.dbaccessors.all_commcare_users import (
+    get_user_docs_by_username,
+)
 from corehq.apps.users.models import CouchUser
 from corehq.apps.users.util import format_username
-from corehq.toggles import BULK_UPLOAD_DATE_OPENED
+from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
+from corehq.sql_db.util import get_db_alias_for_partitioned_doc
+from corehq.toggles import BULK_UPLOAD_DATE_OPENED, PARALLEL_CASE_IMPORT
 from corehq.util.datadog.utils import case_load_counter
 from corehq.util.soft_assert import soft_assert
+from corehq.util.thread_pool import DatabaseThreadPool
 
 from . import exceptions
 from .const import LookupErrors
 from .util import EXTERNAL_ID, RESERVED_FIELDS, lookup_case
 
 CASEBLOCK_CHUNKSIZE = 100
+# number of spreadsheet rows for which cases and owners are looked up at a time
+LOOKUP_CHUNKSIZE = 1000
+# number of caseblock chunks submitted concurrently with PARALLEL_CASE_IMPORT
+SUBMISSION_WORKERS = 4
 RowAndCase = namedtuple('RowAndCase', ['row', 'case'])
+IndexedCase = namedtuple('IndexedCase', ['case_id', 'type'])
 ALL_LOCATIONS = 'ALL_LOCATIONS'
 
 
@@ -48,47 +60,91 @@ class _Importer(object):
         self.results = _ImportResults()
 
         self.owner_accessor = _OwnerAccessor(domain, self.user)
-        self.uncreated_external_ids = set()
+        self.case_index = _CaseIndex(domain)
         self._unsubmitted_caseblocks = []
+        if PARALLEL_CASE_IMPORT.enabled(domain):
+            self.submitter = _ParallelSubmitter(self)
+        else:
+            self.submitter = None
 
     def do_import(self, spreadsheet):
-        for row_num, row in enumerate(spreadsheet.iter_row_dicts(), start=1):
-            set_task_progress(self.task, row_num - 1, spreadsheet.max_row)
-            if row_num == 1:
-                continue  # skip first row (header row)
-
-            try:
-                self.import_row(row_num, row)
-            except exceptions.CaseRowError as error:
-                self.results.add_error(row_num, error)
+        try:
+            return self._do_import(spreadsheet)
+        finally:
+            if self.submitter:
+                self.submitter.close()
+
+    def _do_import(self, spreadsheet):
+        row_dicts = enumerate(spreadsheet.iter_row_dicts(), start=1)
+        for chunk in chunked(row_dicts, LOOKUP_CHUNKSIZE):
+            rows = []
+            for row_num, raw_row in chunk:
+                if row_num == 1:
+                    continue  # skip first row (header row)
+                try:
+                    rows.append((row_num, self.parse_row(raw_row), None))
+                except exceptions.CaseRowError as error:
+                    rows.append((row_num, None, error))
+
+            self.prefetch([row for row_num, row, error in rows if row is not None])
+            for row_num, row, parse_error in rows:
+                set_task_progress(self.task, row_num - 1, spreadsheet.max_row)
+                if parse_error is not None:
+                    self.results.add_error(row_num, parse_error)
+                elif row is not None:
+                    try:
+                        self.import_row(row_num, row)
+                    except exceptions.CaseRowError as error:
+                        self.results.add_error(row_num, error)
 
         self.commit_caseblocks()
         return self.results.to_json()
 
-    def import_row(self, row_num, raw_row):
+    def parse_row(self, raw_row):
+        """
+        :returns: A _CaseImportRow, or None if the row is blank
+        """
         search_id = _parse_search_id(self.config, raw_row)
         fields_to_update = _populate_updated_fields(self.config, raw_row)
         if not any(fields_to_update.values()):
             # if the row was blank, just skip it, no errors
-            return
+            return None
 
-        row = _CaseImportRow(
+        return _CaseImportRow(
             search_id=search_id,
             fields_to_update=fields_to_update,
             config=self.config,
             domain=self.domain,
             user_id=self.user.user_id,
             owner_accessor=self.owner_accessor,
+            case_index=self.case_index,
         )
-        if row.relies_on_uncreated_case(self.uncreated_external_ids):
-            self.commit_caseblocks()
+
+    def prefetch(self, rows):
+        """
+        Look up the cases and owners referenced by a chunk of rows in bulk
+
+        Caseblocks for earlier rows are committed first, so that the lookups
+        see the cases they create and update.
+        """
+        self.commit_caseblocks()
+        case_ids = set()
+        external_ids = set()
+        for row in rows:
+            for search_field, search_id in row.get_lookups():
+                if search_field == 'case_id':
+                    case_ids.add(search_id)
+                elif search_field == EXTERNAL_ID:
+                    external_ids.add(search_id)
+        self.case_index.prefetch(case_ids, external_ids)
+        self.owner_accessor.prefetch_names({row.uploaded_owner_name for row in rows} - {None})
+
+    def import_row(self, row_num, row):
         if row.is_new_case and not self.config.create_new_cases:
             return
 
         try:
             if row.is_new_case:
-                if row.external_id:
-                    self.uncreated_external_ids.add(row.external_id)
                 caseblock = row.get_create_caseblock()
                 self.results.add_created(row_num)
             else:
@@ -97,6 +153,7 @@ class _Importer(object):
         except CaseBlockError:
             raise exceptions.CaseGeneration()
 
+        self.case_index.add_caseblock(caseblock, row)
         self.add_caseblock(RowAndCase(row_num, caseblock))
 
     @cached_property
@@ -104,64 +161,190 @@ class _Importer(object):
         return CouchUser.get_by_user_id(self.config.couch_user_id, self.domain)
 
     def add_caseblock(self, caseblock):
+        if self.submitter:
+            self.submitter.add(caseblock)
+            return
         self._unsubmitted_caseblocks.append(caseblock)
         # check if we've reached a reasonable chunksize and if so, submit
         if len(self._unsubmitted_caseblocks) >= CASEBLOCK_CHUNKSIZE:
             self.commit_caseblocks()
 
     def commit_caseblocks(self):
+        if self.submitter:
+            self.submitter.flush()
+            return
         if self._unsubmitted_caseblocks:
             self.submit_caseblocks(self._unsubmitted_caseblocks)
             self.results.num_chunks += 1
             self._unsubmitted_caseblocks = []
-            self.uncreated_external_ids = set()
 
     def submit_caseblocks(self, caseblocks):
         if not caseblocks:
             return
 
         try:
-            form, cases = submit_case_blocks(
-                [cb.case.as_text() for cb in caseblocks],
+            form, cases = self._submit_caseblocks(caseblocks)
+        except Exception:
+            self.handle_submission_error(caseblocks)
+        else:
+            self.handle_submission(form, cases)
+
+    def _submit_caseblocks(self, caseblocks):
+        form, cases = submit_case_blocks(
+            [cb.case.as_text() for cb in caseblocks],
+            self.domain,
+            self.user.username,
+            self.user.user_id,
+            device_id=__name__ + ".do_import",
+        )
+        if form.is_error:
+            raise Exception("Form error during case import: {}".format(form.problem))
+        return form, cases
+
+    def handle_submission_error(self, caseblocks):
+        """Must be called while handling the submission's exception"""
+        notify_exception(None, "Case Importer: Uncaught failure submitting caseblocks")
+        for row_number, case in caseblocks:
+            self.results.add_error(row_number, exceptions.ImportErrorMessage())
+        # the index includes the cases these caseblocks would have created or updated
+        self.case_index.refresh()
+
+    def handle_submission(self, form, cases):
+        if self.record_form_callback:
+            self.record_form_callback(form.form_id)
+        properties = {p for c in cases for p in c.dynamic_case_properties().keys()}
+        if self.config.case_type and len(properties):
+            add_inferred_export_properties.delay(
+                'CaseImporter',
                 self.domain,
-                self.user.username,
-                self.user.user_id,
-                device_id=__name__ + ".do_import",
+                self.config.case_type,
+                properties,
+            )
+        else:
+            _soft_assert = soft_assert(notify_admins=True)
+            _soft_assert(
+                len(properties) == 0,
+                'error adding inferred export properties in domain '
+                '({}): {}'.format(self.domain, ", ".join(properties))
             )
-            if form.is_error:
-                raise Exception("Form error during case import: {}".format(form.problem))
+
+
+class _ParallelSubmitter(object):
+    """
+    Submits an _Importer's caseblocks in chunks from a pool of threads
+
+    Caseblocks are grouped into chunks by the database shard of their case,
+    and chunks for different shards are submitted concurrently. A caseblock
+    for or indexing a case that has caseblocks in a chunk that has not been
+    submitted yet is added to that chunk, and a chunk is only processed
+    once the submissions of earlier chunks with caseblocks for the cases it
+    references have finished. Submission results are handled in the order
+    chunks were submitted, so the import results are the same as those of
+    submitting one chunk at a time.
+    """
+
+    def __init__(self, importer, workers=SUBMISSION_WORKERS):
+        self.importer = importer
+        self.workers = workers
+        self.pool = None
+        # chunk key -> list of RowAndCase
+        self.chunks = {}
+        # case ID -> key of the unsubmitted chunk with caseblocks for the case
+        self.chunk_keys = {}
+        # case ID -> AsyncResult of the last submitted chunk with caseblocks for the case
+        self.submissions = {}
+        # (caseblocks, AsyncResult) tuples of submissions not yet handled
+        self.pending = deque()
+
+    def add(self, caseblock):
+        case_id = caseblock.case.case_id
+        keys = []
+        for referenced_id in _get_referenced_case_ids(caseblock.case):
+            key = self.chunk_keys.get(referenced_id)
+            if key is not None and key not in keys:
+                keys.append(key)
+        if keys:
+            key = keys[0]
+            for other_key in keys[1:]:
+                self.submit_chunk(other_key)
+        else:
+            key = get_db_alias_for_partitioned_doc(case_id)
+
+        chunk = self.chunks.setdefault(key, [])
+        chunk.append(caseblock)
+        self.chunk_keys[case_id] = key
+        if len(chunk) >= CASEBLOCK_CHUNKSIZE:
+            self.submit_chunk(key)
+
+    def submit_chunk(self, key):
+        caseblocks = self.chunks.pop(key)
+        referenced_ids = set()
+        for caseblock in caseblocks:
+            referenced_ids.update(_get_referenced_case_ids(caseblock.case))
+        dependencies = {
+            self.submissions[case_id] for case_id in referenced_ids if case_id in self.submissions
+        }
+
+        if self.pool is None:
+            self.pool = DatabaseThreadPool(self.workers)
+        result = self.pool.apply_async(self._submit, (caseblocks, dependencies))
+        for caseblock in caseblocks:
+            case_id = caseblock.case.case_id
+            self.chunk_keys.pop(case_id, None)
+            self.submissions[case_id] = result
+        self.pending.append((caseblocks, result))
+        self.importer.results.num_chunks += 1
+
+        while len(self.pending) > self.workers:
+            self._handle_next_submission()
+
+    def _submit(self, caseblocks, dependencies):
+        # dependencies were submitted to the pool earlier, so they are
+        # already running on other threads and this cannot deadlock
+        for dependency in dependencies:
+            dependency.wait()
+        return self.importer._submit_caseblocks(caseblocks)
+
+    def _handle_next_submission(self):
+        caseblocks, result = self.pending.popleft()
+        try:
+            form, cases = result.get()
         except Exception:
-            notify_exception(None, "Case Importer: Uncaught failure submitting caseblocks")
-            for row_number, case in caseblocks:
-                self.results.add_error(row_number, exceptions.ImportErrorMessage())
+            self.importer.handle_submission_error(caseblocks)
         else:
-            if self.record_form_callback:
-                self.record_form_callback(form.form_id)
-            properties = {p for c in cases for p in c.dynamic_case_properties().keys()}
-            if self.config.case_type and len(properties):
-                add_inferred_export_properties.delay(
-                    'CaseImporter',
-                    self.domain,
-                    self.config.case_type,
-                    properties,
-                )
-            else:
-                _soft_assert = soft_assert(notify_admins=True)
-                _soft_assert(
-                    len(properties) == 0,
-                    'error adding inferred export properties in domain '
-                    '({}): {}'.format(self.domain, ", ".join(properties))
-                )
+            self.importer.handle_submission(form, cases)
+        self.submissions = {
+            case_id: submission for case_id, submission in self.submissions.items()
+            if submission is not result
+        }
+
+    def flush(self):
+        """Submit all chunks and wait for the submissions to finish"""
+        for key in list(self.chunks):
+            self.submit_chunk(key)
+        while self.pending:
+            self._handle_next_submission()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+
+def _get_referenced_case_ids(caseblock):
+    """The IDs of the case a caseblock is for and the cases it indexes"""
+    return [caseblock.case_id] + [index.case_id for index in caseblock.index.values()]
 
 
 class _CaseImportRow(object):
-    def __init__(self, search_id, fields_to_update, config, domain, user_id, owner_accessor):
+    def __init__(self, search_id, fields_to_update, config, domain, user_id, owner_accessor, case_index):
         self.search_id = search_id
         self.fields_to_update = fields_to_update
         self.config = config
         self.domain = domain
         self.user_id = user_id
         self.owner_accessor = owner_accessor
+        self.case_index = case_index
 
         self.case_name = fields_to_update.pop('name', None)
         self.external_id = fields_to_update.pop('external_id', None)
@@ -180,19 +363,24 @@ class _CaseImportRow(object):
             # do not allow blank external id since we save this
             raise exceptions.BlankExternalId()
 
-    def relies_on_uncreated_case(self, uncreated_external_ids):
-        return any(lookup_id and lookup_id in uncreated_external_ids
-                   for lookup_id in [self.search_id, self.parent_id, self.parent_external_id])
+    def get_lookups(self):
+        """
+        :returns: `(search_field, search_id)` pairs of the cases this row looks up
+        """
+        lookups = [(self.config.search_field, self.search_id)]
+        if self.parent_id:
+            lookups.append(('case_id', self.parent_id))
+        if self.parent_external_id:
+            lookups.append((EXTERNAL_ID, self.parent_external_id))
+        return lookups
 
     @cached_property
     def existing_case(self):
-        case, error = lookup_case(
+        case, error = self.case_index.lookup_case(
             self.config.search_field,
             self.search_id,
-            self.domain,
             self.config.case_type
         )
-        _log_case_lookup(self.domain)
         if error == LookupErrors.MultipleResults:
             raise exceptions.TooManyMatches()
         return case
@@ -217,9 +405,7 @@ class _CaseImportRow(object):
                 ('parent_external_id', 'external_id', self.parent_external_id),
         ]:
             if search_id:
-                parent_case, error = lookup_case(
-                    search_field, search_id, self.domain, self.parent_type)
-                _log_case_lookup(self.domain)
+                parent_case, error = self.case_index.lookup_case(search_field, search_id, self.parent_type)
                 if parent_case:
                     return {self.parent_ref: (parent_case.type, parent_case.case_id)}
                 raise exceptions.InvalidParentId(column)
@@ -266,8 +452,99 @@ class _CaseImportRow(object):
         )
 
 
-def _log_case_lookup(domain):
-    case_load_counter("case_importer", domain)
+def _log_case_lookup(domain, value=1):
+    case_load_counter("case_importer", domain)(value)
+
+
+class _CaseIndex(object):
+    """
+    The cases looked up by a chunk of spreadsheet rows, fetched in bulk,
+    kept up to date with the cases those rows create and update so that
+    later rows in the chunk can find them before they are committed.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.case_accessors = CaseAccessors(domain)
+        self.case_ids = set()
+        self.external_ids = set()
+        # case ID -> IndexedCase, or None if there is no such case
+        self.cases_by_id = {}
+        # external ID -> list of IndexedCases
+        self.cases_by_external_id = {}
+        self.external_id_by_case_id = {}
+
+    def prefetch(self, case_ids, external_ids):
+        self.case_ids = set(case_ids)
+        self.external_ids = set(external_ids)
+        self.cases_by_id = {case_id: None for case_id in self.case_ids}
+        self.cases_by_external_id = {external_id: [] for external_id in self.external_ids}
+        self.external_id_by_case_id = {}
+
+        if self.case_ids:
+            cases = self.case_accessors.get_cases(list(self.case_ids))
+            _log_case_lookup(self.domain, len(cases))
+            for case in cases:
+                if case.domain == self.domain:
+                    self.cases_by_id[case.case_id] = IndexedCase(case.case_id, case.type)
+
+        if self.external_ids:
+            cases = self.case_accessors.get_cases_by_external_ids(list(self.external_ids))
+            _log_case_lookup(self.domain, len(cases))
+            for case in cases:
+                self._add_external_id(IndexedCase(case.case_id, case.type), case.external_id)
+
+    def refresh(self):
+        self.prefetch(self.case_ids, self.external_ids)
+
+    def lookup_case(self, search_field, search_id, case_type):
+        """
+        Like `corehq.apps.case_importer.util.lookup_case`, but returns an
+        IndexedCase, and only queries the database for cases that were not
+        prefetched.
+        """
+        if search_field == 'case_id' and search_id in self.cases_by_id:
+            case = self.cases_by_id[search_id]
+            if case and case.type == case_type:
+                return (case, None)
+            return (None, LookupErrors.NotFound)
+        elif search_field == EXTERNAL_ID and search_id in self.cases_by_external_id:
+            cases = [case for case in self.cases_by_external_id[search_id] if case.type == case_type]
+            if not cases:
+                return (None, LookupErrors.NotFound)
+            elif len(cases) > 1:
+                return (None, LookupErrors.MultipleResults)
+            return (cases[0], None)
+
+        case, error = lookup_case(search_field, search_id, self.domain, case_type)
+        _log_case_lookup(self.domain)
+        if case:
+            case = IndexedCase(case.case_id, case.type)
+        return (case, error)
+
+    def add_caseblock(self, caseblock, row):
+        """Index a case created or updated by the given row's caseblock"""
+        case_id = caseblock.case_id
+        if row.is_new_case:
+            case = IndexedCase(case_id, row.config.case_type)
+            self.cases_by_id[case_id] = case
+            external_id = row._get_external_id()
+            if external_id:
+                self._add_external_id(case, external_id)
+        elif row.external_id is not None and row.external_id != self.external_id_by_case_id.get(case_id):
+            self._remove_external_id(case_id)
+            self._add_external_id(row.existing_case, row.external_id)
+
+    def _add_external_id(self, case, external_id):
+        self.cases_by_external_id.setdefault(external_id, []).append(case)
+        self.external_id_by_case_id[case.case_id] = external_id
+
+    def _remove_external_id(self, case_id):
+        external_id = self.external_id_by_case_id.pop(case_id, None)
+        if external_id is not None:
+            self.cases_by_external_id[external_id] = [
+                case for case in self.cases_by_external_id[external_id] if case.case_id != case_id
+            ]
 
 
 def _convert_custom_fields_to_struct(config):
@@ -409,6 +686,34 @@ class _OwnerAccessor(object):
         self.user = user
         self.id_cache = {}
         self.name_cache = {}
+        # owner name -> CouchUser, or None if there is no user by that name
+        self.users_by_name = {}
+
+    def prefetch_names(self, names):
+        """
+        Look up the users for the given owner names in bulk, so that
+        `get_id_from_name` only queries for groups and locations
+        """
+        usernames = {
+            self._get_username(name): name for name in names
+            if name not in self.name_cache and name not in self.users_by_name
+        }
+        if not usernames:
+            return
+        users = defaultdict(list)
+        for doc in get_user_docs_by_username(usernames):
+            if doc and doc['username'] in usernames:
+                users[doc['username']].append(doc)
+        for username, name in usernames.items():
+            if len(users[username]) == 1:
+                self.users_by_name[name] = CouchUser.wrap_correctly(users[username][0])
+            elif not users[username]:
+                self.users_by_name[name] = None
+
+    def _get_username(self, name):
+        if '@' not in name:
+            return format_username(name, self.domain)
+        return name
 
     def get_id_from_name(self, name):
         return cached_function_call(self._get_id_from_name, name, self.name_cache)
@@ -422,11 +727,10 @@ class _OwnerAccessor(object):
         '''
 
         def get_user(name):
+            if name in self.users_by_name:
+                return self.users_by_name[name]
             try:
-                name_as_address = name
-                if '@' not in name_as_address:
-                    name_as_address = format_username(name, self.domain)
-                return CouchUser.get_by_username(name_as_address)
+                return CouchUser.get_by_username(self._get_username(name))
             except NoResultFound:
                 return None
 
@@ -323,7 +323,8 @@ class ImporterTest(TestCase):
         self.assertEqual(1, res['created_count'])
         self.assertEqual(2, res['match_count'])
         self.assertFalse(res['errors'])
-        self.assertEqual(2, res['num_chunks']) # the lookup causes an extra chunk
+        # the created case is found without committing it first
+        self.assertEqual(1, res['num_chunks'])
 
         # should just create the one case
         case_ids = self.accessor.get_case_ids_in_domain()
@@ -365,6 +366,25 @@ class ImporterTest(TestCase):
                          len(res['errors'][exceptions.InvalidParentId.title][error_column_name]['rows']),
                          "All cases should have missing parent")
 
+    @run_with_all_backends
+    def testParentExternalIdCreatedInSameImport(self):
+        headers = ['external_id', 'name', 'parent_external_id']
+        config = self._config(headers, search_field='external_id')
+        file = make_worksheet_wrapper(
+            headers,
+            ['parent-external-id', 'parent', ''],
+            ['child-external-id', 'child', 'parent-external-id'],
+        )
+
+        res = do_import(file, config, self.domain)
+        self.assertEqual(2, res['created_count'])
+        self.assertFalse(res['errors'])
+        self.assertEqual(1, res['num_chunks'])
+
+        cases = {case.name: case for case in self.accessor.get_cases(self.accessor.get_case_ids_in_domain())}
+        [index] = cases['child'].indices
+        self.assertEqual(cases['parent'].case_id, index.referenced_id)
+
     def import_mock_file(self, rows):
         config = self._config(rows[0])
         xls_file = make_worksheet_wrapper(*rows)
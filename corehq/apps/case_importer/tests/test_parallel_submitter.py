@@ -0,0 +1,92 @@
+import threading
+
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from casexml.apps.case.mock import CaseBlock
+
+from corehq.apps.case_importer.do_import import (
+    RowAndCase,
+    _ImportResults,
+    _ParallelSubmitter,
+)
+
+
+class FakeImporter(object):
+
+    def __init__(self):
+        self.results = _ImportResults()
+        self.submitted = []
+        self.handled = []
+        self.lock = threading.Lock()
+
+    def _submit_caseblocks(self, caseblocks):
+        with self.lock:
+            self.submitted.append([cb.row for cb in caseblocks])
+        if any(cb.case.case_id == 'bad' for cb in caseblocks):
+            raise Exception("submission failed")
+        return [cb.row for cb in caseblocks], []
+
+    def handle_submission(self, form, cases):
+        self.handled.append(form)
+
+    def handle_submission_error(self, caseblocks):
+        self.handled.append(('error', [cb.row for cb in caseblocks]))
+
+
+def _shard(case_id):
+    return case_id.split('-')[0]
+
+
+@patch('corehq.apps.case_importer.do_import.get_db_alias_for_partitioned_doc', _shard)
+@patch('corehq.apps.case_importer.do_import.CASEBLOCK_CHUNKSIZE', 2)
+class ParallelSubmitterTest(SimpleTestCase):
+
+    def _import(self, caseblocks):
+        importer = FakeImporter()
+        submitter = _ParallelSubmitter(importer, workers=2)
+        try:
+            for row, caseblock in enumerate(caseblocks, start=2):
+                submitter.add(RowAndCase(row, caseblock))
+            submitter.flush()
+        finally:
+            submitter.close()
+        return importer
+
+    def test_chunks_by_shard(self):
+        importer = self._import([
+            CaseBlock('a-1', create=True),
+            CaseBlock('b-1', create=True),
+            CaseBlock('a-2', create=True),
+            CaseBlock('b-2', create=True),
+            CaseBlock('a-3', create=True),
+        ])
+        self.assertEqual(importer.handled, [[2, 4], [3, 5], [6]])
+        self.assertEqual(importer.results.num_chunks, 3)
+
+    def test_dependent_caseblocks_share_a_chunk(self):
+        importer = self._import([
+            CaseBlock('a-1', create=True),
+            CaseBlock('b-1', create=True, index={'parent': ('parent', 'a-1')}),
+            CaseBlock('b-2', create=True),
+        ])
+        self.assertEqual(importer.handled, [[2, 3], [4]])
+
+    def test_dependency_on_submitted_chunk(self):
+        importer = self._import([
+            CaseBlock('a-1', create=True),
+            CaseBlock('a-2', create=True),
+            CaseBlock('b-1', create=True, index={'parent': ('parent', 'a-1')}),
+            CaseBlock('a-1', update={'prop': 'value'}),
+        ])
+        self.assertEqual(importer.handled, [[2, 3], [4], [5]])
+        # the chunks depending on the first chunk are submitted after it
+        self.assertEqual(importer.submitted[0], [2, 3])
+
+    def test_submission_error(self):
+        importer = self._import([
+            CaseBlock('bad', create=True),
+            CaseBlock('a-1', create=True),
+        ])
+        self.assertEqual(importer.handled, [('error', [2]), [3]])
@@ -44,6 +44,11 @@ SPECIAL_CASE_PROPERTIES_MAP = {
 }
 SPECIAL_CASE_PROPERTIES = list(SPECIAL_CASE_PROPERTIES_MAP.keys())
 
+# Properties of ancestor cases that are not indexed with their descendants
+# (see `CaseSearchConfig.indexed_ancestor_paths`). They change with every
+# update, which would otherwise reindex the case's descendants each time.
+UNINDEXED_ANCESTOR_PROPERTIES = ['last_modified']
+
 
 # Properties that can be shown in the report but are not stored on the case or in the case index
 # These properties are computed in `SafeCaseDisplay` when each case is displayed
@@ -5,6 +5,8 @@ from django.utils.translation import ugettext as _
 from eulxml.xpath import parse as parse_xpath
 from eulxml.xpath.ast import FunctionCall, Step, UnaryExpression, serialize
 
+from corehq.apps.case_search.const import UNINDEXED_ANCESTOR_PROPERTIES
+from corehq.apps.case_search.models import get_indexed_ancestor_paths
 from corehq.apps.case_search.xpath_functions import (
     XPATH_FUNCTIONS,
     XPathFunctionException,
@@ -69,8 +71,11 @@ NEQ = "!="
 ALL_OPERATORS = [EQ, NEQ] + list(OPERATOR_MAPPING.keys()) + list(COMPARISON_MAPPING.keys())
 
 
-def build_filter_from_ast(domain, node):
+def build_filter_from_ast(domain, node, indexed_ancestor_paths=None):
     """Builds an ES filter from an AST provided by eulxml.xpath.parse
+
+    :param indexed_ancestor_paths: The related case paths whose properties
+    are indexed with each case. Defaults to the domain's configuration.
     """
 
     def _walk_related_cases(node):
@@ -111,6 +116,38 @@ def build_filter_from_ast(domain, node):
         final_identifier = serialize(n.left)
         return reverse_index_case_query(ids, final_identifier)
 
+    def _is_indexed_ancestor_lookup(node):
+        """Returns whether the related case path of a related case lookup is
+        indexed with each case (see `CaseSearchConfig.active_ancestor_paths`)
+
+        e.g. `parent/host` for `parent/host/thing = 'foo'`
+        """
+        paths = indexed_ancestor_paths
+        if paths is None:
+            paths = get_indexed_ancestor_paths(domain)
+        path, _, case_property_name = serialize(node.left).rpartition('/')
+        return path in paths and case_property_name not in UNINDEXED_ANCESTOR_PROPERTIES
+
+    def _indexed_ancestor_lookup(node):
+        """Return a query on the ancestor's property as indexed with each case,
+        e.g. on the case property `parent/host/thing` for `parent/host/thing = 'foo'`.
+
+        Only cases that have the ancestor match, as with `_walk_related_cases`.
+        """
+        path = serialize(node.left.left)
+        case_property_name = serialize(node.left)
+        if node.op in [EQ, NEQ]:
+            q = _property_equality(case_property_name, node)
+        elif node.op in COMPARISON_MAPPING:
+            q = _property_comparison(case_property_name, node)
+        else:
+            raise CaseFilterError(
+                _("We didn't understand what you were trying to do with {}").format(serialize(node)),
+                serialize(node)
+            )
+        ancestor_exists = filters.NOT(case_property_missing('{}/@case_id'.format(path)))
+        return filters.AND(ancestor_exists, q)
+
     def _parent_property_lookup(node):
         """given a node of the form `parent/foo = 'thing'`, return all case_ids where `foo = thing`
         """
@@ -173,18 +210,7 @@ def build_filter_from_ast(domain, node):
         if isinstance(node.left, Step) and (
                 isinstance(node.right, acceptable_rhs_types)):
             # This is a leaf node
-            case_property_name = serialize(node.left)
-            value = _unwrap_function(node.right)
-
-            if value == '':
-                q = case_property_missing(case_property_name)
-            else:
-                q = exact_case_property_text_query(case_property_name, value)
-
-            if node.op == '!=':
-                return filters.NOT(q)
-
-            return q
+            return _property_equality(serialize(node.left), node)
 
         if isinstance(node.right, Step):
             _raise_step_RHS(node)
@@ -194,12 +220,27 @@ def build_filter_from_ast(domain, node):
             serialize(node)
         )
 
+    def _property_equality(case_property_name, node):
+        value = _unwrap_function(node.right)
+
+        if value == '':
+            q = case_property_missing(case_property_name)
+        else:
+            q = exact_case_property_text_query(case_property_name, value)
+
+        if node.op == '!=':
+            return filters.NOT(q)
+
+        return q
+
     def _comparison(node):
         """Returns the filter for a comparison operation (>, <, >=, <=)
 
         """
+        return _property_comparison(serialize(node.left), node)
+
+    def _property_comparison(case_property_name, node):
         try:
-            case_property_name = serialize(node.left)
             value = _unwrap_function(node.right)
             return case_property_range_query(case_property_name, **{COMPARISON_MAPPING[node.op]: value})
         except (TypeError, ValueError):
@@ -220,6 +261,10 @@ def build_filter_from_ast(domain, node):
 
         if _is_related_case_lookup(node):
             # this node represents a filter on a property for a related case
+            if isinstance(node.right, Step):
+                _raise_step_RHS(node)
+            if _is_indexed_ancestor_lookup(node):
+                return _indexed_ancestor_lookup(node)
             return _walk_related_cases(node)
 
         if node.op in [EQ, NEQ]:
@@ -242,14 +287,14 @@ def build_filter_from_ast(domain, node):
     return visit(node)
 
 
-def build_filter_from_xpath(domain, xpath):
+def build_filter_from_xpath(domain, xpath, indexed_ancestor_paths=None):
     error_message = _(
         "We didn't understand what you were trying to do with {}. "
         "Please try reformatting your query. "
         "The operators we accept are: {}"
     )
     try:
-        return build_filter_from_ast(domain, parse_xpath(xpath))
+        return build_filter_from_ast(domain, parse_xpath(xpath), indexed_ancestor_paths)
     except TypeError as e:
         text_error = re.search(r"Unknown text '(.+)'", str(e))
         if text_error:
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from corehq.apps.case_search.filter_dsl import build_filter_from_xpath
+from corehq.apps.case_search.models import get_indexed_ancestor_paths
+from corehq.apps.es import CaseSearchES
+
+
+class Command(BaseCommand):
+    help = ("Compare a related case filter evaluated by looking up the related cases "
+            "with the same filter evaluated on the indexed ancestor properties")
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain')
+        parser.add_argument('xpath', help="e.g. \"parent/parent/dob > '2000-01-01'\"")
+        parser.add_argument('--iterations', type=int, default=5)
+
+    def handle(self, domain, xpath, **options):
+        if not get_indexed_ancestor_paths(domain):
+            raise CommandError("{} has no indexed ancestor paths".format(domain))
+
+        def search(indexed_ancestor_paths):
+            def _search():
+                return CaseSearchES().domain(domain).filter(
+                    build_filter_from_xpath(domain, xpath, indexed_ancestor_paths)
+                ).count()
+            return _search
+
+        lookup_count, lookup_time = _time(search([]), options['iterations'])
+        indexed_count, indexed_time = _time(search(None), options['iterations'])
+        if lookup_count != indexed_count:
+            print("Results differ: the domain may need to be reindexed")
+        print("{} iterations".format(options['iterations']))
+        print("related case lookups: {:.3f}s ({} cases)".format(lookup_time, lookup_count))
+        print("indexed ancestors:    {:.3f}s ({} cases)".format(indexed_time, indexed_count))
+        print("speedup: {:.2f}x".format(lookup_time / indexed_time))
+
+
+def _time(search, iterations):
+    start = time.time()
+    for i in range(iterations):
+        count = search()
+    return count, (time.time() - start) / iterations
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from corehq.apps.case_search.models import set_indexed_ancestor_paths
+
+
+class Command(BaseCommand):
+    help = ("Set the relationship paths, e.g. 'parent' or 'parent/parent', whose cases' properties "
+            "are indexed with each case of the domain for case search, and reindex the domain")
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain')
+        parser.add_argument('paths', nargs='*')
+
+    def handle(self, domain, paths, **options):
+        config = set_indexed_ancestor_paths(domain, paths)
+        print("Indexed ancestor paths for {}: {}".format(
+            domain, ", ".join(config.indexed_ancestor_paths) or "(none)"))
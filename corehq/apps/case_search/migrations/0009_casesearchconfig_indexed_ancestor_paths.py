@@ -0,0 +1,18 @@
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('case_search', '0008_auto_20180119_1716'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='casesearchconfig',
+            name='indexed_ancestor_paths',
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.CharField(max_length=255), blank=True, default=list, size=None),
+        ),
+    ]
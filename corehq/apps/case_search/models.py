@@ -100,6 +100,22 @@ class CaseSearchConfig(models.Model):
     enabled = models.BooleanField(blank=False, null=False, default=False)
     fuzzy_properties = models.ManyToManyField(FuzzyProperties)
     ignore_patterns = models.ManyToManyField(IgnorePatterns)
+    # Relationship paths, e.g. "parent" or "parent/parent", whose cases'
+    # properties are indexed with each case, prefixed by the path, so that
+    # related case filters like "parent/parent/dob > '2000-01-01'" can be
+    # evaluated as a single query
+    indexed_ancestor_paths = ArrayField(
+        models.CharField(max_length=255),
+        default=list,
+        blank=True,
+    )
+    # The indexed ancestor paths whose properties have been indexed for all
+    # the domain's cases. Only these are used by related case filters.
+    active_ancestor_paths = ArrayField(
+        models.CharField(max_length=255),
+        default=list,
+        blank=True,
+    )
 
     objects = GetOrNoneManager()
 
@@ -147,6 +163,10 @@ class CaseSearchConfig(models.Model):
             fuzzy_properties.append(fp)
         config.fuzzy_properties.set(fuzzy_properties)
 
+        if json_def.get('indexed_ancestor_paths', []) != config.indexed_ancestor_paths:
+            set_indexed_ancestor_paths(domain, json_def.get('indexed_ancestor_paths', []))
+            config.refresh_from_db()
+
         return config
 
 
@@ -273,6 +293,77 @@ def case_search_enabled_for_domain(domain):
         return True
 
 
+@quickcache(['domain'], timeout=24 * 60 * 60, memoize_timeout=60)
+def get_indexed_ancestor_paths(domain):
+    """Returns the indexed ancestor paths that related case filters can use,
+    i.e. those that all the domain's cases have been indexed with
+    """
+    try:
+        config = CaseSearchConfig.objects.get(pk=domain, enabled=True)
+    except CaseSearchConfig.DoesNotExist:
+        return []
+    else:
+        return list(config.active_ancestor_paths)
+
+
+@quickcache(['domain'], timeout=24 * 60 * 60, memoize_timeout=60)
+def get_ancestor_paths_to_index(domain):
+    """Returns the indexed ancestor paths that the domain's cases are indexed
+    with, including those that are still being reindexed
+    """
+    try:
+        config = CaseSearchConfig.objects.get(pk=domain, enabled=True)
+    except CaseSearchConfig.DoesNotExist:
+        return []
+    else:
+        return list(config.indexed_ancestor_paths)
+
+
+def _clear_ancestor_paths_cache(domain):
+    get_indexed_ancestor_paths.clear(domain)
+    get_ancestor_paths_to_index.clear(domain)
+
+
+def set_indexed_ancestor_paths(domain, paths):
+    """Sets the relationship paths whose cases' properties are indexed with
+    each case of the domain, and reindexes the domain's cases to match.
+
+    Removed paths stop being used straight away. New paths are used once
+    the reindex is done (see `activate_indexed_ancestor_paths`).
+    """
+    from corehq.apps.case_search.tasks import reindex_case_search_for_domain
+
+    paths = sorted({path.strip('/') for path in paths if path.strip('/')})
+    config, created = CaseSearchConfig.objects.get_or_create(pk=domain)
+    if config.indexed_ancestor_paths != paths:
+        config.indexed_ancestor_paths = paths
+        config.active_ancestor_paths = [path for path in config.active_ancestor_paths if path in paths]
+        config.save()
+        _clear_ancestor_paths_cache(domain)
+        if config.enabled:
+            # wait for processes to stop using the old paths, which are
+            # memoized for up to a minute
+            reindex_case_search_for_domain.apply_async(args=[domain], countdown=60)
+    return config
+
+
+def activate_indexed_ancestor_paths(domain, paths):
+    """Marks `paths` as usable by related case filters, once all the
+    domain's cases have been indexed with them. Paths that have been
+    removed from the domain's config since are ignored.
+    """
+    config = CaseSearchConfig.objects.get_or_none(pk=domain, enabled=True)
+    if config is None:
+        return
+    active_paths = sorted(
+        set(config.active_ancestor_paths) | (set(paths) & set(config.indexed_ancestor_paths))
+    )
+    if config.active_ancestor_paths != active_paths:
+        config.active_ancestor_paths = active_paths
+        config.save()
+        _clear_ancestor_paths_cache(domain)
+
+
 def enable_case_search(domain):
     from corehq.apps.case_search.tasks import reindex_case_search_for_domain
     from corehq.pillows.case_search import domains_needing_search_index
@@ -282,6 +373,7 @@ def enable_case_search(domain):
         config.enabled = True
         config.save()
         case_search_enabled_for_domain.clear(domain)
+        _clear_ancestor_paths_cache(domain)
         domains_needing_search_index.clear()
         reindex_case_search_for_domain.delay(domain)
     return config
@@ -298,8 +390,11 @@ def disable_case_search(domain):
         return None
     if config.enabled:
         config.enabled = False
+        # the cases are deleted from the index
+        config.active_ancestor_paths = []
         config.save()
         case_search_enabled_for_domain.clear(domain)
+        _clear_ancestor_paths_cache(domain)
         domains_needing_search_index.clear()
         delete_case_search_cases_for_domain.delay(domain)
     return config
@@ -1,16 +1,29 @@
 from celery.task import task
 
+from corehq.apps.case_search.models import (
+    CaseSearchConfig,
+    activate_indexed_ancestor_paths,
+)
 from corehq.pillows.case_search import (
     CaseSearchReindexerFactory,
     delete_case_search_cases,
+    get_case_search_processor,
 )
 
 
 @task(serializer='pickle')
 def reindex_case_search_for_domain(domain):
+    config = CaseSearchConfig.objects.get_or_none(pk=domain)
+    ancestor_paths = config.indexed_ancestor_paths if config else []
     CaseSearchReindexerFactory(domain=domain).build().reindex()
+    activate_indexed_ancestor_paths(domain, ancestor_paths)
 
 
 @task(serializer='pickle')
 def delete_case_search_cases_for_domain(domain):
     delete_case_search_cases(domain)
+
+
+@task(serializer='pickle')
+def update_case_search_descendants(domain, case_ids):
+    get_case_search_processor().update_descendants(domain, case_ids)
@@ -2,6 +2,7 @@ from django.test import SimpleTestCase, TestCase
 
 from elasticsearch.exceptions import ConnectionError
 from eulxml.xpath import parse as parse_xpath
+from mock import patch
 
 from casexml.apps.case.mock import CaseFactory, CaseIndex, CaseStructure
 from pillowtop.es_utils import initialize_index_and_mapping
@@ -316,6 +317,93 @@ class TestFilterDsl(SimpleTestCase):
         with self.assertRaises(CaseFilterError):
             build_filter_from_ast(None, parse_xpath("parent/name > other_property"))
 
+    def test_indexed_ancestor_lookup(self):
+        parsed = parse_xpath("parent/parent/dob >= '2017-02-12'")
+        ancestor_exists = {
+            "not": {
+                "or": (
+                    {
+                        "not": {
+                            "nested": {
+                                "path": "case_properties",
+                                "query": {
+                                    "filtered": {
+                                        "query": {
+                                            "match_all": {}
+                                        },
+                                        "filter": {
+                                            "term": {
+                                                "case_properties.key.exact": "parent/parent/@case_id"
+                                            }
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    },
+                    {
+                        "nested": {
+                            "path": "case_properties",
+                            "query": {
+                                "filtered": {
+                                    "query": {
+                                        "match_all": {}
+                                    },
+                                    "filter": {
+                                        "and": (
+                                            {
+                                                "term": {
+                                                    "case_properties.key.exact": "parent/parent/@case_id"
+                                                }
+                                            },
+                                            {
+                                                "term": {
+                                                    "case_properties.value.exact": ""
+                                                }
+                                            }
+                                        )
+                                    }
+                                }
+                            }
+                        }
+                    }
+                )
+            }
+        }
+        expected_filter = {
+            "and": (
+                ancestor_exists,
+                {
+                    "nested": {
+                        "path": "case_properties",
+                        "query": {
+                            "filtered": {
+                                "filter": {
+                                    "term": {
+                                        "case_properties.key.exact": "parent/parent/dob"
+                                    }
+                                },
+                                "query": {
+                                    "range": {
+                                        "case_properties.value.date": {
+                                            "gte": "2017-02-12",
+                                        }
+                                    }
+                                }
+                            }
+                        }
+                    }
+                }
+            )
+        }
+        built_filter = build_filter_from_ast("domain", parsed, indexed_ancestor_paths=['parent/parent'])
+        self.assertEqual(expected_filter, built_filter)
+
+    def test_indexed_ancestor_lookup_self_reference(self):
+        with self.assertRaises(CaseFilterError):
+            build_filter_from_ast(None, parse_xpath("parent/name = other_property"),
+                                  indexed_ancestor_paths=['parent'])
+
 
 class TestFilterDslLookups(TestCase):
     maxDiff = None
@@ -376,8 +464,10 @@ class TestFilterDslLookups(TestCase):
                 relationship='extension',
             )],
         )
-        for case in factory.create_or_update_cases([child_case]):
-            send_to_elasticsearch('case_search', transform_case_for_elasticsearch(case.to_json()))
+        with patch('corehq.pillows.case_search.get_ancestor_paths_to_index',
+                   return_value=['father', 'father/mother']):
+            for case in factory.create_or_update_cases([child_case]):
+                send_to_elasticsearch('case_search', transform_case_for_elasticsearch(case.to_json()))
         cls.es.indices.refresh(CASE_SEARCH_INDEX_INFO.index)
 
     @classmethod
@@ -455,6 +545,23 @@ class TestFilterDslLookups(TestCase):
         self.assertEqual(expected_filter, built_filter)
         self.assertEqual([self.child_case_id], CaseSearchES().filter(built_filter).values_list('_id', flat=True))
 
+    def test_indexed_ancestor_lookups(self):
+        for xpath in ["father/name = 'Mace'", "father/mother/house = 'Tyrell'", "father/mother/alias != 'Mace'"]:
+            built_filter = build_filter_from_ast(
+                self.domain, parse_xpath(xpath), indexed_ancestor_paths=['father', 'father/mother'])
+            self.assertEqual(
+                [self.child_case_id],
+                CaseSearchES().filter(built_filter).values_list('_id', flat=True),
+                xpath
+            )
+
+    def test_unindexed_ancestor_property_lookup(self):
+        # last_modified is not indexed with descendants, so it is looked up on the related case
+        built_filter = build_filter_from_ast(
+            self.domain, parse_xpath("father/last_modified > '2000-01-01'"), indexed_ancestor_paths=['father'])
+        self.assertEqual(built_filter['nested']['path'], 'indices')
+        self.assertEqual([self.child_case_id], CaseSearchES().filter(built_filter).values_list('_id', flat=True))
+
 
 class TestGetProperties(SimpleTestCase):
     pass
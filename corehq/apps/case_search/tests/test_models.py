@@ -5,6 +5,9 @@ from mock import call, patch
 from corehq.apps.case_search.models import (
     disable_case_search,
     enable_case_search,
+    get_ancestor_paths_to_index,
+    get_indexed_ancestor_paths,
+    set_indexed_ancestor_paths,
 )
 
 
@@ -31,3 +34,38 @@ class TestCaseSearch(TestCase):
 
         disable_case_search(self.domain)
         self.assertEqual(fake_deleter.call_args, call(self.domain))
+
+    @patch('corehq.apps.case_search.tasks.CaseSearchReindexerFactory')
+    def test_ancestor_paths_active_after_reindex(self, fake_factory):
+        """
+        Indexed ancestor paths are used by queries only once the domain's
+        cases have been reindexed with them
+        """
+        self.addCleanup(get_indexed_ancestor_paths.clear, self.domain)
+        self.addCleanup(get_ancestor_paths_to_index.clear, self.domain)
+
+        def check_paths_during_reindex():
+            self.assertEqual(get_ancestor_paths_to_index(self.domain), ['parent', 'parent/parent'])
+            self.assertEqual(get_indexed_ancestor_paths(self.domain), ['parent'])
+
+        enable_case_search(self.domain)
+        set_indexed_ancestor_paths(self.domain, ['parent'])
+        self.assertEqual(get_indexed_ancestor_paths(self.domain), ['parent'])
+
+        fake_factory().build().reindex.side_effect = check_paths_during_reindex
+        set_indexed_ancestor_paths(self.domain, ['parent', 'parent/parent'])
+        self.assertTrue(fake_factory().build().reindex.called)
+        self.assertEqual(get_indexed_ancestor_paths(self.domain), ['parent', 'parent/parent'])
+
+        fake_factory().build().reindex.side_effect = None
+        with patch('corehq.apps.case_search.tasks.activate_indexed_ancestor_paths') as activate:
+            set_indexed_ancestor_paths(self.domain, ['parent/parent'])
+        # removed paths are not used before the reindex is done
+        self.assertEqual(get_indexed_ancestor_paths(self.domain), ['parent/parent'])
+        self.assertTrue(activate.called)
+
+        with patch('corehq.apps.case_search.tasks.delete_case_search_cases'):
+            disable_case_search(self.domain)
+        self.assertEqual(get_indexed_ancestor_paths(self.domain), [])
+        enable_case_search(self.domain)
+        self.assertEqual(get_indexed_ancestor_paths(self.domain), ['parent/parent'])
@@ -5,6 +5,7 @@ from datetime import date, datetime, time, timedelta
 
 from django.conf import settings
 from django.contrib.postgres.fields import JSONField
+from django.contrib.postgres.fields.jsonb import KeyTextTransform
 from django.db import models, transaction
 from django.db.models import Q
 from django.utils.translation import ugettext_lazy
@@ -486,14 +487,21 @@ class AutomaticUpdateRule(models.Model):
         return date
 
     @classmethod
-    def iter_cases(cls, domain, case_type, boundary_date=None, db=None):
+    def iter_cases(cls, domain, case_type, boundary_date=None, db=None, rules=None, now=None):
+        """
+        :param rules: (optional) For domains using the SQL backend, only return
+        the cases that may match any of these rules (see `get_case_sql_filter`).
+        All cases are returned if any rule has actions for cases that don't
+        match.
+        """
         if should_use_sql_backend(domain):
-            return cls._iter_cases_from_postgres(domain, case_type, boundary_date=boundary_date, db=db)
+            return cls._iter_cases_from_postgres(domain, case_type, boundary_date=boundary_date, db=db,
+                                                 rules=rules, now=now)
         else:
             return cls._iter_cases_from_es(domain, case_type, boundary_date=boundary_date)
 
     @classmethod
-    def _iter_cases_from_postgres(cls, domain, case_type, boundary_date=None, db=None):
+    def _iter_cases_from_postgres(cls, domain, case_type, boundary_date=None, db=None, rules=None, now=None):
         q_expression = Q(
             domain=domain,
             type=case_type,
@@ -504,13 +512,65 @@ class AutomaticUpdateRule(models.Model):
         if boundary_date:
             q_expression = q_expression & Q(server_modified_on__lte=boundary_date)
 
+        annotate = None
+        if rules:
+            rules_q_expression, annotate = cls.get_case_sql_filter_for_rules(rules, now)
+            if rules_q_expression is not None:
+                q_expression = q_expression & rules_q_expression
+
         if db:
-            return paginate_query(db, CommCareCaseSQL, q_expression, load_source='auto_update_rule')
+            return paginate_query(db, CommCareCaseSQL, q_expression, annotate=annotate,
+                                  load_source='auto_update_rule')
         else:
             return paginate_query_across_partitioned_databases(
-                CommCareCaseSQL, q_expression, load_source='auto_update_rule'
+                CommCareCaseSQL, q_expression, annotate=annotate, load_source='auto_update_rule'
             )
 
+    @classmethod
+    def get_case_sql_filter_for_rules(cls, rules, now):
+        """
+        Returns a tuple of (Q, annotations) for CommCareCaseSQL that selects
+        the cases that may match any of `rules`, or (None, {}) if that can't
+        be narrowed down in SQL or if cases that don't match must be checked
+        too because a rule has actions for them.
+        """
+        if any(rule.has_actions_when_case_does_not_match for rule in rules):
+            return None, {}
+
+        q_expression = None
+        annotations = {}
+        for rule in rules:
+            rule_q_expression, rule_annotations = rule.get_case_sql_filter(now)
+            if not rule_q_expression:
+                # the rule may match any case
+                return None, {}
+            q_expression = rule_q_expression if q_expression is None else q_expression | rule_q_expression
+            annotations.update(rule_annotations)
+        return q_expression, annotations
+
+    def get_case_sql_filter(self, now):
+        """
+        Returns a tuple of (Q, annotations) for CommCareCaseSQL that selects
+        at least all the cases that match this rule's server modified boundary
+        and the criteria that can be expressed in SQL. Selected cases must
+        still be checked with `criteria_match`. The Q is empty if no criteria
+        can be expressed in SQL.
+        """
+        q_expression = Q()
+        annotations = {}
+        if self.filter_on_server_modified:
+            q_expression &= Q(server_modified_on__lte=now - timedelta(days=self.server_modified_boundary))
+
+        for criteria in self.memoized_criteria:
+            criteria_filter = criteria.definition.get_case_sql_filter(
+                now, 'rule_criteria_{}'.format(criteria.pk))
+            if criteria_filter:
+                criteria_q_expression, criteria_annotations = criteria_filter
+                q_expression &= criteria_q_expression
+                annotations.update(criteria_annotations)
+
+        return q_expression, annotations
+
     @classmethod
     def _iter_cases_from_es(cls, domain, case_type, boundary_date=None):
         case_ids = list(cls._get_case_ids_from_es(domain, case_type, boundary_date))
@@ -578,8 +638,10 @@ class AutomaticUpdateRule(models.Model):
             'create_schedule_instance_definition',
         ))
 
-    def run_rule(self, case, now):
+    def run_rule(self, case, now, stats=None):
         """
+        :param stats: (optional) A CaseRuleRunStats counting the cases checked
+        and matched by each rule
         :return: CaseRuleActionResult object aggregating the results from all actions.
         """
         if self.deleted:
@@ -591,7 +653,11 @@ class AutomaticUpdateRule(models.Model):
         if not isinstance(case, (CommCareCase, CommCareCaseSQL)) or case.domain != self.domain:
             raise self.RuleError("Invalid case given")
 
-        if self.criteria_match(case, now):
+        matches = self.criteria_match(case, now)
+        if stats is not None:
+            stats.add(self, matches)
+
+        if matches:
             return self.run_actions_when_case_matches(case)
         else:
             return self.run_actions_when_case_does_not_match(case)
@@ -639,6 +705,14 @@ class AutomaticUpdateRule(models.Model):
     def run_actions_when_case_does_not_match(self, case):
         return self._run_method_on_action_definitions(case, 'when_case_does_not_match')
 
+    @property
+    def has_actions_when_case_does_not_match(self):
+        return any(
+            type(action.definition).when_case_does_not_match
+            is not CaseRuleActionDefinition.when_case_does_not_match
+            for action in self.memoized_actions
+        )
+
     def delete_criteria(self):
         for item in self.caserulecriteria_set.all():
             item.definition.delete()
@@ -749,6 +823,15 @@ class CaseRuleCriteriaDefinition(models.Model):
     def matches(self, case, now):
         raise NotImplementedError()
 
+    def get_case_sql_filter(self, now, alias):
+        """
+        Returns a tuple of (Q, annotations) for CommCareCaseSQL that selects
+        at least all the cases that match this criteria, or None if the
+        criteria can't be expressed in SQL. Any annotations are named with
+        `alias` as a prefix.
+        """
+        return None
+
 
 class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
     # True when today < (the date in property_name + property_value days)
@@ -863,6 +946,40 @@ class MatchPropertyDefinition(CaseRuleCriteriaDefinition):
 
         return False
 
+    def get_case_sql_filter(self, now, alias):
+        # Properties of related cases, and case fields that the property may
+        # refer to instead of case_json, are only checked in Python
+        case_fields = [field.name for field in CommCareCaseSQL._meta.fields]
+        if '/' in self.property_name or self.property_name in case_fields:
+            return None
+
+        name = self.property_name
+        if self.match_type in (self.MATCH_EQUAL, self.MATCH_NOT_EQUAL) and self.property_value is None:
+            # a missing property is equal to None
+            return None
+        if self.match_type == self.MATCH_EQUAL:
+            return Q(case_json__contains={name: self.property_value}), {}
+        elif self.match_type == self.MATCH_NOT_EQUAL:
+            return ~Q(case_json__contains={name: self.property_value}), {}
+        elif self.match_type == self.MATCH_HAS_VALUE:
+            return Q(case_json__has_key=name) & ~Q(case_json__contains={name: ''}), {}
+        elif self.match_type in (self.MATCH_DAYS_BEFORE, self.MATCH_DAYS_AFTER):
+            try:
+                days = int(self.property_value)
+            except (ValueError, TypeError):
+                return None
+            # Dates are compared to the ISO date prefix of the property value
+            # (see ALLOWED_DATE_REGEX) as strings, with a day to spare for
+            # values with a timezone
+            annotations = {alias: KeyTextTransform(name, 'case_json')}
+            if self.match_type == self.MATCH_DAYS_BEFORE:
+                earliest = (now - timedelta(days=days + 1)).date()
+                return Q(**{'{}__gte'.format(alias): earliest.isoformat()}), annotations
+            else:
+                after_latest = (now - timedelta(days=days - 2)).date()
+                return Q(**{'{}__lt'.format(alias): after_latest.isoformat()}), annotations
+        return None
+
     def matches(self, case, now):
         return {
             self.MATCH_DAYS_BEFORE: self.check_days_before,
@@ -949,6 +1066,21 @@ class CaseRuleAction(models.Model):
             raise ValueError("Unexpected type found: %s" % type(value))
 
 
+class CaseRuleRunStats(object):
+    """
+    Counts the cases that each rule checked and matched
+    """
+
+    def __init__(self):
+        self.checked = defaultdict(int)
+        self.matched = defaultdict(int)
+
+    def add(self, rule, matches):
+        self.checked[rule.pk] += 1
+        if matches:
+            self.matched[rule.pk] += 1
+
+
 class CaseRuleActionResult(object):
 
     def __eq__(self, other):
@@ -16,6 +16,7 @@ from corehq.apps.data_interfaces.models import (
     AUTO_UPDATE_XMLNS,
     AutomaticUpdateRule,
     CaseRuleActionResult,
+    CaseRuleRunStats,
     CaseRuleSubmission,
     DomainCaseRuleRun,
 )
@@ -31,7 +32,11 @@ from corehq.form_processor.interfaces.dbaccessors import (
 )
 from corehq.form_processor.utils.general import should_use_sql_backend
 from corehq.sql_db.util import get_db_aliases_for_partitioned_query
-from corehq.toggles import DISABLE_CASE_UPDATE_RULE_SCHEDULED_TASK
+from corehq.toggles import (
+    CASE_UPDATE_RULE_SQL_FILTER,
+    DISABLE_CASE_UPDATE_RULE_SCHEDULED_TASK,
+)
+from corehq.util.datadog.gauges import datadog_counter
 from corehq.util.decorators import serial_task
 from corehq.util.log import send_HTML_email
 
@@ -78,7 +83,7 @@ def run_case_update_rules(now=None):
             run_case_update_rules_for_domain.delay(domain, now)
 
 
-def run_rules_for_case(case, rules, now):
+def run_rules_for_case(case, rules, now, stats=None):
     aggregated_result = CaseRuleActionResult()
     last_result = None
     for rule in rules:
@@ -90,7 +95,7 @@ def run_rules_for_case(case, rules, now):
             ):
                 case = CaseAccessors(case.domain).get_case(case.case_id)
 
-        last_result = rule.run_rule(case, now)
+        last_result = rule.run_rule(case, now, stats=stats)
         aggregated_result.add_result(last_result)
         if last_result.num_closes > 0:
             break
@@ -141,10 +146,16 @@ def run_case_update_rules_for_domain_and_db(domain, now, run_id, db=None):
 
     all_rules = list(AutomaticUpdateRule.by_domain(domain, AutomaticUpdateRule.WORKFLOW_CASE_UPDATE))
     rules_by_case_type = AutomaticUpdateRule.organize_rules_by_case_type(all_rules)
+    # Cases that don't match can be left out of the query unless a rule has
+    # actions for them (see AutomaticUpdateRule.get_case_sql_filter_for_rules)
+    use_sql_filter = CASE_UPDATE_RULE_SQL_FILTER.enabled(domain)
+    stats = CaseRuleRunStats()
 
     for case_type, rules in rules_by_case_type.items():
         boundary_date = AutomaticUpdateRule.get_boundary_date(rules, now)
-        for case in AutomaticUpdateRule.iter_cases(domain, case_type, boundary_date, db=db):
+        cases = AutomaticUpdateRule.iter_cases(domain, case_type, boundary_date, db=db,
+                                               rules=rules if use_sql_filter else None, now=now)
+        for case in cases:
             migration_in_progress, last_migration_check_time = check_data_migration_in_progress(domain,
                 last_migration_check_time)
 
@@ -156,20 +167,33 @@ def run_case_update_rules_for_domain_and_db(domain, now, run_id, db=None):
             ):
                 DomainCaseRuleRun.done(run_id, DomainCaseRuleRun.STATUS_HALTED, cases_checked, case_update_result,
                     db=db)
+                _report_rule_stats(domain, all_rules, stats, db)
                 notify_error("Halting rule run for domain %s." % domain)
                 return
 
-            case_update_result.add_result(run_rules_for_case(case, rules, now))
+            case_update_result.add_result(run_rules_for_case(case, rules, now, stats=stats))
             cases_checked += 1
 
     run = DomainCaseRuleRun.done(run_id, DomainCaseRuleRun.STATUS_FINISHED, cases_checked, case_update_result,
         db=db)
+    _report_rule_stats(domain, all_rules, stats, db)
 
     if run.status == DomainCaseRuleRun.STATUS_FINISHED:
         for rule in all_rules:
             AutomaticUpdateRule.objects.filter(pk=rule.pk).update(last_run=now)
 
 
+def _report_rule_stats(domain, rules, stats, db):
+    for rule in rules:
+        checked = stats.checked[rule.pk]
+        matched = stats.matched[rule.pk]
+        logger.info("Case update rule %s in domain %s (db %s) checked %s cases and matched %s",
+                    rule.pk, domain, db, checked, matched)
+        tags = ['domain:{}'.format(domain), 'rule:{}'.format(rule.pk)]
+        datadog_counter('commcare.case_update_rules.cases_checked', checked, tags=tags)
+        datadog_counter('commcare.case_update_rules.cases_matched', matched, tags=tags)
+
+
 @task(serializer='pickle', queue='background_queue', acks_late=True, ignore_result=True)
 def run_case_update_rules_on_save(case):
     key = 'case-update-on-save-case-{case}'.format(case=case.case_id)
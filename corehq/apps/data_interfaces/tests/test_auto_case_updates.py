@@ -1,4 +1,4 @@
-from contextlib import contextmanager
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
 
 from django.test import TestCase, override_settings
@@ -16,6 +16,7 @@ from corehq.apps.data_interfaces.models import (
     CaseRuleAction,
     CaseRuleActionResult,
     CaseRuleCriteria,
+    CaseRuleRunStats,
     CaseRuleSubmission,
     CaseRuleUndoer,
     ClosedParentDefinition,
@@ -1095,6 +1096,107 @@ class CaseRuleEndToEndTests(BaseCaseRuleTest):
                 self.assertLastRuleRun(1)
 
 
+@override_settings(TESTS_SHOULD_USE_SQL_BACKEND=True)
+class CaseRuleSQLFilterTest(BaseCaseRuleTest):
+
+    def _add_criteria(self, rule, property_name, property_value, match_type):
+        rule.add_criteria(
+            MatchPropertyDefinition,
+            property_name=property_name,
+            property_value=property_value,
+            match_type=match_type,
+        )
+
+    def _filtered_case_ids(self, rules, now):
+        return {
+            case.case_id
+            for case in AutomaticUpdateRule.iter_cases(self.domain, 'person', rules=rules, now=now)
+        }
+
+    def assertFilterMatches(self, rules, cases, now):
+        # the SQL filter must select every case that a rule matches
+        filtered_case_ids = self._filtered_case_ids(rules, now)
+        for case in cases:
+            if any(rule.criteria_match(case, now) for rule in rules):
+                self.assertIn(case.case_id, filtered_case_ids)
+
+    def test_property_criteria(self):
+        rule1 = _create_empty_rule(self.domain)
+        self._add_criteria(rule1, 'status', 'active', MatchPropertyDefinition.MATCH_EQUAL)
+        rule2 = _create_empty_rule(self.domain)
+        self._add_criteria(rule2, 'result', None, MatchPropertyDefinition.MATCH_HAS_VALUE)
+
+        now = datetime(2017, 1, 1)
+        with _with_case(self.domain, 'person', now, update={'status': 'active'}) as case1, \
+                _with_case(self.domain, 'person', now, update={'status': 'closed'}) as case2, \
+                _with_case(self.domain, 'person', now, update={'result': ''}) as case3, \
+                _with_case(self.domain, 'person', now, update={'result': 'x'}) as case4:
+            self.assertEqual(self._filtered_case_ids([rule1], now), {case1.case_id})
+            self.assertEqual(self._filtered_case_ids([rule1, rule2], now), {case1.case_id, case4.case_id})
+            self.assertFilterMatches([rule1, rule2], [case1, case2, case3, case4], now)
+
+    def test_date_criteria(self):
+        rules = []
+        match_types = (MatchPropertyDefinition.MATCH_DAYS_BEFORE, MatchPropertyDefinition.MATCH_DAYS_AFTER)
+        for days in ('-5', '0', '5'):
+            for match_type in match_types:
+                rule = _create_empty_rule(self.domain)
+                self._add_criteria(rule, 'last_visit_date', days, match_type)
+                rules.append(rule)
+
+        values = ['2017-01-10', '2017-01-15', '2017-01-15T23:00:00.000000Z', '2017-01-20', 'abc']
+        with ExitStack() as stack:
+            cases = [
+                stack.enter_context(
+                    _with_case(self.domain, 'person', datetime(2017, 1, 1), update={'last_visit_date': value}))
+                for value in values
+            ]
+            for rule in rules:
+                for day in (5, 10, 15, 16, 20, 25):
+                    self.assertFilterMatches([rule], cases, datetime(2017, 1, day, 12))
+
+    def test_unfiltered_rule(self):
+        rule1 = _create_empty_rule(self.domain)
+        self._add_criteria(rule1, 'status', 'active', MatchPropertyDefinition.MATCH_EQUAL)
+        rule2 = _create_empty_rule(self.domain)
+        self._add_criteria(rule2, 'status', 'a.*', MatchPropertyDefinition.MATCH_REGEX)
+
+        now = datetime(2017, 1, 1)
+        with _with_case(self.domain, 'person', now, update={'status': 'active'}) as case1, \
+                _with_case(self.domain, 'person', now, update={'status': 'closed'}) as case2:
+            self.assertEqual(self._filtered_case_ids([rule1, rule2], now), {case1.case_id, case2.case_id})
+
+    def test_rule_with_actions_when_case_does_not_match(self):
+        rule1 = _create_empty_rule(self.domain)
+        self._add_criteria(rule1, 'status', 'active', MatchPropertyDefinition.MATCH_EQUAL)
+        rule1.add_action(UpdateCaseDefinition, close_case=True)
+        rule2 = _create_empty_rule(self.domain)
+        self._add_criteria(rule2, 'status', 'pending', MatchPropertyDefinition.MATCH_EQUAL)
+        rule2.add_action(CreateScheduleInstanceActionDefinition)
+        self.assertFalse(rule1.has_actions_when_case_does_not_match)
+        self.assertTrue(rule2.has_actions_when_case_does_not_match)
+
+        now = datetime(2017, 1, 1)
+        with _with_case(self.domain, 'person', now, update={'status': 'active'}) as case1, \
+                _with_case(self.domain, 'person', now, update={'status': 'closed'}) as case2:
+            self.assertEqual(self._filtered_case_ids([rule1], now), {case1.case_id})
+            # rule2 deletes the schedule instances of cases that don't match
+            self.assertEqual(self._filtered_case_ids([rule1, rule2], now), {case1.case_id, case2.case_id})
+
+    def test_run_stats(self):
+        rule = _create_empty_rule(self.domain)
+        self._add_criteria(rule, 'status', 'active', MatchPropertyDefinition.MATCH_EQUAL)
+        stats = CaseRuleRunStats()
+
+        now = datetime(2017, 1, 1)
+        with _with_case(self.domain, 'person', now, update={'status': 'active'}) as case1, \
+                _with_case(self.domain, 'person', now, update={'status': 'closed'}) as case2:
+            rule.run_rule(case1, now, stats=stats)
+            rule.run_rule(case2, now, stats=stats)
+        self.assertEqual(stats.checked[rule.pk], 2)
+        self.assertEqual(stats.matched[rule.pk], 1)
+
+
 class TestParentCaseReferences(BaseCaseRuleTest):
 
     def test_closed_parent_criteria(self):
@@ -10,7 +10,7 @@ from . import (
     queries,
     users,
 )
-from .es_query import ESQuery, HQESQuery
+from .es_query import ESQuery, ESQueryBatch, HQESQuery
 
 AppES = apps.AppES
 CaseES = cases.CaseES
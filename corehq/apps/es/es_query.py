@@ -93,16 +93,51 @@ Language
  * lt/gt - less/greater than
  * lte/gte - less/greater than or equal to
 
+Caching results
+---------------
+
+Queries that many users run repeatedly, such as report totals and
+aggregations, can opt in to caching their results with ``cached()``:
+
+.. code-block:: python
+
+    total = FormES().domain(domain).cached().count()
+
+Results are cached for ``timeout`` seconds, or until a document is next
+written to the index, whichever is sooner.
+
+Batching queries
+----------------
+
+Pages that run many queries can send them in one ``_msearch`` request with
+an ``ESQueryBatch``. ``batch.run(query)`` returns a result that is only
+fetched, together with all the other results of the batch, when it is
+first used, or when the ``with`` block ends:
+
+.. code-block:: python
+
+    with ESQueryBatch() as batch:
+        forms = batch.run(FormES().domain(domain).user_aggregation())
+        cases = batch.run(CaseES().domain(domain).size(0))
+    forms.aggregations.user.counts_by_bucket()
+    cases.total
+
 .. TODOs:
     sorting
     Add esquery.iter() method
 """
+import hashlib
 import json
+import time
 from collections import namedtuple
 from copy import deepcopy
 
+from django.core.cache import cache
+
 from memoized import memoized
 
+from dimagi.utils.chunked import chunked
+
 from corehq.elastic import (
     ES_DEFAULT_INSTANCE,
     ES_META,
@@ -110,13 +145,25 @@ from corehq.elastic import (
     SIZE_LIMIT,
     ESError,
     ScanResult,
+    report_and_fail_on_shard_failures,
+    run_multi_query,
     run_query,
     scroll_query,
 )
+from corehq.util.datadog.gauges import datadog_counter
+from corehq.util.elastic import get_index_generation, is_result_cache_enabled
+from corehq.util.json import CommCareJSONEncoder
 
 from . import aggregations, filters, queries
 from .utils import flatten_field_dict, values_list
 
+RESULT_CACHE_TIMEOUT = 5 * 60
+# Results are not cached until this long after the last write to the index,
+# so that writes not yet visible to searches are not cached as current
+RESULT_CACHE_REFRESH_INTERVAL = 10  # seconds
+RESULT_CACHE_MAX_SIZE = 1024 * 1024  # bytes
+MAX_MULTI_SEARCH_SIZE = 50  # queries per _msearch request
+
 
 class ESQuery(object):
     """
@@ -143,6 +190,7 @@ class ESQuery(object):
     _size = None
     _aggregations = None
     _source = None
+    _cache_timeout = None
     default_filters = {
         "match_all": filters.match_all()
     }
@@ -213,13 +261,80 @@ class ESQuery(object):
     def run(self, include_hits=False):
         """Actually run the query.  Returns an ESQuerySet object."""
         query = self._clean_before_run(include_hits)
-        raw = run_query(
-            query.index,
-            query.raw_query,
-            debug_host=query.debug_host,
+        if query._cache_timeout and not query.debug_host and query._is_result_cache_enabled():
+            raw = query._run_cached()
+        else:
+            raw = query._run_query()
+        return ESQuerySet(raw, deepcopy(query))
+
+    def _run_query(self):
+        return run_query(
+            self.index,
+            self.raw_query,
+            debug_host=self.debug_host,
             es_instance_alias=self.es_instance_alias,
         )
-        return ESQuerySet(raw, deepcopy(query))
+
+    def _run_cached(self):
+        """Returns the cached result of the query for the current generation of
+        the index, or runs the query and caches its result
+
+        Queries limited to one domain use the generation of that domain, so
+        that writes to other domains don't discard their results.
+        """
+        es_index = self._get_es_index()
+        domain = self._get_filtered_domain()
+        generation = get_index_generation(es_index, domain)
+        query_hash = hashlib.md5(
+            json.dumps(self.raw_query, sort_keys=True, cls=CommCareJSONEncoder).encode('utf-8')
+        ).hexdigest()
+        key = 'es-query-result:{}:{}:{}:{}'.format(
+            self.es_instance_alias, es_index, generation.token, query_hash)
+        tags = [
+            'index:{}'.format(self.index),
+            'scope:{}'.format('domain' if domain else 'index'),
+        ]
+        raw = cache.get(key)
+        if raw is not None:
+            datadog_counter('commcare.es.result_cache.hit', tags=tags)
+            return raw
+
+        datadog_counter('commcare.es.result_cache.miss', tags=tags)
+        raw = self._run_query()
+        if (time.time() - generation.bumped_at > RESULT_CACHE_REFRESH_INTERVAL
+                and 'error' not in raw
+                and len(json.dumps(raw)) <= RESULT_CACHE_MAX_SIZE):
+            cache.set(key, raw, self._cache_timeout)
+        return raw
+
+    def _get_es_index(self):
+        return ES_META[self.index].index if self.index in ES_META else self.index
+
+    def _is_result_cache_enabled(self):
+        return is_result_cache_enabled(self._get_es_index())
+
+    def _get_filtered_domain(self):
+        """Returns the domain the query is limited to by a `filters.domain`
+        filter, or None
+        """
+        domains = {
+            filter_['term']['domain.exact'] for filter_ in self._filters
+            if list(filter_) == ['term'] and list(filter_['term']) == ['domain.exact']
+            and isinstance(filter_['term']['domain.exact'], str)
+        }
+        return domains.pop() if len(domains) == 1 else None
+
+    def cached(self, timeout=RESULT_CACHE_TIMEOUT):
+        """Cache the results of running this query for up to `timeout`
+        seconds. Cached results are discarded when documents are written
+        to the index.
+
+        Results are only cached for the indexes listed in
+        `settings.ES_QUERY_RESULT_CACHE_INDEXES`.
+        """
+        query = deepcopy(self)
+        query._cache_timeout = timeout
+        return query
 
     def _clean_before_run(self, include_hits=False):
         query = deepcopy(self)
@@ -550,6 +665,91 @@ class ESQuerySet(object):
         return '{}({!r}, {!r})'.format(self.__class__.__name__, self.raw, self.query)
 
 
+class LazyESQuerySet(ESQuerySet):
+    """
+    The object returned from ``ESQueryBatch.run``. Its batch is run when
+    ``raw`` is first accessed.
+    """
+
+    def __init__(self, batch, query):
+        self.batch = batch
+        self.query = query
+        self._raw = None
+        self._error = None
+
+    @property
+    def raw(self):
+        if self._raw is None and self._error is None:
+            self.batch.execute()
+        if self._error is not None:
+            raise self._error
+        return self._raw
+
+    def _set_result(self, raw):
+        try:
+            report_and_fail_on_shard_failures(raw)
+            self._raw = ESQuerySet(raw, self.query).raw
+        except ESError as e:
+            self._error = e
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, self.query)
+
+
+class ESQueryBatch(object):
+    """
+    Collects queries to be run together with one ``_msearch`` request per
+    ES instance. See "Batching queries" above.
+
+    Queries with a ``debug_host`` are run separately. Results are not read
+    from or saved to the result cache.
+    """
+
+    def __init__(self, max_size=MAX_MULTI_SEARCH_SIZE):
+        self.max_size = max_size
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.execute()
+
+    def run(self, query, include_hits=False):
+        """Returns a ``LazyESQuerySet`` for the results of ``query``"""
+        query = query._clean_before_run(include_hits)
+        result = LazyESQuerySet(self, query)
+        self.pending.append(result)
+        return result
+
+    def execute(self):
+        """Run all pending queries"""
+        pending, self.pending = self.pending, []
+        by_instance = {}
+        for result in pending:
+            if result.query.debug_host:
+                try:
+                    result._set_result(result.query._run_query())
+                except ESError as e:
+                    result._error = e
+            else:
+                by_instance.setdefault(result.query.es_instance_alias, []).append(result)
+        for es_instance_alias, results in by_instance.items():
+            for chunk in chunked(results, self.max_size):
+                try:
+                    responses = run_multi_query(
+                        [(result.query.index, result.query.raw_query) for result in chunk],
+                        es_instance_alias=es_instance_alias,
+                    )
+                except ESError as e:
+                    for result in chunk:
+                        result._error = e
+                    continue
+                for result, raw in zip(chunk, responses):
+                    result._set_result(raw)
+
+
 class HQESQuery(ESQuery):
     """
     Query logic specific to CommCareHQ
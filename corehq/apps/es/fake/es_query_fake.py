@@ -132,6 +132,10 @@ class ESQueryFake(object):
     def get_ids(self):
         return [h['_id'] for h in self.run().hits]
 
+    def cached(self, timeout=None):
+        # results are always current, so there is nothing to cache
+        return self._clone()
+
     def source(self, fields):
         self._source_fields = fields
         return self
@@ -1,12 +1,16 @@
 from copy import deepcopy
 from unittest import TestCase
 
+from django.core.cache.backends.locmem import LocMemCache
+from django.test.utils import override_settings
+
 from mock import patch
 
 from corehq.apps.es import filters, forms, users
-from corehq.apps.es.es_query import HQESQuery
+from corehq.apps.es.es_query import ESQueryBatch, HQESQuery
 from corehq.apps.es.tests.utils import ElasticTestMixin
-from corehq.elastic import SIZE_LIMIT
+from corehq.elastic import ES_META, SIZE_LIMIT, ESError
+from corehq.util.elastic import bump_index_generation
 
 
 class TestESQuery(ElasticTestMixin, TestCase):
@@ -312,3 +316,112 @@ class TestESQuery(ElasticTestMixin, TestCase):
         }
         query = HQESQuery('forms').domain('test-exclude').exclude_source()
         self.checkQuery(query, json_output)
+
+
+@patch('corehq.apps.es.es_query.datadog_counter', lambda *args, **kwargs: None)
+class TestESQueryResultCache(TestCase):
+
+    def setUp(self):
+        self.cache = LocMemCache('es-query-result-cache', {})
+        self.addCleanup(self.cache.clear)
+        settings_override = override_settings(ES_QUERY_RESULT_CACHE_INDEXES=['forms'])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for module in ['corehq.apps.es.es_query', 'corehq.util.elastic']:
+            patcher = patch('{}.cache'.format(module), self.cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('corehq.apps.es.es_query.run_query')
+        self.run_query = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.run_query.side_effect = lambda *args, **kwargs: {
+            'hits': {'hits': [], 'total': self.run_query.call_count}
+        }
+        # results aren't cached until the last write has been refreshed
+        self._age_index_generation()
+
+    def _age_index_generation(self, domains=None):
+        with patch('corehq.util.elastic.time.time', return_value=0):
+            bump_index_generation(ES_META['forms'].index, domains)
+
+    def test_not_cached_by_default(self):
+        query = forms.FormES().domain('test-cache')
+        self.assertEqual([query.count(), query.count()], [1, 2])
+
+    def test_cached(self):
+        query = forms.FormES().domain('test-cache').cached()
+        self.assertEqual([query.count(), query.count()], [1, 1])
+        self.assertEqual(forms.FormES().domain('other').cached().count(), 2)
+
+    def test_invalidated_by_write(self):
+        query = forms.FormES().domain('test-cache').cached()
+        self.assertEqual(query.count(), 1)
+        self._age_index_generation()
+        self.assertEqual(query.count(), 2)
+
+    def test_recent_write(self):
+        bump_index_generation(ES_META['forms'].index)
+        query = forms.FormES().domain('test-cache').cached()
+        self.assertEqual([query.count(), query.count()], [1, 2])
+
+    def test_index_not_cached(self):
+        query = users.UserES().domain('test-cache').cached()
+        self.assertEqual([query.count(), query.count()], [1, 2])
+
+        bump_index_generation(ES_META['users'].index)
+        self.assertIsNone(self.cache.get('es-index-generation:{}'.format(ES_META['users'].index)))
+
+    def test_domain_generation(self):
+        query = forms.FormES().domain('test-cache').cached()
+        all_domains_query = forms.FormES().cached()
+        self.assertEqual([query.count(), all_domains_query.count()], [1, 2])
+
+        # writes to other domains only discard results across domains
+        self._age_index_generation(['other'])
+        self.assertEqual([query.count(), all_domains_query.count()], [1, 3])
+
+        self._age_index_generation(['test-cache'])
+        self.assertEqual([query.count(), all_domains_query.count()], [4, 5])
+
+        # writes whose domains are not known discard all results
+        self._age_index_generation()
+        self.assertEqual([query.count(), all_domains_query.count()], [6, 7])
+
+
+@patch('corehq.apps.es.es_query.run_multi_query')
+class TestESQueryBatch(TestCase):
+
+    def _response(self, total):
+        return {'hits': {'hits': [], 'total': total}}
+
+    def test_lazy(self, run_multi_query):
+        run_multi_query.return_value = [self._response(1), self._response(2)]
+        batch = ESQueryBatch()
+        forms_result = batch.run(forms.FormES().domain('test-batch').size(0))
+        users_result = batch.run(users.UserES().domain('test-batch').size(0))
+        run_multi_query.assert_not_called()
+
+        self.assertEqual(forms_result.total, 1)
+        self.assertEqual(users_result.total, 2)
+        run_multi_query.assert_called_once_with([
+            ('forms', forms_result.query.raw_query),
+            ('users', users_result.query.raw_query),
+        ], es_instance_alias='default')
+
+    def test_context(self, run_multi_query):
+        run_multi_query.side_effect = lambda queries, es_instance_alias: [
+            self._response(i) for i, query in enumerate(queries)
+        ]
+        with ESQueryBatch(max_size=2) as batch:
+            results = [batch.run(forms.FormES().domain('test-batch').size(0)) for i in range(3)]
+        self.assertEqual(run_multi_query.call_count, 2)
+        self.assertEqual([result.total for result in results], [0, 1, 0])
+
+    def test_error(self, run_multi_query):
+        run_multi_query.return_value = [{'error': 'bad query'}, self._response(2)]
+        with ESQueryBatch() as batch:
+            bad_result = batch.run(forms.FormES().domain('test-batch').size(0))
+            result = batch.run(forms.FormES().domain('test-batch').size(0))
+        self.assertEqual(result.total, 2)
+        with self.assertRaises(ESError):
+            bad_result.total
@@ -0,0 +1,261 @@
+"""
+Columnar intermediate storage for export rows.
+
+Multiprocess exports write the rows each worker generates for a page of
+documents to a columnar file rather than to a formatted export file, so
+that the final CSV / Excel output can be written in one pass without
+re-parsing per page outputs.
+
+A columnar file is a sequence of chunks, one per `write_rows` call. Each
+chunk holds the rows of one table of the export:
+
+    table index, number of rows, number of columns (uint32 each)
+    for each column: type code (1 byte), data length (uint64), data
+
+with the column data encoded according to its type:
+
+    's': UTF-8 strings: uint64 end offsets followed by the string bytes
+    'i': int64 values
+    'f': float64 values
+    'o': a pickled list of values of any other (or mixed) type
+
+Chunks whose rows are not all the same length are stored with
+`VARIABLE_WIDTH` columns and a single pickled list of rows.
+
+Files are read back through a memory map, one chunk at a time.
+
+Files written with `include_doc_ids` have the id and row number of the
+form or case each row was generated from as two extra first columns, which
+allows rows to be replaced by document (see `merge_columnar_files`).
+"""
+import contextlib
+from collections import OrderedDict
+import mmap
+import pickle
+import struct
+from array import array
+
+from corehq.apps.export.models import ExportRow
+
+CHUNK_HEADER = struct.Struct('<III')
+COLUMN_HEADER = struct.Struct('<cQ')
+VARIABLE_WIDTH = 0xFFFFFFFF
+
+# number of extra columns in files written with `include_doc_ids`
+DOC_COLUMNS = 2
+
+STRING = b's'
+INT = b'i'
+FLOAT = b'f'
+OBJECT = b'o'
+
+
+class ColumnarExportWriter(object):
+    """
+    An export writer (see `corehq.apps.export.export._ExportWriter`) that
+    stores the rows of a single export instance in a columnar file.
+    """
+    format = 'columnar'
+
+    def __init__(self, path, include_doc_ids=False):
+        self.path = path
+        self.include_doc_ids = include_doc_ids
+        self.file = None
+        self.table_indices = None
+
+    @contextlib.contextmanager
+    def open(self, export_instances):
+        assert len(export_instances) == 1, "Columnar files hold rows for one export instance"
+        self.table_indices = {
+            table: index for index, table in enumerate(export_instances[0].selected_tables)
+        }
+        with open(self.path, 'wb') as file:
+            self.file = file
+            try:
+                yield
+            finally:
+                self.file = None
+
+    def write(self, table, row):
+        self.write_rows(table, [row])
+
+    def write_rows(self, table, rows):
+        if not rows:
+            return
+        if self.include_doc_ids:
+            data = [[row.doc_id, row.row_number] + list(row.data) for row in rows]
+        else:
+            data = [row.data for row in rows]
+        self.file.write(encode_chunk(self.table_indices[table], data))
+
+
+def encode_chunk(table_index, rows):
+    """Encode the rows of one table as a columnar chunk"""
+    num_columns = len(rows[0])
+    if any(len(row) != num_columns for row in rows):
+        data = pickle.dumps([list(row) for row in rows], pickle.HIGHEST_PROTOCOL)
+        return b''.join([
+            CHUNK_HEADER.pack(table_index, len(rows), VARIABLE_WIDTH),
+            COLUMN_HEADER.pack(OBJECT, len(data)),
+            data,
+        ])
+
+    parts = [CHUNK_HEADER.pack(table_index, len(rows), num_columns)]
+    for column in zip(*rows):
+        type_code, data = _encode_column(column)
+        parts.append(COLUMN_HEADER.pack(type_code, len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def _encode_column(values):
+    types = {type(value) for value in values}
+    if types == {str}:
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = array('Q')
+        end = 0
+        for value in encoded:
+            end += len(value)
+            offsets.append(end)
+        return STRING, offsets.tobytes() + b''.join(encoded)
+    if types == {int}:
+        try:
+            return INT, array('q', values).tobytes()
+        except OverflowError:
+            pass
+    elif types == {float}:
+        return FLOAT, array('d', values).tobytes()
+    return OBJECT, pickle.dumps(list(values), pickle.HIGHEST_PROTOCOL)
+
+
+def iter_chunks(path):
+    """
+    Read a columnar file
+
+    :returns: Iterator of `(table_index, rows)` tuples, one per chunk, where
+    `rows` is a list of row data lists.
+    """
+    with open(path, 'rb') as file:
+        if not file.seek(0, 2):
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            offset = 0
+            while offset < len(data):
+                table_index, num_rows, num_columns = CHUNK_HEADER.unpack_from(data, offset)
+                offset += CHUNK_HEADER.size
+                if num_columns == VARIABLE_WIDTH:
+                    type_code, size = COLUMN_HEADER.unpack_from(data, offset)
+                    offset += COLUMN_HEADER.size
+                    rows = pickle.loads(data[offset:offset + size])
+                    offset += size
+                    yield table_index, rows
+                    continue
+
+                columns = []
+                for column_index in range(num_columns):
+                    type_code, size = COLUMN_HEADER.unpack_from(data, offset)
+                    offset += COLUMN_HEADER.size
+                    columns.append(_decode_column(type_code, data, offset, size, num_rows))
+                    offset += size
+                if columns:
+                    yield table_index, [list(row) for row in zip(*columns)]
+                else:
+                    yield table_index, [[] for i in range(num_rows)]
+
+
+def _decode_column(type_code, data, offset, size, num_rows):
+    if type_code == STRING:
+        offsets = array('Q')
+        offsets.frombytes(data[offset:offset + 8 * num_rows])
+        strings = data[offset + 8 * num_rows:offset + size]
+        values = []
+        start = 0
+        for end in offsets:
+            values.append(strings[start:end].decode('utf-8'))
+            start = end
+        return values
+    if type_code in (INT, FLOAT):
+        values = array('q' if type_code == INT else 'd')
+        values.frombytes(data[offset:offset + size])
+        return values.tolist()
+    return pickle.loads(data[offset:offset + size])
+
+
+def get_doc_row_numbers(path):
+    """
+    Get the row number of each document in a file written with `include_doc_ids`
+
+    :returns: Dict of document id to row number.
+    """
+    return {
+        row[0]: row[1]
+        for table_index, rows in iter_chunks(path)
+        for row in rows
+    }
+
+
+def merge_columnar_files(base_path, new_path, replaced_doc_ids, output_path):
+    """
+    Write the rows of `base_path` with the rows of `new_path` merged in to
+    `output_path`. Both files must have been written with `include_doc_ids`.
+
+    Rows of `base_path` for documents in `new_path` or `replaced_doc_ids`
+    are left out. Where a document has rows in the same table of both files,
+    its rows from `new_path` are written in place of its first row in
+    `base_path`. All other rows of `new_path` are written after the rows
+    of `base_path`.
+
+    The rows of `new_path` are held in memory.
+    """
+    new_rows = OrderedDict()
+    for table_index, rows in iter_chunks(new_path):
+        for row in rows:
+            new_rows.setdefault((table_index, row[0]), []).append(row)
+    replaced_doc_ids = set(replaced_doc_ids)
+    replaced_doc_ids.update(doc_id for table_index, doc_id in new_rows)
+
+    with open(output_path, 'wb') as output:
+        for table_index, rows in iter_chunks(base_path):
+            merged = []
+            for row in rows:
+                doc_id = row[0]
+                if doc_id not in replaced_doc_ids:
+                    merged.append(row)
+                elif (table_index, doc_id) in new_rows:
+                    merged.extend(new_rows.pop((table_index, doc_id)))
+            if merged:
+                output.write(encode_chunk(table_index, merged))
+
+        remaining = OrderedDict()
+        for (table_index, doc_id), rows in new_rows.items():
+            remaining.setdefault(table_index, []).extend(rows)
+        for table_index, rows in remaining.items():
+            output.write(encode_chunk(table_index, rows))
+
+
+def write_columnar_files(writer, export_instance, paths, has_doc_ids=False):
+    """
+    Write the rows stored in columnar files to an open export writer
+
+    :param writer: An open _ExportWriter or _PaginatedExportWriter
+    :param export_instance: The ExportInstance the files were written for
+    :param paths: Paths of columnar files, in the order their rows should be written
+    :param has_doc_ids: Whether the files were written with `include_doc_ids`
+    :returns: Number of rows written
+    """
+    tables = export_instance.selected_tables
+    hyperlink_column_indices = [
+        table.get_hyperlink_column_indices(export_instance.split_multiselects)
+        for table in tables
+    ]
+    total_rows = 0
+    for path in paths:
+        for table_index, rows in iter_chunks(path):
+            if has_doc_ids:
+                rows = [row[DOC_COLUMNS:] for row in rows]
+            writer.write_rows(tables[table_index], [
+                ExportRow(data=row, hyperlink_column_indices=hyperlink_column_indices[table_index])
+                for row in rows
+            ])
+            total_rows += len(rows)
+    return total_rows
@@ -1,5 +1,8 @@
 import contextlib
 import datetime
+import hashlib
+import json
+import shutil
 import sys
 import time
 from collections import Counter
@@ -8,9 +11,18 @@ from couchdbkit import ResourceConflict
 
 from couchexport.export import FormattedRow, get_writer
 from couchexport.models import Format
+from dimagi.utils.chunked import chunked
 from dimagi.utils.logging import notify_exception
+from dimagi.utils.parsing import string_to_utc_datetime
 from soil import DownloadBase
 
+from corehq.apps.es import filters as es_filters
+from corehq.apps.export.columnar import (
+    ColumnarExportWriter,
+    get_doc_row_numbers,
+    merge_columnar_files,
+    write_columnar_files,
+)
 from corehq.apps.export.const import MAX_EXPORTABLE_ROWS
 from corehq.apps.export.dbaccessors import get_properly_wrapped_export_instance
 from corehq.apps.export.esaccessors import (
@@ -21,6 +33,7 @@ from corehq.apps.export.esaccessors import (
 from corehq.apps.export.models.new import (
     CaseExportInstance,
     FormExportInstance,
+    IncrementalExportCheckpoint,
     SMSExportInstance,
 )
 from corehq.elastic import iter_es_docs_from_query
@@ -30,6 +43,15 @@ from corehq.util.datadog.utils import DAY_SCALE_TIME_BUCKETS, load_counter
 from corehq.util.files import TransientTempfile, safe_filename
 
 
+# number of documents for which export rows are generated and written at a time
+EXPORT_DOCUMENT_PAGE_SIZE = 1000
+
+INCREMENTAL_EXPORT_MODIFIED_FIELD = 'server_modified_on'
+# documents modified up to this long before an incremental export's checkpoint
+# are processed again to pick up documents that were indexed late
+INCREMENTAL_EXPORT_OVERLAP = datetime.timedelta(hours=1)
+
+
 class ExportFile(object):
     # This is essentially coppied from couchexport.files.ExportFiles
 
@@ -110,6 +132,21 @@ class _ExportWriter(object):
             (table, [FormattedRow(data=row.data, hyperlink_column_indices=row.hyperlink_column_indices)])
         ])
 
+    def write_rows(self, table, rows):
+        """
+        Write the given rows to the given table of the export in one call.
+        :param table: A TableConfiguration
+        :param rows: A list of ExportRows
+        """
+        if not rows:
+            return
+        return self.writer.write([
+            (table, [
+                FormattedRow(data=row.data, hyperlink_column_indices=row.hyperlink_column_indices)
+                for row in rows
+            ])
+        ])
+
     def get_preview(self):
         return self.writer.get_preview()
 
@@ -250,19 +287,33 @@ class _PaginatedExportWriter(object):
         :param table: A TableConfiguration
         :param row: An ExportRow
         """
-        if self.rows_written[table] >= MAX_EXPORTABLE_ROWS * (self.pages[table] + 1):
-            self.pages[table] += 1
-            self.writer.add_table(
-                self._paged_table_index(table),
-                self._get_paginated_headers()[self._paged_table_index(table)][0],
-                table_title=self._get_paginated_table_titles()[self._paged_table_index(table)],
-            )
+        self.write_rows(table, [row])
 
-        self.writer.write([(self._paged_table_index(table), [FormattedRow(data=row.data)])])
-        self.rows_written[table] += 1
+    def write_rows(self, table, rows):
+        """
+        Write the given rows to the given table of the export, with one
+        call to the underlying writer per page the rows are written to.
+        :param table: A TableConfiguration
+        :param rows: A list of ExportRows
+        """
+        while rows:
+            if self.rows_written[table] >= MAX_EXPORTABLE_ROWS * (self.pages[table] + 1):
+                self.pages[table] += 1
+                self.writer.add_table(
+                    self._paged_table_index(table),
+                    self._get_paginated_headers()[self._paged_table_index(table)][0],
+                    table_title=self._get_paginated_table_titles()[self._paged_table_index(table)],
+                )
+
+            page_size = MAX_EXPORTABLE_ROWS * (self.pages[table] + 1) - self.rows_written[table]
+            page_rows, rows = rows[:page_size], rows[page_size:]
+            self.writer.write([
+                (self._paged_table_index(table), [FormattedRow(data=row.data) for row in page_rows])
+            ])
+            self.rows_written[table] += len(page_rows)
 
 
-def get_export_writer(export_instances, temp_path, allow_pagination=True):
+def get_export_writer(export_instances, temp_path, allow_pagination=True, force_pagination=False):
     """
     Return a new _Writer
     """
@@ -271,7 +322,7 @@ def get_export_writer(export_instances, temp_path, allow_pagination=True):
         format = export_instances[0].export_format
 
     legacy_writer = get_writer(format)
-    if allow_pagination and PAGINATED_EXPORTS.enabled(export_instances[0].domain):
+    if force_pagination or (allow_pagination and PAGINATED_EXPORTS.enabled(export_instances[0].domain)):
         writer = _PaginatedExportWriter(legacy_writer, temp_path)
     else:
         writer = _ExportWriter(legacy_writer, temp_path)
@@ -324,7 +375,8 @@ def get_export_size(export_instance, filters):
     return _get_export_query(export_instance, filters).count()
 
 
-def write_export_instance(writer, export_instance, documents, progress_tracker=None):
+def write_export_instance(writer, export_instance, documents, progress_tracker=None, first_row_number=0,
+                          row_numbers=None):
     """
     Write rows to the given open _Writer.
     Rows will be written to each table in the export instance for each of
@@ -333,6 +385,10 @@ def write_export_instance(writer, export_instance, documents, progress_tracker=N
     :param export_instance: An ExportInstance
     :param documents: An iterable yielding documents
     :param progress_tracker: A task for soil to track progress against
+    :param first_row_number: The row number of the first document
+    :param row_numbers: Optional dict of document id to row number for documents
+                        that already have one. Other documents are numbered
+                        consecutively from `first_row_number`.
     :return: None
     """
     if progress_tracker:
@@ -345,40 +401,42 @@ def write_export_instance(writer, export_instance, documents, progress_tracker=N
     write_total = 0
     track_load = load_counter(export_instance.type, "export", export_instance.domain)
 
-    for row_number, doc in enumerate(documents):
-        total_bytes += sys.getsizeof(doc)
+    row_number = first_row_number
+    doc_count = 0
+    for page in chunked(documents, EXPORT_DOCUMENT_PAGE_SIZE, list):
+        total_bytes += sum(sys.getsizeof(doc) for doc in page)
+        page_row_numbers = []
+        for doc in page:
+            if row_numbers and doc['_id'] in row_numbers:
+                page_row_numbers.append(row_numbers[doc['_id']])
+            else:
+                page_row_numbers.append(row_number)
+                row_number += 1
         for table in export_instance.selected_tables:
             compute_start = _time_in_milliseconds()
             try:
-                rows = table.get_rows(
-                    doc,
-                    row_number,
+                rows = table.get_rows_for_documents(
+                    page,
+                    None,
                     split_columns=export_instance.split_multiselects,
                     transform_dates=export_instance.transform_dates,
+                    row_numbers=page_row_numbers,
                 )
             except Exception as e:
-                notify_exception(None, "Error exporting doc", details={
-                    'domain': export_instance.domain,
-                    'export_instance_id': export_instance.get_id,
-                    'export_table': table.label,
-                    'doc_id': doc.get('_id'),
-                })
-                e.sentry_capture = False
+                _notify_export_error(export_instance, table, page, page_row_numbers, e)
                 raise
             compute_total += _time_in_milliseconds() - compute_start
 
             write_start = _time_in_milliseconds()
-            for row in rows:
-                # It might be bad to write one row at a time when you can do more (from a performance perspective)
-                # Regardless, we should handle the batching of rows in the _Writer class, not here.
-                writer.write(table, row)
+            writer.write_rows(table, rows)
             write_total += _time_in_milliseconds() - write_start
 
             total_rows += len(rows)
 
-        track_load()
+        doc_count += len(page)
+        track_load(len(page))
         if progress_tracker:
-            DownloadBase.set_progress(progress_tracker, row_number + 1, documents.count)
+            DownloadBase.set_progress(progress_tracker, doc_count, documents.count)
 
     end = _time_in_milliseconds()
     tags = ['format:{}'.format(writer.format)]
@@ -388,6 +446,37 @@ def write_export_instance(writer, export_instance, documents, progress_tracker=N
     _record_export_duration(end - start, export_instance)
 
 
+def _notify_export_error(export_instance, table, documents, row_numbers, error):
+    """Report an error generating rows for a page of documents
+
+    The documents are re-run one at a time to find the one that failed.
+    If none fails on its own, the original error is reported with the
+    ids of all documents in the page.
+    """
+    details = {
+        'domain': export_instance.domain,
+        'export_instance_id': export_instance.get_id,
+        'export_table': table.label,
+    }
+    for row_number, doc in zip(row_numbers, documents):
+        try:
+            table.get_rows(
+                doc,
+                row_number,
+                split_columns=export_instance.split_multiselects,
+                transform_dates=export_instance.transform_dates,
+            )
+        except Exception as e:
+            details['doc_id'] = doc.get('_id')
+            notify_exception(None, "Error exporting doc", details=details)
+            e.sentry_capture = False
+            raise
+
+    details['doc_ids'] = [doc.get('_id') for doc in documents]
+    notify_exception(None, "Error exporting docs", details=details)
+    error.sentry_capture = False
+
+
 def _time_in_milliseconds():
     return int(time.time() * 1000)
 
@@ -464,6 +553,9 @@ def rebuild_export(export_instance, progress_tracker):
     """
     Rebuild the given daily saved ExportInstance
     """
+    if export_instance.is_incremental and isinstance(export_instance, (FormExportInstance, CaseExportInstance)):
+        return rebuild_incremental_export(export_instance, progress_tracker)
+
     filters = export_instance.get_filters()
     with TransientTempfile() as temp_path:
         export_file = get_export_file([export_instance], filters or [], temp_path, progress_tracker)
@@ -471,9 +563,139 @@ def rebuild_export(export_instance, progress_tracker):
             save_export_payload(export_instance, payload)
 
 
-def save_export_payload(export, payload):
+def rebuild_incremental_export(export_instance, progress_tracker=None):
+    """
+    Rebuild the given daily saved ExportInstance, only processing documents
+    modified since its last build.
+
+    All rows of the export are kept in a columnar base file stored with the
+    export. Rows for documents modified since the checkpoint replace their
+    previous rows in place and keep their row numbers (so case exports keep
+    one set of rows per case), rows for new documents are appended, and rows
+    for modified documents that no longer match the filters are removed.
+    The payload is then written from the result.
+
+    The base file is built from scratch when there is none or the export's
+    tables or resolved filters have changed. Filters are compared after
+    they are resolved, so exports filtered to a relative date range, or to
+    users, groups or locations whose membership changes, are rebuilt from
+    scratch when the dates or members change. Documents that are deleted or
+    archived after they have been exported keep their rows until then.
+    """
+    filters = export_instance.get_filters() or []
+    checkpoint = export_instance.incremental_checkpoint
+    config_hash = _get_incremental_config_hash(export_instance, filters)
+    use_base = (
+        checkpoint.last_modified is not None
+        and checkpoint.config_hash == config_hash
+        and export_instance.has_incremental_base()
+    )
+
+    with TransientTempfile() as new_rows_path, TransientTempfile() as base_path, \
+            TransientTempfile() as merged_path, TransientTempfile() as temp_path:
+        query = _get_export_query(export_instance, filters)
+        if use_base:
+            modified_since = es_filters.date_range(
+                INCREMENTAL_EXPORT_MODIFIED_FIELD,
+                gte=checkpoint.last_modified - INCREMENTAL_EXPORT_OVERLAP,
+            )
+            query = query.filter(modified_since)
+            # includes documents modified to no longer match the filters
+            modified_ids = set(_get_base_query(export_instance).filter(modified_since).scroll_ids())
+            with open(base_path, 'wb') as base_file:
+                shutil.copyfileobj(export_instance.get_incremental_base(stream=True), base_file)
+            row_numbers = get_doc_row_numbers(base_path)
+            first_row_number = checkpoint.doc_count
+        else:
+            row_numbers = {}
+            first_row_number = 0
+        docs = _IncrementalDocuments(
+            iter_es_docs_from_query(query),
+            last_modified=checkpoint.last_modified if use_base else None,
+            existing_doc_ids=row_numbers,
+        )
+
+        columnar_writer = ColumnarExportWriter(new_rows_path, include_doc_ids=True)
+        with columnar_writer.open([export_instance]):
+            write_export_instance(
+                columnar_writer, export_instance, docs, progress_tracker,
+                first_row_number=first_row_number, row_numbers=row_numbers,
+            )
+
+        if use_base:
+            merge_columnar_files(base_path, new_rows_path, modified_ids, merged_path)
+            rows_path = merged_path
+        else:
+            rows_path = new_rows_path
+
+        writer = get_export_writer([export_instance], temp_path)
+        with writer.open([export_instance]):
+            write_columnar_files(writer, export_instance, [rows_path], has_doc_ids=True)
+
+        new_checkpoint = IncrementalExportCheckpoint(
+            last_modified=docs.last_modified,
+            doc_count=first_row_number + docs.new_doc_count,
+            config_hash=config_hash,
+        )
+        with ExportFile(writer.path, writer.format) as payload, open(rows_path, 'rb') as base:
+            save_export_payload(
+                export_instance, payload, incremental_base=base, incremental_checkpoint=new_checkpoint
+            )
+
+
+class _IncrementalDocuments(object):
+    """
+    Wraps export documents to keep track of the number of new documents
+    and the latest modified time of the documents that have been iterated
+    """
+
+    def __init__(self, documents, last_modified=None, existing_doc_ids=()):
+        self.documents = documents
+        self.count = documents.count
+        self.last_modified = last_modified
+        self.existing_doc_ids = existing_doc_ids
+        self.new_doc_count = 0
+
+    def __iter__(self):
+        for doc in self.documents:
+            if doc['_id'] not in self.existing_doc_ids:
+                self.new_doc_count += 1
+            modified = doc.get(INCREMENTAL_EXPORT_MODIFIED_FIELD)
+            if modified:
+                modified = string_to_utc_datetime(modified)
+                if self.last_modified is None or modified > self.last_modified:
+                    self.last_modified = modified
+            yield doc
+
+
+def _get_incremental_config_hash(export_instance, filters):
+    config = {
+        'tables': [table.to_json() for table in export_instance.selected_tables],
+        'split_multiselects': export_instance.split_multiselects,
+        'transform_dates': export_instance.transform_dates,
+        'filters': _sort_lists([filter.to_es_filter() for filter in filters]),
+    }
+    return hashlib.md5(json.dumps(config, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _sort_lists(value):
+    """Sort lists of values in a JSON-like structure, such as lists of owner ids in a filter"""
+    if isinstance(value, dict):
+        return {key: _sort_lists(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        items = [_sort_lists(item) for item in value]
+        if all(isinstance(item, str) for item in items):
+            return sorted(items)
+        return items
+    return value
+
+
+def save_export_payload(export, payload, incremental_base=None, incremental_checkpoint=None):
     """
     Save the contents of an export file to disk for later retrieval.
+
+    :param incremental_base: The columnar base file of an incremental export
+    :param incremental_checkpoint: The IncrementalExportCheckpoint for `incremental_base`
     """
     if export.last_accessed is None:
         export.last_accessed = datetime.datetime.utcnow()
@@ -482,6 +704,9 @@ def save_export_payload(export, payload):
     try:
         with export.atomic_blobs():
             export.set_payload(payload)
+            if incremental_base is not None:
+                export.set_incremental_base(incremental_base)
+                export.incremental_checkpoint = incremental_checkpoint
     except ResourceConflict:
         # task was executed concurrently, so let first to finish win and abort the rest
         pass
@@ -0,0 +1,81 @@
+from timeit import default_timer
+
+from django.core.management import BaseCommand
+
+from corehq.apps.export.models import (
+    ExportColumn,
+    PathNode,
+    RowNumberColumn,
+    ScalarItem,
+    TableConfiguration,
+)
+
+
+class Command(BaseCommand):
+    """Compare rows/sec of building export rows per document with
+    `get_rows` and per page with `get_rows_for_documents` on synthetic
+    form documents.
+
+    Usage: ./manage.py benchmark_export_rows --docs 2000 --questions 20
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--docs', type=int, default=2000,
+                            help='Number of documents')
+        parser.add_argument('--questions', type=int, default=20,
+                            help='Number of questions in each document')
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Number of runs, of which the fastest is reported')
+
+    def handle(self, docs, questions, repeat, **options):
+        table = _make_table(questions)
+        documents = _make_documents(docs, questions)
+
+        def per_document():
+            rows = []
+            for row_number, doc in enumerate(documents):
+                rows.extend(table.get_rows(doc, row_number, transform_dates=True))
+            return rows
+
+        def per_page():
+            return table.get_rows_for_documents(documents, 0, transform_dates=True)
+
+        results = {}
+        for name, func in [("per document", per_document), ("per page", per_page)]:
+            best = None
+            for i in range(repeat):
+                start = default_timer()
+                rows = func()
+                elapsed = default_timer() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = [row.data for row in rows]
+            print("{:<12} {:8.3f}s {:10.0f} rows/sec".format(name, best, len(rows) / best))
+
+        if results["per document"] != results["per page"]:
+            print("WARNING: the rows built per document and per page differ")
+
+
+def _make_table(num_questions):
+    return TableConfiguration(
+        path=[],
+        columns=[RowNumberColumn(selected=True)] + [
+            ExportColumn(
+                item=ScalarItem(
+                    path=[PathNode(name='form'), PathNode(name='group'), PathNode(name='q{}'.format(i))],
+                ),
+                selected=True,
+            )
+            for i in range(num_questions)
+        ]
+    )
+
+
+def _make_documents(num_docs, num_questions):
+    return [
+        {
+            'domain': 'my-domain',
+            '_id': 'doc-{}'.format(n),
+            'form': {'group': {'q{}'.format(i): 'value {}'.format(i) for i in range(num_questions)}},
+        }
+        for n in range(num_docs)
+    ]
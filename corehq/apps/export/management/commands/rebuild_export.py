@@ -26,6 +26,13 @@ class Command(BaseCommand):
             default=multiprocessing.cpu_count() - 1,
             help='Number of parallel processes to run.'
         )
+        parser.add_argument(
+            '--columnar',
+            action='store_true',
+            default=False,
+            help='Write rows to columnar files in the worker processes and '
+                 'combine them into a single export file.'
+        )
 
     def handle(self, **options):
         if __debug__:
@@ -34,7 +41,8 @@ class Command(BaseCommand):
         export_id = options.pop('export_id')
         page_size = options.pop('page_size')
         processes = options.pop('processes')
+        columnar = options.pop('columnar')
 
-        rebuild_export_mutiprocess(export_id, processes, page_size)
+        rebuild_export_mutiprocess(export_id, processes, page_size, columnar=columnar)
 
         self.stdout.write(self.style.SUCCESS('Rebuild Complete'))
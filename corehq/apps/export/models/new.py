@@ -3,7 +3,7 @@ from collections import OrderedDict, defaultdict, namedtuple
 from copy import copy
 from datetime import datetime
 from functools import partial
-from itertools import groupby
+from itertools import count, groupby
 
 from django.core.exceptions import ValidationError
 from django.db import models
@@ -99,7 +99,10 @@ from corehq.apps.reports.models import HQUserType
 from corehq.apps.userreports.app_manager.data_source_meta import (
     get_form_indicator_data_type,
 )
-from corehq.apps.userreports.expressions.getters import NestedDictGetter
+from corehq.apps.userreports.expressions.getters import (
+    NestedDictGetter,
+    safe_recursive_lookup,
+)
 from corehq.blobs import CODES, get_blob_db
 from corehq.blobs.exceptions import NotFound
 from corehq.blobs.mixin import BlobMixin
@@ -112,6 +115,7 @@ from corehq.util.timezones.utils import get_timezone_for_domain
 from corehq.util.view_utils import absolute_reverse
 
 DAILY_SAVED_EXPORT_ATTACHMENT_NAME = "payload"
+INCREMENTAL_EXPORT_BASE_ATTACHMENT_NAME = "incremental_base"
 
 
 class PathNode(DocumentSchema):
@@ -272,55 +276,60 @@ class ExportColumn(DocumentSchema):
         path = [x.name for x in self.item.path[len(base_path):]]
         return self._transform(NestedDictGetter(path)(doc), doc, transform_dates)
 
-    def _transform(self, value, doc, transform_dates):
+    def get_value_function(self, base_path, transform_dates=False, split_column=False):
         """
-        Transform the given value with the transform specified in self.item.transform.
-        Also transform dates if the transform_dates flag is true.
+        Return a function `(domain, doc_id, doc, row_index)` that returns the same
+        value as `get_value` with the given arguments.
+
+        For plain columns the path and transforms are resolved once, which makes
+        the returned function much cheaper to call repeatedly than `get_value`.
+        Columns that override `get_value` are evaluated by calling it.
         """
+        if type(self).get_value is not ExportColumn.get_value:
+            def get_value(domain, doc_id, doc, row_index):
+                return self.get_value(
+                    domain,
+                    doc_id,
+                    doc,
+                    base_path,
+                    row_index=row_index,
+                    split_column=split_column,
+                    transform_dates=transform_dates,
+                )
+            return get_value
 
-        # When XML elements have additional attributes in them, the text node is
-        # put inside of the #text key. For example:
-        #
-        # <element id="123">value</element>  -> {'#text': 'value', 'id':'123'}
-        #
-        # Whereas elements without additional attributes just take on the string value:
-        #
-        # <element>value</element>  -> 'value'
-        #
-        # This line ensures that we grab the actual value instead of the dictionary
-        if isinstance(value, dict):
-            if '#text' in value:
-                value = value.get('#text')
-            else:
-                return EMPTY_VALUE
+        assert base_path == self.item.path[:len(base_path)], "ExportItem's path doesn't start with the base_path"
+        path = [x.name for x in self.item.path[len(base_path):]]
+        transform = self._get_transform_function(transform_dates)
 
-        if transform_dates:
-            value = couch_to_excel_datetime(value, doc)
-        if self.item.transform:
-            value = TRANSFORM_FUNCTIONS[self.item.transform](value, doc)
-        if self.deid_transform:
-            try:
-                value = DEID_TRANSFORM_FUNCTIONS[self.deid_transform](value, doc)
-            except ValueError:
-                # Unable to convert the string to a date
-                pass
-        if value is None:
-            value = MISSING_VALUE
+        def get_value(domain, doc_id, doc, row_index):
+            return transform(safe_recursive_lookup(doc, path), doc)
+        return get_value
 
-        if isinstance(value, list):
-            def _serialize(str_or_dict):
-                """
-                Serialize old data for scalar questions that were previously a repeat
-
-                This is a total edge case. See https://manage.dimagi.com/default.asp?280549.
-                """
-                if isinstance(str_or_dict, dict):
-                    return ','.join('{}={}'.format(k, v) for k, v in str_or_dict.items())
-                else:
-                    return str_or_dict
+    def _transform(self, value, doc, transform_dates):
+        """
+        Transform the given value with the transform specified in self.item.transform.
+        Also transform dates if the transform_dates flag is true.
+        """
+        return _transform_value(
+            value,
+            doc,
+            transform_dates,
+            TRANSFORM_FUNCTIONS[self.item.transform] if self.item.transform else None,
+            DEID_TRANSFORM_FUNCTIONS[self.deid_transform] if self.deid_transform else None,
+        )
 
-            value = ' '.join(_serialize(elem) for elem in value)
-        return value
+    def _get_transform_function(self, transform_dates):
+        """
+        Return a function `(value, doc)` equivalent to `self._transform` with
+        transform_dates, with the transform functions looked up once.
+        """
+        return partial(
+            _transform_value,
+            transform_dates=transform_dates,
+            item_transform=TRANSFORM_FUNCTIONS[self.item.transform] if self.item.transform else None,
+            deid_transform=DEID_TRANSFORM_FUNCTIONS[self.deid_transform] if self.deid_transform else None,
+        )
 
     @staticmethod
     def create_default_from_export_item(table_path, item, app_ids_and_versions, auto_select=True):
@@ -434,6 +443,52 @@ class ExportColumn(DocumentSchema):
             return super(ExportColumn, cls).wrap(data)
 
 
+def _transform_value(value, doc, transform_dates, item_transform, deid_transform):
+    # When XML elements have additional attributes in them, the text node is
+    # put inside of the #text key. For example:
+    #
+    # <element id="123">value</element>  -> {'#text': 'value', 'id':'123'}
+    #
+    # Whereas elements without additional attributes just take on the string value:
+    #
+    # <element>value</element>  -> 'value'
+    #
+    # This line ensures that we grab the actual value instead of the dictionary
+    if isinstance(value, dict):
+        if '#text' in value:
+            value = value.get('#text')
+        else:
+            return EMPTY_VALUE
+
+    if transform_dates:
+        value = couch_to_excel_datetime(value, doc)
+    if item_transform:
+        value = item_transform(value, doc)
+    if deid_transform:
+        try:
+            value = deid_transform(value, doc)
+        except ValueError:
+            # Unable to convert the string to a date
+            pass
+    if value is None:
+        value = MISSING_VALUE
+
+    if isinstance(value, list):
+        def _serialize(str_or_dict):
+            """
+            Serialize old data for scalar questions that were previously a repeat
+
+            This is a total edge case. See https://manage.dimagi.com/default.asp?280549.
+            """
+            if isinstance(str_or_dict, dict):
+                return ','.join('{}={}'.format(k, v) for k, v in str_or_dict.items())
+            else:
+                return str_or_dict
+
+        value = ' '.join(_serialize(elem) for elem in value)
+    return value
+
+
 class DocRow(namedtuple("DocRow", ["doc", "row"])):
     """
     DocRow represents a document and its row index.
@@ -524,10 +579,62 @@ class TableConfiguration(DocumentSchema):
                 rows.append(row_data)
             else:
                 rows.append(ExportRow(
-                    data=row_data, hyperlink_column_indices=self.get_hyperlink_column_indices(split_columns)
+                    data=row_data,
+                    hyperlink_column_indices=self.get_hyperlink_column_indices(split_columns),
+                    doc_id=document_id,
+                    row_number=row_number,
+                ))
+        return rows
+
+    def get_rows_for_documents(self, documents, first_row_number, split_columns=False, transform_dates=False,
+                               row_numbers=None):
+        """
+        Return a list of ExportRows generated for a page of documents.
+
+        Equivalent to calling `get_rows` for each document, but column paths and
+        transforms are only resolved once per page.
+        :param documents: list of dictionary representations of form submissions or cases
+        :param first_row_number: index of the first document in the sequence of all documents in the export.
+                                 Ignored if `row_numbers` is given.
+        :param row_numbers: optional list of the row number of each document, used
+                            instead of consecutive numbers from `first_row_number`
+        :return: List of ExportRows
+        """
+        value_functions = self._get_value_functions(split_columns, transform_dates)
+        hyperlink_column_indices = self.get_hyperlink_column_indices(split_columns)
+        if row_numbers is None:
+            row_numbers = count(first_row_number)
+
+        rows = []
+        for row_number, document in zip(row_numbers, documents):
+            document_id = document.get('_id')
+            domain = document.get('domain')
+
+            assert domain is not None, 'Form or Case must be associated with domain'
+            assert document_id is not None, 'Form or Case must have an id'
+
+            for doc, row_index in self._get_sub_documents(document, row_number, document_id=document_id):
+                row_data = []
+                for get_value in value_functions:
+                    val = get_value(domain, document_id, doc, row_index)
+                    if isinstance(val, list):
+                        row_data.extend(val)
+                    else:
+                        row_data.append(val)
+                rows.append(ExportRow(
+                    data=row_data,
+                    hyperlink_column_indices=hyperlink_column_indices,
+                    doc_id=document_id,
+                    row_number=row_number,
                 ))
         return rows
 
+    def _get_value_functions(self, split_columns, transform_dates):
+        return [
+            col.get_value_function(self.path, transform_dates=transform_dates, split_column=split_columns)
+            for col in self.selected_columns
+        ]
+
     def get_column(self, item_path, item_doc_type, column_transform):
         """
         Given a path and transform, will return the column and its index. If not found, will
@@ -665,6 +772,19 @@ class FormExportInstanceFilters(ExportInstanceFilters):
     user_types = ListProperty(IntegerProperty, default=[HQUserType.ACTIVE, HQUserType.DEACTIVATED])
 
 
+class IncrementalExportCheckpoint(DocumentSchema):
+    """
+    The state of the stored base file of an incremental daily saved export
+    """
+    # server_modified_on of the most recently modified document in the base file
+    last_modified = DateTimeProperty()
+    # number of documents processed into the base file, so rows for new
+    # documents can be numbered after them
+    doc_count = IntegerProperty(default=0)
+    # hash of the table configuration the base file was built with
+    config_hash = StringProperty()
+
+
 class ExportInstance(BlobMixin, Document):
     """
     This is an instance of an export. It contains the tables to export and
@@ -703,6 +823,11 @@ class ExportInstance(BlobMixin, Document):
     last_accessed = DateTimeProperty()
     last_build_duration = IntegerProperty()
 
+    # Whether daily saved export rebuilds only process documents modified
+    # since the last build (see corehq.apps.export.export.rebuild_incremental_export)
+    is_incremental = BooleanProperty(default=False)
+    incremental_checkpoint = SchemaProperty(IncrementalExportCheckpoint)
+
     description = StringProperty(default='')
 
     sharing = StringProperty(default=SharingOption.EDIT_AND_EXPORT, choices=SharingOption.CHOICES)
@@ -1007,10 +1132,26 @@ class ExportInstance(BlobMixin, Document):
         """
         return self.fetch_attachment(DAILY_SAVED_EXPORT_ATTACHMENT_NAME, stream=stream)
 
+    def has_incremental_base(self):
+        """
+        Return True if there is a stored base file for incremental rebuilds.
+        """
+        return INCREMENTAL_EXPORT_BASE_ATTACHMENT_NAME in self.blobs
+
+    def set_incremental_base(self, base):
+        """
+        Set the columnar file of all rows in the export, used by incremental rebuilds.
+        """
+        self.put_attachment(base, INCREMENTAL_EXPORT_BASE_ATTACHMENT_NAME)
+
+    def get_incremental_base(self, stream=False):
+        return self.fetch_attachment(INCREMENTAL_EXPORT_BASE_ATTACHMENT_NAME, stream=stream)
+
     def copy_export(self):
         export_json = self.to_json()
         del export_json['_id']
         del export_json['external_blobs']
+        export_json.pop('incremental_checkpoint', None)
         export_json['name'] = '{} - Copy'.format(self.name)
         new_export = self.__class__.wrap(export_json)
         return new_export
@@ -1254,9 +1395,12 @@ class SMSExportInstanceDefaults(ExportInstanceDefaults):
 
 class ExportRow(object):
 
-    def __init__(self, data, hyperlink_column_indices=()):
+    def __init__(self, data, hyperlink_column_indices=(), doc_id=None, row_number=None):
         self.data = data
         self.hyperlink_column_indices = hyperlink_column_indices
+        # id and row number of the form or case the row was generated from
+        self.doc_id = doc_id
+        self.row_number = row_number
 
 
 class ScalarItem(ExportItem):
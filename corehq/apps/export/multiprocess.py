@@ -17,12 +17,18 @@ The export works as follows:
     * Unsuccessful results can be retried
   * Add successful pages to final ZIP archive
   * Add raw data dumps for unsuccessful pages to final ZIP archive
+
+With `columnar=True` each process writes the rows for its page to a
+columnar file (see corehq.apps.export.columnar) instead of an export
+file, and the rows of all successful pages are streamed into a single
+export file that is added to the final ZIP archive.
 """
 import gzip
 import json
 import logging
 import multiprocessing
 import os
+import shutil
 import tempfile
 import time
 import zipfile
@@ -34,6 +40,10 @@ from six.moves.queue import Empty
 from couchexport.export import get_writer
 from couchexport.writers import ZippedExportWriter
 
+from corehq.apps.export.columnar import (
+    ColumnarExportWriter,
+    write_columnar_files,
+)
 from corehq.apps.export.dbaccessors import get_properly_wrapped_export_instance
 from corehq.apps.export.export import (
     get_export_documents,
@@ -119,13 +129,13 @@ class OutputPaginator(object):
         return RetryResult(self.page, self.path, self.page_size, 0)
 
 
-def rebuild_export_mutiprocess(export_id, num_processes, page_size=100000):
+def rebuild_export_mutiprocess(export_id, num_processes, page_size=100000, columnar=False):
     assert num_processes > 0
 
     export_instance = get_properly_wrapped_export_instance(export_id)
     filters = export_instance.get_filters()
     total_docs = get_export_size(export_instance, filters)
-    exporter = MultiprocessExporter(export_instance, total_docs, num_processes)
+    exporter = MultiprocessExporter(export_instance, total_docs, num_processes, columnar=columnar)
     paginator = OutputPaginator(export_id)
 
     logger.info('Starting data dump of {} docs'.format(total_docs))
@@ -150,7 +160,7 @@ def run_multiprocess_exporter(exporter, filters, paginator, page_size):
     exporter.wait_till_completion()
 
 
-def run_export_with_logging(export_instance, page_number, dump_path, doc_count, attempts):
+def run_export_with_logging(export_instance, page_number, dump_path, doc_count, attempts, columnar=False):
     """Log any exceptions here since logging on the other side of the process queue
     won't show the traceback
     """
@@ -159,7 +169,7 @@ def run_export_with_logging(export_instance, page_number, dump_path, doc_count,
     update_frequency = min(1000, int(doc_count // 10) or 1)
     progress_tracker = LoggingProgressTracker(page_number, progress_queue, update_frequency)
     try:
-        result = run_export(export_instance, page_number, dump_path, doc_count, progress_tracker)
+        result = run_export(export_instance, page_number, dump_path, doc_count, progress_tracker, columnar)
         if progress_queue:
             # just to make sure we set progress to 100%
             progress_queue.put(ProgressValue(page_number, doc_count, doc_count))
@@ -170,9 +180,12 @@ def run_export_with_logging(export_instance, page_number, dump_path, doc_count,
         raise
 
 
-def run_export(export_instance, page_number, dump_path, doc_count, progress_tracker=None):
+def run_export(export_instance, page_number, dump_path, doc_count, progress_tracker=None, columnar=False):
     docs = _get_export_documents_from_file(dump_path, doc_count)
-    export_file_path = _get_export_file_path(export_instance, docs, progress_tracker)
+    if columnar:
+        export_file_path = _get_columnar_file_path(export_instance, docs, progress_tracker)
+    else:
+        export_file_path = _get_export_file_path(export_instance, docs, progress_tracker)
     return SuccessResult(page_number, export_file_path, doc_count)
 
 
@@ -199,6 +212,16 @@ def _get_export_file_path(export_instance, docs, progress_tracker=None):
         return writer.path
 
 
+def _get_columnar_file_path(export_instance, docs, progress_tracker=None):
+    export_instances = [export_instance]
+    fd, temp_path = tempfile.mkstemp(prefix='{}{}_columnar_'.format(TEMP_FILE_PREFIX, export_instance.get_id))
+    os.close(fd)
+    writer = ColumnarExportWriter(temp_path)
+    with writer.open(export_instances):
+        write_export_instance(writer, export_instance, docs, progress_tracker)
+    return writer.path
+
+
 class LoggingProgressTracker(object):
     """Ducktyped class that mimics the interface of a celery task
     to keep track of export progress
@@ -211,13 +234,17 @@ class LoggingProgressTracker(object):
         self.name = name
         self.progress_queue = progress_queue
         self.update_frequency = update_frequency
+        self.last_update = 0
 
     def update_state(self, state=None, meta=None):
         meta = meta or {}
         current = meta.get('current')
         total = meta.get('total', 0)
         if current is not None:
-            if current % self.update_frequency == 0:
+            # progress is set once per page of documents, so report whenever
+            # an update_frequency boundary has been passed
+            if current // self.update_frequency > self.last_update // self.update_frequency:
+                self.last_update = current
                 if self.progress_queue:
                     self.progress_queue.put(ProgressValue(self.name, current, total))
                 else:
@@ -227,8 +254,10 @@ class LoggingProgressTracker(object):
 class MultiprocessExporter(object):
     """Helper class to manage multi-process exporting"""
 
-    def __init__(self, export_instance, total_docs, num_processes, existing_archive_path=None, keep_file=False):
+    def __init__(self, export_instance, total_docs, num_processes, existing_archive_path=None, keep_file=False,
+                 columnar=False):
         self.keep_file = keep_file
+        self.columnar = columnar
         self.export_instance = export_instance
         self.existing_archive_path = existing_archive_path
         self.results = []
@@ -271,7 +300,9 @@ class MultiprocessExporter(object):
         """
         attempts = page_info.retry_count + 1
         self.progress_queue.put(ProgressValue(page_info.page, 0, page_info.page_size))
-        args = self.export_instance, page_info.page, page_info.path, page_info.page_size, attempts
+        args = (
+            self.export_instance, page_info.page, page_info.path, page_info.page_size, attempts, self.columnar
+        )
         result = self.pool.apply_async(self.export_function, args=args)
         self.results.append(QueuedResult(result, page_info.page, page_info.path, page_info.page_size, attempts))
 
@@ -357,14 +388,43 @@ class MultiprocessExporter(object):
                         os.remove(raw_dump_path)
                     continue
 
+                if self.columnar:
+                    continue
+
                 logger.info('  Adding page {} of {} to final file'.format(result.page, pages))
                 if self.is_zip:
                     _add_compressed_page_to_zip(final_zip, result.page, result.path)
                 else:
                     final_zip.write(result.path, '{}_{}'.format(base_name, result.page))
 
+            if self.columnar:
+                self._add_columnar_pages_to_zip(final_zip, base_name, export_results)
+
         return final_zip.filename
 
+    def _add_columnar_pages_to_zip(self, final_zip, base_name, export_results):
+        results = sorted((result for result in export_results if result.success), key=lambda r: r.page)
+        if not results:
+            return
+
+        logger.info('  Writing {} pages to final file'.format(len(results)))
+        fd, temp_path = tempfile.mkstemp(prefix='{}{}_'.format(TEMP_FILE_PREFIX, self.export_instance.get_id))
+        os.close(fd)
+        try:
+            # all pages go into one file, so it needs to be paginated to stay
+            # within the row limits of the export format
+            writer = get_export_writer([self.export_instance], temp_path, force_pagination=True)
+            with writer.open([self.export_instance]):
+                write_columnar_files(writer, self.export_instance, [result.path for result in results])
+            if self.is_zip:
+                _copy_zip_contents(final_zip, writer.path)
+            else:
+                final_zip.write(writer.path, base_name)
+        finally:
+            os.remove(temp_path)
+        for result in results:
+            os.remove(result.path)
+
     def upload(self, final_path):
         logger.info('Uploading final export')
         with open(final_path, 'rb') as payload:
@@ -377,9 +437,17 @@ def _add_compressed_page_to_zip(zip_file, page_number, zip_path_to_add):
     with zipfile.ZipFile(zip_path_to_add, 'r') as page_file:
         for path in page_file.namelist():
             prefix, suffix = path.rsplit('/', 1)
-            zip_file.writestr('{}/{}_{}'.format(
-                prefix, page_number, suffix), page_file.open(path).read()
-            )
+            destination = '{}/{}_{}'.format(prefix, page_number, suffix)
+            with page_file.open(path) as source_file, \
+                    zip_file.open(destination, 'w', force_zip64=True) as dest_file:
+                shutil.copyfileobj(source_file, dest_file)
+
+
+def _copy_zip_contents(zip_file, zip_path_to_add):
+    with zipfile.ZipFile(zip_path_to_add, 'r') as source:
+        for path in source.namelist():
+            with source.open(path) as source_file, zip_file.open(path, 'w', force_zip64=True) as dest_file:
+                shutil.copyfileobj(source_file, dest_file)
 
 
 def _output_progress(queue, total_docs):
@@ -492,6 +492,7 @@ hqDefine('export/js/models', [
             'case_type',
             'xmlns',
             'is_daily_saved_export',
+            'is_incremental',
         ],
         tables: {
             create: function (options) {
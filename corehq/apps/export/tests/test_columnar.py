@@ -0,0 +1,261 @@
+import datetime
+import json
+from io import BytesIO
+
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from couchexport.models import Format
+
+from corehq.apps.export.columnar import (
+    ColumnarExportWriter,
+    encode_chunk,
+    get_doc_row_numbers,
+    iter_chunks,
+    merge_columnar_files,
+    write_columnar_files,
+)
+from corehq.apps.export.export import (
+    ExportFile,
+    get_export_writer,
+    rebuild_incremental_export,
+    write_export_instance,
+)
+from corehq.apps.export.models import (
+    CaseExportInstance,
+    ExportColumn,
+    FormExportInstance,
+    PathNode,
+    RowNumberColumn,
+    ScalarItem,
+    TableConfiguration,
+)
+from corehq.elastic import ScanResult
+from corehq.util.files import TransientTempfile
+
+
+class ColumnarChunkTest(SimpleTestCase):
+
+    def _round_trip(self, chunks):
+        with TransientTempfile() as path:
+            with open(path, 'wb') as file:
+                for table_index, rows in chunks:
+                    file.write(encode_chunk(table_index, rows))
+            return list(iter_chunks(path))
+
+    def test_typed_columns(self):
+        rows = [
+            ['foo', 1, 1.5, None, 'ü', True],
+            ['', 2, -2.5, 'bar', '---', False],
+        ]
+        self.assertEqual(self._round_trip([(3, rows)]), [(3, rows)])
+
+    def test_mixed_and_large_values(self):
+        rows = [
+            [2 ** 70, datetime.date(2020, 1, 1)],
+            [1, '2020-01-01'],
+        ]
+        self.assertEqual(self._round_trip([(0, rows)]), [(0, rows)])
+
+    def test_variable_width_rows(self):
+        chunks = [(0, [['a'], ['b', 'c']]), (1, [['d']])]
+        self.assertEqual(self._round_trip(chunks), chunks)
+
+    def test_no_columns(self):
+        chunks = [(0, [[], [], []]), (1, [['foo']])]
+        self.assertEqual(self._round_trip(chunks), chunks)
+
+    def test_empty_file(self):
+        self.assertEqual(self._round_trip([]), [])
+
+
+class ColumnarExportTest(SimpleTestCase):
+
+    docs = [
+        {
+            'domain': 'my-domain',
+            '_id': '1234',
+            'form': {'q1': 'foo', 'q2': 'bar'},
+        },
+        {
+            'domain': 'my-domain',
+            '_id': '5678',
+            'form': {'q1': 'bip'},
+        },
+    ]
+
+    @patch('corehq.apps.export.models.FormExportInstance.save')
+    def test_write_columnar_files(self, export_save):
+        export_instance = FormExportInstance(
+            export_format=Format.JSON,
+            tables=[
+                TableConfiguration(
+                    label="My table",
+                    selected=True,
+                    columns=[
+                        ExportColumn(
+                            label="Q1",
+                            item=ScalarItem(path=[PathNode(name='form'), PathNode(name='q1')]),
+                            selected=True,
+                        ),
+                        ExportColumn(
+                            label="Q2",
+                            item=ScalarItem(path=[PathNode(name='form'), PathNode(name='q2')]),
+                            selected=True,
+                        ),
+                    ]
+                )
+            ]
+        )
+        with TransientTempfile() as first_page, TransientTempfile() as second_page:
+            for path, docs in [(first_page, self.docs[:1]), (second_page, self.docs[1:])]:
+                columnar_writer = ColumnarExportWriter(path)
+                with columnar_writer.open([export_instance]):
+                    write_export_instance(columnar_writer, export_instance, docs)
+
+            with TransientTempfile() as temp_path:
+                writer = get_export_writer([export_instance], temp_path, allow_pagination=False)
+                with writer.open([export_instance]):
+                    write_columnar_files(writer, export_instance, [first_page, second_page])
+
+                with ExportFile(writer.path, writer.format) as export:
+                    self.assertEqual(json.loads(export.read()), {
+                        'My table': {
+                            'headers': ['Q1', 'Q2'],
+                            'rows': [['foo', 'bar'], ['bip', '---']],
+                        }
+                    })
+
+    @patch('corehq.apps.export.models.FormExportInstance.save')
+    def test_merge_columnar_files(self, export_save):
+        export_instance = FormExportInstance(
+            export_format=Format.JSON,
+            tables=[
+                TableConfiguration(
+                    label="My table",
+                    selected=True,
+                    columns=[
+                        ExportColumn(
+                            label="Q1",
+                            item=ScalarItem(path=[PathNode(name='form'), PathNode(name='q1')]),
+                            selected=True,
+                        ),
+                    ]
+                )
+            ]
+        )
+        base_docs = self.docs + [{'domain': 'my-domain', '_id': '3456', 'form': {'q1': 'bap'}}]
+        updated_doc = {'domain': 'my-domain', '_id': '1234', 'form': {'q1': 'baz'}}
+        new_doc = {'domain': 'my-domain', '_id': '9012', 'form': {'q1': 'bop'}}
+        with TransientTempfile() as base_path, TransientTempfile() as new_path, \
+                TransientTempfile() as merged_path:
+            columnar_writer = ColumnarExportWriter(base_path, include_doc_ids=True)
+            with columnar_writer.open([export_instance]):
+                write_export_instance(columnar_writer, export_instance, base_docs)
+            row_numbers = get_doc_row_numbers(base_path)
+            self.assertEqual(row_numbers, {'1234': 0, '5678': 1, '3456': 2})
+
+            columnar_writer = ColumnarExportWriter(new_path, include_doc_ids=True)
+            with columnar_writer.open([export_instance]):
+                write_export_instance(
+                    columnar_writer, export_instance, [updated_doc, new_doc],
+                    first_row_number=3, row_numbers=row_numbers,
+                )
+
+            # '5678' was modified but has no new rows
+            merge_columnar_files(base_path, new_path, {'1234', '5678'}, merged_path)
+            self.assertEqual(list(iter_chunks(merged_path)), [
+                (0, [['1234', 0, 'baz'], ['3456', 2, 'bap']]),
+                (0, [['9012', 3, 'bop']]),
+            ])
+
+            with TransientTempfile() as temp_path:
+                writer = get_export_writer([export_instance], temp_path, allow_pagination=False)
+                with writer.open([export_instance]):
+                    write_columnar_files(writer, export_instance, [merged_path], has_doc_ids=True)
+
+                with ExportFile(writer.path, writer.format) as export:
+                    self.assertEqual(json.loads(export.read()), {
+                        'My table': {
+                            'headers': ['Q1'],
+                            'rows': [['baz'], ['bap'], ['bop']],
+                        }
+                    })
+
+
+@patch('corehq.apps.export.export.PAGINATED_EXPORTS.enabled', lambda domain: False)
+@patch('corehq.apps.export.models.CaseExportInstance.get_filters', lambda self: [])
+class RebuildIncrementalExportTest(SimpleTestCase):
+
+    def setUp(self):
+        self.export_instance = CaseExportInstance(
+            domain='my-domain',
+            export_format=Format.JSON,
+            is_daily_saved_export=True,
+            is_incremental=True,
+            tables=[
+                TableConfiguration(
+                    label="Cases",
+                    selected=True,
+                    columns=[
+                        RowNumberColumn(label="number", selected=True),
+                        ExportColumn(
+                            label="Name",
+                            item=ScalarItem(path=[PathNode(name='name')]),
+                            selected=True,
+                        ),
+                    ]
+                )
+            ]
+        )
+        self.base = None
+        self.payload = None
+        patch.object(CaseExportInstance, 'save').start()
+
+        query = patch('corehq.apps.export.export._get_export_query').start()
+        query.return_value.filter.return_value = query.return_value
+        base_query = patch('corehq.apps.export.export._get_base_query').start()
+        base_query.return_value.filter.return_value.scroll_ids.side_effect = lambda: iter(self.modified_ids)
+        patch('corehq.apps.export.export.iter_es_docs_from_query',
+              lambda query: ScanResult(len(self.docs), iter(self.docs))).start()
+        patch('corehq.apps.export.export.save_export_payload', self._save_export_payload).start()
+        patch.object(CaseExportInstance, 'has_incremental_base', lambda export: self.base is not None).start()
+        patch.object(CaseExportInstance, 'get_incremental_base',
+                     lambda export, stream=False: BytesIO(self.base)).start()
+        self.addCleanup(patch.stopall)
+
+    def _save_export_payload(self, export, payload, incremental_base=None, incremental_checkpoint=None):
+        self.payload = json.loads(payload.read())
+        self.base = incremental_base.read()
+        export.incremental_checkpoint = incremental_checkpoint
+
+    def _case(self, case_id, name, modified):
+        return {'domain': 'my-domain', '_id': case_id, 'name': name, 'server_modified_on': modified}
+
+    def _rebuild(self, docs, modified_ids=()):
+        self.docs = docs
+        self.modified_ids = modified_ids
+        rebuild_incremental_export(self.export_instance)
+        return self.payload['Cases']['rows']
+
+    def test_rebuild(self):
+        rows = self._rebuild([
+            self._case('a', 'alpha', '2020-01-01T00:00:00.000000Z'),
+            self._case('b', 'beta', '2020-01-01T00:00:00.000000Z'),
+            self._case('c', 'gamma', '2020-01-01T00:00:00.000000Z'),
+        ])
+        self.assertEqual(rows, [['0', 'alpha'], ['1', 'beta'], ['2', 'gamma']])
+        checkpoint = self.export_instance.incremental_checkpoint
+        self.assertEqual(checkpoint.doc_count, 3)
+        self.assertEqual(checkpoint.last_modified, datetime.datetime(2020, 1, 1))
+
+        # 'a' is edited, 'b' is modified to no longer match the filters and 'd' is new
+        rows = self._rebuild([
+            self._case('a', 'alpha 2', '2020-01-02T00:00:00.000000Z'),
+            self._case('d', 'delta', '2020-01-02T00:00:00.000000Z'),
+        ], modified_ids=['a', 'b', 'd'])
+        self.assertEqual(rows, [['0', 'alpha 2'], ['2', 'gamma'], ['3', 'delta']])
+        checkpoint = self.export_instance.incremental_checkpoint
+        self.assertEqual(checkpoint.doc_count, 4)
+        self.assertEqual(checkpoint.last_modified, datetime.datetime(2020, 1, 2))
@@ -336,3 +336,89 @@ class TableConfigurationGetRowsTest(SimpleTestCase):
         self.assertEqual(
             [row.data for row in table_configuration.get_rows(submission, 0)], []
         )
+
+
+class TableConfigurationGetRowsForDocumentsTest(SimpleTestCase):
+
+    def setUp(self):
+        self.table_configuration = TableConfiguration(
+            path=[PathNode(name="form", is_repeat=False), PathNode(name="repeat1", is_repeat=True)],
+            columns=[
+                RowNumberColumn(
+                    selected=True
+                ),
+                ExportColumn(
+                    item=ScalarItem(
+                        path=[
+                            PathNode(name="form"),
+                            PathNode(name="repeat1", is_repeat=True),
+                            PathNode(name="q1")
+                        ],
+                    ),
+                    selected=True,
+                ),
+                ExportColumn(
+                    item=ScalarItem(
+                        path=[
+                            PathNode(name="form"),
+                            PathNode(name="repeat1", is_repeat=True),
+                            PathNode(name="q2")
+                        ],
+                    ),
+                    selected=False,
+                ),
+            ]
+        )
+        self.submissions = [
+            {
+                'domain': 'my-domain',
+                '_id': '1234',
+                'form': {
+                    'repeat1': [
+                        {'q1': 'foo', 'q2': 'baz'},
+                        {'q1': {'#text': 'bar', '@id': '1'}}
+                    ]
+                }
+            },
+            {
+                'domain': 'my-domain',
+                '_id': '5678',
+                'form': {
+                    'repeat1': {'q1': 'beep'}
+                }
+            },
+        ]
+
+    def test_get_rows_for_documents(self):
+        self.assertEqual(
+            [row.data for row in self.table_configuration.get_rows_for_documents(self.submissions, 3)],
+            [
+                ["3.0", 3, 0, 'foo'],
+                ["3.1", 3, 1, 'bar'],
+                ["4.0", 4, 0, 'beep'],
+            ]
+        )
+
+    def test_columns_changed(self):
+        self.table_configuration.get_rows_for_documents(self.submissions, 3)
+        self.table_configuration.columns[1].selected = False
+        self.assertEqual(
+            [row.data for row in self.table_configuration.get_rows_for_documents(self.submissions, 3)],
+            [
+                ["3.0", 3, 0],
+                ["3.1", 3, 1],
+                ["4.0", 4, 0],
+            ]
+        )
+
+    def test_matches_get_rows(self):
+        expected = [
+            row.data
+            for row_number, submission in enumerate(self.submissions)
+            for row in self.table_configuration.get_rows(submission, row_number, transform_dates=True)
+        ]
+        self.assertEqual(
+            [row.data for row in self.table_configuration.get_rows_for_documents(
+                self.submissions, 0, transform_dates=True)],
+            expected
+        )
@@ -9,12 +9,13 @@ from casexml.apps.phone.utils import (
     get_or_cache_global_fixture,
 )
 
+from corehq import toggles
 from corehq.apps.fixtures.dbaccessors import iter_fixture_items_for_data_type
 from corehq.apps.fixtures.models import FIXTURE_BUCKET, FixtureDataType
 from corehq.apps.products.fixtures import product_fixture_generator_json
 from corehq.apps.programs.fixtures import program_fixture_generator_json
 
-from .utils import get_index_schema_node
+from .utils import get_index_schema_node, get_or_cache_fixture_payload
 
 
 def item_lists_by_domain(domain):
@@ -81,6 +82,14 @@ class ItemListsProvider(FixtureProvider):
         return self._get_fixtures(global_types, get_items_by_type, GLOBAL_USER_ID)
 
     def get_user_items(self, user_types, restore_user):
+        if toggles.FIXTURE_PAYLOAD_CACHE.enabled(restore_user.domain):
+            # users who own the same items get the same fixtures
+            key_parts = (self.id, sorted(user_types), sorted(restore_user.get_fixture_data_item_ids()))
+            data_fn = partial(self._get_user_items, user_types, restore_user, GLOBAL_USER_ID)
+            return get_or_cache_fixture_payload(restore_user.domain, key_parts, restore_user.user_id, data_fn)
+        return self._get_user_items(user_types, restore_user, restore_user.user_id)
+
+    def _get_user_items(self, user_types, restore_user, user_id):
         items_by_type = defaultdict(list)
         for item in restore_user.get_fixture_data_items():
             data_type = user_types.get(item.data_type_id)
@@ -92,7 +101,7 @@ class ItemListsProvider(FixtureProvider):
             return sorted(items_by_type.get(data_type, []),
                           key=attrgetter('sort_key'))
 
-        return self._get_fixtures(user_types, get_items_by_type, restore_user.user_id)
+        return self._get_fixtures(user_types, get_items_by_type, user_id)
 
     def _set_cached_type(self, item, data_type):
         # set the cached version used by the object so that it doesn't
@@ -16,6 +16,7 @@ from corehq.apps.fixtures.models import (
     FixtureDataType,
     FixtureTypeField,
 )
+from corehq.apps.fixtures.utils import clear_fixture_cache
 from corehq.apps.users.models import Permissions
 
 
@@ -116,6 +117,7 @@ class LookupTableResource(CouchResourceMixin, HqBaseResource):
 
         with CouchTransaction() as transaction:
             data_type.recursive_delete(transaction)
+        clear_fixture_cache(kwargs['domain'])
         return ImmediateHttpResponse(response=HttpAccepted())
 
     def obj_create(self, bundle, request=None, **kwargs):
@@ -125,6 +127,7 @@ class LookupTableResource(CouchResourceMixin, HqBaseResource):
         bundle.obj = FixtureDataType(bundle.data)
         bundle.obj.domain = kwargs['domain']
         bundle.obj.save()
+        clear_fixture_cache(kwargs['domain'])
         return bundle
 
     def obj_update(self, bundle, **kwargs):
@@ -160,6 +163,7 @@ class LookupTableResource(CouchResourceMixin, HqBaseResource):
 
         if save:
             bundle.obj.save()
+            clear_fixture_cache(kwargs['domain'])
         return bundle
 
     class Meta(CustomResourceMeta):
@@ -199,6 +203,7 @@ class LookupTableItemResource(CouchResourceMixin, HqBaseResource):
             raise NotFound('Lookup table item not found')
         with CouchTransaction() as transaction:
             data_item.recursive_delete(transaction)
+        clear_fixture_cache(kwargs['domain'])
         return ImmediateHttpResponse(response=HttpAccepted())
 
     def obj_create(self, bundle, request=None, **kwargs):
@@ -217,6 +222,7 @@ class LookupTableItemResource(CouchResourceMixin, HqBaseResource):
         bundle.obj.domain = kwargs['domain']
         bundle.obj.sort_key = number_items + 1
         bundle.obj.save()
+        clear_fixture_cache(kwargs['domain'])
         return bundle
 
     def obj_update(self, bundle, **kwargs):
@@ -245,6 +251,7 @@ class LookupTableItemResource(CouchResourceMixin, HqBaseResource):
 
         if save:
             bundle.obj.save()
+            clear_fixture_cache(kwargs['domain'])
 
         return bundle
 
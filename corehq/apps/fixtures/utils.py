@@ -1,6 +1,10 @@
+import hashlib
 import re
+from uuid import uuid4
 from xml.etree import cElementTree as ElementTree
 
+from django.core.cache import cache
+
 from celery.task import task
 
 from dimagi.utils.chunked import chunked
@@ -9,6 +13,9 @@ from corehq.blobs import get_blob_db
 
 BAD_SLUG_PATTERN = r"([/\\<>\s])"
 
+FIXTURE_CONTENT_VERSION_TIMEOUT = 30 * 24 * 60 * 60
+FIXTURE_PAYLOAD_TIMEOUT = 24 * 60 * 60
+
 
 def clean_fixture_field_name(field_name):
     """Effectively slugifies a fixture's field name so that we don't send
@@ -64,6 +71,49 @@ def get_index_schema_node(fixture_id, attrs_to_index):
 def clear_fixture_cache(domain):
     from corehq.apps.fixtures.models import FIXTURE_BUCKET
     get_blob_db().delete(key=FIXTURE_BUCKET + '/' + domain)
+    bump_fixture_content_version(domain)
+
+
+def _fixture_content_version_key(domain):
+    return 'fixture-content-version:{}'.format(domain)
+
+
+def get_fixture_content_version(domain):
+    """
+    Returns a token that changes whenever lookup tables or locations of
+    the domain are edited. See `get_or_cache_fixture_payload`.
+    """
+    key = _fixture_content_version_key(domain)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid4().hex, FIXTURE_CONTENT_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_fixture_content_version(domain):
+    cache.set(_fixture_content_version_key(domain), uuid4().hex, FIXTURE_CONTENT_VERSION_TIMEOUT)
+
+
+def get_or_cache_fixture_payload(domain, key_parts, user_id, get_elements):
+    """
+    Returns a list containing the serialized fixture elements returned by
+    `get_elements()`, to be included in a restore as they are.
+
+    The serialized elements are cached for the domain's fixture content
+    version (see `get_fixture_content_version`), so `key_parts` must
+    identify everything else the elements depend on, such as the fixture
+    type and the IDs of the locations or items they contain. Elements must
+    use GLOBAL_USER_ID for the user ID, which is replaced with `user_id`.
+    """
+    from casexml.apps.phone.utils import GLOBAL_USER_ID, write_fixture_items_to_io
+    key_hash = hashlib.md5(repr(key_parts).encode('utf-8')).hexdigest()
+    key = 'fixture-payload:{}:{}:{}'.format(domain, get_fixture_content_version(domain), key_hash)
+    data = cache.get(key)
+    if data is None:
+        data = write_fixture_items_to_io(get_elements()).read()
+        cache.set(key, data, FIXTURE_PAYLOAD_TIMEOUT)
+    return [data.replace(GLOBAL_USER_ID.encode('utf-8'), user_id.encode('utf-8'))]
 
 
 @task(queue='background_queue')
@@ -9,6 +9,7 @@ from django_cte import With
 from django_cte.raw import raw_cte_sql
 
 from casexml.apps.phone.fixtures import FixtureProvider
+from casexml.apps.phone.utils import GLOBAL_USER_ID
 
 from corehq import toggles
 from corehq.apps.app_manager.const import (
@@ -17,7 +18,10 @@ from corehq.apps.app_manager.const import (
     SYNC_HIERARCHICAL_FIXTURE,
 )
 from corehq.apps.custom_data_fields.dbaccessors import get_by_domain_and_type
-from corehq.apps.fixtures.utils import get_index_schema_node
+from corehq.apps.fixtures.utils import (
+    get_index_schema_node,
+    get_or_cache_fixture_payload,
+)
 from corehq.apps.locations.models import (
     LocationFixtureConfiguration,
     LocationRelation,
@@ -123,7 +127,20 @@ class LocationFixtureProvider(FixtureProvider):
             return []
 
         data_fields = _get_location_data_fields(restore_user.domain)
-        return self.serializer.get_xml_nodes(self.id, restore_user, locations_queryset, data_fields)
+        if toggles.FIXTURE_PAYLOAD_CACHE.enabled(restore_user.domain):
+            # users who sync the same locations get the same fixture
+            key_parts = (
+                self.id,
+                [field.slug for field in data_fields],
+                sorted(locations_queryset.values_list('id', flat=True)),
+            )
+            return get_or_cache_fixture_payload(
+                restore_user.domain, key_parts, restore_user.user_id,
+                lambda: self.serializer.get_xml_nodes(
+                    self.id, restore_user, locations_queryset, data_fields, GLOBAL_USER_ID)
+            )
+        return self.serializer.get_xml_nodes(
+            self.id, restore_user, locations_queryset, data_fields, restore_user.user_id)
 
 
 class HierarchicalLocationSerializer(object):
@@ -131,10 +148,10 @@ class HierarchicalLocationSerializer(object):
     def should_sync(self, restore_user, app):
         return should_sync_hierarchical_fixture(restore_user.project, app)
 
-    def get_xml_nodes(self, fixture_id, restore_user, locations_queryset, data_fields):
+    def get_xml_nodes(self, fixture_id, restore_user, locations_queryset, data_fields, user_id):
         locations_db = LocationSet(locations_queryset)
 
-        root_node = Element('fixture', {'id': fixture_id, 'user_id': restore_user.user_id})
+        root_node = Element('fixture', {'id': fixture_id, 'user_id': user_id})
         root_locations = locations_db.root_locations
 
         if root_locations:
@@ -154,7 +171,7 @@ class FlatLocationSerializer(object):
     def should_sync(self, restore_user, app):
         return should_sync_flat_fixture(restore_user.project, app)
 
-    def get_xml_nodes(self, fixture_id, restore_user, locations_queryset, data_fields):
+    def get_xml_nodes(self, fixture_id, restore_user, locations_queryset, data_fields, user_id):
 
         all_types = LocationType.objects.filter(domain=restore_user.domain).values_list(
             'code', flat=True
@@ -165,12 +182,12 @@ class FlatLocationSerializer(object):
 
         return [get_index_schema_node(fixture_id, attrs_to_index),
                 self._get_fixture_node(fixture_id, restore_user, locations_queryset,
-                                       location_type_attrs, data_fields)]
+                                       location_type_attrs, data_fields, user_id)]
 
     def _get_fixture_node(self, fixture_id, restore_user, locations_queryset,
-                          location_type_attrs, data_fields):
+                          location_type_attrs, data_fields, user_id):
         root_node = Element('fixture', {'id': fixture_id,
-                                        'user_id': restore_user.user_id,
+                                        'user_id': user_id,
                                         'indexed': 'true'})
         outer_node = Element('locations')
         root_node.append(outer_node)
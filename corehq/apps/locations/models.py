@@ -12,6 +12,7 @@ from django_cte import CTEQuerySet
 from memoized import memoized
 
 from corehq.apps.domain.models import Domain
+from corehq.apps.fixtures.utils import bump_fixture_content_version
 from corehq.apps.locations.adjacencylist import AdjListManager, AdjListModel
 from corehq.apps.products.models import SQLProduct
 from corehq.form_processor.exceptions import CaseNotFound
@@ -174,12 +175,18 @@ class LocationType(models.Model):
 
         is_not_first_save = self.pk is not None
         saved = super(LocationType, self).save(*args, **kwargs)
+        bump_fixture_content_version(self.domain)
 
         if is_not_first_save:
             self.sync_administrative_status()
 
         return saved
 
+    def delete(self, *args, **kwargs):
+        deleted = super(LocationType, self).delete(*args, **kwargs)
+        bump_fixture_content_version(self.domain)
+        return deleted
+
     def sync_administrative_status(self, sync_supply_points=True):
         from .tasks import sync_administrative_status
         if self._administrative_old != self.administrative:
@@ -225,6 +232,7 @@ class LocationType(models.Model):
 
         cls._pre_bulk_save(objects)
         cls.objects.bulk_create(objects)
+        bump_fixture_content_version(objects[0].domain)
         return list(objects)
 
     @classmethod
@@ -238,6 +246,8 @@ class LocationType(models.Model):
             o.last_modified = now
         # the caller should call 'sync_administrative_status' for individual objects
         bulk_update_helper(objects)
+        if objects:
+            bump_fixture_content_version(objects[0].domain)
 
     @classmethod
     def bulk_delete(cls, objects):
@@ -265,9 +275,14 @@ class LocationQueriesMixin(object):
 
     def delete(self, *args, **kwargs):
         from .document_store import publish_location_saved
+        domains = set()
         for domain, location_id in self.values_list('domain', 'location_id'):
             publish_location_saved(domain, location_id, is_deletion=True)
-        return super(LocationQueriesMixin, self).delete(*args, **kwargs)
+            domains.add(domain)
+        deleted = super(LocationQueriesMixin, self).delete(*args, **kwargs)
+        for domain in domains:
+            bump_fixture_content_version(domain)
+        return deleted
 
     def _user_input_filter(self, domain, user_input):
         """Build a Q expression for filtering on user input
@@ -421,6 +436,7 @@ class SQLLocation(AdjListModel):
             super(SQLLocation, self).save(*args, **kwargs)
 
         publish_location_saved(self.domain, self.location_id)
+        bump_fixture_content_version(self.domain)
 
     def delete(self, *args, **kwargs):
         """Delete this location and all descentants
@@ -435,6 +451,7 @@ class SQLLocation(AdjListModel):
             loc._remove_user()
 
         super(SQLLocation, self).delete(*args, **kwargs)
+        bump_fixture_content_version(self.domain)
         update_users_at_locations.delay(
             self.domain,
             [loc.location_id for loc in to_delete],
@@ -14,6 +14,7 @@ from casexml.apps.phone.tests.utils import (
     call_fixture_generator,
     create_restore_user,
 )
+from casexml.apps.phone.utils import get_cached_items_with_count
 
 from corehq.apps.app_manager.tests.util import (
     TestXmlMixin,
@@ -724,6 +725,46 @@ class RelatedLocationFixturesTest(LocationHierarchyTestCase, FixtureHasLocations
             len(call_fixture_generator(related_locations_fixture_generator, self.user, last_sync=sync_log)), 2)
 
 
+@mock.patch.object(Domain, 'uses_locations', lambda: True)  # removes dependency on accounting
+@flag_enabled('SYNC_ALL_LOCATIONS')
+class CachedLocationFixturesTest(LocationHierarchyTestCase):
+    location_type_names = ['state', 'county', 'city']
+    location_structure = TEST_LOCATION_STRUCTURE
+
+    def setUp(self):
+        super(CachedLocationFixturesTest, self).setUp()
+        self.user = create_restore_user(self.domain, 'user', '123')
+
+    def tearDown(self):
+        self.user._couch_user.delete()
+        super(CachedLocationFixturesTest, self).tearDown()
+
+    def _get_cached_fixture(self):
+        with flag_enabled('FIXTURE_PAYLOAD_CACHE'):
+            fixture, = call_fixture_generator(flat_location_fixture_generator, self.user)
+        return get_cached_items_with_count(fixture)
+
+    def test_cached_fixture_matches_fixture(self):
+        expected = b''.join(
+            ElementTree.tostring(element, encoding='utf-8')
+            for element in call_fixture_generator(flat_location_fixture_generator, self.user)
+        )
+        self.assertEqual(self._get_cached_fixture(), (expected, 2))
+        # the second call is served from the cache
+        self.assertEqual(self._get_cached_fixture(), (expected, 2))
+
+    def test_location_edit_invalidates_cache(self):
+        self._get_cached_fixture()
+        boston = self.locations['Boston']
+        boston.name = 'Beantown'
+        boston.save()
+        try:
+            fixture, num_items = self._get_cached_fixture()
+        finally:
+            boston.name = 'Boston'
+            boston.save()
+        self.assertIn(b'Beantown', fixture)
+
 
 class ShouldSyncLocationFixturesTest(TestCase):
 
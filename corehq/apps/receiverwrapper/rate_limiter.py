@@ -40,7 +40,7 @@ submission_rate_limiter = RateLimiter(
 @enterprise_skip
 @silence_and_report_error("Exception raised in the submission rate limiter",
                           'commcare.xform_submissions.rate_limiter_errors')
-def rate_limit_submission_by_delaying(domain, max_wait):
+def rate_limit_submission_by_delaying(domain, max_wait, num_forms=1):
     if not submission_rate_limiter.allow_usage(domain):
         with TimingContext() as timer:
             acquired = submission_rate_limiter.wait(domain, timeout=max_wait)
@@ -52,4 +52,4 @@ def rate_limit_submission_by_delaying(domain, max_wait):
             'domain:{}'.format(domain),
             'duration:{}'.format(duration_tag)
         ])
-    submission_rate_limiter.report_usage(domain)
+    submission_rate_limiter.report_usage(domain, delta=num_forms)
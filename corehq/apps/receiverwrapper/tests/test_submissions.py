@@ -1,5 +1,6 @@
 import json
 import os
+import re
 from io import BytesIO
 
 from django.conf import settings
@@ -8,16 +9,21 @@ from django.test.client import Client
 from django.test.utils import override_settings
 from django.urls import reverse
 
+from mock import patch
+
 from corehq.apps.domain.shortcuts import create_domain
 from corehq.apps.receiverwrapper.util import submit_form_locally
 from corehq.apps.users.models import CommCareUser
-from corehq.form_processor.interfaces.dbaccessors import FormAccessors
+from corehq.form_processor.exceptions import XFormLockError
+from corehq.form_processor.interfaces.dbaccessors import CaseAccessors, FormAccessors
+from corehq.form_processor.interfaces.processor import FormProcessorInterface
+from corehq.form_processor.submission_post import SubmissionPost
 from corehq.form_processor.tests.utils import (
     FormProcessorTestUtils,
     use_sql_backend,
 )
 from corehq.util.json import CommCareJSONEncoder
-from corehq.util.test_utils import TestFileMixin, softer_assert
+from corehq.util.test_utils import TestFileMixin, flag_enabled, softer_assert
 
 
 class SubmissionTest(TestCase):
@@ -150,6 +156,126 @@ class SubmissionTestSQL(SubmissionTest):
             [("file", b"text file"), ("image", b"other fake image")])
 
 
+@use_sql_backend
+@flag_enabled('BULK_FORM_SUBMISSION')
+class BulkSubmissionTestSQL(TestCase):
+
+    def setUp(self):
+        super(BulkSubmissionTestSQL, self).setUp()
+        self.domain = create_domain("bulk-submit")
+        self.couch_user = CommCareUser.create(self.domain.name, "test", "foobar")
+        self.client = Client()
+        self.client.login(**{'username': 'test', 'password': 'foobar'})
+        self.url = reverse("receiver_bulk_post", args=[self.domain])
+
+    def tearDown(self):
+        FormProcessorTestUtils.delete_all_xforms(self.domain.name)
+        FormProcessorTestUtils.delete_all_cases(self.domain.name)
+        self.couch_user.delete()
+        self.domain.delete()
+        super(BulkSubmissionTestSQL, self).tearDown()
+
+    def _read(self, formname):
+        file_path = os.path.join(os.path.dirname(__file__), "data", formname)
+        with open(file_path, "rb") as f:
+            return f.read()
+
+    def _submit(self, *formnames, **data):
+        return self._submit_instances([self._read(formname) for formname in formnames], **data)
+
+    def _submit_instances(self, instances, url=None, **data):
+        data["xml_submission_file"] = [BytesIO(instance) for instance in instances]
+        return self.client.post(url or self.url, data)
+
+    def _get_results(self, response):
+        return [(r['submission_type'], r['status_code']) for r in json.loads(response.content)['results']]
+
+    def test_submit_forms(self):
+        response = self._submit('simple_form.xml', 'form_with_case.xml', 'simple_form.xml')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)['results']
+        self.assertEqual(self._get_results(response), [('normal', 201), ('normal', 201), ('duplicate', 201)])
+        forms = FormAccessors(self.domain.name).get_forms([results[0]['form_id'], results[1]['form_id']])
+        self.assertEqual(len(forms), 2)
+
+    def test_attachments_not_allowed(self):
+        response = self._submit('simple_form.xml', image=BytesIO(b"fake image"))
+        self.assertEqual(response.status_code, 400)
+
+    def test_ignored_submission(self):
+        demo_form = self._read('simple_form.xml').replace(b'someuserid', b'demo_user')
+        response = self._submit_instances(
+            [self._read('simple_form.xml'), demo_form],
+            url=self.url + '?submit_mode=demo',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._get_results(response), [('ignored', 201), ('normal', 201)])
+        form_ids = FormAccessors(self.domain.name).get_all_form_ids_in_domain()
+        self.assertEqual(len(form_ids), 1)
+
+    @flag_enabled('FORM_SUBMISSION_BLACKLIST')
+    def test_blacklisted_domain(self):
+        response = self._submit('simple_form.xml', 'form_with_case.xml')
+        self.assertEqual(response.status_code, 509)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(self._get_results(response), [('blacklisted', 509), ('blacklisted', 509)])
+        self.assertEqual(FormAccessors(self.domain.name).get_all_form_ids_in_domain(), [])
+
+    def test_partial_failure(self):
+        run = SubmissionPost.run
+        calls = []
+
+        def run_or_fail_second(submission_post):
+            calls.append(submission_post)
+            if len(calls) == 2:
+                raise XFormLockError("locked")
+            return run(submission_post)
+
+        with patch.object(SubmissionPost, 'run', autospec=True, side_effect=run_or_fail_second):
+            response = self._submit('simple_form.xml', 'form_with_case.xml', 'simple_form_edited.xml')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._get_results(response), [('normal', 201), ('error', 423), (None, None)])
+        self.assertEqual(len(calls), 2)
+        form_ids = FormAccessors(self.domain.name).get_all_form_ids_in_domain()
+        self.assertEqual(len(form_ids), 1)
+
+    def _case_update_form(self, form_id, external_id, extra_block=b''):
+        form = re.sub(rb'<create>.*?</create>', b'', self._read('form_with_case.xml'), flags=re.DOTALL)
+        form = form.replace(b'ad38211be256653bceac8e2156475666', form_id)
+        form = form.replace(b'someexternal', external_id)
+        return form.replace(b'</update>', b'</update>' + extra_block)
+
+    def test_shared_case_db(self):
+        self._submit('form_with_case.xml')
+        get_case_with_lock = FormProcessorInterface.get_case_with_lock
+        with patch.object(FormProcessorInterface, 'get_case_with_lock', autospec=True,
+                          side_effect=get_case_with_lock) as mock:
+            response = self._submit_instances([
+                self._case_update_form(b'b1d81c3bd0a24b6c9f4d5e3b8a5c7d01', b'first'),
+                self._case_update_form(b'b1d81c3bd0a24b6c9f4d5e3b8a5c7d02', b'second'),
+            ])
+        self.assertEqual(self._get_results(response), [('normal', 201), ('normal', 201)])
+        case_ids = [call[0][1] for call in mock.call_args_list]
+        self.assertEqual(case_ids, ['ad38211be256653bceac8e2156475667'])
+        case = CaseAccessors(self.domain.name).get_case('ad38211be256653bceac8e2156475667')
+        self.assertEqual(case.external_id, 'second')
+        self.assertEqual(len(case.xform_ids), 3)
+
+    def test_failed_form_changes_discarded(self):
+        self._submit('form_with_case.xml')
+        missing_index = b'<index><parent case_type="parent">missing-case-id</parent></index>'
+        response = self._submit_instances([
+            self._case_update_form(b'b1d81c3bd0a24b6c9f4d5e3b8a5c7d01', b'first'),
+            self._case_update_form(b'b1d81c3bd0a24b6c9f4d5e3b8a5c7d02', b'failed', missing_index),
+            self._case_update_form(b'b1d81c3bd0a24b6c9f4d5e3b8a5c7d03', b'third', b'<close/>'),
+        ])
+        self.assertEqual([result[0] for result in self._get_results(response)], ['normal', 'error', 'normal'])
+        case = CaseAccessors(self.domain.name).get_case('ad38211be256653bceac8e2156475667')
+        self.assertEqual(case.external_id, 'third')
+        self.assertTrue(case.closed)
+        self.assertEqual(case.get_indices(), [])
+
+
 @override_settings(TESTS_SHOULD_USE_SQL_BACKEND=True)
 class SubmissionSQLTransactionsTest(TestCase, TestFileMixin):
     root = os.path.dirname(__file__)
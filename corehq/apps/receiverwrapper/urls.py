@@ -1,11 +1,13 @@
 from django.conf.urls import url
 
-from corehq.apps.receiverwrapper.views import post, secure_post
+from corehq.apps.receiverwrapper.views import bulk_post, post, secure_post
 
 urlpatterns = [
     url(r'^$', post, name='receiver_post'),
     url(r'^secure/(?P<app_id>[\w-]+)/$', secure_post, name='receiver_secure_post_with_app_id'),
     url(r'^secure/$', secure_post, name='receiver_secure_post'),
+    url(r'^bulk/(?P<app_id>[\w-]+)/$', bulk_post, name='receiver_bulk_post_with_app_id'),
+    url(r'^bulk/$', bulk_post, name='receiver_bulk_post'),
 
     # odk urls
     url(r'^submission/?$', post, name="receiver_odk_post"),
@@ -225,15 +225,18 @@ def from_demo_user(form_json):
 DEMO_SUBMIT_MODE = 'demo'
 
 
-def should_ignore_submission(request):
+def should_ignore_submission(request, instance=None):
     """
     If submission request.GET has `submit_mode=demo` and submitting user is not demo_user,
     the submissions should be ignored
+
+    :param instance: Form XML to check. Read from the request if not given.
     """
     if not request.GET.get('submit_mode') == DEMO_SUBMIT_MODE:
         return False
 
-    instance, _ = couchforms.get_instance_and_attachment(request)
+    if instance is None:
+        instance, _ = couchforms.get_instance_and_attachment(request)
     form_json = convert_xform_to_json(instance)
 
     return False if from_demo_user(form_json) else True
@@ -1,7 +1,7 @@
 import logging
 import os
 
-from django.http import HttpResponseBadRequest, HttpResponseForbidden
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
@@ -10,7 +10,7 @@ from couchdbkit import ResourceNotFound
 import couchforms
 from casexml.apps.case.xform import get_case_updates, is_device_report
 from couchforms import openrosa_response
-from couchforms.const import MAGIC_PROPERTY
+from couchforms.const import EMPTY_PAYLOAD_ERROR, MAGIC_PROPERTY
 from couchforms.getters import MultimediaBug
 from dimagi.utils.decorators.profile import profile_prod
 from dimagi.utils.logging import notify_exception
@@ -44,7 +44,7 @@ from corehq.apps.receiverwrapper.util import (
 )
 from corehq.form_processor.exceptions import XFormLockError
 from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
-from corehq.form_processor.submission_post import SubmissionPost
+from corehq.form_processor.submission_post import BulkSubmissionPost, SubmissionPost
 from corehq.form_processor.utils import (
     convert_xform_to_json,
     should_use_sql_backend,
@@ -61,6 +61,8 @@ PROFILE_PROBABILITY = float(os.getenv('COMMCARE_PROFILE_SUBMISSION_PROBABILITY',
 PROFILE_LIMIT = os.getenv('COMMCARE_PROFILE_SUBMISSION_LIMIT')
 PROFILE_LIMIT = int(PROFILE_LIMIT) if PROFILE_LIMIT is not None else 1
 
+BULK_SUBMISSION_MAX_FORMS = 100
+
 
 @profile_prod('commcare_receiverwapper_process_form.prof', probability=PROFILE_PROBABILITY, limit=PROFILE_LIMIT)
 def _process_form(request, domain, app_id, user_id, authenticated,
@@ -144,6 +146,105 @@ def _process_form(request, domain, app_id, user_id, authenticated,
     return response
 
 
+def _process_bulk_forms(request, domain, app_id, user_id, authenticated):
+    """Process a multipart request with one form per `xml_submission_file` part
+
+    Responds with a JSON list of results in the order of the submitted
+    forms. Forms after one that could not be processed are not processed
+    and have no `status_code`; they should be submitted again.
+    """
+    if list(request.POST) or set(request.FILES) - {MAGIC_PROPERTY}:
+        return _bulk_submission_error(
+            "Bulk submissions must only contain '{}' parts".format(MAGIC_PROPERTY))
+    instances = [f.read() for f in request.FILES.getlist(MAGIC_PROPERTY)]
+    if not instances:
+        return _bulk_submission_error("No forms submitted")
+    if len(instances) > BULK_SUBMISSION_MAX_FORMS:
+        return _bulk_submission_error(
+            "Too many forms. The maximum is {}".format(BULK_SUBMISSION_MAX_FORMS))
+
+    rate_limit_submission_by_delaying(domain, max_wait=15, num_forms=len(instances))
+
+    metric_tags = [
+        'backend:sql' if should_use_sql_backend(domain) else 'backend:couch',
+        'domain:{}'.format(domain),
+        'bulk:true',
+    ]
+    if toggles.FORM_SUBMISSION_BLACKLIST.enabled(domain):
+        response = openrosa_response.BLACKLISTED_RESPONSE
+        _record_metrics(metric_tags, 'blacklisted', response)
+        return JsonResponse({
+            'results': [_bulk_form_result(None, 'blacklisted', response.status_code) for i in instances],
+        }, status=response.status_code)
+
+    # silently ignore submissions that meet ignore-criteria
+    ignored = [bool(instance) and should_ignore_submission(request, instance) for instance in instances]
+
+    app_id, build_id = get_app_and_build_ids(domain, app_id)
+    bulk_post = BulkSubmissionPost(
+        instances=[
+            instance or EMPTY_PAYLOAD_ERROR
+            for instance, ignore in zip(instances, ignored) if not ignore
+        ],
+        domain=domain,
+        app_id=app_id,
+        build_id=build_id,
+        auth_context=AuthContext(
+            domain=domain,
+            user_id=user_id,
+            authenticated=authenticated,
+        ),
+        location=couchforms.get_location(request),
+        received_on=couchforms.get_received_on(request),
+        date_header=couchforms.get_date_header(request),
+        path=couchforms.get_path(request),
+        submit_ip=couchforms.get_submit_ip(request),
+        last_sync_token=couchforms.get_last_sync_token(request),
+        openrosa_headers=couchforms.get_openrosa_headers(request),
+        force_logs=bool(request.GET.get('force_logs', False)),
+    )
+    results, error = bulk_post.run()
+
+    results = iter(results)
+    form_results = []
+    for index, ignore in enumerate(ignored):
+        if ignore:
+            response = openrosa_response.SUBMISSION_IGNORED_RESPONSE
+            _record_metrics(list(metric_tags), 'ignored', response)
+            form_results.append(_bulk_form_result(None, 'ignored', response.status_code))
+            continue
+        result = next(results)
+        if result is not None:
+            _record_metrics(list(metric_tags), result.submission_type, result.response, xform=result.xform)
+            form_results.append(_bulk_form_result(
+                result.xform.form_id if result.xform else None,
+                result.submission_type,
+                result.response.status_code,
+            ))
+        elif error is not None:
+            if isinstance(error, XFormLockError):
+                form_results.append(_bulk_form_result(None, 'error', 423))
+                datadog_counter(XFORM_LOCKED_COUNT, tags=metric_tags)
+            else:
+                form_results.append(_bulk_form_result(None, 'error', 500))
+                notify_exception(request, "Error processing bulk form submission", {
+                    'domain': domain,
+                    'form_index': index,
+                })
+            error = None
+        else:
+            form_results.append(_bulk_form_result(None, None, None))
+    return JsonResponse({'results': form_results})
+
+
+def _bulk_form_result(form_id, submission_type, status_code):
+    return {'form_id': form_id, 'submission_type': submission_type, 'status_code': status_code}
+
+
+def _bulk_submission_error(message):
+    return JsonResponse({'error': message}, status=400)
+
+
 def _submission_error(request, message, count_metric, metric_tags,
         domain, app_id, user_id, authenticated, meta=None, status=400,
         notify=True):
@@ -304,6 +405,56 @@ def _secure_post_basic(request, domain, app_id=None):
     )
 
 
+@login_or_digest_ex(allow_cc_users=True)
+@two_factor_exempt
+@toggles.BULK_FORM_SUBMISSION.required_decorator()
+def _bulk_post_digest(request, domain, app_id=None):
+    return _process_bulk_forms(
+        request=request,
+        domain=domain,
+        app_id=app_id,
+        user_id=request.couch_user.get_id,
+        authenticated=True,
+    )
+
+
+@handle_401_response
+@login_or_basic_ex(allow_cc_users=True)
+@two_factor_exempt
+@toggles.BULK_FORM_SUBMISSION.required_decorator()
+def _bulk_post_basic(request, domain, app_id=None):
+    return _process_bulk_forms(
+        request=request,
+        domain=domain,
+        app_id=app_id,
+        user_id=request.couch_user.get_id,
+        authenticated=True,
+    )
+
+
+@location_safe
+@csrf_exempt
+@require_POST
+@check_domain_migration
+def bulk_post(request, domain, app_id=None):
+    """Submit many forms for one user in a single request
+
+    Forms are processed in order. See `BulkSubmissionPost`.
+    """
+    authtype_map = {
+        DIGEST: _bulk_post_digest,
+        BASIC: _bulk_post_basic,
+    }
+    authtype = request.GET.get('authtype') or determine_authtype_from_request(request, default=BASIC)
+    try:
+        decorated_view = authtype_map[authtype]
+    except KeyError:
+        return _bulk_submission_error(
+            'authtype must be one of: {0}'.format(','.join(authtype_map))
+        )
+    return decorated_view(request, domain, app_id=app_id)
+
+
 @location_safe
 @csrf_exempt
 @require_POST
@@ -6,6 +6,7 @@ from dimagi.utils.parsing import string_to_datetime
 from corehq.apps.es import (
     CaseES,
     CaseSearchES,
+    ESQueryBatch,
     FormES,
     GroupES,
     UserES,
@@ -73,6 +74,11 @@ def get_total_case_counts_by_owner(domain, datespan, case_types=None, owner_ids=
 
 
 def _get_case_case_counts_by_owner(domain, datespan, case_types, is_total=False, owner_ids=None, export=False):
+    case_query = _get_case_counts_by_owner_query(domain, datespan, case_types, is_total, owner_ids, export)
+    return case_query.run().aggregations.owner_id.counts_by_bucket()
+
+
+def _get_case_counts_by_owner_query(domain, datespan, case_types, is_total=False, owner_ids=None, export=False):
     es_instance = ES_EXPORT_INSTANCE if export else ES_DEFAULT_INSTANCE
     case_query = (CaseES(es_instance_alias=es_instance)
          .domain(domain)
@@ -95,7 +101,7 @@ def _get_case_case_counts_by_owner(domain, datespan, case_types, is_total=False,
     if owner_ids:
         case_query = case_query.owner(owner_ids)
 
-    return case_query.run().aggregations.owner_id.counts_by_bucket()
+    return case_query
 
 
 def get_case_counts_closed_by_user(domain, datespan, case_types=None, user_ids=None, export=False):
@@ -107,6 +113,12 @@ def get_case_counts_opened_by_user(domain, datespan, case_types=None, user_ids=N
 
 
 def _get_case_counts_by_user(domain, datespan, case_types=None, is_opened=True, user_ids=None, export=False):
+    case_query = _get_case_counts_by_user_query(domain, datespan, case_types, is_opened, user_ids, export)
+    return case_query.run().aggregations.by_user.counts_by_bucket()
+
+
+def _get_case_counts_by_user_query(domain, datespan, case_types=None, is_opened=True, user_ids=None,
+                                   export=False):
     date_field = 'opened_on' if is_opened else 'closed_on'
     user_field = 'opened_by' if is_opened else 'closed_by'
 
@@ -131,7 +143,7 @@ def _get_case_counts_by_user(domain, datespan, case_types=None, is_opened=True,
     if user_ids:
         case_query = case_query.filter(filters.term(user_field, user_ids))
 
-    return case_query.run().aggregations.by_user.counts_by_bucket()
+    return case_query
 
 
 def get_paged_forms_by_type(
@@ -267,6 +279,11 @@ def get_completed_counts_by_user(domain, datespan, user_ids=None, export=False):
 
 
 def _get_form_counts_by_user(domain, datespan, is_submission_time, user_ids=None, export=False):
+    form_query = _get_form_counts_by_user_query(domain, datespan, is_submission_time, user_ids, export)
+    return form_query.run().aggregations.user.counts_by_bucket()
+
+
+def _get_form_counts_by_user_query(domain, datespan, is_submission_time, user_ids=None, export=False):
     es_instance = ES_EXPORT_INSTANCE if export else ES_DEFAULT_INSTANCE
     form_query = FormES(es_instance_alias=es_instance).domain(domain)
     for xmlns in SYSTEM_FORM_XMLNS_MAP.keys():
@@ -284,10 +301,43 @@ def _get_form_counts_by_user(domain, datespan, is_submission_time, user_ids=None
     if user_ids:
         form_query = form_query.user_id(user_ids)
 
-    form_query = (form_query
+    return (form_query
         .user_aggregation()
         .size(0))
-    return form_query.run().aggregations.user.counts_by_bucket()
+
+
+def get_worker_activity_counts(domain, datespan, avg_datespan, case_types=None, user_ids=None,
+                               owner_ids=None, include_active_cases=True, export=False):
+    """
+    Returns the submission and case counts by user or owner of the worker
+    activity report, fetched with one multi-search request. The counts are
+    the same as those of `get_submission_counts_by_user` etc.
+    """
+    # the query for each count, and the name of its aggregation
+    queries = {
+        'avg_submissions_by_user': (
+            _get_form_counts_by_user_query(domain, avg_datespan, True, user_ids, export), 'user'),
+        'submissions_by_user': (
+            _get_form_counts_by_user_query(domain, datespan, True, user_ids, export), 'user'),
+        'total_cases_by_owner': (
+            _get_case_counts_by_owner_query(domain, datespan, case_types, True, owner_ids, export), 'owner_id'),
+        'cases_closed_by_user': (
+            _get_case_counts_by_user_query(domain, datespan, case_types, False, user_ids, export), 'by_user'),
+        'cases_opened_by_user': (
+            _get_case_counts_by_user_query(domain, datespan, case_types, True, user_ids, export), 'by_user'),
+    }
+    if include_active_cases:
+        queries['active_cases_by_owner'] = (
+            _get_case_counts_by_owner_query(domain, datespan, case_types, False, owner_ids, export), 'owner_id')
+
+    with ESQueryBatch() as batch:
+        results = {key: (batch.run(query), aggregation) for key, (query, aggregation) in queries.items()}
+    counts = {
+        key: getattr(result.aggregations, aggregation).counts_by_bucket()
+        for key, (result, aggregation) in results.items()
+    }
+    counts.setdefault('active_cases_by_owner', {})
+    return counts
 
 
 def get_submission_counts_by_date(domain, user_ids, datespan, timezone):
@@ -31,9 +31,6 @@ from corehq.apps.locations.permissions import (
 )
 from corehq.apps.reports import util
 from corehq.apps.reports.analytics.esaccessors import (
-    get_active_case_counts_by_owner,
-    get_case_counts_closed_by_user,
-    get_case_counts_opened_by_user,
     get_completed_counts_by_date,
     get_completed_counts_by_user,
     get_form_counts_by_user_xmlns,
@@ -43,7 +40,7 @@ from corehq.apps.reports.analytics.esaccessors import (
     get_last_submission_time_for_users,
     get_submission_counts_by_date,
     get_submission_counts_by_user,
-    get_total_case_counts_by_owner,
+    get_worker_activity_counts,
 )
 from corehq.apps.reports.datatables import (
     DataTablesColumn,
@@ -1778,33 +1775,14 @@ class WorkerActivityReport(WorkerMonitoringCaseReportTableBase, DatespanMixin):
         avg_datespan = self.avg_datespan
 
         case_owners = _get_owner_ids_from_users(users_to_iterate)
-        user_ids = user_ids
 
-        if self.include_active_cases:
-            active_cases_by_owner = get_active_case_counts_by_owner(
-                self.domain, self.datespan, self.case_types, owner_ids=case_owners, export=export
-            )
-        else:
-            active_cases_by_owner = {}
-
-        return WorkerActivityReportData(
-            avg_submissions_by_user=get_submission_counts_by_user(
-                self.domain, avg_datespan, user_ids=user_ids, export=export
-            ),
-            submissions_by_user=get_submission_counts_by_user(
-                self.domain, self.datespan, user_ids=user_ids, export=export
-            ),
-            active_cases_by_owner=active_cases_by_owner,
-            total_cases_by_owner=get_total_case_counts_by_owner(
-                self.domain, self.datespan, self.case_types, owner_ids=case_owners, export=export
-            ),
-            cases_closed_by_user=get_case_counts_closed_by_user(
-                self.domain, self.datespan, self.case_types, user_ids=user_ids, export=export
-            ),
-            cases_opened_by_user=get_case_counts_opened_by_user(
-                self.domain, self.datespan, self.case_types, user_ids=user_ids, export=export
-            ),
-        )
+        return WorkerActivityReportData(**get_worker_activity_counts(
+            self.domain, self.datespan, avg_datespan, self.case_types,
+            user_ids=user_ids,
+            owner_ids=case_owners,
+            include_active_cases=self.include_active_cases,
+            export=export,
+        ))
 
     def _total_row(self, rows, report_data, users):
         total_row = [_("Total")]
@@ -105,6 +105,7 @@ def _deduplicate_columns_if_necessary(config):
 
         # clear indicators cache, which is awkward with properties
         DataSourceConfiguration.indicators.fget.reset_cache(config)
+        DataSourceConfiguration._compile.reset_cache(config)
         config.validate()
     return config
 
@@ -0,0 +1,526 @@
+"""Compile UCR expressions, filters and indicators into plain functions
+
+Expressions and filters built by `ExpressionFactory` and `FilterFactory`
+are trees of spec objects whose `__call__` methods read their
+configuration from jsonobject properties on every evaluation. The
+functions here lower a configured tree into nested closures once, with
+all configuration read up front, so evaluating a document is a chain
+of plain function calls.
+
+Compiled functions have the same `(item, context=None)` signature and
+return the same values as the objects they are compiled from. Objects
+of types that are not known to the compiler are used as they are.
+
+Data sources in a domain can be compiled together with
+`compile_data_sources`, in which case identical sub-expressions are
+evaluated once per document and their result is shared by every data
+source that uses them.
+"""
+import json
+from collections import Counter, namedtuple
+
+from simpleeval import InvalidExpression
+
+from dimagi.ext.jsonobject import JsonObject
+
+from corehq.apps.userreports.expressions.getters import (
+    TransformedGetter,
+    safe_recursive_lookup,
+    transform_from_datatype,
+)
+from corehq.apps.userreports.expressions.specs import (
+    ArrayIndexExpressionSpec,
+    CoalesceExpressionSpec,
+    ConditionalExpressionSpec,
+    ConstantGetterSpec,
+    DictExpressionSpec,
+    EvalExpressionSpec,
+    IdentityExpressionSpec,
+    IteratorExpressionSpec,
+    NamedExpressionSpec,
+    NestedExpressionSpec,
+    PropertyNameGetterSpec,
+    PropertyPathGetterSpec,
+    RelatedDocExpressionSpec,
+    RootDocExpressionSpec,
+    SwitchExpressionSpec,
+)
+from corehq.apps.userreports.expressions.utils import eval_statements
+from corehq.apps.userreports.filters import (
+    ANDFilter,
+    CustomFilter,
+    NamedFilter,
+    NOTFilter,
+    ORFilter,
+    SinglePropertyValueFilter,
+)
+from corehq.apps.userreports.indicators import (
+    BooleanIndicator,
+    ColumnValue,
+    CompoundIndicator,
+    RawIndicator,
+    SmallBooleanIndicator,
+)
+from corehq.apps.userreports.specs import EvaluationContext
+
+CompiledDataSource = namedtuple('CompiledDataSource', 'filter base_item_expression get_values')
+
+
+def compile_data_source(config, compiler=None):
+    """Compile the filter, base item expression and indicators of a data source
+
+    :returns: `CompiledDataSource` with `filter(doc, context)`,
+    `base_item_expression(doc, context)` (or `None`) and
+    `get_values(item, context)` functions.
+    """
+    if compiler is None:
+        compiler = Compiler()
+    base_item_expression = config.parsed_expression
+    return CompiledDataSource(
+        filter=compiler.compile_filter(config._get_main_filter()),
+        base_item_expression=(
+            compiler.compile_expression(base_item_expression)
+            if base_item_expression is not None else None
+        ),
+        get_values=compiler.compile_indicator(config.indicators),
+    )
+
+
+def compile_data_sources(configs):
+    """Compile data sources sharing identical sub-expressions between them
+
+    Sub-expressions that occur more than once across `configs` are
+    evaluated once per document and the result is cached in the
+    evaluation context.
+
+    :returns: List of `CompiledDataSource`, in the order of `configs`.
+    """
+    counter = Compiler()
+    for config in configs:
+        compile_data_source(config, counter)
+    shared_keys = {key for key, count in counter.key_counts.items() if count > 1}
+    compiler = Compiler(shared_keys)
+    return [compile_data_source(config, compiler) for config in configs]
+
+
+class Compiler(object):
+    """Compiles expressions, filters and indicators
+
+    Objects shared within a tree (named expressions and filters) are
+    compiled once per compiler.
+
+    :param shared_keys: Keys (see `get_expression_key`) of expressions
+    whose results should be cached per document and shared between all
+    trees compiled by this compiler.
+    """
+
+    def __init__(self, shared_keys=None):
+        self._compiled = {}
+        self._shared_keys = shared_keys or set()
+        self._shared = {}
+        self.key_counts = Counter()
+
+    def compile_expression(self, expression):
+        key = get_expression_key(expression)
+        if key is None:
+            return self._compile(expression, _EXPRESSION_COMPILERS)
+        self.key_counts[key] += 1
+        if key not in self._shared_keys:
+            return self._compile(expression, _EXPRESSION_COMPILERS)
+        if key not in self._shared:
+            self._shared[key] = _shared(
+                len(self._shared), self._compile(expression, _EXPRESSION_COMPILERS))
+        return self._shared[key]
+
+    def compile_filter(self, filter):
+        return self._compile(filter, _FILTER_COMPILERS)
+
+    def compile_indicator(self, indicator):
+        """Compile indicator to a function returning its column values"""
+        compile_ = _INDICATOR_COMPILERS.get(type(indicator))
+        if compile_ is None:
+            return indicator.get_values
+        return compile_(self, indicator)
+
+    def _compile(self, obj, compilers):
+        key = id(obj)
+        if key not in self._compiled:
+            compile_ = compilers.get(type(obj))
+            # keep a reference to obj so its id is not reused
+            self._compiled[key] = (obj, compile_(self, obj) if compile_ else obj)
+        return self._compiled[key][1]
+
+
+def get_expression_key(expression):
+    """Get a key identifying the result of an expression for a document
+
+    Expressions with equal keys return equal values for the same
+    document. Returns `None` for expressions that are not worth sharing
+    or whose result depends on more than their spec: references to
+    named expressions or filters of a particular data source and
+    iteration numbers.
+    """
+    if isinstance(expression, NamedExpressionSpec):
+        target_key = get_expression_key(expression._context.named_expressions[expression.name])
+        return None if target_key is None else 'named:' + target_key
+    if isinstance(expression, (IdentityExpressionSpec, ConstantGetterSpec)):
+        return None
+    if not isinstance(expression, JsonObject):
+        return None
+    spec = expression.to_json()
+    if _has_unshareable_type(spec):
+        return None
+    return json.dumps(spec, sort_keys=True, default=str)
+
+
+def _has_unshareable_type(spec):
+    if isinstance(spec, dict):
+        if spec.get('type') in ('named', 'base_iteration_number'):
+            return True
+        return any(_has_unshareable_type(value) for value in spec.values())
+    if isinstance(spec, list):
+        return any(_has_unshareable_type(value) for value in spec)
+    return False
+
+
+def _shared(index, expression):
+    cache_key = 'shared_expression-{}'.format(index)
+
+    def shared(item, context=None):
+        # only results for the root doc are shared since other items are
+        # built separately for each data source
+        if context is None or item is not context.root_doc:
+            return expression(item, context)
+        if context.exists_in_cache(cache_key):
+            return context.get_cache_value(cache_key)
+        result = expression(item, context)
+        context.set_cache_value(cache_key, result)
+        return result
+    return shared
+
+
+def _identity(compiler, expression):
+    def identity(item, context=None):
+        return item
+    return identity
+
+
+def _constant(compiler, expression):
+    value = expression.constant
+
+    def constant(item, context=None):
+        return value
+    return constant
+
+
+def _property_name(compiler, expression):
+    transform = transform_from_datatype(expression.datatype)
+    name_expression = expression._property_name_expression
+    if type(name_expression) is ConstantGetterSpec:
+        name = name_expression.constant
+
+        def property_name(item, context=None):
+            return transform(item.get(name) if isinstance(item, dict) else None)
+        return property_name
+
+    get_name = compiler.compile_expression(name_expression)
+
+    def property_name(item, context=None):
+        return transform(item.get(get_name(item, context)) if isinstance(item, dict) else None)
+    return property_name
+
+
+def _property_path(compiler, expression):
+    transform = transform_from_datatype(expression.datatype)
+    path = list(expression.property_path)
+
+    def property_path(item, context=None):
+        return transform(safe_recursive_lookup(item, path))
+    return property_path
+
+
+def _named(compiler, expression):
+    name = expression.name
+    named_expression = compiler.compile_expression(expression._context.named_expressions[name])
+
+    def named(item, context=None):
+        key = 'named_expression-{}-{}'.format(name, id(item))
+        if context and context.exists_in_cache(key):
+            return context.get_cache_value(key)
+
+        result = named_expression(item, context)
+        if context:
+            context.set_iteration_cache_value(key, result)
+        return result
+    return named
+
+
+def _conditional(compiler, expression):
+    test = compiler.compile_filter(expression._test_function)
+    if_true = compiler.compile_expression(expression._true_expression)
+    if_false = compiler.compile_expression(expression._false_expression)
+
+    def conditional(item, context=None):
+        if test(item, context):
+            return if_true(item, context)
+        return if_false(item, context)
+    return conditional
+
+
+def _switch(compiler, expression):
+    switch_on = compiler.compile_expression(expression._switch_on_expression)
+    cases = [
+        (case, compiler.compile_expression(expression._case_expressions[case]))
+        for case in expression.cases
+    ]
+    default = compiler.compile_expression(expression._default_expression)
+
+    def switch(item, context=None):
+        switch_value = switch_on(item, context)
+        for case, case_expression in cases:
+            if switch_value == case:
+                return case_expression(item, context)
+        return default(item, context)
+    return switch
+
+
+def _array_index(compiler, expression):
+    get_array = compiler.compile_expression(expression._array_expression)
+    get_index = compiler.compile_expression(expression._index_expression)
+
+    def array_index(item, context=None):
+        array_value = get_array(item, context)
+        if not isinstance(array_value, list):
+            return None
+        index_value = get_index(item, context)
+        if not isinstance(index_value, int):
+            return None
+        try:
+            return array_value[index_value]
+        except IndexError:
+            return None
+    return array_index
+
+
+def _iterator(compiler, expression):
+    expressions = [compiler.compile_expression(e) for e in expression._expression_fns]
+    test = compiler.compile_filter(expression._test)
+
+    def iterator(item, context=None):
+        values = []
+        for expression_fn in expressions:
+            value = expression_fn(item, context)
+            if test(value):
+                values.append(value)
+        return values
+    return iterator
+
+
+def _root_doc(compiler, expression):
+    root_expression = compiler.compile_expression(expression._expression_fn)
+
+    def root_doc(item, context=None):
+        if context is None:
+            return None
+        return root_expression(context.root_doc, context)
+    return root_doc
+
+
+def _related_doc(compiler, expression):
+    related_doc_type = expression.related_doc_type
+    get_doc_id = compiler.compile_expression(expression._doc_id_expression)
+    get_value = compiler.compile_expression(expression._value_expression)
+    get_document = RelatedDocExpressionSpec._get_document
+
+    def related_doc(item, context=None):
+        doc_id = get_doc_id(item, context)
+        if doc_id:
+            assert context.root_doc['domain']
+            doc = get_document(related_doc_type, doc_id, context)
+            # explicitly use a new evaluation context since this is a new document
+            return get_value(doc, EvaluationContext(doc, 0))
+    return related_doc
+
+
+def _nested(compiler, expression):
+    get_argument = compiler.compile_expression(expression._argument_expression)
+    get_value = compiler.compile_expression(expression._value_expression)
+
+    def nested(item, context=None):
+        return get_value(get_argument(item, context), context)
+    return nested
+
+
+def _dict(compiler, expression):
+    properties = [
+        (name, compiler.compile_expression(property_expression))
+        for name, property_expression in expression._compiled_properties.items()
+    ]
+
+    def dict_(item, context=None):
+        return {name: property_expression(item, context) for name, property_expression in properties}
+    return dict_
+
+
+def _evaluator(compiler, expression):
+    statement = expression.statement
+    transform = transform_from_datatype(expression.datatype)
+    variables = [
+        (slug, compiler.compile_expression(variable_expression))
+        for slug, variable_expression in expression._context_variables.items()
+    ]
+
+    def evaluator(item, context=None):
+        var_dict = {slug: variable_expression(item, context) for slug, variable_expression in variables}
+        try:
+            return transform(eval_statements(statement, var_dict))
+        except (InvalidExpression, SyntaxError, TypeError, ZeroDivisionError):
+            return None
+    return evaluator
+
+
+def _coalesce(compiler, expression):
+    get_value = compiler.compile_expression(expression._expression)
+    get_default = compiler.compile_expression(expression._default_expression)
+
+    def coalesce(item, context=None):
+        value = get_value(item, context)
+        default_value = get_default(item, context)
+        if value is None or value == '':
+            return default_value
+        return value
+    return coalesce
+
+
+def _transformed_getter(compiler, getter):
+    get_value = compiler.compile_expression(getter.getter)
+    transform = getter.transform
+    if not transform:
+        return get_value
+
+    def transformed_getter(item, context=None):
+        return transform(get_value(item, context))
+    return transformed_getter
+
+
+_EXPRESSION_COMPILERS = {
+    IdentityExpressionSpec: _identity,
+    ConstantGetterSpec: _constant,
+    PropertyNameGetterSpec: _property_name,
+    PropertyPathGetterSpec: _property_path,
+    NamedExpressionSpec: _named,
+    ConditionalExpressionSpec: _conditional,
+    SwitchExpressionSpec: _switch,
+    ArrayIndexExpressionSpec: _array_index,
+    IteratorExpressionSpec: _iterator,
+    RootDocExpressionSpec: _root_doc,
+    RelatedDocExpressionSpec: _related_doc,
+    NestedExpressionSpec: _nested,
+    DictExpressionSpec: _dict,
+    EvalExpressionSpec: _evaluator,
+    CoalesceExpressionSpec: _coalesce,
+    TransformedGetter: _transformed_getter,
+}
+
+
+def _and(compiler, filter):
+    filters = [compiler.compile_filter(f) for f in filter.filters]
+
+    def and_(item, context=None):
+        for filter_fn in filters:
+            if not filter_fn(item, context):
+                return False
+        return True
+    return and_
+
+
+def _or(compiler, filter):
+    filters = [compiler.compile_filter(f) for f in filter.filters]
+
+    def or_(item, context=None):
+        for filter_fn in filters:
+            if filter_fn(item, context):
+                return True
+        return False
+    return or_
+
+
+def _not(compiler, filter):
+    inner = compiler.compile_filter(filter._filter)
+
+    def not_(item, context=None):
+        return not inner(item, context)
+    return not_
+
+
+def _custom(compiler, filter):
+    return filter._filter
+
+
+def _single_property_value(compiler, filter):
+    get_value = compiler.compile_expression(filter.expression)
+    operator = filter.operator
+    reference_expression = filter.reference_expression
+    if type(reference_expression) is ConstantGetterSpec:
+        reference_value = reference_expression.constant
+
+        def single_property_value(item, context=None):
+            return operator(get_value(item, context), reference_value)
+        return single_property_value
+
+    get_reference = compiler.compile_expression(reference_expression)
+
+    def single_property_value(item, context=None):
+        return operator(get_value(item, context), get_reference(item, context))
+    return single_property_value
+
+
+def _named_filter(compiler, filter):
+    return compiler.compile_filter(filter.filter)
+
+
+_FILTER_COMPILERS = {
+    ANDFilter: _and,
+    ORFilter: _or,
+    NOTFilter: _not,
+    CustomFilter: _custom,
+    SinglePropertyValueFilter: _single_property_value,
+    NamedFilter: _named_filter,
+}
+
+
+def _raw_indicator(compiler, indicator):
+    column = indicator.column
+    getter = compiler.compile_expression(indicator.getter)
+
+    def raw_indicator(item, context=None):
+        return [ColumnValue(column, getter(item, context))]
+    return raw_indicator
+
+
+def _boolean_indicator(compiler, indicator):
+    column = indicator.column
+    filter_fn = compiler.compile_filter(indicator.filter)
+
+    def boolean_indicator(item, context=None):
+        return [ColumnValue(column, 1 if filter_fn(item, context) else 0)]
+    return boolean_indicator
+
+
+def _compound_indicator(compiler, indicator):
+    indicators = [compiler.compile_indicator(i) for i in indicator.indicators]
+
+    def compound_indicator(item, context=None):
+        values = []
+        for get_values in indicators:
+            values.extend(get_values(item, context))
+        return values
+    return compound_indicator
+
+
+_INDICATOR_COMPILERS = {
+    RawIndicator: _raw_indicator,
+    BooleanIndicator: _boolean_indicator,
+    SmallBooleanIndicator: _boolean_indicator,
+    CompoundIndicator: _compound_indicator,
+}
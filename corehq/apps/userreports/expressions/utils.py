@@ -3,6 +3,7 @@ import copy
 import operator
 from datetime import date, datetime, timedelta
 from decimal import Decimal
+from functools import lru_cache
 
 import six
 from simpleeval import (
@@ -62,7 +63,14 @@ def eval_statements(statement, variable_context):
         raise InvalidExpression('Context contains disallowed types')
 
     evaluator = EvalNoMethods(operators=SAFE_OPERATORS, names=variable_context, functions=FUNCTIONS)
-    return evaluator.eval(statement)
+    # equivalent to evaluator.eval(statement) without parsing the statement every time
+    evaluator.expr = statement
+    return evaluator._eval(_parse_statement(statement))
+
+
+@lru_cache(maxsize=1000)
+def _parse_statement(statement):
+    return ast.parse(statement.strip()).body[0].value
 
 
 SUM = 'sum'
@@ -0,0 +1,62 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from corehq.apps.change_feed.data_sources import (
+    get_document_store_for_doc_type,
+)
+from corehq.apps.userreports.compiler import compile_data_source
+from corehq.apps.userreports.models import get_datasource_config
+from corehq.apps.userreports.specs import EvaluationContext
+
+
+class Command(BaseCommand):
+    help = "Compare a data source's throughput with interpreted and compiled expressions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain')
+        parser.add_argument('data_source_id')
+        parser.add_argument('doc_ids', nargs='+')
+        parser.add_argument('--iterations', type=int, default=100)
+
+    def handle(self, domain, data_source_id, doc_ids, **options):
+        config, _ = get_datasource_config(data_source_id, domain)
+        doc_store = get_document_store_for_doc_type(
+            domain, config.referenced_doc_type, load_source="benchmark_data_source")
+        docs = list(doc_store.iter_documents(doc_ids))
+        if not docs:
+            print("No documents found")
+            return
+        iterations = options['iterations']
+
+        interpreted = _time_docs(
+            docs, iterations, config._get_main_filter(), config.parsed_expression, config.indicators.get_values)
+
+        start = time.time()
+        compiled = compile_data_source(config)
+        compile_time = time.time() - start
+        compiled_time = _time_docs(
+            docs, iterations, compiled.filter, compiled.base_item_expression, compiled.get_values)
+
+        num_docs = len(docs) * iterations
+        print("Processed {} docs {} times".format(len(docs), iterations))
+        print("Interpreted: {:.1f} docs/sec".format(num_docs / interpreted))
+        print("Compiled:    {:.1f} docs/sec (compiled in {:.3f}s)".format(
+            num_docs / compiled_time, compile_time))
+        print("Speedup:     {:.2f}x".format(interpreted / compiled_time))
+
+
+def _time_docs(docs, iterations, filter_fn, base_item_expression, get_values):
+    start = time.time()
+    for i in range(iterations):
+        for doc in docs:
+            eval_context = EvaluationContext(doc)
+            if not filter_fn(doc, eval_context):
+                continue
+            items = base_item_expression(doc, eval_context) if base_item_expression else doc
+            if not isinstance(items, list):
+                items = [items] if items is not None else []
+            for item in items:
+                get_values(item, eval_context)
+                eval_context.increment_iteration()
+    return time.time() - start
@@ -46,6 +46,7 @@ from corehq.apps.cachehq.mixins import (
 from corehq.apps.userreports.app_manager.data_source_meta import (
     REPORT_BUILDER_DATA_SOURCE_TYPE_VALUES,
 )
+from corehq.apps.userreports.compiler import compile_data_source
 from corehq.apps.userreports.const import (
     DATA_SOURCE_TYPE_AGGREGATE,
     DATA_SOURCE_TYPE_STANDARD,
@@ -86,6 +87,7 @@ from corehq.apps.userreports.util import (
 )
 from corehq.pillows.utils import get_deleted_doc_types
 from corehq.sql_db.connections import UCR_ENGINE_ID, connection_manager
+from corehq.toggles import UCR_COMPILED_EXPRESSIONS
 from corehq.util.couch import DocumentNotFound, get_document_or_not_found
 from corehq.util.quickcache import quickcache
 
@@ -260,7 +262,8 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
         if eval_context is None:
             eval_context = EvaluationContext(document)
 
-        filter_fn = self._get_main_filter()
+        compiled = self._get_compiled()
+        filter_fn = compiled.filter if compiled else self._get_main_filter()
         return filter_fn(document, eval_context)
 
     def deleted_filter(self, document):
@@ -294,6 +297,30 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
             for validation in self.validations
         ]
 
+    def set_domain_compiled(self, compiled):
+        """Use functions compiled together with the domain's other data sources
+
+        See `corehq.apps.userreports.compiler.compile_data_sources`.
+        """
+        self._domain_compiled = compiled
+
+    def _get_compiled(self):
+        """Get compiled filter, base item expression and indicators
+
+        :returns: `CompiledDataSource` or `None` if compilation is not enabled
+        for the domain.
+        """
+        domain_compiled = getattr(self, '_domain_compiled', None)
+        if domain_compiled is not None:
+            return domain_compiled
+        return self._compile()
+
+    @memoized
+    def _compile(self):
+        if UCR_COMPILED_EXPRESSIONS.enabled(self.domain):
+            return compile_data_source(self)
+        return None
+
     @memoized
     def _get_main_filter(self):
         return self._get_filter([self.referenced_doc_type])
@@ -448,7 +475,9 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
             if not self.base_item_expression:
                 return [document]
             else:
-                result = self.parsed_expression(document, eval_context)
+                compiled = self._get_compiled()
+                expression = compiled.base_item_expression if compiled else self.parsed_expression
+                result = expression(document, eval_context)
                 if result is None:
                     return []
                 elif isinstance(result, list):
@@ -479,9 +508,11 @@ class DataSourceConfiguration(CachedCouchDocumentMixin, Document, AbstractUCRDat
                     )
                 return []
 
+        compiled = self._get_compiled()
+        get_values = compiled.get_values if compiled else self.indicators.get_values
         rows = []
         for item in self.get_items(doc, eval_context):
-            indicators = self.indicators.get_values(item, eval_context)
+            indicators = get_values(item, eval_context)
             rows.append(indicators)
             eval_context.increment_iteration()
 
@@ -7,12 +7,15 @@ from django.conf import settings
 
 from pillowtop.checkpoints.manager import KafkaPillowCheckpoint
 from pillowtop.const import DEFAULT_PROCESSOR_CHUNK_SIZE
-from pillowtop.dao.exceptions import DocumentMismatchError
 from pillowtop.exceptions import PillowConfigError
 from pillowtop.logger import pillow_logging
 from pillowtop.pillow.interface import ConstructedPillow
 from pillowtop.processors import BulkPillowProcessor
-from pillowtop.utils import ensure_document_exists, ensure_matched_revisions
+from pillowtop.utils import (
+    bulk_fetch_changes_docs,
+    ensure_document_exists,
+    ensure_matched_revisions,
+)
 
 from corehq.apps.change_feed.consumer.feed import (
     KafkaChangeFeed,
@@ -20,6 +23,7 @@ from corehq.apps.change_feed.consumer.feed import (
 )
 from corehq.apps.change_feed.topics import LOCATION as LOCATION_TOPIC
 from corehq.apps.domain.dbaccessors import get_domain_ids_by_names
+from corehq.apps.userreports.compiler import compile_data_sources
 from corehq.apps.userreports.const import KAFKA_TOPICS
 from corehq.apps.userreports.data_source_providers import (
     DynamicDataSourceProvider,
@@ -42,6 +46,7 @@ from corehq.apps.userreports.sql import get_metadata
 from corehq.apps.userreports.tasks import rebuild_indicators
 from corehq.apps.userreports.util import get_indicator_adapter
 from corehq.sql_db.connections import connection_manager
+from corehq.toggles import UCR_COMPILED_EXPRESSIONS
 from corehq.util.datadog.gauges import datadog_bucket_timer, datadog_histogram
 from corehq.util.soft_assert import soft_assert
 from corehq.util.timer import TimingContext
@@ -177,12 +182,29 @@ class ConfigurableReportTableManagerMixin(object):
                 get_indicator_adapter(config, raise_errors=True, load_source='change_feed')
             )
 
+        self._compile_domain_data_sources()
+
         if self.run_migrations:
             self.rebuild_tables_if_necessary()
 
         self.bootstrapped = True
         self.last_bootstrapped = datetime.utcnow()
 
+    def _compile_domain_data_sources(self):
+        """Compile each domain's data sources together so that sub-expressions
+        they have in common are evaluated once per document"""
+        for domain, adapters in self.table_adapters_by_domain.items():
+            if len(adapters) < 2 or not UCR_COMPILED_EXPRESSIONS.enabled(domain):
+                continue
+            configs = [adapter.config for adapter in adapters]
+            try:
+                compiled_data_sources = compile_data_sources(configs)
+            except Exception:
+                pillow_logging.exception("Error compiling UCR data sources for domain %s", domain)
+                continue
+            for config, compiled in zip(configs, compiled_data_sources):
+                config.set_domain_compiled(compiled)
+
     def rebuild_tables_if_necessary(self):
         self._rebuild_sql_tables([
             adapter
@@ -373,38 +395,8 @@ class ConfigurableReportPillowProcessor(ConfigurableReportTableManagerMixin, Bul
 
     @staticmethod
     def get_docs_for_changes(changes, domain):
-        # break up by doctype
-        changes_by_doctype = defaultdict(list)
-        for change in changes:
-            assert change.metadata.domain == domain
-            changes_by_doctype[change.metadata.data_source_name].append(change)
-
-        # query
-        docs = []
-        for _, _changes in changes_by_doctype.items():
-            doc_store = _changes[0].document_store
-            doc_ids_to_query = [change.id for change in _changes if change.should_fetch_document()]
-            new_docs = list(doc_store.iter_documents(doc_ids_to_query))
-            docs_queried_prior = [change.document for change in _changes if not change.should_fetch_document()]
-            docs.extend(new_docs + docs_queried_prior)
-
-        # catch missing docs
-        retry_changes = set()
-        docs_by_id = {doc['_id']: doc for doc in docs}
-        for change in changes:
-            if change.id not in docs_by_id:
-                # we need to capture DocumentMissingError which is not possible in bulk
-                #   so let pillow fall back to serial mode to capture the error for missing docs
-                retry_changes.add(change)
-                continue
-            else:
-                # set this, so that subsequent doc lookups are avoided
-                change.set_document(docs_by_id[change.id])
-            try:
-                ensure_matched_revisions(change, docs_by_id.get(change.id))
-            except DocumentMismatchError:
-                retry_changes.add(change)
-        return retry_changes, docs
+        assert all(change.metadata.domain == domain for change in changes)
+        return bulk_fetch_changes_docs(changes)
 
     def process_change(self, change):
         self.bootstrap_if_needed()
@@ -0,0 +1,213 @@
+import datetime
+
+from django.test import SimpleTestCase
+
+from mock import patch
+
+from corehq.apps.userreports.compiler import (
+    Compiler,
+    compile_data_source,
+    compile_data_sources,
+    get_expression_key,
+)
+from corehq.apps.userreports.expressions.factory import ExpressionFactory
+from corehq.apps.userreports.filters.factory import FilterFactory
+from corehq.apps.userreports.models import DataSourceConfiguration
+from corehq.apps.userreports.specs import EvaluationContext, FactoryContext
+from corehq.apps.userreports.tests.utils import (
+    get_sample_data_source,
+    get_sample_doc_and_indicators,
+)
+from corehq.util.test_utils import flag_enabled, generate_cases
+
+
+class CompiledDataSourceTest(SimpleTestCase):
+
+    def setUp(self):
+        self.config = get_sample_data_source()
+
+    @patch('corehq.apps.userreports.specs.datetime')
+    def test_compiled_values_match(self, datetime_mock):
+        fake_time_now = datetime.datetime(2015, 4, 24, 12, 30, 8, 24886)
+        datetime_mock.utcnow.return_value = fake_time_now
+        sample_doc, _ = get_sample_doc_and_indicators(fake_time_now)
+        compiled = compile_data_source(self.config)
+
+        self.assertTrue(compiled.filter(sample_doc, EvaluationContext(sample_doc)))
+        self.assertEqual(
+            self.config.indicators.get_values(sample_doc, EvaluationContext(sample_doc)),
+            compiled.get_values(sample_doc, EvaluationContext(sample_doc)),
+        )
+
+    def test_compiled_filter_rejects(self):
+        compiled = compile_data_source(self.config)
+        sample_doc, _ = get_sample_doc_and_indicators()
+        sample_doc['type'] = 'not-a-ticket'
+        self.assertFalse(compiled.filter(sample_doc, EvaluationContext(sample_doc)))
+
+    @flag_enabled('UCR_COMPILED_EXPRESSIONS')
+    @patch('corehq.apps.userreports.specs.datetime')
+    def test_get_all_values_with_toggle(self, datetime_mock):
+        fake_time_now = datetime.datetime(2015, 4, 24, 12, 30, 8, 24886)
+        datetime_mock.utcnow.return_value = fake_time_now
+        sample_doc, _ = get_sample_doc_and_indicators(fake_time_now)
+        with patch.object(DataSourceConfiguration, '_get_compiled', return_value=None):
+            expected = get_sample_data_source().get_all_values(sample_doc)
+        self.assertIsNotNone(self.config._get_compiled())
+        self.assertEqual(expected, self.config.get_all_values(sample_doc))
+
+    def test_named_expression_compiled_once(self):
+        context = FactoryContext({
+            'three': {'type': 'constant', 'constant': 3},
+        }, {})
+        expression = ExpressionFactory.from_spec({
+            'type': 'nested',
+            'argument_expression': {'type': 'named', 'name': 'three'},
+            'value_expression': {'type': 'named', 'name': 'three'},
+        }, context)
+        compiler = Compiler()
+        compiled = compiler.compile_expression(expression)
+        self.assertEqual(3, compiled({}, EvaluationContext({})))
+        compiled_named = [
+            fn for obj, fn in compiler._compiled.values()
+            if obj is context.named_expressions['three']
+        ]
+        self.assertEqual(1, len(compiled_named))
+
+    @patch('corehq.apps.userreports.specs.datetime')
+    def test_compile_data_sources_shares_expressions(self, datetime_mock):
+        fake_time_now = datetime.datetime(2015, 4, 24, 12, 30, 8, 24886)
+        datetime_mock.utcnow.return_value = fake_time_now
+        sample_doc, _ = get_sample_doc_and_indicators(fake_time_now)
+        other_config = get_sample_data_source()
+        compiled, other_compiled = compile_data_sources([self.config, other_config])
+
+        eval_context = EvaluationContext(sample_doc)
+        self.assertTrue(compiled.filter(sample_doc, eval_context))
+        values = compiled.get_values(sample_doc, eval_context)
+        shared_keys = {key for key in eval_context.cache if key.startswith('shared_expression-')}
+        self.assertTrue(shared_keys)
+
+        eval_context.reset_iteration()
+        self.assertTrue(other_compiled.filter(sample_doc, eval_context))
+        self.assertEqual(values, other_compiled.get_values(sample_doc, eval_context))
+        self.assertEqual(
+            self.config.indicators.get_values(sample_doc, EvaluationContext(sample_doc)),
+            values,
+        )
+        self.assertEqual(
+            shared_keys,
+            {key for key in eval_context.cache if key.startswith('shared_expression-')},
+        )
+
+    def test_named_expressions_not_shared_by_spec(self):
+        def named_expression(property_name):
+            context = FactoryContext({'value': {'type': 'property_name', 'property_name': property_name}}, {})
+            return ExpressionFactory.from_spec({
+                'type': 'conditional',
+                'test': {'type': 'boolean_expression', 'expression': {'type': 'identity'},
+                         'operator': 'eq', 'property_value': None},
+                'expression_if_true': {'type': 'constant', 'constant': None},
+                'expression_if_false': {'type': 'named', 'name': 'value'},
+            }, context)
+
+        self.assertIsNone(get_expression_key(named_expression('a')))
+        self.assertNotEqual(
+            get_expression_key(named_expression('a')._false_expression),
+            get_expression_key(named_expression('b')._false_expression),
+        )
+
+
+@generate_cases([
+    ({'type': 'identity'},),
+    ({'type': 'constant', 'constant': 'foo'},),
+    ({'type': 'property_name', 'property_name': 'a'},),
+    ({'type': 'property_name', 'property_name': 'a', 'datatype': 'integer'},),
+    ({'type': 'property_name', 'property_name': {'type': 'property_name', 'property_name': 'key'}},),
+    ({'type': 'property_path', 'property_path': ['nested', 'b']},),
+    ({
+        'type': 'conditional',
+        'test': {'type': 'boolean_expression', 'expression': {'type': 'property_name', 'property_name': 'a'},
+                 'operator': 'eq', 'property_value': '1'},
+        'expression_if_true': {'type': 'constant', 'constant': 'yes'},
+        'expression_if_false': {'type': 'constant', 'constant': 'no'},
+    },),
+    ({
+        'type': 'switch',
+        'switch_on': {'type': 'property_name', 'property_name': 'key'},
+        'cases': {'a': {'type': 'constant', 'constant': 'A'}},
+        'default': {'type': 'constant', 'constant': 'default'},
+    },),
+    ({
+        'type': 'array_index',
+        'array_expression': {'type': 'property_name', 'property_name': 'list'},
+        'index_expression': {'type': 'constant', 'constant': 1},
+    },),
+    ({
+        'type': 'iterator',
+        'expressions': [
+            {'type': 'property_name', 'property_name': 'a'},
+            {'type': 'property_name', 'property_name': 'missing'},
+        ],
+        'test': {'type': 'not', 'filter': {'type': 'boolean_expression', 'operator': 'eq',
+                                           'expression': {'type': 'identity'}, 'property_value': None}},
+    },),
+    ({
+        'type': 'nested',
+        'argument_expression': {'type': 'property_name', 'property_name': 'nested'},
+        'value_expression': {'type': 'property_name', 'property_name': 'b'},
+    },),
+    ({
+        'type': 'dict',
+        'properties': {'x': {'type': 'property_name', 'property_name': 'a'}, 'y': 'constant'},
+    },),
+    ({
+        'type': 'evaluator',
+        'statement': 'a + b',
+        'context_variables': {
+            'a': {'type': 'property_name', 'property_name': 'a', 'datatype': 'integer'},
+            'b': {'type': 'property_path', 'property_path': ['nested', 'b'], 'datatype': 'integer'},
+        },
+    },),
+    ({
+        'type': 'evaluator',
+        'statement': 'a / 0',
+        'context_variables': {'a': {'type': 'property_name', 'property_name': 'a', 'datatype': 'integer'}},
+    },),
+    ({
+        'type': 'coalesce',
+        'expression': {'type': 'property_name', 'property_name': 'empty'},
+        'default_expression': {'type': 'constant', 'constant': 'default'},
+    },),
+    ({
+        'type': 'root_doc',
+        'expression': {'type': 'property_name', 'property_name': 'key'},
+    },),
+], CompiledDataSourceTest)
+def test_compiled_expression(self, spec):
+    doc = {'a': '1', 'key': 'a', 'empty': '', 'list': ['x', 'y'], 'nested': {'b': '2'}}
+    expression = ExpressionFactory.from_spec(spec)
+    compiled = Compiler().compile_expression(expression)
+    self.assertEqual(expression(doc, EvaluationContext(doc)), compiled(doc, EvaluationContext(doc)))
+
+
+@generate_cases([
+    ({'type': 'boolean_expression', 'expression': {'type': 'property_name', 'property_name': 'a'},
+      'operator': 'in', 'property_value': ['1', '2']},),
+    ({'type': 'boolean_expression', 'expression': {'type': 'property_name', 'property_name': 'a'},
+      'operator': 'eq', 'property_value': {'type': 'property_name', 'property_name': 'b'}},),
+    ({'type': 'and', 'filters': [
+        {'type': 'property_match', 'property_name': 'a', 'property_value': '1'},
+        {'type': 'property_match', 'property_name': 'b', 'property_value': '1'},
+    ]},),
+    ({'type': 'or', 'filters': [
+        {'type': 'property_match', 'property_name': 'a', 'property_value': '2'},
+        {'type': 'property_match', 'property_name': 'b', 'property_value': '1'},
+    ]},),
+    ({'type': 'not', 'filter': {'type': 'property_match', 'property_name': 'a', 'property_value': '1'}},),
+], CompiledDataSourceTest)
+def test_compiled_filter(self, spec):
+    doc = {'a': '1', 'b': '1'}
+    filter_ = FilterFactory.from_spec(spec)
+    compiled = Compiler().compile_filter(filter_)
+    self.assertEqual(filter_(doc, EvaluationContext(doc)), compiled(doc, EvaluationContext(doc)))
@@ -233,14 +233,7 @@ def run_query(index_name, q, debug_host=None, es_instance_alias=ES_DEFAULT_INSTA
     else:
         es_instance = get_es_instance(es_instance_alias)
 
-    try:
-        es_meta = ES_META[index_name]
-    except KeyError:
-        from corehq.apps.userreports.util import is_ucr_table
-        if is_ucr_table(index_name):
-            es_meta = EsMeta(index_name, 'indicator')
-        else:
-            raise
+    es_meta = _get_es_meta(index_name)
     try:
         results = es_instance.search(es_meta.index, es_meta.type, body=q)
         report_and_fail_on_shard_failures(results)
@@ -249,6 +242,38 @@ def run_query(index_name, q, debug_host=None, es_instance_alias=ES_DEFAULT_INSTA
         raise ESError(e)
 
 
+def run_multi_query(queries, es_instance_alias=ES_DEFAULT_INSTANCE):
+    """
+    Run several searches in one `_msearch` request.
+
+    :param queries: List of (index_name, query) tuples
+    :returns: List of the search results in the same order. A result that
+    failed has an "error" key instead of hits. Shard failures are not
+    checked; pass each result to `report_and_fail_on_shard_failures`.
+    """
+    if not queries:
+        return []
+    lines = []
+    for index_name, q in queries:
+        es_meta = _get_es_meta(index_name)
+        lines.append(json.dumps({'index': es_meta.index, 'type': es_meta.type}))
+        lines.append(json.dumps(q, cls=CommCareJSONEncoder))
+    try:
+        return get_es_instance(es_instance_alias).msearch(body='\n'.join(lines) + '\n')['responses']
+    except ElasticsearchException as e:
+        raise ESError(e)
+
+
+def _get_es_meta(index_name):
+    try:
+        return ES_META[index_name]
+    except KeyError:
+        from corehq.apps.userreports.util import is_ucr_table
+        if is_ucr_table(index_name):
+            return EsMeta(index_name, 'indicator')
+        raise
+
+
 def mget_query(index_name, ids, source):
     if not ids:
         return []
@@ -0,0 +1,237 @@
+"""
+Direct-to-bytes case XML serialization for restores.
+
+The serializers in this module produce exactly the same bytes as
+``tostring(get_case_element(case, updates, version))`` without building
+an ElementTree for every case. They mirror the structure of the
+generators in ``casexml.apps.case.xml.generator`` and must be kept in
+sync with them.
+
+ElementTree (python 2.7 and 3.6) writes attributes in sorted order and
+writes elements with no text and no children as ``<tag />``, which is
+replicated here.
+"""
+import logging
+
+from casexml.apps.case import const
+from casexml.apps.case.xml import V1, V2, V3, check_version, V2_NAMESPACE
+from casexml.apps.case.xml.generator import (
+    _sync_attachments,
+    date_to_xml_string,
+    datetime_to_xml_string,
+)
+import six
+
+
+def get_case_xml_bytes(case, updates, version=V1):
+    """Get serialized case block for the given updates
+
+    :returns: UTF-8 encoded case XML identical to the output of
+    ``tostring(get_case_element(case, updates, version))``.
+    """
+    check_version(version)
+
+    if case is None:
+        logging.error("Can't generate case xml for empty case!")
+        return b""
+
+    return SERIALIZER_MAP[version](case).serialize(updates)
+
+
+def escape_text(text):
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+def escape_attrib(text):
+    text = escape_text(text)
+    if "\"" in text:
+        text = text.replace("\"", "&quot;")
+    if "\n" in text:
+        text = text.replace("\n", "&#10;")
+    return text
+
+
+def write_element(parts, tag, text=None, attrib=None, children=None):
+    """Append serialized element to `parts`, a list of text fragments
+
+    :param text: Element text. Must be a text type or a false value.
+    :param attrib: Dict of attribute names to text values.
+    :param children: List of already serialized child elements.
+    """
+    parts.append("<" + tag)
+    if attrib:
+        for key in sorted(attrib):
+            parts.append(' %s="%s"' % (key, escape_attrib(attrib[key])))
+    if text or children:
+        parts.append(">")
+        if text:
+            parts.append(escape_text(text))
+        if children:
+            parts.extend(children)
+        parts.append("</%s>" % tag)
+    else:
+        parts.append(" />")
+
+
+def write_safe_element(parts, tag, text=None):
+    # equivalent of generator.safe_element
+    write_element(parts, tag, six.text_type(text) if text else None)
+
+
+def write_dynamic_element(parts, key, val):
+    # equivalent of generator.get_dynamic_element
+    if isinstance(val, dict):
+        text = six.text_type(val.get('#text', ''))
+        attrib = {x[1:]: six.text_type(val[x]) for x in val if x and x.startswith("@")}
+    else:
+        text = six.text_type(val)
+        attrib = None
+    write_element(parts, key, text, attrib)
+
+
+class CaseXMLSerializerBase(object):
+
+    def __init__(self, case):
+        self.case = case
+
+    def serialize(self, updates):
+        # keep in sync with casexml.apps.phone.xml.get_case_element
+        do_create = const.CASE_ACTION_CREATE in updates
+        do_update = const.CASE_ACTION_UPDATE in updates
+        do_index = do_update
+        do_attach = do_update
+        do_purge = const.CASE_ACTION_PURGE in updates or const.CASE_ACTION_CLOSE in updates
+
+        parts = []
+        if do_create:
+            create_parts = []
+            self.write_base_properties(create_parts)
+            write_element(parts, "create", children=create_parts)
+
+        if do_update:
+            update_parts = []
+            if not do_create:
+                self.write_base_properties(update_parts)
+            self.write_custom_properties(update_parts)
+            if update_parts:
+                write_element(parts, "update", children=update_parts)
+
+        if do_index:
+            self.write_indices(parts)
+        if do_attach:
+            self.write_attachments(parts)
+
+        if do_purge:
+            write_element(parts, "close")
+
+        root = []
+        self.write_root_element(root, parts)
+        return "".join(root).encode("utf-8")
+
+    def write_root_element(self, parts, children):
+        raise NotImplementedError("That method must be overridden by subclass!")
+
+    def write_base_properties(self, parts):
+        raise NotImplementedError("That method must be overridden by subclass!")
+
+    def write_custom_properties(self, parts):
+        for key, value in self.case.dynamic_case_properties().items():
+            write_dynamic_element(parts, key, value)
+
+    def write_indices(self, parts):
+        pass
+
+    def write_attachments(self, parts):
+        pass
+
+
+class V1CaseXMLSerializer(CaseXMLSerializerBase):
+
+    def write_root_element(self, parts, children):
+        root_children = []
+        write_safe_element(root_children, "case_id", self.case.case_id)
+        if self.case.modified_on:
+            write_safe_element(root_children, "date_modified",
+                               datetime_to_xml_string(self.case.modified_on))
+        root_children.extend(children)
+        write_element(parts, "case", children=root_children)
+
+    def write_base_properties(self, parts):
+        write_safe_element(parts, "case_type_id", self.case.type)
+        write_safe_element(parts, "user_id", self.case.user_id)
+        write_safe_element(parts, "case_name", self.case.name)
+        write_safe_element(parts, "external_id", self.case.external_id)
+
+    def write_custom_properties(self, parts):
+        if self.case.owner_id:
+            write_safe_element(parts, "owner_id", self.case.owner_id)
+        if self.case.opened_on:
+            write_safe_element(parts, "date_opened", date_to_xml_string(self.case.opened_on))
+        super(V1CaseXMLSerializer, self).write_custom_properties(parts)
+
+    def write_indices(self, parts):
+        # intentionally a no-op
+        if self.case.indices:
+            logging.info("Tried to add indices to version 1 CaseXML restore. This is not supported. "
+                         "The case id is %s, domain %s." % (self.case.case_id, self.case.domain))
+
+
+class V2CaseXMLSerializer(CaseXMLSerializerBase):
+
+    def write_root_element(self, parts, children):
+        attrib = {
+            "xmlns": V2_NAMESPACE,
+            "case_id": self.case.case_id,
+            "user_id": self.case.user_id or '',
+        }
+        if self.case.modified_on:
+            attrib["date_modified"] = datetime_to_xml_string(self.case.modified_on)
+        write_element(parts, "case", attrib=attrib, children=children)
+
+    def write_base_properties(self, parts):
+        from corehq.apps.users.cases import get_owner_id
+        write_safe_element(parts, "case_type", self.case.type)
+        write_safe_element(parts, "case_name", self.case.name)
+        write_safe_element(parts, "owner_id", get_owner_id(self.case))
+
+    def write_custom_properties(self, parts):
+        if self.case.external_id:
+            write_safe_element(parts, "external_id", self.case.external_id)
+        if self.case.opened_on:
+            write_safe_element(parts, "date_opened", date_to_xml_string(self.case.opened_on))
+        super(V2CaseXMLSerializer, self).write_custom_properties(parts)
+
+    def write_indices(self, parts):
+        if self.case.indices:
+            index_parts = []
+            for index in sorted(self.case.indices, key=lambda index: index.identifier):
+                attrib = {"case_type": index.referenced_type}
+                if getattr(index, 'relationship') and index.relationship == "extension":
+                    attrib["relationship"] = index.relationship
+                text = six.text_type(index.referenced_id) if index.referenced_id else None
+                write_element(index_parts, index.identifier, text, attrib)
+            write_element(parts, "index", children=index_parts)
+
+    def write_attachments(self, parts):
+        if _sync_attachments(self.case.domain):
+            if self.case.case_attachments:
+                attachment_parts = []
+                for key in self.case.case_attachments:
+                    write_element(attachment_parts, key, attrib={
+                        "src": self.case.get_attachment_server_url(key),
+                        "from": "remote",
+                    })
+                write_element(parts, "attachment", children=attachment_parts)
+
+
+SERIALIZER_MAP = {
+    V1: V1CaseXMLSerializer,
+    V2: V2CaseXMLSerializer,
+    V3: V2CaseXMLSerializer,
+}
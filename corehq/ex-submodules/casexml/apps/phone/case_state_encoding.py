@@ -0,0 +1,158 @@
+"""Compact binary encoding of SimplifiedSyncLog case state
+
+The case id sets and index trees of a SimplifiedSyncLog make up most of
+its size. Rather than storing them in the JSON doc they are encoded as:
+
+- a table of all case ids referenced by the case state, with UUIDs
+  stored as sorted 16 byte values and any other ids as UTF-8 strings,
+- each case id set as a sorted array of positions in the table,
+- each index tree as an adjacency list of
+  `(case, num_indices, (identifier, referenced case) * num_indices)`
+  positions.
+
+The result is zlib compressed and prefixed with a format version byte.
+"""
+import binascii
+import re
+import struct
+import uuid
+import zlib
+
+import six
+
+ENCODING_VERSION = 1
+
+CASE_ID_SET_FIELDS = ['case_ids_on_phone', 'dependent_case_ids_on_phone', 'closed_cases']
+INDEX_TREE_FIELDS = ['index_tree', 'extension_index_tree']
+CASE_STATE_FIELDS = frozenset(CASE_ID_SET_FIELDS + INDEX_TREE_FIELDS)
+
+_UUID = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+_HEX_UUID = re.compile(r'^[0-9a-f]{32}$')
+_NONE = 0xFFFFFFFF  # position of None referenced case id
+
+
+def encode_case_state(doc):
+    """Split case state out of a SimplifiedSyncLog JSON doc
+
+    :returns: Two-tuple `(doc, case_state)`: a copy of `doc` without
+    case state fields and the encoded case state bytes.
+    """
+    doc = dict(doc)
+    id_sets = [doc.pop(name, None) or [] for name in CASE_ID_SET_FIELDS]
+    trees = [(doc.pop(name, None) or {}).get('indices') or {} for name in INDEX_TREE_FIELDS]
+
+    case_ids = set()
+    identifiers = set()
+    for id_set in id_sets:
+        case_ids.update(id_set)
+    for tree in trees:
+        for case_id, indices in tree.items():
+            case_ids.add(case_id)
+            identifiers.update(indices)
+            case_ids.update(ref_id for ref_id in indices.values() if ref_id is not None)
+
+    uuids = sorted(case_id for case_id in case_ids if _UUID.match(case_id))
+    hex_uuids = sorted(case_id for case_id in case_ids if _HEX_UUID.match(case_id))
+    others = sorted(case_ids - set(uuids) - set(hex_uuids))
+    table = uuids + hex_uuids + others
+    positions = {case_id: pos for pos, case_id in enumerate(table)}
+    identifiers = sorted(identifiers)
+    identifier_positions = {name: pos for pos, name in enumerate(identifiers)}
+
+    parts = [struct.pack('<III', len(uuids), len(hex_uuids), len(others))]
+    parts.extend(uuid.UUID(case_id).bytes for case_id in uuids)
+    parts.extend(binascii.unhexlify(case_id) for case_id in hex_uuids)
+    _pack_strings(parts, others)
+    for id_set in id_sets:
+        _pack_ints(parts, sorted(positions[case_id] for case_id in id_set))
+    _pack_strings(parts, identifiers, with_count=True)
+    for tree in trees:
+        values = [len(tree)]
+        for case_id, indices in tree.items():
+            values.append(positions[case_id])
+            values.append(len(indices))
+            for identifier, ref_id in indices.items():
+                values.append(identifier_positions[identifier])
+                values.append(_NONE if ref_id is None else positions[ref_id])
+        _pack_ints(parts, values)
+    payload = zlib.compress(b''.join(parts))
+    return doc, struct.pack('<B', ENCODING_VERSION) + payload
+
+
+def decode_case_state(case_state):
+    """Decode case state encoded by `encode_case_state`
+
+    :returns: Dict of case state fields in SimplifiedSyncLog JSON format.
+    """
+    case_state = bytes(case_state)
+    version, = struct.unpack_from('<B', case_state)
+    if version != ENCODING_VERSION:
+        raise ValueError("unknown case state encoding: {}".format(version))
+    reader = _Reader(zlib.decompress(case_state[1:]))
+
+    num_uuids, num_hex_uuids, num_others = reader.unpack('<III')
+    table = [str(uuid.UUID(bytes=reader.read(16))) for i in range(num_uuids)]
+    table.extend(
+        binascii.hexlify(reader.read(16)).decode('ascii')
+        for i in range(num_hex_uuids)
+    )
+    table.extend(reader.read_strings(num_others))
+
+    result = {}
+    for name in CASE_ID_SET_FIELDS:
+        result[name] = [table[pos] for pos in reader.read_ints()]
+    identifiers = reader.read_strings(reader.unpack('<I')[0])
+    for name in INDEX_TREE_FIELDS:
+        values = iter(reader.read_ints())
+        tree = {}
+        for i in range(next(values)):
+            case_id = table[next(values)]
+            indices = tree[case_id] = {}
+            for j in range(next(values)):
+                identifier = identifiers[next(values)]
+                ref_pos = next(values)
+                indices[identifier] = None if ref_pos == _NONE else table[ref_pos]
+        result[name] = {'doc_type': 'IndexTree', 'indices': tree}
+    return result
+
+
+def _pack_ints(parts, values):
+    parts.append(struct.pack('<I', len(values)))
+    parts.append(struct.pack('<%sI' % len(values), *values))
+
+
+def _pack_strings(parts, values, with_count=False):
+    if with_count:
+        parts.append(struct.pack('<I', len(values)))
+    for value in values:
+        data = six.text_type(value).encode('utf-8')
+        parts.append(struct.pack('<I', len(data)))
+        parts.append(data)
+
+
+class _Reader(object):
+
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def read(self, size):
+        value = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return value
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def read_ints(self):
+        count, = self.unpack('<I')
+        return self.unpack('<%sI' % count)
+
+    def read_strings(self, count):
+        strings = []
+        for i in range(count):
+            size, = self.unpack('<I')
+            strings.append(self.read(size).decode('utf-8'))
+        return strings
@@ -13,6 +13,15 @@ INITIAL_ASYNC_TIMEOUT_THRESHOLD = 10
 # to see if the task is done.
 ASYNC_RETRY_AFTER = 5
 
+# maximum size of serialized case XML cached per process for restores
+CASE_XML_CACHE_MAX_BYTES = 64 * 1024 * 1024  # 64 MB
+
+# livequery case batches fetched concurrently when prefetching is enabled
+LIVEQUERY_PREFETCH_WORKERS = 4
+# maximum number of case batches (of 1000 cases) in flight or waiting
+# to be serialized when prefetching
+LIVEQUERY_PREFETCH_MAX_BATCHES = 8
+
 ASYNC_RESTORE_CACHE_KEY_PREFIX = "async-restore-task"
 RESTORE_CACHE_KEY_PREFIX = "ota-restore"
 
@@ -0,0 +1,284 @@
+"""Compact case graph used by livequery restore
+
+Case ids are interned to integers on first use. Per-case state is kept
+in a single `bytearray` of flags and relationships are stored in
+append-only adjacency lists backed by `array` objects, avoiding the
+overhead of a set of 36-character case id strings per case. Seen index
+keys are stored as (case number, identifier number) pairs packed into
+one integer rather than as '<case_id> <identifier>' strings. Keys of
+identifiers whose numbers don't fit in `IDENTIFIER_BITS` are stored as
+unpacked tuples.
+"""
+from array import array
+from collections import defaultdict
+from itertools import chain, repeat
+
+# case flags
+OWNED = 1 << 0       # owned and open (may be an extension)
+OPEN = 1 << 1
+DELETED = 1 << 2
+LIVE = 1 << 3
+DISCOVERED = 1 << 4  # related indices have been or will be fetched
+EXT_CACHED = 1 << 5  # has_live_extension result is cached
+EXT_LIVE = 1 << 6    # cached has_live_extension result
+
+IDENTIFIER_BITS = 16  # low bits of a packed index key: identifier number
+
+
+class AdjacencyList(object):
+    """Append-only multimap of integer node -> integer targets
+
+    Edges are stored as a singly linked list per node in flat arrays:
+    `_head[node]` is the position of the most recently added edge of
+    the node and `_next[edge]` is the position of the edge added before
+    it (-1 terminates the list).
+    """
+
+    def __init__(self, typecode='i'):
+        self._head = array('i')
+        self._next = array('i')
+        self._target = array(typecode)
+
+    def add(self, node, target):
+        head = self._head
+        if node >= len(head):
+            head.extend(repeat(-1, node + 1 - len(head)))
+        self._next.append(head[node])
+        self._target.append(target)
+        head[node] = len(self._target) - 1
+
+    def __contains__(self, node):
+        """Check if node has at least one target"""
+        return node < len(self._head) and self._head[node] != -1
+
+    def get(self, node):
+        """Iterate over targets of node, most recently added first"""
+        if node >= len(self._head):
+            return
+        edge = self._head[node]
+        next_, target = self._next, self._target
+        while edge != -1:
+            yield target[edge]
+            edge = next_[edge]
+
+    def nbytes(self):
+        return sum(a.buffer_info()[1] * a.itemsize
+                   for a in [self._head, self._next, self._target])
+
+
+class CaseGraph(object):
+    """Case graph with the livequery live/available rules
+
+    - A case is available if
+        - it is open and not an extension case (applies to host).
+        - it is open and is the extension of an available case.
+    - A case is live if it is owned and available.
+    - A case that has a live child or extension is live.
+
+    All methods accept and return case id strings.
+    """
+
+    def __init__(self, owned_ids):
+        self._ids = []          # number -> case id
+        self._nums = {}         # case id -> number
+        self._flags = bytearray()
+        self._identifiers = []      # number -> index identifier
+        self._identifier_nums = {}  # index identifier -> number
+        self._seen_ix = AdjacencyList('q')          # case -> packed index keys
+        self._unpacked_seen_ix = defaultdict(list)  # case -> unpacked index keys
+        self._extensions_by_host = AdjacencyList()  # host -> (open) extensions
+        self._hosts_by_extension = AdjacencyList()  # (open) extension -> hosts
+        self._parents_by_child = AdjacencyList()    # child -> parents
+        for case_id in owned_ids:
+            self._flags[self._intern(case_id)] |= OWNED | OPEN | DISCOVERED
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _intern(self, case_id):
+        try:
+            return self._nums[case_id]
+        except KeyError:
+            num = self._nums[case_id] = len(self._ids)
+            self._ids.append(case_id)
+            self._flags.append(0)
+            return num
+
+    def _has_flag(self, case_id, flag):
+        num = self._nums.get(case_id)
+        return num is not None and bool(self._flags[num] & flag)
+
+    def _iter_ids_with_flag(self, flag):
+        ids = self._ids
+        return (ids[num] for num, flags in enumerate(self._flags) if flags & flag)
+
+    def is_owned(self, case_id):
+        return self._has_flag(case_id, OWNED)
+
+    def is_open(self, case_id):
+        return self._has_flag(case_id, OPEN)
+
+    def is_deleted(self, case_id):
+        return self._has_flag(case_id, DELETED)
+
+    def is_live(self, case_id):
+        return self._has_flag(case_id, LIVE)
+
+    def is_discovered(self, case_id):
+        return self._has_flag(case_id, DISCOVERED)
+
+    def discover(self, case_ids):
+        for case_id in case_ids:
+            self._flags[self._intern(case_id)] |= DISCOVERED
+
+    def mark_open(self, case_ids):
+        for case_id in case_ids:
+            self._flags[self._intern(case_id)] |= OPEN
+
+    def mark_deleted(self, case_id):
+        self._flags[self._intern(case_id)] |= DELETED
+
+    def iter_owned_ids(self):
+        return self._iter_ids_with_flag(OWNED)
+
+    def iter_open_ids(self):
+        return self._iter_ids_with_flag(OPEN)
+
+    def iter_live_ids(self):
+        return self._iter_ids_with_flag(LIVE)
+
+    def get_live_ids(self):
+        return set(self.iter_live_ids())
+
+    def count_open(self):
+        return sum(1 for flags in self._flags if flags & OPEN)
+
+    def _intern_identifier(self, identifier):
+        try:
+            return self._identifier_nums[identifier]
+        except KeyError:
+            num = self._identifier_nums[identifier] = len(self._identifiers)
+            self._identifiers.append(identifier)
+            return num
+
+    def see_index(self, sub_id, identifier, ref_id):
+        """Record index as seen by both cases
+
+        :returns: False if the index had already been seen, else True.
+        """
+        sub = self._intern(sub_id)
+        identifier_num = self._intern_identifier(identifier)
+        # an index is always seen by its sub case
+        if identifier_num < 1 << IDENTIFIER_BITS:
+            key = (sub << IDENTIFIER_BITS) | identifier_num
+            if any(seen == key for seen in self._seen_ix.get(sub)):
+                return False
+            self._seen_ix.add(sub, key)
+            self._seen_ix.add(self._intern(ref_id), key)
+        else:
+            # too many distinct identifiers to pack the key
+            key = (sub, identifier_num)
+            if key in self._unpacked_seen_ix[sub]:
+                return False
+            self._unpacked_seen_ix[sub].append(key)
+            self._unpacked_seen_ix[self._intern(ref_id)].append(key)
+        return True
+
+    def _iter_seen_indices(self, num):
+        """Iterate over (case number, identifier number) pairs of indices
+        seen by case number `num`"""
+        mask = (1 << IDENTIFIER_BITS) - 1
+        for key in self._seen_ix.get(num):
+            yield key >> IDENTIFIER_BITS, key & mask
+        yield from self._unpacked_seen_ix.get(num, ())
+
+    def get_seen_index_keys(self, case_ids):
+        """Get '<index.case_id> <index.identifier>' keys of indices seen by cases"""
+        ids, identifiers = self._ids, self._identifiers
+        return {'{} {}'.format(ids[sub], identifiers[identifier_num])
+            for case_id in case_ids
+            if case_id in self._nums
+            for sub, identifier_num in self._iter_seen_indices(self._nums[case_id])}
+
+    def add_extension(self, host_id, extension_id):
+        host = self._intern(host_id)
+        extension = self._intern(extension_id)
+        self._extensions_by_host.add(host, extension)
+        self._hosts_by_extension.add(extension, host)
+
+    def add_parent(self, child_id, parent_id):
+        self._parents_by_child.add(self._intern(child_id), self._intern(parent_id))
+
+    def is_extension(self, case_id):
+        """Determine if case_id is an extension case
+
+        A case that is both a child and an extension is not an extension.
+        """
+        num = self._nums.get(case_id)
+        return (num is not None
+            and num in self._hosts_by_extension
+            and num not in self._parents_by_child)
+
+    def has_live_extension(self, case_id):
+        """Check if available case_id has a live extension case
+
+        Do not check for live children because an available parent
+        cannot cause it's children to become live. This is unlike an
+        available host, which can cause its available extension to
+        become live through the recursive rules.
+
+        The result is cached to reduce recursion in subsequent calls
+        and to prevent infinite recursion.
+        """
+        return self._has_live_extension(self._intern(case_id))
+
+    def _has_live_extension(self, num):
+        flags = self._flags
+        if flags[num] & EXT_CACHED:
+            return bool(flags[num] & EXT_LIVE)
+        flags[num] |= EXT_CACHED
+        result = any(
+            flags[ext] & LIVE      # has live extension
+            or flags[ext] & OWNED  # ext is owned and available, will be live
+            or self._has_live_extension(ext)
+            for ext in self._extensions_by_host.get(num)
+        )
+        if result:
+            flags[num] |= EXT_LIVE
+        return result
+
+    def enliven(self, case_id):
+        """Mark the given case, its extensions and their hosts as live
+
+        :returns: List of case ids that became live.
+        """
+        flags = self._flags
+        stack = [self._intern(case_id)]
+        enlivened = []
+        while stack:
+            num = stack.pop()
+            if flags[num] & LIVE:
+                continue
+            flags[num] |= LIVE
+            enlivened.append(self._ids[num])
+            stack.extend(chain(
+                # case is open and is the extension of a live case
+                self._extensions_by_host.get(num),
+                # case has live extension
+                self._hosts_by_extension.get(num),
+                # case has live child
+                self._parents_by_child.get(num),
+            ))
+        return enlivened
+
+    def nbytes(self):
+        """Approximate size of the compact graph structures in bytes
+
+        Excludes interned case id and index key strings.
+        """
+        return len(self._flags) + sum(adjacency.nbytes() for adjacency in [
+            self._seen_ix,
+            self._extensions_by_host,
+            self._hosts_by_extension,
+            self._parents_by_child,
+        ])
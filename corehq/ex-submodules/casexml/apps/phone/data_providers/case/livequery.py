@@ -29,12 +29,24 @@ from casexml.apps.case.const import CASE_INDEX_EXTENSION as EXTENSION
 from casexml.apps.phone.data_providers.case.load_testing import (
     get_xml_for_response,
 )
-from casexml.apps.phone.const import ASYNC_RETRY_AFTER
+from casexml.apps.phone.const import (
+    ASYNC_RETRY_AFTER,
+    LIVEQUERY_PREFETCH_MAX_BATCHES,
+    LIVEQUERY_PREFETCH_WORKERS,
+)
+from casexml.apps.phone.data_providers.case.case_graph import CaseGraph
 from casexml.apps.phone.data_providers.case.stock import get_stock_payload
 from casexml.apps.phone.data_providers.case.utils import get_case_sync_updates
+from casexml.apps.phone.data_providers.case.xml_cache import (
+    get_cached_xml_for_response,
+    get_case_xml_cache,
+)
 from casexml.apps.phone.tasks import ASYNC_RESTORE_SENT
 from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
+from corehq.toggles import LIVEQUERY_PREFETCH_CASES, LIVEQUERY_STREAMING
+from corehq.util.datadog.gauges import datadog_counter
 from corehq.util.datadog.utils import case_load_counter
+from corehq.util.thread_pool import prefetch_map
 
 
 def do_livequery(timing_context, restore_state, response, async_task=None):
@@ -44,68 +56,18 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
     the `restore_state.current_sync_log` and progress of `async_task`.
     Extends `response` with restore elements.
     """
-    def index_key(index):
-        return '{} {}'.format(index.case_id, index.identifier)
-
-    def is_extension(case_id):
-        """Determine if case_id is an extension case
-
-        A case that is both a child and an extension is not an extension.
-        """
-        return case_id in hosts_by_extension and case_id not in parents_by_child
-
-    def has_live_extension(case_id, cache={}):
-        """Check if available case_id has a live extension case
-
-        Do not check for live children because an available parent
-        cannot cause it's children to become live. This is unlike an
-        available host, which can cause its available extension to
-        become live through the recursive rules:
-
-        - A case is available if
-            - it is open and not an extension case (applies to host).
-            - it is open and is the extension of an available case.
-        - A case is live if it is owned and available.
-
-        The result is cached to reduce recursion in subsequent calls
-        and to prevent infinite recursion.
-        """
-        try:
-            return cache[case_id]
-        except KeyError:
-            cache[case_id] = False
-        cache[case_id] = result = any(
-            ext_id in live_ids      # has live extension
-            or ext_id in owned_ids  # ext is owned and available, will be live
-            or has_live_extension(ext_id)
-            for ext_id in extensions_by_host[case_id]
-        )
-        return result
-
     def enliven(case_id):
-        """Mark the given case, its extensions and their hosts as live
-
-        This closure mutates `live_ids` from the enclosing function.
-        """
-        if case_id in live_ids:
-            # already live
-            return
-        debug('enliven(%s)', case_id)
-        live_ids.add(case_id)
-        # case is open and is the extension of a live case
-        ext_ids = extensions_by_host.get(case_id, [])
-        # case has live extension
-        host_ids = hosts_by_extension.get(case_id, [])
-        # case has live child
-        parent_ids = parents_by_child.get(case_id, [])
-        for cid in chain(ext_ids, host_ids, parent_ids):
-            enliven(cid)
+        """Mark the given case, its extensions and their hosts as live"""
+        enlivened = graph.enliven(case_id)
+        if enlivened:
+            debug('enliven(%s): %r', case_id, enlivened)
+            if stream_ids is not None:
+                stream_ids.update(enlivened)
 
     def classify(index, prev_ids):
         """Classify index as either live or extension with live status pending
 
-        This closure mutates case graph data structures from the
-        enclosing function.
+        This closure mutates the case graph from the enclosing function.
 
         :returns: Case id for next related index fetch or IGNORE
         if the related case should be ignored.
@@ -113,48 +75,45 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
         sub_id = index.case_id
         ref_id = index.referenced_id  # aka parent/host/super
         relationship = index.relationship
-        ix_key = index_key(index)
-        if ix_key in seen_ix[sub_id]:
+        if not graph.see_index(sub_id, index.identifier, ref_id):
             return IGNORE  # unexpected, don't process duplicate index twice
-        seen_ix[sub_id].add(ix_key)
-        seen_ix[ref_id].add(ix_key)
         indices[sub_id].append(index)
         debug("%s --%s--> %s", sub_id, relationship, ref_id)
-        if sub_id in live_ids:
+        if graph.is_live(sub_id):
             # ref has a live child or extension
             enliven(ref_id)
             # It does not matter that sub_id -> ref_id never makes it into
-            # hosts_by_extension since both are live and therefore this index
-            # will not need to be traversed in other liveness calculations.
+            # the graph's extension index since both are live and therefore
+            # this index will not need to be traversed in other liveness
+            # calculations.
         elif relationship == EXTENSION:
-            if sub_id in open_ids:
-                if ref_id in live_ids:
+            if graph.is_open(sub_id):
+                if graph.is_live(ref_id):
                     # sub is open and is the extension of a live case
                     enliven(sub_id)
                 else:
                     # live status pending:
                     # if ref becomes live -> sub is open extension of live case
                     # if sub becomes live -> ref has a live extension
-                    extensions_by_host[ref_id].add(sub_id)
-                    hosts_by_extension[sub_id].add(ref_id)
+                    graph.add_extension(ref_id, sub_id)
             else:
                 return IGNORE  # closed extension
-        elif sub_id in owned_ids:
+        elif graph.is_owned(sub_id):
             # sub is owned and available (open and not an extension case)
             enliven(sub_id)
             # ref has a live child
             enliven(ref_id)
         else:
             # live status pending: if sub becomes live -> ref has a live child
-            parents_by_child[sub_id].add(ref_id)
+            graph.add_parent(sub_id, ref_id)
 
         next_id = ref_id if sub_id in prev_ids else sub_id
-        if next_id not in all_ids:
+        if not graph.is_discovered(next_id):
             return next_id
         return IGNORE  # circular reference
 
     def update_open_and_deleted_ids(related):
-        """Update open_ids and deleted_ids with related case_ids
+        """Update open and deleted status of related case_ids
 
         TODO store referenced case (parent) deleted and closed status in
         CommCareCaseIndexSQL to reduce number of related indices fetched
@@ -163,40 +122,26 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
         case_ids = {case_id
             for index in related
             for case_id in [index.case_id, index.referenced_id]
-            if case_id not in all_ids}
+            if not graph.is_discovered(case_id)}
         rows = accessor.get_closed_and_deleted_ids(list(case_ids))
         for case_id, closed, deleted in rows:
             if deleted:
-                deleted_ids.add(case_id)
+                graph.mark_deleted(case_id)
             if closed or deleted:
                 case_ids.remove(case_id)
-        open_ids.update(case_ids)
-
-    IGNORE = object()
-    debug = logging.getLogger(__name__).debug
-    accessor = CaseAccessors(restore_state.domain)
+        graph.mark_open(case_ids)
 
-    # case graph data structures
-    live_ids = set()
-    deleted_ids = set()
-    extensions_by_host = defaultdict(set)  # host_id -> (open) extension_ids
-    hosts_by_extension = defaultdict(set)  # (open) extension_id -> host_ids
-    parents_by_child = defaultdict(set)    # child_id -> parent_ids
-    indices = defaultdict(list)  # case_id -> list of CommCareCaseIndex-like
-    seen_ix = defaultdict(set)   # case_id -> set of '<index.case_id> <index.identifier>'
-    owner_ids = list(restore_state.owner_ids)
-
-    debug("sync %s for %r", restore_state.current_sync_log._id, owner_ids)
-    with timing_context("livequery"):
-        with timing_context("get_case_ids_by_owners"):
-            owned_ids = accessor.get_case_ids_by_owners(owner_ids, closed=False)
-            debug("owned: %r", owned_ids)
+    def expand_graph():
+        """Walk the case graph breadth first from owned cases
 
-        next_ids = all_ids = set(owned_ids)
-        owned_ids = set(owned_ids)  # owned, open case ids (may be extensions)
-        open_ids = set(owned_ids)
+        Yields the set of case ids that have been discovered but whose
+        related indices have not yet been fetched after each round of
+        related index queries. All other discovered cases are resolved:
+        their indices are known and their extension status is final.
+        """
+        next_ids = set(owned_ids)
         while next_ids:
-            exclude = set(chain.from_iterable(seen_ix[id] for id in next_ids))
+            exclude = graph.get_seen_index_keys(next_ids)
             with timing_context("get_related_indices({} cases, {} seen)".format(
                     len(next_ids), len(exclude))):
                 related = accessor.get_related_indices(list(next_ids), exclude)
@@ -205,27 +150,127 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
                 update_open_and_deleted_ids(related)
                 next_ids = {classify(index, next_ids)
                     for index in related
-                    if index.referenced_id not in deleted_ids
-                        and index.case_id not in deleted_ids}
+                    if not graph.is_deleted(index.referenced_id)
+                        and not graph.is_deleted(index.case_id)}
                 next_ids.discard(IGNORE)
-                all_ids.update(next_ids)
+                graph.discover(next_ids)
                 debug('next: %r', next_ids)
+            yield next_ids
 
-        with timing_context("enliven open roots (%s cases)" % len(open_ids)):
-            debug('open: %r', open_ids)
+    def enliven_open_roots():
+        with timing_context("enliven open roots (%s cases)" % graph.count_open()):
             # owned, open, not an extension -> live
-            for case_id in owned_ids:
-                if not is_extension(case_id):
+            for case_id in graph.iter_owned_ids():
+                if not graph.is_extension(case_id):
                     enliven(case_id)
 
             # available case with live extension -> live
-            for case_id in open_ids:
-                if (case_id not in live_ids
-                        and not is_extension(case_id)
-                        and has_live_extension(case_id)):
+            for case_id in graph.iter_open_ids():
+                if (not graph.is_live(case_id)
+                        and not graph.is_extension(case_id)
+                        and graph.has_live_extension(case_id)):
                     enliven(case_id)
 
-            debug('live: %r', live_ids)
+    def iter_streamed_sync_ids():
+        """Yield case ids to sync while the case graph is being walked
+
+        A case can be synced as soon as it is resolved (all of its
+        indices have been fetched) and known to be live. Liveness is
+        never revoked, so live cases qualify, as do owned, open,
+        non-extension cases, which will be enlivened once the walk is
+        complete. The latter are not enlivened early because index
+        classification depends on the order in which cases become live.
+        Remaining live cases, and modified cases that are no longer
+        live, are yielded after the walk is complete.
+
+        `stream_ids` holds owned and newly enlivened cases that have not
+        yet been checked after they were resolved, so each round only
+        checks cases that may have become ready since the last round.
+        """
+        if restore_state.last_sync_log:
+            with timing_context("get_modified_case_ids"):
+                phone_ids, modified_ids = get_phone_and_modified_ids(
+                    restore_state, accessor)
+        else:
+            phone_ids = modified_ids = set()
+
+        def should_sync(case_id):
+            return case_id not in phone_ids or case_id in modified_ids
+
+        # Until the walk is complete, the total is the number of
+        # discovered cases to sync plus modified cases not (yet)
+        # discovered, which is an upper bound of the cases to be synced.
+        discovered_count = sum(1 for case_id in owned_ids if should_sync(case_id))
+        undiscovered_modified_ids = modified_ids.difference(owned_ids)
+        sync_total[0] = discovered_count + len(undiscovered_modified_ids)
+
+        for pending_ids in expand_graph():
+            discovered_count += sum(1 for case_id in pending_ids if should_sync(case_id))
+            undiscovered_modified_ids -= pending_ids
+            sync_total[0] = discovered_count + len(undiscovered_modified_ids)
+            resolved_ids = {case_id for case_id in stream_ids if case_id not in pending_ids}
+            stream_ids.difference_update(resolved_ids)
+            # An owned extension that is not live yet is dropped here. It
+            # is added back to `stream_ids` if it is enlivened later.
+            ready_ids = {case_id for case_id in resolved_ids
+                if case_id not in emitted
+                    and (graph.is_live(case_id)
+                        or (graph.is_owned(case_id) and not graph.is_extension(case_id)))
+                    and should_sync(case_id)}
+            emitted.update(ready_ids)
+            debug('ready: %r', ready_ids)
+            for case_id in ready_ids:
+                yield case_id
+
+        enliven_open_roots()
+        remaining_ids = {case_id
+            for case_id in chain(graph.iter_live_ids(), modified_ids)
+            if case_id not in emitted and should_sync(case_id)}
+        sync_total[0] = len(emitted) + len(remaining_ids)
+        emitted.update(remaining_ids)
+        for case_id in remaining_ids:
+            yield case_id
+
+    IGNORE = object()
+    debug = logging.getLogger(__name__).debug
+    accessor = CaseAccessors(restore_state.domain)
+
+    indices = defaultdict(list)  # case_id -> list of CommCareCaseIndex-like
+    owner_ids = list(restore_state.owner_ids)
+
+    debug("sync %s for %r", restore_state.current_sync_log._id, owner_ids)
+    with timing_context("livequery"):
+        with timing_context("get_case_ids_by_owners"):
+            owned_ids = accessor.get_case_ids_by_owners(owner_ids, closed=False)
+            debug("owned: %r", owned_ids)
+
+        # owned, open case ids (may be extensions)
+        graph = CaseGraph(owned_ids)
+        prefetch = get_prefetch_options(restore_state.domain)
+        stream_ids = None  # cases to check for streaming (see iter_streamed_sync_ids)
+
+        if LIVEQUERY_STREAMING.enabled(restore_state.domain):
+            stream_ids = set(owned_ids)
+            emitted = set()
+            sync_total = [0]  # total number of cases to sync, updated while streaming
+            with timing_context("compile_response (streaming)"):
+                iaccessor = PrefetchIndexCaseAccessor(accessor, indices)
+                compile_response(
+                    timing_context,
+                    restore_state,
+                    response,
+                    batch_cases(iaccessor, iter_streamed_sync_ids(), **prefetch),
+                    init_progress(async_task, lambda: sync_total[0]),
+                )
+            restore_state.current_sync_log.case_ids_on_phone = graph.get_live_ids()
+            return
+
+        for _ in expand_graph():
+            pass
+
+        enliven_open_roots()
+        live_ids = graph.get_live_ids()
+        debug('live: %r', live_ids)
 
         if restore_state.last_sync_log:
             with timing_context("discard_already_synced_cases"):
@@ -242,26 +287,39 @@ def do_livequery(timing_context, restore_state, response, async_task=None):
                 timing_context,
                 restore_state,
                 response,
-                batch_cases(iaccessor, sync_ids),
+                batch_cases(iaccessor, sync_ids, **prefetch),
                 init_progress(async_task, len(sync_ids)),
             )
 
 
 def discard_already_synced_cases(live_ids, restore_state, accessor):
     debug = logging.getLogger(__name__).debug
-    sync_log = restore_state.last_sync_log
-    phone_ids = sync_log.case_ids_on_phone
-    debug("phone_ids: %r", phone_ids)
+    phone_ids, modified_ids = get_phone_and_modified_ids(restore_state, accessor)
     if phone_ids:
         sync_ids = live_ids - phone_ids  # sync all live cases not on phone
         # also sync cases on phone that have been modified since last sync
-        sync_ids.update(accessor.get_modified_case_ids(list(phone_ids), sync_log))
+        sync_ids.update(modified_ids)
     else:
         sync_ids = live_ids
     debug('sync_ids: %r', sync_ids)
     return sync_ids
 
 
+def get_phone_and_modified_ids(restore_state, accessor):
+    """Get ids of cases on phone and those modified since last sync
+
+    :returns: A tuple `(phone_ids, modified_ids)` of sets.
+    """
+    debug = logging.getLogger(__name__).debug
+    sync_log = restore_state.last_sync_log
+    phone_ids = sync_log.case_ids_on_phone
+    debug("phone_ids: %r", phone_ids)
+    if not phone_ids:
+        return set(), set()
+    modified_ids = set(accessor.get_modified_case_ids(list(phone_ids), sync_log))
+    return phone_ids, modified_ids
+
+
 class PrefetchIndexCaseAccessor(object):
 
     def __init__(self, accessor, indices):
@@ -270,29 +328,68 @@ class PrefetchIndexCaseAccessor(object):
         self.indices = indices
 
     def get_cases(self, case_ids, **kw):
-        assert 'prefetched_indices' not in kw
-        kw['prefetched_indices'] = [ix
-            for case_id in case_ids
-            for ix in self.indices[case_id]]
+        if kw.get('prefetched_indices') is None:
+            kw['prefetched_indices'] = self.get_indices(case_ids)
         return self.accessor.get_cases(case_ids, **kw)
 
+    def get_indices(self, case_ids):
+        """Get a snapshot of the indices of the given cases"""
+        return tuple(ix
+            for case_id in case_ids
+            for ix in self.indices.get(case_id, []))
+
+
+def batch_cases(accessor, case_ids, workers=0, max_batches=None):
+    """Fetch cases in batches of 1000
 
-def batch_cases(accessor, case_ids):
+    :param workers: Number of threads used to fetch batches
+    concurrently. Batches are fetched serially if zero.
+    :param max_batches: Maximum number of batches in flight or held in
+    memory when fetching concurrently. Defaults to `workers`.
+    :returns: Iterable of case lists in `case_ids` order.
+    """
     def take(n, iterable):
         # https://docs.python.org/2/library/itertools.html#recipes
         return list(islice(iterable, n))
 
+    def iter_id_batches():
+        ids = iter(case_ids)
+        while True:
+            next_ids = take(1000, ids)
+            if not next_ids:
+                break
+            track_load(len(next_ids))
+            yield next_ids
+
+    def get_cases(batch):
+        ids, indices = batch
+        return accessor.get_cases(ids, prefetched_indices=indices)
+
     track_load = case_load_counter("livequery_restore", accessor.domain)
-    ids = iter(case_ids)
-    while True:
-        next_ids = take(1000, ids)
-        if not next_ids:
-            break
-        track_load(len(next_ids))
-        yield accessor.get_cases(next_ids)
+    if workers:
+        # Indices are looked up in this thread because the case graph
+        # may still be changing while batches are fetched when streaming.
+        batches = ((ids, accessor.get_indices(ids)) for ids in iter_id_batches())
+        return prefetch_map(get_cases, batches, workers, max_batches)
+    return (accessor.get_cases(next_ids) for next_ids in iter_id_batches())
+
+
+def get_prefetch_options(domain):
+    """Get `batch_cases` keyword arguments for domain"""
+    if LIVEQUERY_PREFETCH_CASES.enabled(domain):
+        return {
+            'workers': LIVEQUERY_PREFETCH_WORKERS,
+            'max_batches': LIVEQUERY_PREFETCH_MAX_BATCHES,
+        }
+    return {}
 
 
 def init_progress(async_task, total):
+    """Get a function to report restore progress to `async_task`
+
+    :param total: Total number of cases to be synced or a function
+    returning the total known so far when it is not known up front.
+    """
     if not async_task:
         return lambda done: None
 
@@ -301,7 +398,7 @@ def init_progress(async_task, total):
             state=ASYNC_RESTORE_SENT,
             meta={
                 'done': done,
-                'total': total,
+                'total': total() if callable(total) else total,
                 'retry-after': ASYNC_RETRY_AFTER
             }
         )
@@ -312,6 +409,8 @@ def init_progress(async_task, total):
 
 def compile_response(timing_context, restore_state, response, batches, update_progress):
     done = 0
+    xml_cache = get_case_xml_cache(restore_state)
+    cache_hits = cache_lookups = 0
     for cases in batches:
         with timing_context("get_stock_payload"):
             response.extend(get_stock_payload(
@@ -325,9 +424,21 @@ def compile_response(timing_context, restore_state, response, batches, update_pr
                 restore_state.domain, cases, restore_state.last_sync_log)
 
         with timing_context("get_xml_for_response (%s updates)" % len(updates)):
-            response.extend(item
-                for update in updates
-                for item in get_xml_for_response(update, restore_state))
+            if xml_cache is None:
+                response.extend(item
+                    for update in updates
+                    for item in get_xml_for_response(update, restore_state))
+            else:
+                items, hits = get_cached_xml_for_response(
+                    updates, restore_state, xml_cache)
+                response.extend(items)
+                cache_hits += hits
+                cache_lookups += len(updates)
 
         done += len(cases)
         update_progress(done)
+
+    if xml_cache is not None:
+        tags = ['domain:{}'.format(restore_state.domain)]
+        datadog_counter('commcare.restores.case_xml_cache.hits', cache_hits, tags=tags)
+        datadog_counter('commcare.restores.case_xml_cache.misses', cache_lookups - cache_hits, tags=tags)
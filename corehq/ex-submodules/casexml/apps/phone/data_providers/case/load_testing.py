@@ -1,6 +1,6 @@
 from copy import deepcopy
+from casexml.apps.case.xml.serializer import get_case_xml_bytes
 from casexml.apps.phone.data_providers.case.utils import CaseSyncUpdate
-from casexml.apps.phone.xml import get_case_element, tostring
 from corehq.apps.app_manager.const import USERCASE_TYPE
 
 
@@ -28,8 +28,8 @@ def get_xml_for_response(update, restore_state):
     original_update = update
     elements = []
     while current_count < restore_state.loadtest_factor:
-        element = get_case_element(update.case, update.required_updates, restore_state.version)
-        elements.append(tostring(element))
+        elements.append(get_case_xml_bytes(
+            update.case, update.required_updates, restore_state.version))
         current_count += 1
         if current_count < restore_state.loadtest_factor:
             update = transform_loadtest_update(original_update, current_count)
@@ -0,0 +1,123 @@
+"""Cache of serialized case XML for restores
+
+Users who share a location sync many of the same cases. Serialized case
+blocks are cached in a process-local, size-bounded LRU store keyed by
+case id, case server modified date, restore version, the required
+updates and whether case attachments are synced, so a case is only
+serialized again after it has changed.
+"""
+import threading
+from collections import OrderedDict
+
+from casexml.apps.case import const
+from casexml.apps.case.xml.generator import _sync_attachments
+from casexml.apps.phone.const import CASE_XML_CACHE_MAX_BYTES
+from casexml.apps.phone.data_providers.case.load_testing import (
+    get_xml_for_response,
+)
+from corehq.toggles import LIVEQUERY_CASE_XML_CACHE
+
+
+class CaseXMLCache(object):
+    """Thread-safe LRU store of serialized case XML bounded by size in bytes
+
+    Values are lists of XML byte strings.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._items.pop(key)
+            except KeyError:
+                return None
+            self._items[key] = value  # most recently used
+            return value
+
+    def set(self, key, value):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.nbytes -= _size_of(old)
+            self._items[key] = value
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                __, evicted = self._items.popitem(last=False)
+                self.nbytes -= _size_of(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.nbytes = 0
+
+
+def _size_of(value):
+    return sum(len(item) for item in value)
+
+
+_case_xml_cache = CaseXMLCache(CASE_XML_CACHE_MAX_BYTES)
+
+
+def get_case_xml_cache(restore_state):
+    """Get case XML cache for restore or None if it should not be used"""
+    if restore_state.loadtest_factor > 1:
+        return None
+    if not LIVEQUERY_CASE_XML_CACHE.enabled(restore_state.domain):
+        return None
+    return _case_xml_cache
+
+
+def get_cache_key(update, version, sync_attachments):
+    """Get cache key for case sync update
+
+    :param sync_attachments: Whether case attachments are included in
+    the case XML (see MM_CASE_PROPERTIES).
+    :returns: A hashable key or None if the case cannot be cached.
+    """
+    case = update.case
+    if not case.server_modified_on:
+        return None
+    required = update.required_updates
+    return (
+        case.case_id,
+        case.server_modified_on.isoformat(),
+        version,
+        sync_attachments,
+        const.CASE_ACTION_CREATE in required,
+        const.CASE_ACTION_UPDATE in required,
+        const.CASE_ACTION_CLOSE in required or const.CASE_ACTION_PURGE in required,
+    )
+
+
+def get_cached_xml_for_response(updates, restore_state, cache):
+    """Get case XML items for updates, serializing only cache misses
+
+    :returns: A tuple `(items, hits)` where `items` is a list of XML
+    byte strings in the order of `updates` and `hits` is the number of
+    updates whose XML was found in the cache.
+    """
+    items = []
+    hits = 0
+    sync_attachments = _sync_attachments(restore_state.domain)
+    for update in updates:
+        key = get_cache_key(update, restore_state.version, sync_attachments)
+        xml = cache.get(key) if key is not None else None
+        if xml is None:
+            xml = get_xml_for_response(update, restore_state)
+            if key is not None:
+                cache.set(key, xml)
+        else:
+            hits += 1
+        items.extend(xml)
+    return items, hits
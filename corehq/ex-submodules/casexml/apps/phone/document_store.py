@@ -11,4 +11,4 @@ class ReadonlySyncLogDocumentStore(ReadOnlyDocumentStore):
         except SyncLogSQL.DoesNotExist as e:
             raise DocumentNotFoundError(e)
 
-        return sycnlog.doc
+        return sycnlog.get_doc()
@@ -0,0 +1,75 @@
+import datetime
+import uuid
+from timeit import default_timer
+
+from django.core.management import BaseCommand
+
+from casexml.apps.case import const
+from casexml.apps.case.models import CommCareCase
+from casexml.apps.case.sharedmodels import CommCareCaseIndex
+from casexml.apps.case.xml import V1, V2
+from casexml.apps.case.xml.serializer import get_case_xml_bytes
+from casexml.apps.phone.xml import get_case_element, tostring
+
+
+class Command(BaseCommand):
+    """Compare the ElementTree case XML generator with the direct-to-bytes
+    serializer used for restores on synthetic cases.
+
+    Usage: ./manage.py benchmark_case_xml --cases 10000 --properties 30
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cases', type=int, default=10000)
+        parser.add_argument('--properties', type=int, default=20,
+                            help='Number of dynamic properties per case')
+        parser.add_argument('--indices', type=int, default=1,
+                            help='Number of indices per case')
+
+    def handle(self, cases, properties, indices, **options):
+        case_list = [_make_case(properties, indices) for i in range(cases)]
+        updates = [const.CASE_ACTION_CREATE, const.CASE_ACTION_UPDATE]
+
+        def generate(case, version):
+            return tostring(get_case_element(case, updates, version))
+
+        def serialize(case, version):
+            return get_case_xml_bytes(case, updates, version)
+
+        for version in [V1, V2]:
+            for name, func in [("ElementTree", generate), ("serializer", serialize)]:
+                start = default_timer()
+                for case in case_list:
+                    func(case, version)
+                elapsed = default_timer() - start
+                print("V{} {:<12} {:8.3f}s {:10.0f} cases/sec".format(
+                    version, name, elapsed, len(case_list) / elapsed))
+
+            mismatched = sum(1 for case in case_list
+                             if generate(case, version) != serialize(case, version))
+            if mismatched:
+                print("V{} {} cases serialized differently".format(version, mismatched))
+
+
+def _make_case(num_properties, num_indices):
+    now = datetime.datetime.utcnow()
+    case = CommCareCase(
+        domain='benchmark',
+        opened_on=now,
+        modified_on=now,
+        type='patient',
+        closed=False,
+        name='case & <name>',
+        owner_id=uuid.uuid4().hex,
+        user_id=uuid.uuid4().hex,
+        indices=[CommCareCaseIndex(
+            identifier='parent{}'.format(i),
+            referenced_type='household',
+            referenced_id=uuid.uuid4().hex,
+            relationship='child',
+        ) for i in range(num_indices)],
+    )
+    case._id = uuid.uuid4().hex
+    for i in range(num_properties):
+        setattr(case, 'property_{}'.format(i), 'value "{}" <{}>'.format(i, uuid.uuid4().hex))
+    return case
@@ -0,0 +1,103 @@
+import random
+import tracemalloc
+import uuid
+from collections import defaultdict
+from itertools import chain
+from timeit import default_timer
+
+from django.core.management import BaseCommand
+
+from casexml.apps.phone.data_providers.case.case_graph import CaseGraph
+
+
+class Command(BaseCommand):
+    """Compare memory and runtime of the compact livequery case graph
+    with the dict-of-sets structures it replaced on synthetic graphs.
+
+    Usage: ./manage.py benchmark_livequery_graph 100000 1000000
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='+', type=int,
+                            help='Number of cases in each synthetic graph')
+        parser.add_argument('--extension-ratio', type=float, default=0.3,
+                            help='Fraction of indices that are extension indices')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, sizes, extension_ratio, seed, **options):
+        for size in sizes:
+            random.seed(seed)
+            owned_ids, edges = _make_graph(size, extension_ratio)
+            for name, func in [("dict of sets", _build_sets), ("CaseGraph", _build_graph)]:
+                tracemalloc.start()
+                start = default_timer()
+                num_live = func(owned_ids, edges)
+                elapsed = default_timer() - start
+                __, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print("{:>8} cases {:<12} {:8.3f}s {:10.1f} MB peak, {} live".format(
+                    size, name, elapsed, peak / 1024.0 / 1024, num_live))
+
+
+def _make_graph(size, extension_ratio):
+    """Make synthetic households of cases with child and extension indices
+
+    :returns: `(owned_ids, edges)` where edges is a list of
+    `(sub_id, identifier, ref_id, is_extension)` tuples.
+    """
+    case_ids = [str(uuid.uuid4()) for i in range(size)]
+    owned_ids = case_ids[::2]
+    edges = []
+    for i, case_id in enumerate(case_ids[1:], start=1):
+        ref_id = case_ids[random.randrange(max(0, i - 50), i)]
+        is_extension = random.random() < extension_ratio
+        edges.append((case_id, 'parent', ref_id, is_extension))
+    return owned_ids, edges
+
+
+def _build_sets(owned_ids, edges):
+    live_ids = set()
+    extensions_by_host = defaultdict(set)
+    hosts_by_extension = defaultdict(set)
+    parents_by_child = defaultdict(set)
+    seen_ix = defaultdict(set)
+    for sub_id, identifier, ref_id, is_extension in edges:
+        ix_key = '{} {}'.format(sub_id, identifier)
+        seen_ix[sub_id].add(ix_key)
+        seen_ix[ref_id].add(ix_key)
+        if is_extension:
+            extensions_by_host[ref_id].add(sub_id)
+            hosts_by_extension[sub_id].add(ref_id)
+        else:
+            parents_by_child[sub_id].add(ref_id)
+
+    for case_id in owned_ids:
+        if case_id in hosts_by_extension and case_id not in parents_by_child:
+            continue
+        stack = [case_id]
+        while stack:
+            case_id = stack.pop()
+            if case_id in live_ids:
+                continue
+            live_ids.add(case_id)
+            stack.extend(chain(
+                extensions_by_host.get(case_id, []),
+                hosts_by_extension.get(case_id, []),
+                parents_by_child.get(case_id, []),
+            ))
+    return len(live_ids)
+
+
+def _build_graph(owned_ids, edges):
+    graph = CaseGraph(owned_ids)
+    for sub_id, identifier, ref_id, is_extension in edges:
+        graph.see_index(sub_id, identifier, ref_id)
+        if is_extension:
+            graph.add_extension(ref_id, sub_id)
+        else:
+            graph.add_parent(sub_id, ref_id)
+
+    for case_id in owned_ids:
+        if not graph.is_extension(case_id):
+            graph.enliven(case_id)
+    return sum(1 for case_id in graph.iter_live_ids())
@@ -0,0 +1,19 @@
+# flake8: noqa
+# Generated by Django 1.11.20 on 2019-06-10 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('phone', '0003_auto_20190405_1752'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='synclogsql',
+            name='case_state',
+            field=models.BinaryField(null=True),
+        ),
+    ]
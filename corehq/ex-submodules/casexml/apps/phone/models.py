@@ -2,11 +2,13 @@ from collections import defaultdict, namedtuple
 from copy import copy
 from datetime import datetime
 import architect
+import time
 import uuid
 import json
 from couchdbkit.exceptions import ResourceConflict, ResourceNotFound
 from casexml.apps.phone.exceptions import IncompatibleSyncLogType, MissingSyncLog
-from corehq.toggles import LEGACY_SYNC_SUPPORT
+from corehq.toggles import COMPACT_SYNCLOG_CASE_STATE, LEGACY_SYNC_SUPPORT
+from corehq.util.datadog.gauges import datadog_histogram
 from corehq.util.global_request import get_request_domain
 from corehq.util.soft_assert import soft_assert
 from corehq.toggles import ENABLE_LOADTEST_USERS
@@ -20,6 +22,11 @@ from dimagi.utils.couch import LooselyEqualDocumentSchema
 from dimagi.utils.logging import notify_exception
 from casexml.apps.case import const
 from casexml.apps.case.sharedmodels import CommCareCaseIndex, IndexHoldingMixIn
+from casexml.apps.phone.case_state_encoding import (
+    CASE_STATE_FIELDS,
+    decode_case_state,
+    encode_case_state,
+)
 from casexml.apps.phone.checksum import Checksum, CaseStateHash
 from casexml.apps.phone.change_publishers import publish_synclog_saved
 import logging
@@ -102,6 +109,9 @@ class OTARestoreUser(object):
     def get_fixture_data_items(self):
         raise NotImplementedError()
 
+    def get_fixture_data_item_ids(self):
+        raise NotImplementedError()
+
     def get_commtrack_location_id(self):
         raise NotImplementedError()
 
@@ -141,6 +151,9 @@ class OTARestoreWebUser(OTARestoreUser):
     def get_fixture_data_items(self):
         return []
 
+    def get_fixture_data_item_ids(self):
+        return set()
+
     def get_commtrack_location_id(self):
         return None
 
@@ -176,6 +189,11 @@ class OTARestoreCommCareUser(OTARestoreUser):
 
         return FixtureDataItem.by_user(self._couch_user)
 
+    def get_fixture_data_item_ids(self):
+        from corehq.apps.fixtures.models import FixtureDataItem
+
+        return FixtureDataItem.by_user(self._couch_user, wrap=False)
+
     def get_commtrack_location_id(self):
         from corehq.apps.commtrack.util import get_commtrack_location_id
 
@@ -354,8 +372,14 @@ class AbstractSyncLog(SafeSaveDocument):
 
 
 def save_synclog_to_sql(synclog_json_object):
+    start = time.time()
     synclog = synclog_to_sql_object(synclog_json_object)
     synclog.save()
+    tags = _get_synclog_metric_tags(synclog)
+    datadog_histogram('commcare.sync_log.save_time', time.time() - start, tags=tags)
+    datadog_histogram('commcare.sync_log.case_count', synclog_json_object.case_count(), tags=tags)
+    if synclog.case_state is not None:
+        datadog_histogram('commcare.sync_log.case_state_size', len(synclog.case_state), tags=tags)
 
 
 def delete_synclog(synclog_id):
@@ -401,10 +425,23 @@ def synclog_to_sql_object(synclog_json_object):
             error_date=synclog_json_object.error_date,
             error_hash=synclog_json_object.error_hash,
         )
-    synclog.doc = synclog_json_object.to_json()
+    doc = synclog_json_object.to_json()
+    if (isinstance(synclog_json_object, SimplifiedSyncLog)
+            and COMPACT_SYNCLOG_CASE_STATE.enabled(synclog_json_object.domain)):
+        doc, synclog.case_state = encode_case_state(doc)
+    else:
+        synclog.case_state = None
+    synclog.doc = doc
     return synclog
 
 
+def _get_synclog_metric_tags(synclog):
+    return [
+        'format:{}'.format(synclog.log_format),
+        'encoding:{}'.format('binary' if synclog.case_state is not None else 'json'),
+    ]
+
+
 @architect.install('partition', type='range', subtype='date', constraint='week', column='date')
 class SyncLogSQL(models.Model):
 
@@ -414,6 +451,9 @@ class SyncLogSQL(models.Model):
     date = models.DateTimeField(db_index=True, null=True, blank=True)
     previous_synclog_id = models.UUIDField(max_length=255, default=None, null=True, blank=True)
     doc = JSONField()
+    # SimplifiedSyncLog case state encoded by case_state_encoding.encode_case_state
+    # When set the case state fields are omitted from `doc`.
+    case_state = models.BinaryField(null=True)
     log_format = models.CharField(
         max_length=10,
         default=LOG_FORMAT_LEGACY,
@@ -440,6 +480,17 @@ class SyncLogSQL(models.Model):
                 details={'pk': self.pk}
             )
 
+    def get_doc(self):
+        """Get sync log JSON doc including case state"""
+        if self.case_state is None:
+            return self.doc
+        doc = dict(self.doc)
+        doc.update(decode_case_state(self.case_state))
+        return doc
+
+    def get_wrapped(self):
+        return properly_wrap_sync_log(self.doc, self.case_state)
+
 
 class SyncLog(AbstractSyncLog):
     """
@@ -822,6 +873,33 @@ class SimplifiedSyncLog(AbstractSyncLog):
     device_id = StringProperty()
 
     _purged_cases = None
+    _encoded_case_state = None
+
+    def set_encoded_case_state(self, case_state):
+        """Set case state to be decoded on first access
+
+        See `casexml.apps.phone.case_state_encoding`
+        """
+        self._encoded_case_state = case_state
+
+    def _decode_case_state(self):
+        case_state = self._encoded_case_state
+        self._encoded_case_state = None
+        start = time.time()
+        fields = decode_case_state(case_state)
+        for name, value in fields.items():
+            if isinstance(value, dict):
+                value = IndexTree.wrap(value)
+            else:
+                value = set(value)
+            setattr(self, name, value)
+        datadog_histogram('commcare.sync_log.case_state_decode_time', time.time() - start,
+                          tags=['format:{}'.format(self.log_format)])
+
+    def to_json(self):
+        if self._encoded_case_state is not None:
+            self._decode_case_state()
+        return super(SimplifiedSyncLog, self).to_json()
 
     @property
     def purged_cases(self):
@@ -1277,6 +1355,32 @@ class SimplifiedSyncLog(AbstractSyncLog):
         return [CaseState(case_id=id) for id in self.dependent_case_ids_on_phone]
 
 
+class _LazyCaseStateProperty(object):
+    """Decodes encoded case state before a case state property is used
+
+    Wraps a case state property of SimplifiedSyncLog. See
+    `SimplifiedSyncLog.set_encoded_case_state`.
+    """
+
+    def __init__(self, property_):
+        self.property = property_
+
+    def __get__(self, instance, owner):
+        if instance is not None and instance._encoded_case_state is not None:
+            instance._decode_case_state()
+        return self.property.__get__(instance, owner)
+
+    def __set__(self, instance, value):
+        if instance._encoded_case_state is not None:
+            instance._decode_case_state()
+        self.property.__set__(instance, value)
+
+
+for _name in CASE_STATE_FIELDS:
+    setattr(SimplifiedSyncLog, _name, _LazyCaseStateProperty(SimplifiedSyncLog.properties()[_name]))
+del _name
+
+
 def _domain_has_legacy_toggle_set():
     # old versions of commcare (< 2.10ish) didn't purge on form completion
     # so can still modify cases that should no longer be on the phone.
@@ -1292,9 +1396,13 @@ def get_properly_wrapped_sync_log(doc_id):
     Raises MissingSyncLog if doc_id is not found
     """
     try:
+        start = time.time()
         synclog = SyncLogSQL.objects.filter(synclog_id=doc_id).first()
         if synclog:
-            return properly_wrap_sync_log(synclog.doc)
+            wrapped = synclog.get_wrapped()
+            datadog_histogram('commcare.sync_log.load_time', time.time() - start,
+                              tags=_get_synclog_metric_tags(synclog))
+            return wrapped
     except ValidationError:
         # this occurs if doc_id is not a valid UUID
         pass
@@ -1302,8 +1410,16 @@ def get_properly_wrapped_sync_log(doc_id):
         doc_id))
 
 
-def properly_wrap_sync_log(doc):
-    return get_sync_log_class_by_format(doc.get('log_format')).wrap(doc)
+def properly_wrap_sync_log(doc, case_state=None):
+    """Wrap sync log doc
+
+    :param case_state: Encoded case state of a SimplifiedSyncLog, which
+    will be decoded lazily. See `SyncLogSQL.case_state`.
+    """
+    synclog = get_sync_log_class_by_format(doc.get('log_format')).wrap(doc)
+    if case_state is not None:
+        synclog.set_encoded_case_state(bytes(case_state))
+    return synclog
 
 
 def get_sync_log_class_by_format(format):
@@ -5,6 +5,7 @@ from casexml.apps.phone.const import RESTORE_CACHE_KEY_PREFIX, ASYNC_RESTORE_CAC
 from corehq.toggles import ENABLE_LOADTEST_USERS
 from corehq.util.quickcache import quickcache
 from dimagi.utils.couch.cache.cache_core import get_redis_default_cache
+from django_redis.cache import RedisCache
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +34,33 @@ class _CacheAccessor(object):
         get_redis_default_cache().delete(self.cache_key)
 
 
+def get_and_invalidate_many(accessors):
+    """Get the values of and invalidate many cache accessors
+
+    With a Redis cache this is done in a single pipelined round trip.
+
+    :returns: List of values (`None` where not set) in the order of
+    `accessors`.
+    """
+    if not accessors:
+        return []
+    logger.debug('getting and invalidating {}'.format([a.debug_info for a in accessors]))
+    cache = get_redis_default_cache()
+    keys = [accessor.cache_key for accessor in accessors]
+    if isinstance(cache, RedisCache):
+        client = cache.client
+        redis_keys = [client.make_key(key) for key in keys]
+        pipeline = client.get_client(write=True).pipeline(transaction=False)
+        for key in redis_keys:
+            pipeline.get(key)
+        pipeline.delete(*redis_keys)
+        values = pipeline.execute()[:-1]
+        return [None if value is None else client.decode(value) for value in values]
+    values = cache.get_many(keys)
+    cache.delete_many(keys)
+    return [values.get(key) for key in keys]
+
+
 @quickcache(['domain', 'user_id'], timeout=24 * 60 * 60)
 def get_loadtest_factor_for_user(domain, user_id):
     from corehq.apps.users.models import CouchUser, CommCareUser
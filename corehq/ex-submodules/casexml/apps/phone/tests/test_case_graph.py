@@ -0,0 +1,97 @@
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.data_providers.case.case_graph import (
+    IDENTIFIER_BITS,
+    AdjacencyList,
+    CaseGraph,
+)
+
+
+class TestAdjacencyList(SimpleTestCase):
+
+    def test_add_and_get(self):
+        adjacency = AdjacencyList()
+        adjacency.add(3, 1)
+        adjacency.add(0, 2)
+        adjacency.add(3, 4)
+        self.assertEqual(list(adjacency.get(3)), [4, 1])
+        self.assertEqual(list(adjacency.get(0)), [2])
+        self.assertEqual(list(adjacency.get(1)), [])
+        self.assertEqual(list(adjacency.get(10)), [])
+
+    def test_contains(self):
+        adjacency = AdjacencyList()
+        adjacency.add(2, 0)
+        self.assertIn(2, adjacency)
+        self.assertNotIn(1, adjacency)
+        self.assertNotIn(5, adjacency)
+
+
+class TestCaseGraph(SimpleTestCase):
+
+    def test_owned_cases(self):
+        graph = CaseGraph(["a", "b"])
+        self.assertTrue(graph.is_owned("a"))
+        self.assertTrue(graph.is_open("b"))
+        self.assertTrue(graph.is_discovered("a"))
+        self.assertFalse(graph.is_owned("c"))
+        self.assertFalse(graph.is_live("a"))
+        self.assertEqual(set(graph.iter_owned_ids()), {"a", "b"})
+
+    def test_see_index(self):
+        graph = CaseGraph(["a"])
+        self.assertTrue(graph.see_index("a", "parent", "b"))
+        self.assertFalse(graph.see_index("a", "parent", "b"))
+        self.assertTrue(graph.see_index("c", "host", "b"))
+        self.assertTrue(graph.see_index("b", "parent", "a"))
+        self.assertEqual(graph.get_seen_index_keys(["a"]), {"a parent", "b parent"})
+        self.assertEqual(graph.get_seen_index_keys(["c", "x"]), {"c host"})
+
+    def test_see_index_many_identifiers(self):
+        # identifier numbers that don't fit in IDENTIFIER_BITS use unpacked keys
+        graph = CaseGraph(["a"])
+        identifiers = ["ix{}".format(i) for i in range((1 << IDENTIFIER_BITS) + 2)]
+        for identifier in identifiers:
+            self.assertTrue(graph.see_index("a", identifier, "b"))
+        self.assertFalse(graph.see_index("a", identifiers[-1], "b"))
+        self.assertTrue(graph.see_index("c", identifiers[-1], "b"))
+        self.assertEqual(graph.get_seen_index_keys(["a"]), {"a " + identifier for identifier in identifiers})
+        self.assertEqual(graph.get_seen_index_keys(["c"]), {"c " + identifiers[-1]})
+        self.assertEqual(len(graph.get_seen_index_keys(["b"])), len(identifiers) + 1)
+
+    def test_is_extension(self):
+        graph = CaseGraph(["e", "c"])
+        graph.add_extension("h", "e")
+        graph.add_extension("h", "c")
+        graph.add_parent("c", "p")
+        self.assertTrue(graph.is_extension("e"))
+        # a case that is both a child and an extension is not an extension
+        self.assertFalse(graph.is_extension("c"))
+        self.assertFalse(graph.is_extension("h"))
+        self.assertFalse(graph.is_extension("unknown"))
+
+    def test_enliven(self):
+        # h <--ext-- e <--chi-- c, x is unrelated
+        graph = CaseGraph(["c"])
+        graph.mark_open(["h", "e", "x"])
+        graph.add_extension("h", "e")
+        graph.add_parent("c", "e")
+        self.assertEqual(set(graph.enliven("c")), {"c", "e", "h"})
+        self.assertEqual(graph.enliven("c"), [])
+        self.assertEqual(graph.get_live_ids(), {"c", "e", "h"})
+
+    def test_has_live_extension(self):
+        # a <--ext-- b <--ext-- c(owned)
+        graph = CaseGraph(["c"])
+        graph.mark_open(["a", "b"])
+        graph.add_extension("a", "b")
+        graph.add_extension("b", "c")
+        self.assertTrue(graph.has_live_extension("a"))
+        self.assertFalse(graph.has_live_extension("c"))
+
+    def test_has_live_extension_cycle(self):
+        graph = CaseGraph([])
+        graph.mark_open(["a", "b"])
+        graph.add_extension("a", "b")
+        graph.add_extension("b", "a")
+        self.assertFalse(graph.has_live_extension("a"))
@@ -0,0 +1,87 @@
+import uuid
+
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.case_state_encoding import (
+    decode_case_state,
+    encode_case_state,
+)
+from casexml.apps.phone.models import (
+    IndexTree,
+    SimplifiedSyncLog,
+    properly_wrap_sync_log,
+)
+
+
+class TestCaseStateEncoding(SimpleTestCase):
+
+    def setUp(self):
+        self.case_ids = [str(uuid.uuid4()) for i in range(10)]
+        self.case_ids.extend([uuid.uuid4().hex, 'not-a-uuid', u'élément'])
+        parent_id, child_id, host_id, ext_id = self.case_ids[:4]
+        self.sync_log = SimplifiedSyncLog(
+            domain='test',
+            case_ids_on_phone=set(self.case_ids),
+            dependent_case_ids_on_phone={parent_id},
+            closed_cases={self.case_ids[-1]},
+            index_tree=IndexTree(indices={
+                child_id: {'parent': parent_id, 'removed': None},
+                self.case_ids[-2]: {'parent': self.case_ids[-3]},
+            }),
+            extension_index_tree=IndexTree(indices={ext_id: {'host': host_id}}),
+        )
+
+    def test_round_trip(self):
+        doc = self.sync_log.to_json()
+        stripped, case_state = encode_case_state(doc)
+        for name in ['case_ids_on_phone', 'index_tree', 'extension_index_tree']:
+            self.assertNotIn(name, stripped)
+            self.assertIn(name, doc)
+        self.assertEqual(stripped['domain'], 'test')
+
+        decoded = decode_case_state(case_state)
+        self.assertEqual(set(decoded['case_ids_on_phone']), set(self.case_ids))
+        self.assertEqual(decoded['dependent_case_ids_on_phone'], [self.case_ids[0]])
+        self.assertEqual(decoded['closed_cases'], [self.case_ids[-1]])
+        self.assertEqual(decoded['index_tree'], doc['index_tree'])
+        self.assertEqual(decoded['extension_index_tree'], doc['extension_index_tree'])
+
+    def test_empty(self):
+        __, case_state = encode_case_state(SimplifiedSyncLog().to_json())
+        decoded = decode_case_state(case_state)
+        self.assertEqual(decoded['case_ids_on_phone'], [])
+        self.assertEqual(decoded['index_tree'], {'doc_type': 'IndexTree', 'indices': {}})
+
+    def test_unknown_version(self):
+        __, case_state = encode_case_state(self.sync_log.to_json())
+        with self.assertRaises(ValueError):
+            decode_case_state(b'\xff' + case_state[1:])
+
+    def test_lazy_decode(self):
+        doc, case_state = encode_case_state(self.sync_log.to_json())
+        sync_log = properly_wrap_sync_log(doc, case_state)
+        self.assertIsInstance(sync_log, SimplifiedSyncLog)
+        self.assertIsNotNone(sync_log._encoded_case_state)
+        self.assertEqual(sync_log.domain, 'test')
+        self.assertIsNotNone(sync_log._encoded_case_state)
+
+        self.assertEqual(sync_log.case_ids_on_phone, set(self.case_ids))
+        self.assertIsNone(sync_log._encoded_case_state)
+        self.assertEqual(sync_log.index_tree.indices, self.sync_log.index_tree.indices)
+
+    def test_set_before_decode(self):
+        doc, case_state = encode_case_state(self.sync_log.to_json())
+        sync_log = properly_wrap_sync_log(doc, case_state)
+        sync_log.closed_cases = set()
+        self.assertEqual(sync_log.closed_cases, set())
+        self.assertEqual(sync_log.case_ids_on_phone, set(self.case_ids))
+
+    def test_to_json_decodes(self):
+        doc, case_state = encode_case_state(self.sync_log.to_json())
+        sync_log = properly_wrap_sync_log(doc, case_state)
+        result = sync_log.to_json()
+        expected = self.sync_log.to_json()
+        self.assertEqual(set(result['case_ids_on_phone']), set(self.case_ids))
+        self.assertEqual(result['closed_cases'], expected['closed_cases'])
+        self.assertEqual(result['index_tree'], expected['index_tree'])
+        self.assertEqual(result['extension_index_tree'], expected['extension_index_tree'])
@@ -0,0 +1,127 @@
+from datetime import datetime
+
+from django.test import SimpleTestCase
+from mock import patch
+
+from casexml.apps.case import const
+from casexml.apps.case.xml import V2
+from casexml.apps.phone.data_providers.case.utils import CaseSyncUpdate
+from casexml.apps.phone.data_providers.case.xml_cache import (
+    CaseXMLCache,
+    get_cache_key,
+    get_cached_xml_for_response,
+)
+
+
+class TestCaseXMLCache(SimpleTestCase):
+
+    def test_get_set(self):
+        cache = CaseXMLCache(100)
+        self.assertIsNone(cache.get("a"))
+        cache.set("a", [b"<case />"])
+        self.assertEqual(cache.get("a"), [b"<case />"])
+        self.assertEqual(cache.nbytes, 8)
+
+    def test_lru_eviction(self):
+        cache = CaseXMLCache(20)
+        cache.set("a", [b"x" * 8])
+        cache.set("b", [b"x" * 8])
+        cache.get("a")  # a is now most recently used
+        cache.set("c", [b"x" * 8])
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNotNone(cache.get("c"))
+        self.assertEqual(cache.nbytes, 16)
+
+    def test_replace(self):
+        cache = CaseXMLCache(20)
+        cache.set("a", [b"x" * 8])
+        cache.set("a", [b"x" * 4])
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.nbytes, 4)
+
+    def test_value_larger_than_cache_is_not_stored(self):
+        cache = CaseXMLCache(4)
+        cache.set("a", [b"x" * 8])
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.nbytes, 0)
+
+
+class FakeCase(object):
+
+    def __init__(self, case_id, server_modified_on, closed=False):
+        self.case_id = case_id
+        self.server_modified_on = server_modified_on
+        self.closed = closed
+
+
+class FakeRestoreState(object):
+    domain = 'case-xml-cache'
+    version = V2
+    loadtest_factor = 1
+
+
+class TestGetCachedXMLForResponse(SimpleTestCase):
+
+    def setUp(self):
+        self.modified = datetime(2019, 1, 2, 3, 4, 5)
+        self.restore_state = FakeRestoreState()
+
+    def update(self, case_id, modified, required_updates=None):
+        return CaseSyncUpdate(
+            FakeCase(case_id, modified),
+            None,
+            required_updates or [const.CASE_ACTION_CREATE, const.CASE_ACTION_UPDATE],
+        )
+
+    def test_cache_key(self):
+        key = get_cache_key(self.update("abc", self.modified), V2, False)
+        self.assertEqual(key, ("abc", "2019-01-02T03:04:05", V2, False, True, True, False))
+        update_only = self.update("abc", self.modified, [const.CASE_ACTION_UPDATE])
+        self.assertNotEqual(get_cache_key(update_only, V2, False), key)
+        self.assertNotEqual(get_cache_key(self.update("abc", self.modified), V2, True), key)
+        self.assertIsNone(get_cache_key(self.update("abc", None), V2, False))
+
+    @patch('casexml.apps.phone.data_providers.case.xml_cache._sync_attachments', lambda domain: False)
+    def test_serialize_misses_only(self):
+        cache = CaseXMLCache(1000)
+        path = 'casexml.apps.phone.data_providers.case.xml_cache.get_xml_for_response'
+
+        def fake_xml(update, restore_state):
+            return [update.case.case_id.encode("utf-8")]
+
+        with patch(path, side_effect=fake_xml) as get_xml:
+            items, hits = get_cached_xml_for_response(
+                [self.update("a", self.modified), self.update("b", self.modified)],
+                self.restore_state,
+                cache,
+            )
+            self.assertEqual((items, hits), ([b"a", b"b"], 0))
+            self.assertEqual(get_xml.call_count, 2)
+
+            items, hits = get_cached_xml_for_response(
+                [
+                    self.update("a", self.modified),
+                    self.update("b", datetime(2019, 2, 1)),  # modified
+                    self.update("c", None),  # cannot be cached
+                ],
+                self.restore_state,
+                cache,
+            )
+            self.assertEqual((items, hits), ([b"a", b"b", b"c"], 1))
+            self.assertEqual(get_xml.call_count, 4)
+
+    def test_attachments_setting_changed(self):
+        cache = CaseXMLCache(1000)
+        path = 'casexml.apps.phone.data_providers.case.xml_cache.'
+
+        def fake_xml(update, restore_state):
+            return [update.case.case_id.encode("utf-8")]
+
+        with patch(path + 'get_xml_for_response', side_effect=fake_xml) as get_xml:
+            for sync_attachments in [False, True]:
+                with patch(path + '_sync_attachments', lambda domain: sync_attachments):
+                    items, hits = get_cached_xml_for_response(
+                        [self.update("a", self.modified)], self.restore_state, cache)
+                self.assertEqual((items, hits), ([b"a"], 0))
+            self.assertEqual(get_xml.call_count, 2)
@@ -0,0 +1,29 @@
+import uuid
+
+from django.test import SimpleTestCase
+
+from casexml.apps.phone.restore_caching import (
+    AsyncRestoreTaskIdCache,
+    RestorePayloadPathCache,
+    get_and_invalidate_many,
+)
+
+
+class GetAndInvalidateManyTest(SimpleTestCase):
+
+    def test_get_and_invalidate_many(self):
+        user_id = uuid.uuid4().hex
+        payload_cache = RestorePayloadPathCache('test-domain', user_id, None, None)
+        task_id_cache = AsyncRestoreTaskIdCache('test-domain', user_id, None, 'device')
+        unset_cache = AsyncRestoreTaskIdCache('test-domain', user_id, None, None)
+        payload_cache.set_value('path')
+        task_id_cache.set_value('task-id')
+
+        values = get_and_invalidate_many([payload_cache, task_id_cache, unset_cache])
+
+        self.assertEqual(values, ['path', 'task-id', None])
+        self.assertFalse(payload_cache.exists())
+        self.assertFalse(task_id_cache.exists())
+
+    def test_empty(self):
+        self.assertEqual(get_and_invalidate_many([]), [])
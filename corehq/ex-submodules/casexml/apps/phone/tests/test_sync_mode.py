@@ -1,5 +1,6 @@
 import os
 import uuid
+from collections import deque
 from datetime import datetime
 from xml.etree import cElementTree as ElementTree
 from django.test.utils import override_settings
@@ -41,7 +42,7 @@ from casexml.apps.phone.restore import (
     RestoreParams,
     RestoreCacheSettings,
 )
-from casexml.apps.case.xml import V2, V1
+from casexml.apps.case.xml import V2, V1, V2_NAMESPACE
 from casexml.apps.case.sharedmodels import CommCareCaseIndex
 from six.moves import range
 
@@ -806,6 +807,38 @@ class LiveQuerySyncTokenUpdateTestSQL(LiveQuerySyncTokenUpdateTest):
     pass
 
 
+@use_sql_backend
+@flag_enabled('LIVEQUERY_STREAMING')
+class LiveQueryStreamingSyncTokenUpdateTestSQL(LiveQuerySyncTokenUpdateTest):
+
+    def test_progress_total(self):
+        progress = []
+
+        def init_progress(async_task, total):
+            def update_progress(done):
+                progress.append((done, total()))
+            return update_progress
+
+        self.device.post_changes([
+            CaseStructure(
+                case_id='child',
+                attrs={'create': True},
+                indices=[CaseIndex(
+                    CaseStructure(case_id='parent', attrs={'create': True}),
+                    relationship=CHILD_RELATIONSHIP,
+                    related_type=PARENT_TYPE,
+                )],
+            ),
+            CaseStructure(case_id='other', attrs={'create': True}),
+        ])
+        with patch('casexml.apps.phone.data_providers.case.livequery.init_progress', init_progress):
+            sync = self.get_device().sync()
+        self.assertEqual(set(sync.cases), {'child', 'parent', 'other'})
+        self.assertEqual(progress[-1], (3, 3))
+        for done, total in progress:
+            self.assertGreaterEqual(total, done)
+
+
 class SyncDeletedCasesTest(BaseSyncTest):
 
     def test_deleted_case_doesnt_sync(self):
@@ -848,6 +881,12 @@ class LiveQuerySyncDeletedCasesTestSQL(LiveQuerySyncDeletedCasesTest):
     pass
 
 
+@use_sql_backend
+@flag_enabled('LIVEQUERY_STREAMING')
+class LiveQueryStreamingSyncDeletedCasesTestSQL(LiveQuerySyncDeletedCasesTest):
+    pass
+
+
 class ExtensionCasesSyncTokenUpdates(BaseSyncTest):
     """Makes sure the extension case trees are propertly updated
     """
@@ -1089,6 +1128,12 @@ class LiveQueryExtensionCasesSyncTokenUpdatesSQL(LiveQueryExtensionCasesSyncToke
     pass
 
 
+@use_sql_backend
+@flag_enabled('LIVEQUERY_STREAMING')
+class LiveQueryStreamingExtensionCasesSyncTokenUpdatesSQL(LiveQueryExtensionCasesSyncTokenUpdates):
+    pass
+
+
 class ExtensionCasesFirstSync(BaseSyncTest):
 
     def setUp(self):
@@ -1132,6 +1177,12 @@ class LiveQueryExtensionCasesFirstSyncSQL(LiveQueryExtensionCasesFirstSync):
     pass
 
 
+@use_sql_backend
+@flag_enabled('LIVEQUERY_STREAMING')
+class LiveQueryStreamingExtensionCasesFirstSyncSQL(LiveQueryExtensionCasesFirstSync):
+    pass
+
+
 class ChangingOwnershipTest(BaseSyncTest):
 
     def test_remove_user_from_group(self):
@@ -1203,6 +1254,66 @@ class LiveQueryChangingOwnershipTestSQL(LiveQueryChangingOwnershipTest):
     pass
 
 
+@use_sql_backend
+@flag_enabled('LIVEQUERY_STREAMING')
+class LiveQueryStreamingChangingOwnershipTestSQL(LiveQueryChangingOwnershipTest):
+    pass
+
+
+def _serial_prefetch_map(func, iterable, workers, max_in_flight=None):
+    # The test's transaction is not visible to other threads, so call
+    # func in this thread, after taking items ahead like prefetch_map.
+    pending = deque()
+    for item in iterable:
+        pending.append(item)
+        if len(pending) >= (max_in_flight or workers):
+            yield func(pending.popleft())
+    while pending:
+        yield func(pending.popleft())
+
+
+@use_sql_backend
+class LiveQueryPrefetchCasesTestSQL(BaseSyncTest):
+    restore_options = {'case_sync': LIVEQUERY}
+
+    def _restore(self):
+        sync = self.get_device().sync(overwrite_cache=True)
+        case_xml = sorted(ElementTree.tostring(node)
+                          for node in sync.xml.findall("{%s}case" % V2_NAMESPACE))
+        return case_xml, sync.log.case_ids_on_phone
+
+    def test_prefetch_matches_serial_fetch(self):
+        self.device.post_changes([
+            CaseStructure(
+                case_id='child',
+                attrs={'create': True},
+                indices=[CaseIndex(
+                    CaseStructure(case_id='parent', attrs={'create': True}),
+                    relationship=CHILD_RELATIONSHIP,
+                    related_type=PARENT_TYPE,
+                )],
+            ),
+            CaseStructure(
+                case_id='extension',
+                attrs={'create': True},
+                indices=[CaseIndex(
+                    CaseStructure(case_id='host', attrs={'create': True}),
+                    relationship='extension',
+                    related_type=PARENT_TYPE,
+                    identifier='host',
+                )],
+            ),
+        ])
+        expected = self._restore()
+        self.assertEqual(expected[1], {'child', 'parent', 'extension', 'host'})
+
+        with flag_enabled('LIVEQUERY_PREFETCH_CASES'), \
+                patch('casexml.apps.phone.data_providers.case.livequery.prefetch_map', _serial_prefetch_map):
+            self.assertEqual(self._restore(), expected)
+            with flag_enabled('LIVEQUERY_STREAMING'):
+                self.assertEqual(self._restore(), expected)
+
+
 @patch('casexml.apps.phone.restore.INITIAL_SYNC_CACHE_THRESHOLD', 0)
 class SyncTokenCachingTest(BaseSyncTest):
 
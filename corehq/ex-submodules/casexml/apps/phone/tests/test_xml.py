@@ -1,10 +1,14 @@
 import datetime
 import os.path
 from django.test import SimpleTestCase
+from mock import patch
 
 import casexml.apps.phone.xml as xml
+from casexml.apps.case import const
 from casexml.apps.case.models import CommCareCase
 from casexml.apps.case.sharedmodels import CommCareCaseIndex
+from casexml.apps.case.xml import V1, V2
+from casexml.apps.case.xml.serializer import get_case_xml_bytes
 
 from corehq.apps.app_manager.tests.util import TestXmlMixin
 
@@ -38,3 +42,78 @@ class TestCaseDBElement(TestXmlMixin, SimpleTestCase):
     def test_generate_xml(self):
         casedb_xml = xml.tostring(xml.get_casedb_element(self.case))
         self.assertXmlEqual(casedb_xml, self.get_xml('case_db_block'))
+
+
+class TestCaseXMLSerializer(SimpleTestCase):
+
+    domain = 'winterfell'
+
+    def setUp(self):
+        self.case = CommCareCase(
+            domain=self.domain,
+            opened_on=datetime.datetime(2016, 5, 31),
+            modified_on=datetime.datetime(2016, 5, 31),
+            type='priestess',
+            closed=False,
+            name='melisandre <of asshai> & "the red woman"',
+            owner_id='lordoflight',
+            user_id='stannis',
+            external_id='',
+            indices=[
+                CommCareCaseIndex(
+                    identifier='king',
+                    referenced_type='human',
+                    referenced_id='stannis',
+                    relationship='child',
+                ),
+                CommCareCaseIndex(
+                    identifier='advisor',
+                    referenced_type='human & "friends"',
+                    referenced_id='davos',
+                    relationship='extension',
+                ),
+            ]
+        )
+        self.case._id = 'redwoman'
+        self.case.power = 'prophecy > sight'
+        self.case.hometown = 'asshai\nby the shadow'
+        self.case.empty = ''
+        self.case.unicode = '\u2603 snow'
+
+    def assert_same_xml(self, updates, version):
+        expected = xml.tostring(xml.get_case_element(self.case, updates, version))
+        self.assertEqual(get_case_xml_bytes(self.case, updates, version), expected)
+
+    def test_v1(self):
+        for updates in self._update_combinations():
+            self.assert_same_xml(updates, V1)
+
+    def test_v2(self):
+        for updates in self._update_combinations():
+            self.assert_same_xml(updates, V2)
+
+    def test_v2_attachments(self):
+        self.case.case_attachments = {'portrait': {}, 'flame': {}}
+        url = 'http://example.com/portrait?a=1&b="2"'
+        with patch('casexml.apps.case.xml.generator._sync_attachments', return_value=True), \
+                patch('casexml.apps.case.xml.serializer._sync_attachments', return_value=True), \
+                patch.object(CommCareCase, 'get_attachment_server_url', return_value=url):
+            self.assert_same_xml([const.CASE_ACTION_UPDATE], V2)
+
+    def test_no_modified_on(self):
+        self.case.modified_on = None
+        self.case.opened_on = None
+        for version in [V1, V2]:
+            self.assert_same_xml([const.CASE_ACTION_CREATE, const.CASE_ACTION_UPDATE], version)
+
+    @staticmethod
+    def _update_combinations():
+        return [
+            [],
+            [const.CASE_ACTION_CREATE],
+            [const.CASE_ACTION_CREATE, const.CASE_ACTION_UPDATE],
+            [const.CASE_ACTION_UPDATE],
+            [const.CASE_ACTION_CLOSE],
+            [const.CASE_ACTION_PURGE],
+            [const.CASE_ACTION_CREATE, const.CASE_ACTION_UPDATE, const.CASE_ACTION_CLOSE],
+        ]
@@ -11,10 +11,13 @@ def tmpfile(*args, **kwargs):
     return (os.fdopen(fd, 'w'), path)
 
 
-def simple_post(data, url, content_type="text/xml", timeout=60, headers=None, auth=None, verify=None):
+def simple_post(data, url, content_type="text/xml", timeout=60, headers=None, auth=None, verify=None,
+                session=None):
     """
     POST with a cleaner API, and return the actual HTTPResponse object, so
     that error codes can be interpreted.
+
+    Pass a requests.Session as `session` to reuse its connections.
     """
     if isinstance(data, six.text_type):
         data = data.encode('utf-8')  # can't pass unicode to http request posts
@@ -34,6 +37,8 @@ def simple_post(data, url, content_type="text/xml", timeout=60, headers=None, au
     if verify is not None:
         kwargs["verify"] = verify
 
+    if session is not None:
+        return session.post(url, data, **kwargs)
     return requests.post(url, data, **kwargs)
 
 
@@ -3,12 +3,18 @@ import time
 
 from elasticsearch.exceptions import RequestError, ConnectionError, NotFoundError, ConflictError
 
-from pillowtop.utils import ensure_matched_revisions, ensure_document_exists
+from pillowtop.utils import (
+    bulk_fetch_changes_docs,
+    ensure_document_exists,
+    ensure_matched_revisions,
+    prepare_bulk_payloads,
+)
 from pillowtop.exceptions import PillowtopIndexingError
 from pillowtop.logger import pillow_logging
-from .interface import PillowProcessor
+from .interface import BulkPillowProcessor
 
 from corehq.util.datadog.gauges import datadog_bucket_timer
+from corehq.util.elastic import bump_index_generation
 
 
 def identity(x):
@@ -17,9 +23,17 @@ def identity(x):
 
 RETRY_INTERVAL = 2  # seconds, exponentially increasing
 MAX_RETRIES = 4  # exponential factor threshold for alerts
+MAX_BULK_PAYLOAD_SIZE = 10 ** 7  # bytes
 
 
-class ElasticProcessor(PillowProcessor):
+class ElasticProcessor(BulkPillowProcessor):
+    """
+    Index documents in Elasticsearch
+
+    Documents are indexed with "index" requests, which create or replace
+    them, so there is no need to check whether they already exist. Chunks
+    of changes are fetched in bulk and sent in `_bulk` requests.
+    """
 
     def __init__(self, elasticsearch, index_info, doc_prep_fn=None, doc_filter_fn=None):
         self.doc_filter_fn = doc_filter_fn
@@ -32,7 +46,7 @@ class ElasticProcessor(PillowProcessor):
 
     def process_change(self, change):
         if change.deleted and change.id:
-            self._delete_doc_if_exists(change.id)
+            self._delete_doc(change.id, change.metadata.domain if change.metadata else None)
             return
 
         with self._datadog_timing('extract'):
@@ -45,8 +59,8 @@ class ElasticProcessor(PillowProcessor):
             if doc is None or (self.doc_filter_fn and self.doc_filter_fn(doc)):
                 return
 
-            if doc.get('doc_type') is not None and doc['doc_type'].endswith("-Deleted"):
-                self._delete_doc_if_exists(change.id)
+            if _is_deleted(doc):
+                self._delete_doc(change.id, doc.get('domain'))
                 return
 
             # prepare doc for es
@@ -61,15 +75,84 @@ class ElasticProcessor(PillowProcessor):
                 es_getter=self.es_getter,
                 name='ElasticProcessor',
                 data=doc_ready_to_save,
-                update=self._doc_exists(change.id),
+                update=True,
             )
 
-    def _doc_exists(self, doc_id):
-        return self.elasticsearch.exists(self.index_info.index, self.index_info.type, doc_id)
+    def process_changes_chunk(self, changes_chunk):
+        """
+        Index or delete the documents of `changes_chunk` with `_bulk`
+        requests. Changes that can't be fetched in bulk or whose bulk
+        actions fail are returned to be reprocessed serially.
+        """
+        retry_changes = set()
+        change_exceptions = []
+        to_delete = []
+        to_fetch = []
+        for change in changes_chunk:
+            if change.deleted and change.id:
+                to_delete.append(change)
+            elif change.metadata is None:
+                retry_changes.add(change)
+            else:
+                to_fetch.append(change)
+
+        with self._datadog_timing('extract'):
+            bad_changes, docs = bulk_fetch_changes_docs(to_fetch)
+            retry_changes.update(bad_changes)
 
-    def _delete_doc_if_exists(self, doc_id):
-        if self._doc_exists(doc_id):
+        actions = []
+        changes_by_id = {change.id: change for change in changes_chunk}
+        domains_by_id = {}
+        with self._datadog_timing('transform'):
+            for doc in docs:
+                change = changes_by_id[doc['_id']]
+                if change in retry_changes or (self.doc_filter_fn and self.doc_filter_fn(doc)):
+                    continue
+                if _is_deleted(doc):
+                    to_delete.append(change)
+                    continue
+                try:
+                    doc_ready_to_save = self.doc_transform_fn(doc)
+                except Exception as e:
+                    change_exceptions.append((change, e))
+                    continue
+                actions.append(self._bulk_action('index', change.id))
+                actions.append(doc_ready_to_save)
+                domains_by_id[change.id] = doc_ready_to_save.get('domain')
+            for change in to_delete:
+                actions.append(self._bulk_action('delete', change.id))
+                domains_by_id[change.id] = change.metadata.domain if change.metadata else None
+
+        with self._datadog_timing('load'):
+            failed_ids = set()
+            for payload in prepare_bulk_payloads(actions, MAX_BULK_PAYLOAD_SIZE):
+                response = self.elasticsearch.bulk(payload.decode('utf-8'))
+                for doc_id in _get_failed_ids(response):
+                    failed_ids.add(doc_id)
+                    retry_changes.add(changes_by_id[doc_id])
+            written_domains = [
+                domain for doc_id, domain in domains_by_id.items()
+                if doc_id not in failed_ids
+            ]
+            if written_domains:
+                bump_index_generation(self.index_info.index, _get_generation_domains(written_domains))
+
+        return retry_changes, change_exceptions
+
+    def _bulk_action(self, action, doc_id):
+        return {action: {
+            '_index': self.index_info.index,
+            '_type': self.index_info.type,
+            '_id': doc_id,
+        }}
+
+    def _delete_doc(self, doc_id, domain=None):
+        try:
             self.elasticsearch.delete(self.index_info.index, self.index_info.type, doc_id)
+        except NotFoundError:
+            pass
+        else:
+            bump_index_generation(self.index_info.index, _get_generation_domains([domain]))
 
     def _datadog_timing(self, step):
         return datadog_bucket_timer('commcare.change_feed.processor.timing', tags=[
@@ -78,6 +161,34 @@ class ElasticProcessor(PillowProcessor):
         ], timing_buckets=(.03, .1, .3, 1, 3, 10))
 
 
+def _is_deleted(doc):
+    return doc.get('doc_type') is not None and doc['doc_type'].endswith("-Deleted")
+
+
+def _get_generation_domains(domains):
+    """
+    Returns the domains whose index generations are bumped for writes of
+    documents of `domains`, or None if not all of them are known
+    """
+    if all(domain and isinstance(domain, str) for domain in domains):
+        return sorted(set(domains))
+    return None
+
+
+def _get_failed_ids(bulk_response):
+    """
+    Returns the IDs of documents whose actions failed in a `_bulk`
+    request. Deleting a document that is not in the index is not a failure.
+    """
+    if not bulk_response.get('errors'):
+        return
+    for item in bulk_response['items']:
+        (action, result), = item.items()
+        status = result.get('status', 500)
+        if status >= 300 and not (action == 'delete' and status == 404):
+            yield result['_id']
+
+
 def send_to_elasticsearch(index, doc_type, doc_id, es_getter, name, data=None, retries=MAX_RETRIES,
                           except_on_failure=False, update=False, delete=False, es_merge_update=False):
     """
@@ -89,6 +200,7 @@ def send_to_elasticsearch(index, doc_type, doc_id, es_getter, name, data=None, r
     """
     data = data if data is not None else {}
     current_tries = 0
+    written = False
     while current_tries < retries:
         try:
             if delete:
@@ -101,6 +213,7 @@ def send_to_elasticsearch(index, doc_type, doc_id, es_getter, name, data=None, r
                     es_getter().index(index, doc_type, body=data, id=doc_id, params=params)
             else:
                 es_getter().create(index, doc_type, body=data, id=doc_id)
+            written = True
             break
         except ConnectionError as ex:
             current_tries += 1
@@ -131,3 +244,7 @@ def send_to_elasticsearch(index, doc_type, doc_id, es_getter, name, data=None, r
             break  # ignore the error if a doc already exists when trying to create it in the index
         except NotFoundError:
             break
+    if written:
+        # the domain of a deleted document is not known
+        domains = None if delete else _get_generation_domains([data.get('domain')])
+        bump_index_generation(index, domains)
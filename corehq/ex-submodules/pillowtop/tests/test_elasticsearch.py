@@ -4,6 +4,7 @@ import uuid
 from django.conf import settings
 from django.test import SimpleTestCase
 from elasticsearch.exceptions import ConnectionError
+from mock import Mock, patch
 
 from corehq.elastic import get_es_new
 from corehq.util.elastic import ensure_index_deleted
@@ -12,7 +13,8 @@ from pillowtop.es_utils import INDEX_REINDEX_SETTINGS, INDEX_STANDARD_SETTINGS,
     set_index_reindex_settings, set_index_normal_settings, mapping_exists, initialize_index, \
     initialize_index_and_mapping, assume_alias
 from pillowtop.exceptions import PillowtopIndexingError
-from pillowtop.processors.elastic import send_to_elasticsearch
+from pillowtop.feed.interface import Change, ChangeMeta
+from pillowtop.processors.elastic import ElasticProcessor, send_to_elasticsearch
 from .utils import get_doc_count, get_index_mapping, TEST_INDEX_INFO
 
 
@@ -226,8 +228,10 @@ class TestSendToElasticsearch(SimpleTestCase):
 
         doc = {'_id': uuid.uuid4().hex, 'doc_type': 'MyCoolDoc', 'property': 'bar'}
 
-        with self.assertRaises(PillowtopIndexingError):
+        with self.assertRaises(PillowtopIndexingError), \
+                patch('pillowtop.processors.elastic.bump_index_generation') as bump_index_generation:
             self._send_to_es_and_check(doc, esgetter=_bad_es_getter)
+        bump_index_generation.assert_not_called()
 
     def test_not_found(self):
         doc = {'_id': uuid.uuid4().hex, 'doc_type': 'MyCoolDoc', 'property': 'bar'}
@@ -239,4 +243,79 @@ class TestSendToElasticsearch(SimpleTestCase):
         self._send_to_es_and_check(doc)
 
         # attempt to create the same doc twice shouldn't fail
-        self._send_to_es_and_check(doc)
+        with patch('pillowtop.processors.elastic.bump_index_generation') as bump_index_generation:
+            self._send_to_es_and_check(doc)
+        bump_index_generation.assert_not_called()
+
+    def test_index_generation(self):
+        doc = {'_id': uuid.uuid4().hex, 'doc_type': 'MyCoolDoc', 'domain': 'test-domain'}
+        with patch('pillowtop.processors.elastic.bump_index_generation') as bump_index_generation:
+            self._send_to_es_and_check(doc)
+        bump_index_generation.assert_called_once_with(self.index, ['test-domain'])
+
+
+class TestElasticProcessorChunk(SimpleTestCase):
+
+    def setUp(self):
+        self.es = get_es_new()
+        self.index = TEST_INDEX_INFO.index
+        self.processor = ElasticProcessor(self.es, TEST_INDEX_INFO)
+
+        with trap_extra_setup(ConnectionError):
+            ensure_index_deleted(self.index)
+            initialize_index_and_mapping(self.es, TEST_INDEX_INFO)
+
+    def tearDown(self):
+        ensure_index_deleted(self.index)
+
+    def _change(self, doc, deleted=False):
+        metadata = ChangeMeta(document_id=doc['_id'], data_source_type='test', data_source_name='test')
+        return Change(doc['_id'], None, document=doc, deleted=deleted, metadata=metadata)
+
+    def _get_doc_ids(self):
+        self.es.indices.refresh(self.index)
+        results = self.es.search(self.index, body={'query': {'match_all': {}}})
+        return {hit['_id'] for hit in results['hits']['hits']}
+
+    def test_process_changes_chunk(self):
+        docs = [{'_id': uuid.uuid4().hex, 'doc_type': 'MyCoolDoc', 'property': i} for i in range(3)]
+        retry, errors = self.processor.process_changes_chunk([self._change(doc) for doc in docs])
+        self.assertEqual((retry, errors), (set(), []))
+        self.assertEqual(self._get_doc_ids(), {doc['_id'] for doc in docs})
+
+        # update, soft-delete, hard-delete and delete a doc that isn't indexed
+        updated = dict(docs[0], property='updated')
+        soft_deleted = dict(docs[1], doc_type='MyCoolDoc-Deleted')
+        missing = {'_id': uuid.uuid4().hex, 'doc_type': 'MyCoolDoc'}
+        retry, errors = self.processor.process_changes_chunk([
+            self._change(updated),
+            self._change(soft_deleted),
+            self._change(docs[2], deleted=True),
+            self._change(missing, deleted=True),
+        ])
+        self.assertEqual((retry, errors), (set(), []))
+        self.assertEqual(self._get_doc_ids(), {docs[0]['_id']})
+        es_doc = self.es.get(self.index, docs[0]['_id'])['_source']
+        self.assertEqual(es_doc['property'], 'updated')
+
+    def test_index_generation(self):
+        docs = [
+            {'_id': uuid.uuid4().hex, 'doc_type': 'MyCoolDoc', 'domain': domain}
+            for domain in ['test-domain', 'other-domain', 'test-domain']
+        ]
+        with patch('pillowtop.processors.elastic.bump_index_generation') as bump_index_generation:
+            self.processor.process_changes_chunk([self._change(doc) for doc in docs])
+        bump_index_generation.assert_called_once_with(self.index, ['other-domain', 'test-domain'])
+
+    def test_failed_writes(self):
+        doc = {'_id': uuid.uuid4().hex, 'doc_type': 'MyCoolDoc', 'domain': 'test-domain'}
+        elasticsearch = Mock()
+        elasticsearch.bulk.return_value = {
+            'errors': True,
+            'items': [{'index': {'_id': doc['_id'], 'status': 500}}],
+        }
+        processor = ElasticProcessor(elasticsearch, TEST_INDEX_INFO)
+        with patch('pillowtop.processors.elastic.bump_index_generation') as bump_index_generation:
+            retry, errors = processor.process_changes_chunk([self._change(doc)])
+        self.assertEqual(len(retry), 1)
+        bump_index_generation.assert_not_called()
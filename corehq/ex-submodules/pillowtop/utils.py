@@ -1,4 +1,4 @@
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 from copy import deepcopy
 from datetime import datetime
 import sys
@@ -272,6 +272,48 @@ def prepare_bulk_payloads(bulk_changes, max_size, chunk_size=100):
     return [_f for _f in payloads if _f]
 
 
+def bulk_fetch_changes_docs(changes):
+    """
+    Fetch the documents of `changes` in bulk from their document stores,
+    and set them on the changes so that later lookups are avoided.
+
+    :returns: Tuple of the set of changes whose documents are missing or
+    don't match the change's revision, which should be reprocessed
+    serially to raise the appropriate errors, and the list of documents
+    """
+    # break up by document store
+    changes_by_doctype = defaultdict(list)
+    for change in changes:
+        changes_by_doctype[change.metadata.data_source_name].append(change)
+
+    # query
+    docs = []
+    for _, _changes in changes_by_doctype.items():
+        doc_store = _changes[0].document_store
+        doc_ids_to_query = [change.id for change in _changes if change.should_fetch_document()]
+        new_docs = list(doc_store.iter_documents(doc_ids_to_query)) if doc_ids_to_query else []
+        docs_queried_prior = [change.document for change in _changes if not change.should_fetch_document()]
+        docs.extend(new_docs + docs_queried_prior)
+
+    # catch missing docs
+    retry_changes = set()
+    docs_by_id = {doc['_id']: doc for doc in docs}
+    for change in changes:
+        if change.id not in docs_by_id:
+            # we need to capture DocumentMissingError which is not possible in bulk
+            #   so let pillow fall back to serial mode to capture the error for missing docs
+            retry_changes.add(change)
+            continue
+        else:
+            # set this, so that subsequent doc lookups are avoided
+            change.set_document(docs_by_id[change.id])
+        try:
+            ensure_matched_revisions(change, docs_by_id.get(change.id))
+        except DocumentMismatchError:
+            retry_changes.add(change)
+    return retry_changes, docs
+
+
 def ensure_matched_revisions(change, fetched_document):
     """
     This function ensures that the document fetched from a change matches the
@@ -4,7 +4,7 @@ import logging
 import struct
 from abc import ABCMeta, abstractproperty
 from abc import abstractmethod
-from collections import namedtuple
+from collections import defaultdict, namedtuple
 from datetime import datetime
 from io import BytesIO
 from itertools import groupby
@@ -65,8 +65,12 @@ from corehq.sql_db.util import (
 )
 from corehq.util.datadog.utils import form_load_counter
 from corehq.util.queries import fast_distinct_in_domain
+from corehq.util.thread_pool import prefetch_map
 from dimagi.utils.chunked import chunked
 
+# minimum number of IDs for bulk getters to query shard databases directly
+DIRECT_SHARD_QUERY_MIN_IDS = 100
+
 doc_type_to_state = {
     "XFormInstance": XFormInstanceSQL.NORMAL,
     "XFormError": XFormInstanceSQL.ERROR,
@@ -368,7 +372,11 @@ class FormAccessorSQL(AbstractFormAccessor):
         assert isinstance(form_ids, list)
         if not form_ids:
             return []
-        forms = list(XFormInstanceSQL.objects.raw('SELECT * from get_forms_by_id(%s)', [form_ids]))
+        if _use_direct_shard_queries(form_ids):
+            forms = _get_docs_by_id_from_shards(XFormInstanceSQL, 'get_forms_by_id', form_ids)
+            ordered = True
+        else:
+            forms = list(XFormInstanceSQL.objects.raw('SELECT * from get_forms_by_id(%s)', [form_ids]))
         if ordered:
             _sort_with_id_list(forms, form_ids, 'form_id')
 
@@ -756,7 +764,11 @@ class CaseAccessorSQL(AbstractCaseAccessor):
         assert isinstance(case_ids, list)
         if not case_ids:
             return []
-        cases = list(CommCareCaseSQL.objects.raw('SELECT * from get_cases_by_id(%s)', [case_ids]))
+        if _use_direct_shard_queries(case_ids):
+            cases = _get_docs_by_id_from_shards(CommCareCaseSQL, 'get_cases_by_id', case_ids)
+            ordered = True
+        else:
+            cases = list(CommCareCaseSQL.objects.raw('SELECT * from get_cases_by_id(%s)', [case_ids]))
 
         if ordered:
             _sort_with_id_list(cases, case_ids, 'case_id')
@@ -844,15 +856,28 @@ class CaseAccessorSQL(AbstractCaseAccessor):
         if not case_ids:
             return []
 
+        if _use_direct_shard_queries(case_ids):
+            def get_cases_with_indices(db_name):
+                # indices are stored in the same database as their case
+                return CaseAccessorSQL._get_reverse_indexed_cases(
+                    domain, case_ids, case_types, is_closed, using=db_name)
+
+            return _query_all_shards(get_cases_with_indices)
+        return CaseAccessorSQL._get_reverse_indexed_cases(domain, case_ids, case_types, is_closed)
+
+    @staticmethod
+    def _get_reverse_indexed_cases(domain, case_ids, case_types, is_closed, using=None):
         cases = list(CommCareCaseSQL.objects.raw(
             'SELECT * FROM get_reverse_indexed_cases_3(%s, %s, %s, %s)',
-            [domain, case_ids, case_types, is_closed])
-        )
+            [domain, case_ids, case_types, is_closed],
+            using=using,
+        ))
         cases_by_id = {case.case_id: case for case in cases}
         indices = list(CommCareCaseIndexSQL.objects.raw(
             'SELECT * FROM get_multiple_cases_indices(%s, %s)',
-            [domain, list(cases_by_id)])
-        )
+            [domain, list(cases_by_id)],
+            using=using,
+        ))
         _attach_prefetch_models(cases_by_id, indices, 'case_id', 'cached_indices')
         return cases
 
@@ -1030,9 +1055,17 @@ class CaseAccessorSQL(AbstractCaseAccessor):
         assert isinstance(case_ids, list), case_ids
         if not case_ids:
             return []
-        return list(CommCareCaseIndexSQL.objects.raw(
-            'SELECT * FROM get_related_indices(%s, %s, %s)',
-            [domain, case_ids, list(exclude_indices)]))
+
+        def query(db_name=None):
+            return list(CommCareCaseIndexSQL.objects.raw(
+                'SELECT * FROM get_related_indices(%s, %s, %s)',
+                [domain, case_ids, list(exclude_indices)],
+                using=db_name,
+            ))
+
+        if _use_direct_shard_queries(case_ids):
+            return _query_all_shards(query)
+        return query()
 
     @staticmethod
     def get_closed_and_deleted_ids(domain, case_ids):
@@ -1112,6 +1145,27 @@ class CaseAccessorSQL(AbstractCaseAccessor):
             [domain, external_id, case_type]
         ))
 
+    @staticmethod
+    def get_cases_by_external_ids(domain, external_ids, case_type=None):
+        """
+        Get the cases with any of the given external IDs, querying each
+        shard once rather than once per external ID
+        """
+        if not external_ids:
+            return []
+
+        cases = []
+        for db_name in get_db_aliases_for_partitioned_query():
+            query = CommCareCaseSQL.objects.using(db_name).filter(
+                domain=domain,
+                external_id__in=external_ids,
+                deleted=False,
+            )
+            if case_type:
+                query = query.filter(type=case_type)
+            cases.extend(query)
+        return cases
+
     @staticmethod
     def get_case_by_domain_hq_user_id(domain, user_id, case_type):
         try:
@@ -1448,6 +1502,50 @@ class LedgerAccessorSQL(AbstractLedgerAccessor):
                 yield trans
 
 
+def _use_direct_shard_queries(ids):
+    """
+    Whether bulk getters should query the shard databases concurrently
+    rather than through the PL/Proxy database, which queries them in turn
+
+    Shard queries run on other threads, which can't see the changes of an
+    open transaction, so they are only used outside transactions.
+    """
+    return (
+        settings.USE_PARTITIONED_DATABASE
+        and settings.PARTITIONED_QUERY_WORKERS > 1
+        and len(ids) >= DIRECT_SHARD_QUERY_MIN_IDS
+        and not any(connection.in_atomic_block for connection in connections.all())
+    )
+
+
+def _get_docs_by_id_from_shards(model_class, function_name, doc_ids):
+    """
+    Call a `function_name(doc_ids)` SQL function on the shard database of
+    each of the given IDs, querying the databases concurrently
+    """
+    ids_by_db = defaultdict(list)
+    for doc_id, db_name in ShardAccessor.get_database_for_docs(doc_ids).items():
+        ids_by_db[db_name].append(doc_id)
+
+    def get_docs(db_name_and_ids):
+        db_name, ids = db_name_and_ids
+        return list(model_class.objects.raw(
+            'SELECT * FROM {}(%s)'.format(function_name), [ids], using=db_name))
+
+    results = prefetch_map(get_docs, list(ids_by_db.items()), settings.PARTITIONED_QUERY_WORKERS)
+    return list(itertools.chain.from_iterable(results))
+
+
+def _query_all_shards(query):
+    """
+    Call `query(db_name)` for each shard database concurrently
+
+    :returns: A list of the results of all calls, which must return lists
+    """
+    results = prefetch_map(query, get_db_aliases_for_partitioned_query(), settings.PARTITIONED_QUERY_WORKERS)
+    return list(itertools.chain.from_iterable(results))
+
+
 def _sort_with_id_list(object_list, id_list, id_property):
     """Sort object list in the same order as given list of ids
 
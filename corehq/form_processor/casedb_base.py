@@ -135,6 +135,17 @@ class AbstractCaseDbCache(metaclass=ABCMeta):
     def clear_changed(self):
         self._changed = set()
 
+    def clear(self, keep_case_ids=()):
+        """Forget the cached forms, the changed cases and the cached cases
+        other than `keep_case_ids`, to reuse the case DB for another form
+
+        Only cases that stay locked should be kept since other processes may
+        change the rest. Locks are not released.
+        """
+        self.cache = {case_id: case for case_id, case in self.cache.items() if case_id in keep_case_ids}
+        self.cached_xforms = []
+        self._changed = set()
+
     def get_cached_forms(self):
         """
         Get any in-memory forms being processed. These are only used by the Couch backend
@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from corehq.form_processor.backends.sql.dbaccessors import (
+    CaseAccessorSQL,
+    FormAccessorSQL,
+)
+
+
+class Command(BaseCommand):
+    help = "Compare the bulk getters' PL/Proxy queries with concurrent shard queries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('domain')
+        parser.add_argument('--count', type=int, default=1000, help='Number of IDs to fetch')
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--workers', type=int, default=8, help='Shard databases to query concurrently')
+
+    def handle(self, domain, **options):
+        if not settings.USE_PARTITIONED_DATABASE:
+            raise CommandError("This command requires a partitioned database")
+        count = options['count']
+        case_ids = CaseAccessorSQL.get_case_ids_in_domain(domain)[:count]
+        form_ids = FormAccessorSQL.get_form_ids_in_domain_by_type(domain, 'XFormInstance')[:count]
+
+        getters = [
+            ('get_cases', lambda: CaseAccessorSQL.get_cases(case_ids)),
+            ('get_reverse_indexed_cases', lambda: CaseAccessorSQL.get_reverse_indexed_cases(domain, case_ids)),
+            ('get_related_indices', lambda: CaseAccessorSQL.get_related_indices(domain, case_ids, set())),
+            ('get_forms', lambda: FormAccessorSQL.get_forms(form_ids)),
+        ]
+        print("{} case IDs, {} form IDs, {} iterations".format(
+            len(case_ids), len(form_ids), options['iterations']))
+        for name, getter in getters:
+            with override_settings(PARTITIONED_QUERY_WORKERS=1):
+                proxy_time = _time(getter, options['iterations'])
+            with override_settings(PARTITIONED_QUERY_WORKERS=options['workers']):
+                shard_time = _time(getter, options['iterations'])
+            print("{:<28} proxy: {:.3f}s  shards: {:.3f}s  speedup: {:.2f}x".format(
+                name, proxy_time, shard_time, proxy_time / shard_time))
+
+
+def _time(getter, iterations):
+    start = time.time()
+    for i in range(iterations):
+        getter()
+    return (time.time() - start) / iterations
@@ -13,7 +13,12 @@ from django.conf import settings
 from django.urls import reverse
 from django.utils.translation import ugettext as _
 import sys
-from casexml.apps.phone.restore_caching import AsyncRestoreTaskIdCache, RestorePayloadPathCache
+import time
+from casexml.apps.phone.restore_caching import (
+    AsyncRestoreTaskIdCache,
+    RestorePayloadPathCache,
+    get_and_invalidate_many,
+)
 import couchforms
 from casexml.apps.case.exceptions import PhoneDateValueError, IllegalCaseId, UsesReferrals, InvalidCaseIndex, \
     CaseValueError
@@ -31,7 +36,9 @@ from corehq.form_processor.interfaces.processor import FormProcessorInterface
 from corehq.form_processor.parsers.form import process_xform_xml
 from corehq.form_processor.system_action import SYSTEM_ACTION_XMLNS, handle_system_action
 from corehq.form_processor.utils.metadata import scrub_meta
+from corehq.form_processor.utils.xform import convert_xform_to_json
 from corehq.form_processor.submission_process_tracker import unfinished_submission
+from corehq.util.datadog.gauges import datadog_histogram
 from corehq.util.datadog.utils import form_load_counter
 from corehq.util.global_request import get_request
 from couchforms import openrosa_response
@@ -315,36 +322,41 @@ class SubmissionPost(object):
         if url and SUMOLOGIC_LOGS.enabled(instance.form_data.get('device_id'), NAMESPACE_OTHER):
             SumoLogicLog(self.domain, instance).send_data(url)
 
+    @tracer.wrap(name='submission.invalidate_caches')
     def _invalidate_caches(self, xform):
-        for device_id in {None, xform.metadata.deviceID if xform.metadata else None}:
-            self._invalidate_restore_payload_path_cache(xform, device_id)
-            if ASYNC_RESTORE.enabled(self.domain):
-                self._invalidate_async_restore_task_id_cache(xform, device_id)
-
-    def _invalidate_restore_payload_path_cache(self, xform, device_id):
-        """invalidate cached initial restores"""
-        restore_payload_path_cache = RestorePayloadPathCache(
-            domain=self.domain,
-            user_id=xform.user_id,
-            sync_log_id=xform.last_sync_token,
-            device_id=device_id,
-        )
-        restore_payload_path_cache.invalidate()
-
-    def _invalidate_async_restore_task_id_cache(self, xform, device_id):
-        async_restore_task_id_cache = AsyncRestoreTaskIdCache(
-            domain=self.domain,
-            user_id=xform.user_id,
-            sync_log_id=self.last_sync_token,
-            device_id=device_id,
+        """invalidate cached initial restores and revoke async restore tasks"""
+        start = time.time()
+        device_ids = {None, xform.metadata.deviceID if xform.metadata else None}
+        async_restore = ASYNC_RESTORE.enabled(self.domain)
+        caches = [
+            RestorePayloadPathCache(
+                domain=self.domain,
+                user_id=xform.user_id,
+                sync_log_id=xform.last_sync_token,
+                device_id=device_id,
+            )
+            for device_id in device_ids
+        ]
+        if async_restore:
+            caches.extend(
+                AsyncRestoreTaskIdCache(
+                    domain=self.domain,
+                    user_id=xform.user_id,
+                    sync_log_id=self.last_sync_token,
+                    device_id=device_id,
+                )
+                for device_id in device_ids
+            )
+        values = get_and_invalidate_many(caches)
+        for cache, task_id in zip(caches, values):
+            if task_id is not None and isinstance(cache, AsyncRestoreTaskIdCache):
+                revoke_celery_task(task_id)
+        datadog_histogram(
+            'commcare.xform_submissions.cache_invalidation_time',
+            time.time() - start,
+            tags=['async_restore:{}'.format(async_restore)],
         )
 
-        task_id = async_restore_task_id_cache.get_value()
-
-        if task_id is not None:
-            revoke_celery_task(task_id)
-            async_restore_task_id_cache.invalidate()
-
     @tracer.wrap(name='submission.save_models')
     def save_processed_models(self, case_db, xforms, case_stock_result):
         instance = xforms[0]
@@ -509,6 +521,101 @@ class SubmissionPost(object):
         return FormProcessingResult(response, device_log_form, [], [], 'device-log')
 
 
+class BulkSubmissionPost(object):
+    """Process a batch of form submissions in order
+
+    The forms share one case DB. The existing cases that the forms update
+    are locked and loaded once, before the first form is processed, and
+    stay locked and cached until the batch is done, so forms that touch
+    the same cases don't lock and load them again. Other cases, such as
+    the targets of indices, are locked per form like in `SubmissionPost`.
+    When a form is not saved normally, its changes to cached cases are
+    discarded by reloading them.
+
+    Each form is otherwise processed and saved as it would be by
+    `SubmissionPost`, so duplicate and error handling is per form. Forms
+    are saved in their own transactions since each form's changes are
+    published and its post save signals sent as it is saved.
+
+    Processing stops at the first form that cannot be locked or fails
+    with an unexpected error since later forms may depend on it. Results
+    for the remaining forms are `None`.
+
+    :param instances: List of form XML instances.
+    :param kwargs: Passed to `SubmissionPost` for each form.
+    """
+
+    def __init__(self, instances, domain, **kwargs):
+        assert 'attachments' not in kwargs and 'case_db' not in kwargs, kwargs
+        self.instances = instances
+        self.domain = domain
+        self.kwargs = kwargs
+        self.interface = FormProcessorInterface(domain)
+
+    def run(self):
+        """Process forms
+
+        :returns: Two-tuple `(results, error)` where `results` is a list of
+        `FormProcessingResult` (or `None` if the form was not processed) in
+        the order of `instances` and `error` is the exception that stopped
+        processing or `None`.
+        """
+        results = [None] * len(self.instances)
+        case_db = self.interface.casedb_cache(
+            domain=self.domain, lock=True, deleted_ok=True, load_src="bulk_form_submission",
+        )
+        with case_db:
+            locked_case_ids = self._lock_cases(case_db)
+            for index, instance in enumerate(self.instances):
+                submission_post = SubmissionPost(
+                    instance=instance,
+                    domain=self.domain,
+                    case_db=case_db,
+                    **self.kwargs
+                )
+                try:
+                    results[index] = result = submission_post.run()
+                except Exception as e:
+                    return results, e
+                if result.submission_type == 'normal':
+                    case_db.clear(keep_case_ids=locked_case_ids)
+                else:
+                    # the form may have changed cached cases before failing
+                    case_db.clear()
+                    case_db.populate(locked_case_ids)
+        return results, None
+
+    def _lock_cases(self, case_db):
+        """Lock and load the existing cases updated by the forms, in order
+        of case ID so that concurrent batches can't deadlock
+
+        :returns: The set of IDs of the locked cases
+        """
+        case_ids = set()
+        for instance in self.instances:
+            case_ids.update(_get_updated_case_ids(instance))
+        locked_case_ids = set()
+        for case_id in sorted(case_ids):
+            try:
+                case = case_db.get(case_id)
+            except IllegalCaseId:
+                continue  # reported when the form is processed
+            if case is not None:
+                locked_case_ids.add(case_id)
+        return locked_case_ids
+
+
+def _get_updated_case_ids(instance):
+    from casexml.apps.case.xform import extract_case_blocks
+    from casexml.apps.case.xml.parser import case_update_from_block
+    try:
+        form_json = convert_xform_to_json(instance)
+        return {case_update_from_block(block).id for block in extract_case_blocks(form_json)}
+    except Exception:
+        # invalid forms are reported when they are processed
+        return set()
+
+
 def _transform_instance_to_error(interface, exception, instance):
     error_message = '{}: {}'.format(type(exception).__name__, str(exception))
     return interface.xformerror_from_xform_instance(instance, error_message)
@@ -589,6 +589,26 @@ class CaseAccessorTestsSQL(TestCase):
 
         self.assertEqual([], CaseAccessorSQL.get_cases_by_external_id('d2', '123', case_type='t2'))
 
+    def test_get_cases_by_external_ids(self):
+        case1 = _create_case(domain=DOMAIN, case_type='t1')
+        case1.external_id = '123'
+        CaseAccessorSQL.save_case(case1)
+        case2 = _create_case(domain=DOMAIN, case_type='t2')
+        case2.external_id = '456'
+        CaseAccessorSQL.save_case(case2)
+        case3 = _create_case(domain='d2', case_type='t1')
+        case3.external_id = '123'
+        CaseAccessorSQL.save_case(case3)
+        self.addCleanup(lambda: FormProcessorTestUtils.delete_all_cases('d2'))
+
+        cases = CaseAccessorSQL.get_cases_by_external_ids(DOMAIN, ['123', '456', '789'])
+        self.assertEqual({case.case_id for case in cases}, {case1.case_id, case2.case_id})
+
+        [case] = CaseAccessorSQL.get_cases_by_external_ids(DOMAIN, ['123', '456'], case_type='t2')
+        self.assertEqual(case.case_id, case2.case_id)
+
+        self.assertEqual([], CaseAccessorSQL.get_cases_by_external_ids(DOMAIN, []))
+
     def test_closed_transactions(self):
         case = _create_case()
         _create_case_transactions(case)
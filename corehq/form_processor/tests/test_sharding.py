@@ -5,8 +5,13 @@ from uuid import uuid4, UUID
 from django.conf import settings
 from django.test import TestCase
 from django.test.utils import override_settings
+from mock import patch
 
-from corehq.form_processor.backends.sql.dbaccessors import ShardAccessor
+from corehq.form_processor.backends.sql.dbaccessors import (
+    CaseAccessorSQL,
+    FormAccessorSQL,
+    ShardAccessor,
+)
 from corehq.form_processor.models import XFormInstanceSQL, CommCareCaseSQL
 from corehq.form_processor.tests.utils import create_form_for_test, FormProcessorTestUtils, use_sql_backend
 from corehq.sql_db.config import partition_config
@@ -83,6 +88,25 @@ class ShardingTests(TestCase):
         for form_id, db_alias in dbs_for_docs.items():
             XFormInstanceSQL.objects.using(db_alias).get(form_id=form_id)
 
+    def test_direct_shard_queries(self):
+        case_ids = [uuid4().hex for i in range(10)]
+        form_ids = [create_form_for_test(DOMAIN, case_id=case_id).form_id for case_id in case_ids]
+
+        def serial_map(func, iterable, workers):
+            # the test's transaction is not visible to other threads
+            return map(func, iterable)
+
+        with patch('corehq.form_processor.backends.sql.dbaccessors._use_direct_shard_queries',
+                   return_value=True), \
+                patch('corehq.form_processor.backends.sql.dbaccessors.prefetch_map', serial_map):
+            cases = CaseAccessorSQL.get_cases(case_ids + ['missing'])
+            forms = FormAccessorSQL.get_forms(list(reversed(form_ids)))
+            related_indices = CaseAccessorSQL.get_related_indices(DOMAIN, case_ids, set())
+
+        self.assertEqual([case.case_id for case in cases], case_ids)
+        self.assertEqual([form.form_id for form in forms], list(reversed(form_ids)))
+        self.assertEqual(related_indices, [])
+
     def test_same_dbalias_util(self):
         from corehq.sql_db.util import get_db_alias_for_partitioned_doc, new_id_in_same_dbalias
         for i in range(10):
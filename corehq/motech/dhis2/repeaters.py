@@ -61,7 +61,7 @@ class Dhis2Repeater(FormRepeater):
         payload = super(Dhis2Repeater, self).get_payload(repeat_record)
         return json.loads(payload)
 
-    def send_request(self, repeat_record, payload):
+    def send_request(self, repeat_record, payload, session=None):
         """
         Sends API request and returns response if ``payload`` is a form
         that is configured to be forwarded to DHIS2.
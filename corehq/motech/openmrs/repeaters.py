@@ -189,7 +189,7 @@ class OpenmrsRepeater(CaseRepeater):
         payload = super(OpenmrsRepeater, self).get_payload(repeat_record)
         return json.loads(payload)
 
-    def send_request(self, repeat_record, payload):
+    def send_request(self, repeat_record, payload, session=None):
         value_sources = chain(
             self.openmrs_config.case_config.patient_identifiers.values(),
             self.openmrs_config.case_config.person_properties.values(),
@@ -7,6 +7,17 @@ CHECK_REPEATERS_KEY = 'check-repeaters-key'
 
 POST_TIMEOUT = 75  # seconds
 
+# Repeat records are dispatched in batches per repeater when the
+# REPEAT_RECORD_DISPATCHER toggle is enabled for their domain
+DISPATCH_CHUNK_SIZE = 100
+REPEATER_CONCURRENCY = 4  # concurrent requests per repeater
+REPEATER_RATE_LIMIT = 10  # requests per second per repeater
+# Chunks of the same repeater are sent one at a time. A chunk whose
+# repeater is locked by another task is queued again after a delay.
+REPEATER_DISPATCH_LOCK_KEY = 'repeater-dispatch-{}'
+REPEATER_DISPATCH_LOCK_TIMEOUT = 60 * 60  # seconds
+REPEATER_DISPATCH_RETRY_DELAY = 30  # seconds
+
 RECORD_PENDING_STATE = 'PENDING'
 RECORD_SUCCESS_STATE = 'SUCCESS'
 RECORD_FAILURE_STATE = 'FAIL'
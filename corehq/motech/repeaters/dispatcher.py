@@ -0,0 +1,208 @@
+"""
+Forward repeat records in batches per repeater.
+
+`check_repeaters` queues each due repeat record as its own task, which
+sends it with a new connection. For domains with the
+REPEAT_RECORD_DISPATCHER toggle enabled, due records are instead grouped
+by repeater (see `RepeatRecordDispatcher`) and each group is sent by one
+task (see `send_repeat_records`) using a pool of keep-alive connections
+to the repeater's endpoint, with a limit on concurrent requests and on
+requests per second so that the receiving server is not overwhelmed.
+Tasks for the same repeater hold a lock while they send, so the limits
+apply per repeater (see `process_repeat_records`).
+
+If the repeater's payload format supports batch payloads, the payloads
+of up to `max_batch_size` records are sent in each request.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import requests
+from couchdbkit import BulkSaveError
+from requests.adapters import HTTPAdapter
+
+from dimagi.utils.chunked import chunked
+from dimagi.utils.couch.undo import DELETED_SUFFIX
+
+from corehq.motech.repeaters.const import (
+    DISPATCH_CHUNK_SIZE,
+    RECORD_FAILURE_STATE,
+    RECORD_PENDING_STATE,
+    REPEATER_CONCURRENCY,
+    REPEATER_RATE_LIMIT,
+)
+from corehq.motech.repeaters.models import RepeatRecord
+from corehq.util.datadog.gauges import datadog_counter, datadog_gauge
+from corehq.util.thread_pool import DatabaseThreadPool
+
+
+class RepeatRecordDispatcher(object):
+    """
+    Collects due repeat records by repeater, and queues a task for each
+    chunk of `chunk_size` records of the same repeater.
+
+    Records are claimed before they are queued in the same way as
+    `RepeatRecord.attempt_forward_now` claims them, but saved in bulk.
+    Call `flush()` to queue the remaining records.
+    """
+
+    def __init__(self, chunk_size=DISPATCH_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.records_by_repeater = defaultdict(list)
+
+    def add(self, record):
+        if not record.is_ready_to_forward():
+            return
+        records = self.records_by_repeater[record.repeater_id]
+        records.append(record)
+        if len(records) >= self.chunk_size:
+            self._dispatch(record.repeater_id)
+
+    def flush(self):
+        for repeater_id in list(self.records_by_repeater):
+            self._dispatch(repeater_id)
+
+    def _dispatch(self, repeater_id):
+        from corehq.motech.repeaters.tasks import process_repeat_records
+
+        records = _claim_repeat_records(self.records_by_repeater.pop(repeater_id))
+        if records:
+            process_repeat_records.delay(records)
+
+
+def _claim_repeat_records(records):
+    """
+    Set the next check of `records` an arbitrarily long time from now
+    (see `RepeatRecord.attempt_forward_now`), and return the records that
+    were saved. Records that another process has modified are dropped.
+    """
+    next_check = datetime.utcnow() + timedelta(hours=48)
+    for record in records:
+        record.next_check = next_check
+    try:
+        RepeatRecord.bulk_save(records)
+    except BulkSaveError as e:
+        conflict_ids = {error['id'] for error in e.errors}
+        return [record for record in records if record._id not in conflict_ids]
+    return records
+
+
+class RateLimiter(object):
+    """
+    Thread-safe limit on how often `wait()` returns: at most `rate` times
+    per second, evenly spaced.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.next_time = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            wait_until = max(self.next_time, now)
+            self.next_time = wait_until + self.interval
+        if wait_until > now:
+            time.sleep(wait_until - now)
+
+
+def get_session(concurrency):
+    """
+    Returns a requests.Session that keeps up to `concurrency` connections
+    per host open to be reused
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def send_repeat_records(records, concurrency=REPEATER_CONCURRENCY, rate_limit=REPEATER_RATE_LIMIT):
+    """
+    Send repeat records of the same repeater concurrently. Each record is
+    saved as soon as it has been sent, or each batch if the repeater's
+    payload format supports batch payloads.
+
+    Records are checked and handled in the same way as by
+    `process_repeat_record`, which is used for all the records if their
+    repeater is missing, paused or deleted.
+    """
+    from corehq.motech.repeaters.tasks import process_repeat_record
+
+    if not records:
+        return
+    repeater = records[0].repeater
+    if not repeater or repeater.paused or repeater.doc_type.endswith(DELETED_SUFFIX):
+        for record in records:
+            process_repeat_record(record)
+        return
+
+    to_cancel = []
+    to_send = []
+    for record in records:
+        assert record.repeater_id == repeater.get_id, (record.repeater_id, repeater.get_id)
+        if record.state == RECORD_FAILURE_STATE and record.overall_tries >= record.max_possible_tries:
+            record.cancel()
+            to_cancel.append(record)
+        elif record.state in (RECORD_PENDING_STATE, RECORD_FAILURE_STATE):
+            to_send.append(record)
+    if to_cancel:
+        _bulk_save(to_cancel)
+
+    session = get_session(concurrency)
+    rate_limiter = RateLimiter(rate_limit)
+
+    def send(record):
+        rate_limiter.wait()
+        try:
+            record.fire(session=session, repeater=repeater)
+        except Exception:
+            logging.exception('Failed to process repeat record: {}'.format(record._id))
+
+    def send_batch(batch):
+        rate_limiter.wait()
+        batch = list(batch)
+        for record in batch:
+            record.overall_tries += 1
+        try:
+            attempts = repeater.fire_for_records(batch, session=session)
+        except Exception as e:
+            logging.exception('Failed to process repeat records: {}'.format(
+                ', '.join(record._id for record in batch)))
+            attempts = [record.handle_payload_exception(e) for record in batch]
+        for record, attempt in zip(batch, attempts):
+            record.add_attempt(attempt)
+        _bulk_save(batch)
+
+    generator = repeater.generator
+    if generator.supports_batch_payload:
+        send_func, items = send_batch, list(chunked(to_send, generator.max_batch_size))
+    else:
+        repeater.prefetch_payload_docs(to_send)
+        send_func, items = send, to_send
+
+    start = time.time()
+    try:
+        with DatabaseThreadPool(min(concurrency, len(items)) or 1) as pool:
+            pool.map(send_func, items)
+    finally:
+        session.close()
+    elapsed = time.time() - start
+
+    tags = ['domain:{}'.format(repeater.domain), 'repeater:{}'.format(repeater.get_id)]
+    datadog_counter('commcare.repeaters.dispatcher.sent', len(to_send), tags=tags)
+    if to_send and elapsed:
+        datadog_gauge('commcare.repeaters.dispatcher.records_per_second', len(to_send) / elapsed, tags=tags)
+
+
+def _bulk_save(records):
+    try:
+        RepeatRecord.bulk_save(records)
+    except BulkSaveError as e:
+        logging.error('Failed to save repeat records: {}'.format(
+            ', '.join(error['id'] for error in e.errors)))
@@ -35,6 +35,7 @@ from corehq.form_processor.interfaces.dbaccessors import (
 from corehq.motech.const import ALGO_AES
 from corehq.motech.repeaters.repeater_generators import (
     AppStructureGenerator,
+    CaseRepeaterJsonBatchPayloadGenerator,
     CaseRepeaterJsonPayloadGenerator,
     CaseRepeaterXMLPayloadGenerator,
     FormRepeaterJsonPayloadGenerator,
@@ -153,6 +154,31 @@ class Repeater(QuickCachedDocumentMixin, Document):
     def payload_doc(self, repeat_record):
         raise NotImplementedError
 
+    def payload_docs(self, repeat_records):
+        """
+        Returns a dict of the payload docs of `repeat_records` by payload
+        ID, leaving out docs that are not found. Repeaters whose payload
+        docs can be fetched in bulk override this.
+        """
+        payload_docs = {}
+        for repeat_record in repeat_records:
+            try:
+                payload_docs[repeat_record.payload_id] = self.payload_doc(repeat_record)
+            except ResourceNotFound:
+                pass
+        return payload_docs
+
+    def prefetch_payload_docs(self, repeat_records):
+        """
+        Load the payload docs of `repeat_records` for `payload_doc` to
+        return instead of loading them one at a time. Does nothing for
+        repeaters that cannot fetch their payload docs in bulk.
+        """
+        pass
+
+    def _get_prefetched_payload_doc(self, repeat_record):
+        return getattr(self, '_prefetched_payload_docs', {}).get(repeat_record.payload_id)
+
     @memoized
     def get_payload(self, repeat_record):
         return self.generator.get_payload(repeat_record, self.payload_doc(repeat_record))
@@ -294,16 +320,21 @@ class Repeater(QuickCachedDocumentMixin, Document):
     def verify(self):
         return not self.skip_cert_verify
 
-    def send_request(self, repeat_record, payload):
+    def send_request(self, repeat_record, payload, session=None):
+        """
+        :param session: A requests.Session whose connections should be
+        used. Repeaters that manage their own connections may ignore it.
+        """
         headers = self.get_headers(repeat_record)
         auth = self.get_auth()
         url = self.get_url(repeat_record)
-        return simple_post(payload, url, headers=headers, timeout=POST_TIMEOUT, auth=auth, verify=self.verify)
+        return simple_post(payload, url, headers=headers, timeout=POST_TIMEOUT, auth=auth, verify=self.verify,
+                           session=session)
 
-    def fire_for_record(self, repeat_record):
+    def fire_for_record(self, repeat_record, session=None):
         payload = self.get_payload(repeat_record)
         try:
-            response = self.send_request(repeat_record, payload)
+            response = self.send_request(repeat_record, payload, session=session)
         except (Timeout, ConnectionError) as error:
             log_repeater_timeout_in_datadog(self.domain)
             return self.handle_response(RequestConnectionError(error), repeat_record)
@@ -312,21 +343,60 @@ class Repeater(QuickCachedDocumentMixin, Document):
         else:
             return self.handle_response(response, repeat_record)
 
-    def handle_response(self, result, repeat_record):
+    def fire_for_records(self, repeat_records, session=None):
+        """
+        Send the payloads of `repeat_records` in one request, and return
+        an attempt for each record. Requires a payload generator that
+        supports batch payloads.
+
+        Records whose payload docs are not found are cancelled, as they
+        would be by `RepeatRecord.fire`.
+        """
+        assert self.generator.supports_batch_payload, self.generator
+        payload_docs_by_id = self.payload_docs(repeat_records)
+        found = [r for r in repeat_records if r.payload_id in payload_docs_by_id]
+        attempts = {
+            r._id: r.handle_payload_exception(Exception('Payload not found: {}'.format(r.payload_id)))
+            for r in repeat_records if r.payload_id not in payload_docs_by_id
+        }
+        if found:
+            payload_docs = [payload_docs_by_id[r.payload_id] for r in found]
+            payload = self.generator.get_batch_payload(found, payload_docs)
+            try:
+                result = simple_post(payload, self.get_batch_url(found), headers=self.generator.get_headers(),
+                                     timeout=POST_TIMEOUT, auth=self.get_auth(), verify=self.verify,
+                                     session=session)
+            except (Timeout, ConnectionError) as error:
+                log_repeater_timeout_in_datadog(self.domain)
+                result = RequestConnectionError(error)
+            except Exception as e:
+                result = e
+            for repeat_record, payload_doc in zip(found, payload_docs):
+                attempts[repeat_record._id] = self.handle_response(result, repeat_record, payload_doc)
+        return [attempts[r._id] for r in repeat_records]
+
+    def get_batch_url(self, repeat_records):
+        # to be overridden
+        return self.url
+
+    def handle_response(self, result, repeat_record, payload_doc=None):
         """
         route the result to the success, failure, or exception handlers
 
         result may be either a response object or an exception
         """
+        def get_payload_doc():
+            return payload_doc if payload_doc is not None else self.payload_doc(repeat_record)
+
         if isinstance(result, Exception):
             attempt = repeat_record.handle_exception(result)
             self.generator.handle_exception(result, repeat_record)
         elif _is_response(result) and 200 <= result.status_code < 300 or result is True:
             attempt = repeat_record.handle_success(result)
-            self.generator.handle_success(result, self.payload_doc(repeat_record), repeat_record)
+            self.generator.handle_success(result, get_payload_doc(), repeat_record)
         else:
             attempt = repeat_record.handle_failure(result)
-            self.generator.handle_failure(result, self.payload_doc(repeat_record), repeat_record)
+            self.generator.handle_failure(result, get_payload_doc(), repeat_record)
         return attempt
 
     @property
@@ -354,7 +424,17 @@ class FormRepeater(Repeater):
 
     @memoized
     def payload_doc(self, repeat_record):
-        return FormAccessors(repeat_record.domain).get_form(repeat_record.payload_id)
+        return (
+            self._get_prefetched_payload_doc(repeat_record)
+            or FormAccessors(repeat_record.domain).get_form(repeat_record.payload_id)
+        )
+
+    def payload_docs(self, repeat_records):
+        form_ids = [repeat_record.payload_id for repeat_record in repeat_records]
+        return {form.form_id: form for form in FormAccessors(self.domain).get_forms(form_ids)}
+
+    def prefetch_payload_docs(self, repeat_records):
+        self._prefetched_payload_docs = self.payload_docs(repeat_records)
 
     @property
     def form_class_name(self):
@@ -401,7 +481,11 @@ class CaseRepeater(Repeater):
 
     """
 
-    payload_generator_classes = (CaseRepeaterXMLPayloadGenerator, CaseRepeaterJsonPayloadGenerator)
+    payload_generator_classes = (
+        CaseRepeaterXMLPayloadGenerator,
+        CaseRepeaterJsonPayloadGenerator,
+        CaseRepeaterJsonBatchPayloadGenerator,
+    )
 
     version = StringProperty(default=V2, choices=LEGAL_VERSIONS)
     white_listed_case_types = StringListProperty(default=[])  # empty value means all case-types are accepted
@@ -423,7 +507,17 @@ class CaseRepeater(Repeater):
 
     @memoized
     def payload_doc(self, repeat_record):
-        return CaseAccessors(repeat_record.domain).get_case(repeat_record.payload_id)
+        return (
+            self._get_prefetched_payload_doc(repeat_record)
+            or CaseAccessors(repeat_record.domain).get_case(repeat_record.payload_id)
+        )
+
+    def payload_docs(self, repeat_records):
+        case_ids = [repeat_record.payload_id for repeat_record in repeat_records]
+        return {case.case_id: case for case in CaseAccessors(self.domain).get_cases(case_ids)}
+
+    def prefetch_payload_docs(self, repeat_records):
+        self._prefetched_payload_docs = self.payload_docs(repeat_records)
 
     @property
     def form_class_name(self):
@@ -699,11 +793,16 @@ class RepeatRecord(Document):
             succeeded=False,
         )
 
-    def fire(self, force_send=False):
+    def fire(self, force_send=False, session=None, repeater=None):
+        """
+        :param session: A requests.Session to send the payload with
+        :param repeater: The record's repeater, if already loaded, e.g.
+        with its payload docs prefetched
+        """
         if self.try_now() or force_send:
             self.overall_tries += 1
             try:
-                attempt = self.repeater.fire_for_record(self)
+                attempt = (repeater or self.repeater).fire_for_record(self, session=session)
             except Exception as e:
                 log_repeater_error_in_datadog(self.domain, status_code=None,
                                               repeater_type=self.repeater_type)
@@ -784,16 +883,14 @@ class RepeatRecord(Document):
         self.next_check = None
         self.cancelled = True
 
+    def is_ready_to_forward(self):
+        already_processed = self.succeeded or self.cancelled or self.next_check is None
+        return not already_processed and self.next_check < datetime.utcnow()
+
     def attempt_forward_now(self):
         from corehq.motech.repeaters.tasks import process_repeat_record
 
-        def is_ready():
-            return self.next_check < datetime.utcnow()
-
-        def already_processed():
-            return self.succeeded or self.cancelled or self.next_check is None
-
-        if already_processed() or not is_ready():
+        if not self.is_ready_to_forward():
             return
 
         # Set the next check to happen an arbitrarily long time from now so
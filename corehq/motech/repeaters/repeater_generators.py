@@ -31,6 +31,11 @@ class BasePayloadGenerator(object):
     # if you ever change format_name, add the old format_name here for backwards compatability
     deprecated_format_names = ()
 
+    # set to True for formats whose endpoints accept the payloads of
+    # several repeat records in one request (see `get_batch_payload`)
+    supports_batch_payload = False
+    max_batch_size = 100
+
     def __init__(self, repeater):
         self.repeater = repeater
 
@@ -45,6 +50,13 @@ class BasePayloadGenerator(object):
     def get_payload(self, repeat_record, payload_doc):
         raise NotImplementedError()
 
+    def get_batch_payload(self, repeat_records, payload_docs):
+        """
+        Returns one payload for several repeat records. `payload_docs`
+        are the payload docs of `repeat_records`, in the same order.
+        """
+        raise NotImplementedError()
+
     def get_headers(self):
         return {'Content-Type': self.content_type}
 
@@ -261,6 +273,32 @@ class CaseRepeaterJsonPayloadGenerator(BasePayloadGenerator):
         )
 
 
+class CaseRepeaterJsonBatchPayloadGenerator(CaseRepeaterJsonPayloadGenerator):
+    """
+    Sends a JSON list of cases. Repeat records are sent in batches when
+    they are dispatched per repeater; otherwise each list holds one case.
+    """
+    format_name = 'case_json_batch'
+    format_label = _('JSON (batched)')
+
+    supports_batch_payload = True
+
+    @staticmethod
+    def enabled_for_domain(domain):
+        from corehq import toggles
+        return toggles.REPEAT_RECORD_DISPATCHER.enabled(domain)
+
+    def get_payload(self, repeat_record, payload_doc):
+        return self.get_batch_payload([repeat_record], [payload_doc])
+
+    def get_batch_payload(self, repeat_records, payload_docs):
+        data = [payload_doc.to_api_json(lite=True) for payload_doc in payload_docs]
+        return json.dumps(data, cls=DjangoJSONEncoder)
+
+    def get_test_payload(self, domain):
+        return '[{}]'.format(super(CaseRepeaterJsonBatchPayloadGenerator, self).get_test_payload(domain))
+
+
 class AppStructureGenerator(BasePayloadGenerator):
 
     deprecated_format_names = ('app_structure_xml',)
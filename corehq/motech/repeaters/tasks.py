@@ -14,11 +14,19 @@ from corehq.motech.repeaters.const import (
     CHECK_REPEATERS_KEY,
     RECORD_FAILURE_STATE,
     RECORD_PENDING_STATE,
+    REPEATER_DISPATCH_LOCK_KEY,
+    REPEATER_DISPATCH_LOCK_TIMEOUT,
+    REPEATER_DISPATCH_RETRY_DELAY,
 )
+from corehq import toggles
 from corehq.motech.repeaters.dbaccessors import (
     get_overdue_repeat_record_count,
     iterate_repeat_records,
 )
+from corehq.motech.repeaters.dispatcher import (
+    RepeatRecordDispatcher,
+    send_repeat_records,
+)
 from corehq.util.datadog.gauges import (
     datadog_bucket_timer,
     datadog_counter,
@@ -58,6 +66,7 @@ def check_repeaters():
         datadog_counter("commcare.repeaters.check.locked_out")
         return
 
+    dispatcher = RepeatRecordDispatcher()
     try:
         with datadog_bucket_timer(
             "commcare.repeaters.check.processing",
@@ -69,7 +78,11 @@ def check_repeaters():
                     _soft_assert(False, "I've been iterating repeat records for six hours. I quit!")
                     break
                 datadog_counter("commcare.repeaters.check.attempt_forward")
-                record.attempt_forward_now()
+                if toggles.REPEAT_RECORD_DISPATCHER.enabled(record.domain):
+                    dispatcher.add(record)
+                else:
+                    record.attempt_forward_now()
+            dispatcher.flush()
     finally:
         check_repeater_lock.release()
 
@@ -108,6 +121,30 @@ def process_repeat_record(repeat_record):
         logging.exception('Failed to process repeat record: {}'.format(repeat_record._id))
 
 
+@task(serializer='pickle', queue=settings.CELERY_REPEAT_RECORD_QUEUE)
+def process_repeat_records(repeat_records):
+    """
+    Send repeat records of the same repeater. See
+    `corehq.motech.repeaters.dispatcher`
+
+    Only one task sends records of a repeater at a time, so that its
+    concurrency and rate limits apply to the repeater rather than to
+    each task. If another task is sending records of the same repeater
+    this task is queued again.
+    """
+    repeater_id = repeat_records[0].repeater_id
+    lock_key = REPEATER_DISPATCH_LOCK_KEY.format(repeater_id)
+    lock = get_redis_lock(lock_key, timeout=REPEATER_DISPATCH_LOCK_TIMEOUT, name='repeater-dispatch')
+    if not lock.acquire(blocking=False):
+        datadog_counter("commcare.repeaters.dispatcher.locked_out")
+        process_repeat_records.apply_async((repeat_records,), countdown=REPEATER_DISPATCH_RETRY_DELAY)
+        return
+    try:
+        send_repeat_records(repeat_records)
+    finally:
+        lock.release()
+
+
 repeaters_overdue = datadog_gauge_task(
     'commcare.repeaters.overdue',
     get_overdue_repeat_record_count,
@@ -0,0 +1,147 @@
+from django.test import SimpleTestCase
+
+from mock import Mock, patch
+
+from corehq.motech.repeaters.const import (
+    RECORD_FAILURE_STATE,
+    RECORD_PENDING_STATE,
+)
+from corehq.motech.repeaters.dispatcher import (
+    RateLimiter,
+    RepeatRecordDispatcher,
+    send_repeat_records,
+)
+from corehq.motech.repeaters.tasks import process_repeat_records
+
+
+def _record(record_id, repeater_id='r1', state=RECORD_PENDING_STATE, overall_tries=0):
+    return Mock(
+        _id=record_id,
+        repeater_id=repeater_id,
+        state=state,
+        overall_tries=overall_tries,
+        max_possible_tries=3,
+        is_ready_to_forward=Mock(return_value=True),
+    )
+
+
+class RateLimiterTest(SimpleTestCase):
+
+    @patch('corehq.motech.repeaters.dispatcher.time')
+    def test_wait(self, time_mock):
+        time_mock.monotonic.return_value = 100
+        limiter = RateLimiter(4)
+        for i in range(3):
+            limiter.wait()
+        self.assertEqual([c[0][0] for c in time_mock.sleep.call_args_list], [0.25, 0.5])
+
+
+@patch('corehq.motech.repeaters.dispatcher._claim_repeat_records', lambda records: records)
+@patch('corehq.motech.repeaters.tasks.process_repeat_records')
+class RepeatRecordDispatcherTest(SimpleTestCase):
+
+    def test_chunks_by_repeater(self, task_mock):
+        dispatcher = RepeatRecordDispatcher(chunk_size=2)
+        records = [_record('a', 'r1'), _record('b', 'r2'), _record('c', 'r1'), _record('d', 'r2')]
+        for record in records:
+            dispatcher.add(record)
+        dispatcher.add(_record('e', 'r1'))
+        dispatcher.flush()
+        self.assertEqual(
+            [[r._id for r in c[0][0]] for c in task_mock.delay.call_args_list],
+            [['a', 'c'], ['b', 'd'], ['e']],
+        )
+
+    def test_not_ready(self, task_mock):
+        dispatcher = RepeatRecordDispatcher()
+        record = _record('a')
+        record.is_ready_to_forward.return_value = False
+        dispatcher.add(record)
+        dispatcher.flush()
+        task_mock.delay.assert_not_called()
+
+
+@patch('corehq.motech.repeaters.dispatcher.datadog_counter', Mock())
+@patch('corehq.motech.repeaters.dispatcher.datadog_gauge', Mock())
+@patch('corehq.motech.repeaters.dispatcher.RepeatRecord')
+class SendRepeatRecordsTest(SimpleTestCase):
+
+    def _records(self, repeater):
+        records = [
+            _record('a'),
+            _record('b', state=RECORD_FAILURE_STATE, overall_tries=1),
+            _record('c', state=RECORD_FAILURE_STATE, overall_tries=3),
+        ]
+        for record in records:
+            record.repeater = repeater
+        return records
+
+    def test_send(self, record_class):
+        repeater = Mock(get_id='r1', paused=False, doc_type='FormRepeater',
+                        generator=Mock(supports_batch_payload=False))
+        a, b, c = records = self._records(repeater)
+        send_repeat_records(records, rate_limit=None)
+        a.fire.assert_called_once()
+        b.fire.assert_called_once()
+        c.fire.assert_not_called()
+        c.cancel.assert_called_once()
+        self.assertEqual(a.fire.call_args[1]['session'], b.fire.call_args[1]['session'])
+        self.assertIs(a.fire.call_args[1]['repeater'], repeater)
+        repeater.prefetch_payload_docs.assert_called_once_with([a, b])
+        # sent records are saved by fire()
+        record_class.bulk_save.assert_called_once_with([c])
+
+    def test_send_batches(self, record_class):
+        repeater = Mock(get_id='r1', paused=False, doc_type='CaseRepeater',
+                        generator=Mock(supports_batch_payload=True, max_batch_size=1))
+        repeater.fire_for_records.side_effect = lambda batch, session: [
+            'attempt-{}'.format(record._id) for record in batch
+        ]
+        a, b, c = records = self._records(repeater)
+        send_repeat_records(records, rate_limit=None)
+        self.assertEqual(
+            sorted(c[0][0][0]._id for c in repeater.fire_for_records.call_args_list),
+            ['a', 'b'],
+        )
+        a.fire.assert_not_called()
+        a.add_attempt.assert_called_once_with('attempt-a')
+        b.add_attempt.assert_called_once_with('attempt-b')
+        self.assertEqual((a.overall_tries, b.overall_tries), (1, 2))
+        self.assertEqual(record_class.bulk_save.call_args_list[0][0][0], [c])
+        self.assertEqual(
+            sorted(r._id for call in record_class.bulk_save.call_args_list[1:] for r in call[0][0]),
+            ['a', 'b'],
+        )
+
+    @patch('corehq.motech.repeaters.tasks.process_repeat_record')
+    def test_paused_repeater(self, process_mock, record_class):
+        repeater = Mock(get_id='r1', paused=True, doc_type='FormRepeater')
+        records = self._records(repeater)
+        send_repeat_records(records)
+        self.assertEqual([c[0][0] for c in process_mock.call_args_list], records)
+        record_class.bulk_save.assert_not_called()
+
+
+@patch('corehq.motech.repeaters.tasks.datadog_counter', Mock())
+@patch('corehq.motech.repeaters.tasks.send_repeat_records')
+@patch('corehq.motech.repeaters.tasks.get_redis_lock')
+class ProcessRepeatRecordsTest(SimpleTestCase):
+
+    def test_send(self, lock_mock, send_mock):
+        lock_mock.return_value.acquire.return_value = True
+        records = [_record('a'), _record('b')]
+        with patch.object(process_repeat_records, 'apply_async') as apply_async:
+            process_repeat_records(records)
+        self.assertEqual(lock_mock.call_args[0][0], 'repeater-dispatch-r1')
+        send_mock.assert_called_once_with(records)
+        lock_mock.return_value.release.assert_called_once()
+        apply_async.assert_not_called()
+
+    def test_repeater_locked(self, lock_mock, send_mock):
+        lock_mock.return_value.acquire.return_value = False
+        records = [_record('a'), _record('b')]
+        with patch.object(process_repeat_records, 'apply_async') as apply_async:
+            process_repeat_records(records)
+        send_mock.assert_not_called()
+        lock_mock.return_value.release.assert_not_called()
+        self.assertEqual(apply_async.call_args[0][0], (records,))
@@ -565,6 +565,96 @@ class CaseRepeaterTest(BaseRepeaterTest, TestXmlMixin):
         self.assertEqual(2, len(self.repeat_records(self.domain_name).all()))
 
 
+class CaseRepeaterBatchTest(BaseRepeaterTest):
+    domain_name = "test-batch-domain"
+
+    def setUp(self):
+        super(CaseRepeaterBatchTest, self).setUp()
+        self.domain = create_domain(self.domain_name)
+        self.repeater = CaseRepeater(
+            domain=self.domain_name,
+            url="case-repeater-url",
+            format="case_json_batch",
+        )
+        self.repeater.save()
+
+    def tearDown(self):
+        self.repeater.delete()
+        FormProcessorTestUtils.delete_all_cases_forms_ledgers(self.domain_name)
+        delete_all_repeat_records()
+        self.domain.delete()
+        super(CaseRepeaterBatchTest, self).tearDown()
+
+    def _create_cases(self):
+        with patch('corehq.motech.repeaters.models.simple_post',
+                   return_value=MockResponse(status_code=500, reason="Borked")):
+            CaseFactory(self.domain_name).post_case_blocks([
+                CaseBlock(case_id="case1", create=True, case_type="planet", case_name="Mercury").as_xml(),
+                CaseBlock(case_id="case2", create=True, case_type="planet", case_name="Venus").as_xml(),
+            ])
+        return sorted(self.repeat_records(self.domain_name).all(), key=lambda r: r.payload_id)
+
+    def _missing_case_record(self):
+        return RepeatRecord(
+            domain=self.domain_name,
+            repeater_id=self.repeater.get_id,
+            repeater_type=self.repeater.doc_type,
+            payload_id="missing",
+        )
+
+    @run_with_all_backends
+    def test_payload_docs(self):
+        records = self._create_cases()
+        payload_docs = self.repeater.payload_docs(records + [self._missing_case_record()])
+        self.assertEqual(sorted(payload_docs), ["case1", "case2"])
+        self.assertEqual(payload_docs["case1"].name, "Mercury")
+
+    @run_with_all_backends
+    def test_prefetch_payload_docs(self):
+        records = self._create_cases()
+        self.repeater.prefetch_payload_docs(records)
+        with patch.object(CaseAccessors, 'get_case') as get_case:
+            self.assertEqual(self.repeater.payload_doc(records[1]).name, "Venus")
+        get_case.assert_not_called()
+
+    @run_with_all_backends
+    def test_get_batch_payload(self):
+        records = self._create_cases()
+        cases = [CaseAccessors(self.domain_name).get_case(case_id) for case_id in ["case1", "case2"]]
+        payload = json.loads(self.repeater.generator.get_batch_payload(records, cases))
+        self.assertEqual(
+            [(case['case_id'], case['properties']['case_name']) for case in payload],
+            [("case1", "Mercury"), ("case2", "Venus")],
+        )
+
+    @run_with_all_backends
+    def test_fire_for_records(self):
+        records = self._create_cases()
+        missing = self._missing_case_record()
+        with patch('corehq.motech.repeaters.models.simple_post',
+                   return_value=MockResponse(status_code=200, reason="OK")) as mock_post:
+            attempts = self.repeater.fire_for_records([records[0], missing, records[1]])
+
+        mock_post.assert_called_once()
+        payload = json.loads(mock_post.call_args[0][0])
+        self.assertEqual([case['case_id'] for case in payload], ["case1", "case2"])
+        self.assertEqual(mock_post.call_args[0][1], "case-repeater-url")
+        self.assertEqual(
+            [(attempt.succeeded, attempt.cancelled) for attempt in attempts],
+            [(True, False), (False, True), (True, False)],
+        )
+
+    @run_with_all_backends
+    def test_fire_for_records_failure(self):
+        records = self._create_cases()
+        with patch('corehq.motech.repeaters.models.simple_post',
+                   return_value=MockResponse(status_code=500, reason="Borked")):
+            attempts = self.repeater.fire_for_records(records)
+        self.assertEqual([attempt.succeeded for attempt in attempts], [False, False])
+        self.assertEqual([attempt.cancelled for attempt in attempts], [False, False])
+        self.assertTrue(all(attempt.next_check for attempt in attempts))
+
+
 class RepeaterFailureTest(BaseRepeaterTest):
 
     def setUp(self):
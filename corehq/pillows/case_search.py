@@ -1,4 +1,4 @@
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from datetime import datetime
 
 from django.core.mail import mail_admins
@@ -9,10 +9,14 @@ from corehq.apps.case_search.const import (
     INDEXED_ON,
     SPECIAL_CASE_PROPERTIES_MAP,
     SYSTEM_PROPERTIES,
+    UNINDEXED_ANCESTOR_PROPERTIES,
     VALUE,
 )
 from corehq.apps.case_search.exceptions import CaseSearchNotEnabledException
-from corehq.apps.case_search.models import case_search_enabled_domains
+from corehq.apps.case_search.models import (
+    case_search_enabled_domains,
+    get_ancestor_paths_to_index,
+)
 from corehq.apps.change_feed import topics
 from corehq.apps.change_feed.consumer.feed import (
     KafkaChangeFeed,
@@ -21,6 +25,7 @@ from corehq.apps.change_feed.consumer.feed import (
 from corehq.apps.es import CaseSearchES
 from corehq.elastic import get_es_new
 from corehq.form_processor.backends.sql.dbaccessors import CaseReindexAccessor
+from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
 from corehq.form_processor.utils.general import should_use_sql_backend
 from corehq.pillows.mappings.case_mapping import CASE_ES_TYPE
 from corehq.pillows.mappings.case_search_mapping import (
@@ -36,12 +41,13 @@ from corehq.toggles import (
 from corehq.util.doc_processor.sql import SqlDocumentProvider
 from corehq.util.log import get_traceback_string
 from corehq.util.quickcache import quickcache
+from dimagi.utils.chunked import chunked
 from dimagi.utils.parsing import json_format_datetime
 from pillowtop.checkpoints.manager import (
     get_checkpoint_for_elasticsearch_pillow,
 )
 from pillowtop.es_utils import initialize_index_and_mapping
-from pillowtop.feed.interface import Change
+from pillowtop.feed.interface import Change, ChangeMeta
 from pillowtop.pillow.interface import ConstructedPillow
 from pillowtop.processors.elastic import ElasticProcessor
 from pillowtop.reindexer.change_providers.case import (
@@ -52,6 +58,7 @@ from pillowtop.reindexer.reindexer import (
     ReindexerFactory,
     ResumableBulkElasticPillowReindexer,
 )
+from pillowtop.utils import bulk_fetch_changes_docs
 
 
 @quickcache([], timeout=24 * 60 * 60, memoize_timeout=60)
@@ -66,7 +73,14 @@ def domain_needs_search_index(domain):
     return domain in domains_needing_search_index()
 
 
-def transform_case_for_elasticsearch(doc_dict):
+DESCENDANTS_CHUNK_SIZE = 100
+
+
+def transform_case_for_elasticsearch(doc_dict, ancestor_cases=None):
+    """
+    :param ancestor_cases: A dict of the case's ancestors, as returned by
+    `get_ancestor_cases`, to avoid looking them up for each case
+    """
     doc = {
         desired_property: doc_dict.get(desired_property)
         for desired_property in CASE_SEARCH_MAPPING['properties'].keys()
@@ -74,7 +88,10 @@ def transform_case_for_elasticsearch(doc_dict):
     }
     doc['_id'] = doc_dict.get('_id')
     doc[INDEXED_ON] = json_format_datetime(datetime.utcnow())
-    doc['case_properties'] = _get_case_properties(doc_dict)
+    doc['case_properties'] = (
+        _get_case_properties(doc_dict)
+        + _get_ancestor_case_properties(doc_dict, ancestor_cases if ancestor_cases is not None else {})
+    )
     return doc
 
 
@@ -95,7 +112,104 @@ def _get_case_properties(doc_dict):
     return base_case_properties + dynamic_mapping
 
 
+def get_ancestor_cases(domain, doc_dicts, ancestor_cases):
+    """Adds the ancestors of `doc_dicts` along the domain's indexed ancestor
+    paths to `ancestor_cases`, a dict of case JSON by case ID in which missing
+    and deleted cases are None. Each level of ancestors is loaded with one
+    query, skipping the cases that are already in `ancestor_cases`.
+
+    :returns: `ancestor_cases`
+    """
+    paths = [path.split('/') for path in get_ancestor_paths_to_index(domain)]
+    accessor = CaseAccessors(domain)
+    cases = doc_dicts
+    for level in range(max(len(path) for path in paths) if paths else 0):
+        identifiers = {path[level] for path in paths if len(path) > level}
+        case_ids = {
+            index['referenced_id']
+            for case in cases
+            for index in case.get('indices', [])
+            if index.get('identifier') in identifiers and index.get('referenced_id')
+        }
+        to_load = [case_id for case_id in case_ids if case_id not in ancestor_cases]
+        if to_load:
+            ancestor_cases.update(dict.fromkeys(to_load))
+            ancestor_cases.update(
+                (case.case_id, case.to_json())
+                for case in accessor.get_cases(to_load)
+                if not case.is_deleted
+            )
+        cases = [ancestor_cases[case_id] for case_id in case_ids if ancestor_cases[case_id]]
+    return ancestor_cases
+
+
+def _get_ancestor_case_properties(doc_dict, ancestor_cases):
+    """Returns the case properties of the case's ancestors along the domain's
+    indexed ancestor paths, with keys prefixed by the path, e.g.
+    "parent/parent/dob". Related case filters on these paths can then be
+    evaluated without looking up the related cases first.
+    """
+    domain = doc_dict.get('domain')
+    paths = get_ancestor_paths_to_index(domain)
+    if not paths:
+        return []
+
+    get_ancestor_cases(domain, [doc_dict], ancestor_cases)
+    ancestors = {}
+
+    def get_ancestor(path):
+        if path not in ancestors:
+            parent_path, _, identifier = path.rpartition('/')
+            case = get_ancestor(parent_path) if parent_path else doc_dict
+            ancestors[path] = _get_indexed_case(ancestor_cases, case, identifier) if case else None
+        return ancestors[path]
+
+    properties = []
+    for path in paths:
+        ancestor = get_ancestor(path)
+        if ancestor:
+            properties.extend(
+                {'key': '{}/{}'.format(path, prop['key']), VALUE: prop[VALUE]}
+                for prop in _get_case_properties(ancestor)
+                if prop['key'] not in UNINDEXED_ANCESTOR_PROPERTIES
+            )
+    return properties
+
+
+def _get_indexed_case(ancestor_cases, doc_dict, identifier):
+    for index in doc_dict.get('indices', []):
+        if index.get('identifier') == identifier:
+            return ancestor_cases.get(index.get('referenced_id'))
+    return None
+
+
 class CaseSearchPillowProcessor(ElasticProcessor):
+    """
+    When the case properties that a case's descendants index with their own
+    (see `_get_ancestor_case_properties`) change, the descendants are
+    reindexed by a task, which follows them down only as far as their own
+    properties change.
+
+    The properties as previously indexed are fetched with one request per
+    chunk of changes, before the chunk is indexed, and compared with the
+    properties of the transformed documents.
+    """
+
+    def __init__(self, elasticsearch, index_info, doc_filter_fn=None):
+        super(CaseSearchPillowProcessor, self).__init__(
+            elasticsearch, index_info, doc_prep_fn=self._transform_case, doc_filter_fn=doc_filter_fn)
+        self._reset()
+
+    def _reset(self):
+        self._ancestor_cases = {}
+        self._previous_properties = {}
+        self._current_properties = {}
+
+    def _transform_case(self, doc_dict):
+        doc = transform_case_for_elasticsearch(doc_dict, self._ancestor_cases)
+        if doc['_id'] in self._previous_properties:
+            self._current_properties[doc['_id']] = _get_descendant_indexed_properties(doc['case_properties'])
+        return doc
 
     def process_change(self, change):
         assert isinstance(change, Change)
@@ -107,14 +221,153 @@ class CaseSearchPillowProcessor(ElasticProcessor):
             domain = change.get_document()['domain']
 
         if domain and domain_needs_search_index(domain):
-            super(CaseSearchPillowProcessor, self).process_change(change)
+            if get_ancestor_paths_to_index(domain):
+                self._previous_properties = self._get_indexed_properties([change.id])
+            try:
+                super(CaseSearchPillowProcessor, self).process_change(change)
+                changed_case_ids = self._get_changed_case_ids()
+            finally:
+                self._reset()
+            self._update_descendants_later(domain, changed_case_ids)
+
+    def process_changes_chunk(self, changes_chunk):
+        # changes without metadata are reprocessed serially, which looks up their domain
+        changes_chunk = [
+            change for change in changes_chunk
+            if change.metadata is None or (
+                change.metadata.domain and domain_needs_search_index(change.metadata.domain)
+            )
+        ]
+        domains = {change.metadata.domain for change in changes_chunk if change.metadata is not None}
+        ancestor_domains = {domain for domain in domains if get_ancestor_paths_to_index(domain)}
+        domains_by_case_id = {
+            change.id: change.metadata.domain for change in changes_chunk
+            if change.metadata is not None and change.metadata.domain in ancestor_domains
+        }
+        self._previous_properties = self._get_indexed_properties(list(domains_by_case_id))
+        self._prefetch_ancestor_cases(changes_chunk, ancestor_domains)
+        try:
+            retry, errors = super(CaseSearchPillowProcessor, self).process_changes_chunk(changes_chunk)
+            failed_ids = {change.id for change in retry} | {change.id for change, exception in errors}
+            changed_case_ids = self._get_changed_case_ids(failed_ids)
+        finally:
+            self._reset()
+        case_ids_by_domain = defaultdict(list)
+        for case_id in changed_case_ids:
+            case_ids_by_domain[domains_by_case_id[case_id]].append(case_id)
+        for domain, case_ids in case_ids_by_domain.items():
+            self._update_descendants_later(domain, case_ids)
+        return retry, errors
+
+    def _prefetch_ancestor_cases(self, changes_chunk, domains):
+        to_fetch = [
+            change for change in changes_chunk
+            if change.metadata is not None and change.metadata.domain in domains and not change.deleted
+        ]
+        if not to_fetch:
+            return
+        # the documents are set on the changes, so they are not fetched again
+        retry, docs = bulk_fetch_changes_docs(to_fetch)
+        docs_by_domain = defaultdict(list)
+        for doc in docs:
+            docs_by_domain[doc['domain']].append(doc)
+        for domain, doc_dicts in docs_by_domain.items():
+            get_ancestor_cases(domain, doc_dicts, self._ancestor_cases)
+
+    def _get_indexed_properties(self, case_ids):
+        """Returns the case properties of `case_ids` that their descendants
+        index, as currently indexed, by case ID. Cases that are not indexed
+        have None.
+        """
+        if not case_ids:
+            return {}
+        docs = self.elasticsearch.mget(
+            index=self.index_info.index,
+            doc_type=self.index_info.type,
+            body={'ids': case_ids},
+            _source=['case_properties'],
+        )['docs']
+        return {
+            doc['_id']: _get_descendant_indexed_properties(doc['_source'].get('case_properties', []))
+            if doc.get('found') else None
+            for doc in docs
+        }
+
+    def _get_changed_case_ids(self, failed_ids=()):
+        """Returns the IDs of the cases whose properties were fetched before
+        indexing and differ from the properties they were indexed with. Cases
+        that were not indexed again were deleted.
+        """
+        return [
+            case_id for case_id, case_properties in self._previous_properties.items()
+            if case_id not in failed_ids and self._current_properties.get(case_id) != case_properties
+        ]
+
+    def _update_descendants_later(self, domain, case_ids):
+        from corehq.apps.case_search.tasks import update_case_search_descendants
+        if case_ids:
+            update_case_search_descendants.delay(domain, case_ids)
+
+    def update_descendants(self, domain, case_ids):
+        """Reindex the descendants of `case_ids` whose documents include the
+        properties of these cases, level by level, following only the
+        descendants whose indexed properties changed
+        """
+        paths = get_ancestor_paths_to_index(domain)
+        if not paths:
+            return
+        accessor = CaseAccessors(domain)
+        data_source_type = 'sql' if should_use_sql_backend(domain) else 'couch'
+        depth = max(path.count('/') + 1 for path in paths)
+        for i in range(depth):
+            changed_case_ids = []
+            for case_ids_chunk in chunked(case_ids, DESCENDANTS_CHUNK_SIZE):
+                descendants = accessor.get_reverse_indexed_cases(list(case_ids_chunk))
+                for descendants_chunk in chunked(descendants, DESCENDANTS_CHUNK_SIZE):
+                    changes = [
+                        Change(
+                            id=case.case_id,
+                            sequence_id=None,
+                            document=case.to_json(),
+                            metadata=ChangeMeta(
+                                document_id=case.case_id,
+                                data_source_type=data_source_type,
+                                data_source_name='case-search-descendants',
+                                domain=domain,
+                            ),
+                        )
+                        for case in descendants_chunk
+                    ]
+                    self._previous_properties = self._get_indexed_properties([change.id for change in changes])
+                    self._prefetch_ancestor_cases(changes, {domain})
+                    try:
+                        retry, errors = super(CaseSearchPillowProcessor, self).process_changes_chunk(changes)
+                        for change in retry:
+                            super(CaseSearchPillowProcessor, self).process_change(change)
+                        changed_case_ids.extend(
+                            self._get_changed_case_ids({change.id for change, exception in errors}))
+                    finally:
+                        self._reset()
+            case_ids = changed_case_ids
+            if not case_ids:
+                break
+
+
+def _get_descendant_indexed_properties(case_properties):
+    """Returns the case properties, as indexed, that the case's descendants
+    index with their own, by key
+    """
+    return {
+        prop['key']: prop[VALUE]
+        for prop in case_properties
+        if prop['key'] not in UNINDEXED_ANCESTOR_PROPERTIES
+    }
 
 
 def get_case_search_processor():
     return CaseSearchPillowProcessor(
         elasticsearch=get_es_new(),
         index_info=CASE_SEARCH_INDEX_INFO,
-        doc_prep_fn=transform_case_for_elasticsearch
     )
 
 
@@ -184,7 +437,6 @@ def get_case_search_to_elasticsearch_pillow(pillow_id='CaseSearchToElasticsearch
     case_processor = CaseSearchPillowProcessor(
         elasticsearch=get_es_new(),
         index_info=CASE_SEARCH_INDEX_INFO,
-        doc_prep_fn=transform_case_for_elasticsearch
     )
     change_feed = KafkaChangeFeed(
         topics=topics.CASE_TOPICS, client_id='cases-to-es', num_processes=num_processes, process_num=process_num
@@ -0,0 +1,69 @@
+import heapq
+from operator import itemgetter
+
+from django.test import SimpleTestCase
+
+from corehq.sql_db.util import _iter_pager, _iter_pages_concurrently
+
+
+class FakePager(object):
+
+    def __init__(self, values, query_size=2, fail_after=None):
+        self.values = values
+        self.query_size = query_size
+        self.fail_after = fail_after
+        self.position = 0
+        self.done = False
+
+    def get_page(self):
+        if self.fail_after is not None and self.position >= self.fail_after:
+            raise ValueError("query failed")
+        page = [(value, 'row-{}'.format(value))
+                for value in self.values[self.position:self.position + self.query_size]]
+        self.position += self.query_size
+        if len(page) < self.query_size:
+            self.done = True
+        return page
+
+
+class PaginateConcurrentlyTest(SimpleTestCase):
+
+    shard_values = [
+        [1, 4, 7, 10, 13],
+        [2, 5, 8],
+        [],
+        [3, 6, 9, 12],
+    ]
+
+    def _pagers(self):
+        return [FakePager(values) for values in self.shard_values]
+
+    def _expected(self):
+        return [(value, 'row-{}'.format(value)) for values in self.shard_values for value in values]
+
+    def test_unordered(self):
+        rows = list(_iter_pages_concurrently(self._pagers(), 2, 1, merge=False))
+        self.assertEqual(sorted(rows), sorted(self._expected()))
+        # each database's results are in order
+        for values in self.shard_values:
+            self.assertEqual([value for value, row in rows if value in values], values)
+
+    def test_merged(self):
+        rows = list(_iter_pages_concurrently(self._pagers(), 3, 2, merge=True))
+        self.assertEqual(rows, sorted(self._expected()))
+
+    def test_merged_matches_serial(self):
+        serial = list(heapq.merge(*[_iter_pager(pager) for pager in self._pagers()], key=itemgetter(0)))
+        concurrent = list(_iter_pages_concurrently(self._pagers(), 4, 2, merge=True))
+        self.assertEqual(serial, concurrent)
+
+    def test_error(self):
+        pagers = self._pagers()
+        pagers[1].fail_after = 2
+        with self.assertRaises(ValueError):
+            list(_iter_pages_concurrently(pagers, 2, 2, merge=False))
+
+    def test_stop_early(self):
+        rows = _iter_pages_concurrently(self._pagers(), 2, 2, merge=False)
+        next(rows)
+        rows.close()
@@ -1,7 +1,12 @@
+import heapq
+import itertools
+import queue
 import re
+import threading
 import uuid
 from collections import defaultdict
 from functools import wraps
+from operator import itemgetter
 from random import choices
 
 from django import db
@@ -15,13 +20,15 @@ from psycopg2._psycopg import InterfaceError as Psycopg2InterfaceError
 from corehq.sql_db.config import partition_config
 from corehq.util.datadog.utils import load_counter_for_model
 from corehq.util.quickcache import quickcache
+from corehq.util.thread_pool import DatabaseThreadPool
 
 ACCEPTABLE_STANDBY_DELAY_SECONDS = 3
 STALE_CHECK_FREQUENCY = 30
 
 
 def paginate_query_across_partitioned_databases(model_class, q_expression, annotate=None, query_size=5000,
-                                                values=None, load_source=None):
+                                                values=None, load_source=None, sort_col='pk', merge=False,
+                                                workers=None, prefetch_pages=2):
     """
     Runs a query across all partitioned databases in small chunks and produces a generator
     with the results.
@@ -37,16 +44,40 @@ def paginate_query_across_partitioned_databases(model_class, q_expression, annot
     :param values: (optional) If specified, should be a list of values to retrieve rather
     than retrieving entire objects.
 
+    :param sort_col: (optional) The unique column each database's results are ordered
+    and paginated by. Defaults to the primary key.
+
+    :param merge: (optional) If True, results from all databases are merged in `sort_col`
+    order. Otherwise the results of each database are yielded in `sort_col` order, but
+    results from different databases are interleaved when they are queried concurrently.
+
+    :param workers: (optional) The number of databases to query concurrently. Defaults
+    to `settings.PARTITIONED_QUERY_WORKERS`. With one worker the databases are queried
+    one after another.
+
+    :param prefetch_pages: (optional) The number of pages fetched ahead of the consumer
+    for each database when querying concurrently.
+
     :return: A generator with the results
     """
-    db_names = get_db_aliases_for_partitioned_query()
-    for db_name in db_names:
-        for row in paginate_query(db_name, model_class, q_expression, annotate, query_size, values, load_source):
-            yield row
+    if workers is None:
+        workers = settings.PARTITIONED_QUERY_WORKERS
+    pagers = [
+        _QueryPager(db_name, model_class, q_expression, annotate, query_size, values, load_source, sort_col)
+        for db_name in get_db_aliases_for_partitioned_query()
+    ]
+    if workers > 1 and len(pagers) > 1:
+        rows = _iter_pages_concurrently(pagers, workers, prefetch_pages, merge)
+    elif merge:
+        rows = heapq.merge(*[_iter_pager(pager) for pager in pagers], key=itemgetter(0))
+    else:
+        rows = itertools.chain.from_iterable(_iter_pager(pager) for pager in pagers)
+    for value, row in rows:
+        yield row
 
 
 def paginate_query(db_name, model_class, q_expression, annotate=None, query_size=5000, values=None,
-                   load_source=None):
+                   load_source=None, sort_col='pk'):
     """
     Runs a query on the given database in small chunks and produces a generator
     with the results.
@@ -64,41 +95,152 @@ def paginate_query(db_name, model_class, q_expression, annotate=None, query_size
     :param values: (optional) If specified, should be a list of values to retrieve rather
     than retrieving entire objects.
 
+    :param sort_col: (optional) The unique column results are ordered and paginated by.
+    Defaults to the primary key.
+
     :return: A generator with the results
     """
+    pager = _QueryPager(db_name, model_class, q_expression, annotate, query_size, values, load_source, sort_col)
+    for value, row in _iter_pager(pager):
+        yield row
 
-    track_load = load_counter_for_model(model_class)(load_source, None, extra_tags=['db:{}'.format(db_name)])
-    sort_col = 'pk'
 
-    return_values = None
-    if values:
-        return_values = [sort_col] + values
+class _QueryPager(object):
+    """
+    Fetches the results of a query on one database a page at a time, in `sort_col` order
+    """
 
-    qs = model_class.objects.using(db_name)
-    if annotate:
-        qs = qs.annotate(**annotate)
+    def __init__(self, db_name, model_class, q_expression, annotate, query_size, values, load_source,
+                 sort_col):
+        self.db_name = db_name
+        self.query_size = query_size
+        self.sort_col = sort_col
+        self.values = values
+        self.track_load = load_counter_for_model(model_class)(
+            load_source, None, extra_tags=['db:{}'.format(db_name)])
 
-    qs = qs.filter(q_expression).order_by(sort_col)
+        qs = model_class.objects.using(db_name)
+        if annotate:
+            qs = qs.annotate(**annotate)
 
-    if return_values:
-        qs = qs.values_list(*return_values)
+        qs = qs.filter(q_expression).order_by(sort_col)
 
-    filter_expression = {}
-    while True:
-        results = qs.filter(**filter_expression)[:query_size]
-        for row in results:
-            track_load()
-            if return_values:
-                value = row[0]
-                yield row[1:]
-            else:
-                value = row.pk
-                yield row
+        if values:
+            qs = qs.values_list(*([sort_col] + values))
+        self.qs = qs
+        self.last_value = None
+        self.done = False
 
-        if len(results) < query_size:
-            break
+    def get_page(self):
+        """
+        :returns: A list of `(sort value, result)` tuples. Sets `done` when
+        there are no more pages.
+        """
+        qs = self.qs
+        if self.last_value is not None:
+            qs = qs.filter(**{'{}__gt'.format(self.sort_col): self.last_value})
+        results = list(qs[:self.query_size])
+        if self.values:
+            page = [(row[0], row[1:]) for row in results]
+        else:
+            page = [(getattr(row, self.sort_col), row) for row in results]
+        if page:
+            self.last_value = page[-1][0]
+            self.track_load(len(page))
+        if len(results) < self.query_size:
+            self.done = True
+        return page
+
+
+def _iter_pager(pager):
+    while not pager.done:
+        yield from pager.get_page()
+
+
+def _iter_pages_concurrently(pagers, workers, prefetch_pages, merge):
+    """
+    Fetch pages from all pagers on a pool of threads
+
+    :returns: A generator of `(sort value, result)` tuples, merged in
+    sort value order if `merge` is True.
+    """
+    pool = DatabaseThreadPool(workers)
+    stopped = threading.Event()
+    try:
+        if merge:
+            fetchers = [_PageFetcher(pager, pool, queue.Queue(), prefetch_pages, stopped) for pager in pagers]
+            rows = heapq.merge(*[_iter_fetched_pages([fetcher]) for fetcher in fetchers], key=itemgetter(0))
+        else:
+            pages = queue.Queue()
+            fetchers = [_PageFetcher(pager, pool, pages, prefetch_pages, stopped) for pager in pagers]
+            rows = _iter_fetched_pages(fetchers)
+        yield from rows
+    finally:
+        stopped.set()
+        pool.shutdown()
+
+
+def _iter_fetched_pages(fetchers):
+    """Yield the results of pages fetched by fetchers sharing a queue, in the order they are fetched"""
+    pages = fetchers[0].pages
+    for fetcher in fetchers:
+        fetcher.fetch()
+    remaining = len(fetchers)
+    while remaining:
+        fetcher, page, is_last = pages.get()
+        if isinstance(page, Exception):
+            raise page
+        if is_last:
+            remaining -= 1
+        fetcher.page_consumed()
+        yield from page
+
+
+class _PageFetcher(object):
+    """
+    Fetches the pages of a _QueryPager on a thread pool, up to
+    `prefetch_pages` pages ahead of the consumer
+
+    Fetched pages are put on the `pages` queue as `(fetcher, page, is_last)`
+    tuples, or `(fetcher, exception, True)` if fetching a page fails.
+    """
 
-        filter_expression = {'{}__gt'.format(sort_col): value}
+    def __init__(self, pager, pool, pages, prefetch_pages, stopped):
+        self.pager = pager
+        self.pool = pool
+        self.pages = pages
+        self.prefetch_pages = prefetch_pages
+        self.stopped = stopped
+        self.lock = threading.Lock()
+        self.buffered = 0
+        self.fetching = False
+        self.finished = False
+
+    def fetch(self):
+        with self.lock:
+            if self.fetching or self.finished or self.buffered >= self.prefetch_pages or self.stopped.is_set():
+                return
+            self.fetching = True
+        self.pool.apply_async(self.pager.get_page, callback=self._fetched, error_callback=self._failed)
+
+    def page_consumed(self):
+        with self.lock:
+            self.buffered -= 1
+        self.fetch()
+
+    def _fetched(self, page):
+        with self.lock:
+            self.fetching = False
+            self.buffered += 1
+            self.finished = self.pager.done
+        self.pages.put((self, page, self.finished))
+        self.fetch()
+
+    def _failed(self, error):
+        with self.lock:
+            self.fetching = False
+            self.finished = True
+        self.pages.put((self, error, True))
 
 
 def estimate_partitioned_row_count(model_class, q_expression):
@@ -584,6 +584,13 @@ USER_CONFIGURABLE_REPORTS = StaticToggle(
     notification_emails=['jemord']
 )
 
+UCR_COMPILED_EXPRESSIONS = StaticToggle(
+    'ucr_compiled_expressions',
+    'Evaluate UCR data sources with compiled expressions',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
 LOCATIONS_IN_UCR = StaticToggle(
     'locations_in_ucr',
     'ICDS: Add Locations as one of the Source Types for User Configurable Reports',
@@ -719,6 +726,34 @@ LIVEQUERY_SYNC = StaticToggle(
     always_enabled={'icds-cas'}
 )
 
+LIVEQUERY_STREAMING = StaticToggle(
+    'livequery_streaming',
+    'Stream livequery sync cases while the case graph is being resolved',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+LIVEQUERY_PREFETCH_CASES = StaticToggle(
+    'livequery_prefetch_cases',
+    'Fetch livequery sync case batches concurrently',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+LIVEQUERY_CASE_XML_CACHE = StaticToggle(
+    'livequery_case_xml_cache',
+    'Cache serialized case XML across livequery restores',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+COMPACT_SYNCLOG_CASE_STATE = StaticToggle(
+    'compact_synclog_case_state',
+    'Store sync log case state in a compact binary encoding',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
 NO_VELLUM = StaticToggle(
     'no_vellum',
     'Allow disabling Form Builder per form '
@@ -903,6 +938,13 @@ FORM_SUBMISSION_BLACKLIST = StaticToggle(
     always_disabled={'icds-cas'}
 )
 
+BULK_FORM_SUBMISSION = StaticToggle(
+    'bulk_form_submission',
+    'Allow submitting many forms in one request to the bulk receiver endpoint',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
 
 def _commtrackify(domain_name, toggle_is_enabled):
     from corehq.apps.domain.models import Domain
@@ -1361,6 +1403,13 @@ PAGINATED_EXPORTS = StaticToggle(
     [NAMESPACE_DOMAIN]
 )
 
+INCREMENTAL_DAILY_SAVED_EXPORTS = StaticToggle(
+    'incremental_daily_saved_exports',
+    'Allow daily saved exports to be rebuilt from modified forms and cases only',
+    TAG_INTERNAL,
+    [NAMESPACE_DOMAIN]
+)
+
 LOGIN_AS_ALWAYS_OFF = StaticToggle(
     'always_turn_login_as_off',
     'Always turn login as off',
@@ -1435,6 +1484,34 @@ BULK_UPLOAD_DATE_OPENED = StaticToggle(
     [NAMESPACE_DOMAIN],
 )
 
+PARALLEL_CASE_IMPORT = StaticToggle(
+    'parallel_case_import',
+    'Submit case import chunks for different case shards concurrently',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+FIXTURE_PAYLOAD_CACHE = StaticToggle(
+    'fixture_payload_cache',
+    'Cache serialized user lookup tables and location fixtures by content version',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+REPEAT_RECORD_DISPATCHER = StaticToggle(
+    'repeat_record_dispatcher',
+    'Forward repeat records in batches per repeater over pooled connections',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
+CASE_UPDATE_RULE_SQL_FILTER = StaticToggle(
+    'case_update_rule_sql_filter',
+    'Only load the cases that can match automatic case update rules, using their criteria in SQL',
+    TAG_INTERNAL,
+    namespaces=[NAMESPACE_DOMAIN],
+)
+
 REGEX_FIELD_VALIDATION = StaticToggle(
     'regex_field_validation',
     'Regular Expression Validation for Custom Data Fields',
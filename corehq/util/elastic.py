@@ -1,9 +1,17 @@
+import time
+from collections import namedtuple
+from uuid import uuid4
+
 from django.conf import settings
+from django.core.cache import cache
 from elasticsearch import NotFoundError
 
 from corehq.util.test_utils import unit_testing_only
 
 TEST_ES_PREFIX = 'test_'
+INDEX_GENERATION_TIMEOUT = 7 * 24 * 60 * 60
+
+IndexGeneration = namedtuple('IndexGeneration', 'token bumped_at')
 
 
 def es_index(index):
@@ -11,6 +19,72 @@ def es_index(index):
     return "{}{}".format(prefix, index)
 
 
+# Generations of documents whose domain is not known
+UNKNOWN_DOMAIN = '*'
+
+
+def _index_generation_key(index, domain=None):
+    if domain is None:
+        return 'es-index-generation:{}'.format(index)
+    return 'es-index-generation:{}:{}'.format(index, domain)
+
+
+def _get_generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        # no write has been recorded since the generation expired
+        cache.add(key, IndexGeneration(uuid4().hex, 0), INDEX_GENERATION_TIMEOUT)
+        generation = cache.get(key)
+    return IndexGeneration(*generation)
+
+
+def get_index_generation(index, domain=None):
+    """
+    Returns an `IndexGeneration` whose token changes whenever documents are
+    written to the Elasticsearch index `index`, for keying cached query
+    results, and the time it last changed
+
+    With `domain`, the token only changes when documents of that domain, or
+    documents whose domain is not known, are written.
+    """
+    if domain is None:
+        return _get_generation(_index_generation_key(index))
+    generations = [
+        _get_generation(_index_generation_key(index, UNKNOWN_DOMAIN)),
+        _get_generation(_index_generation_key(index, domain)),
+    ]
+    return IndexGeneration(
+        '.'.join(generation.token for generation in generations),
+        max(generation.bumped_at for generation in generations),
+    )
+
+
+def is_result_cache_enabled(index):
+    """
+    Returns whether query results of the Elasticsearch index `index` can be
+    cached. See `settings.ES_QUERY_RESULT_CACHE_INDEXES`.
+    """
+    from corehq.elastic import ES_META
+    return any(ES_META[name].index == index for name in settings.ES_QUERY_RESULT_CACHE_INDEXES)
+
+
+def bump_index_generation(index, domains=None):
+    """
+    Changes the generation of `index` after documents of `domains` were
+    written to it. Pass None for `domains` if they are not all known.
+
+    Does nothing if query results of `index` are not cached.
+    """
+    if not is_result_cache_enabled(index):
+        return
+    generation = IndexGeneration(uuid4().hex, time.time())
+    domains = [UNKNOWN_DOMAIN] if domains is None else list(domains)
+    cache.set_many({
+        _index_generation_key(index, domain): generation
+        for domain in [None] + domains
+    }, INDEX_GENERATION_TIMEOUT)
+
+
 @unit_testing_only
 def ensure_index_deleted(es_index):
     try:
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from mock import patch
+from testil import assert_raises, eq
+
+from corehq.util.thread_pool import DatabaseThreadPool, prefetch_map
+
+
+def test_prefetch_map_preserves_order():
+    def slow_square(x):
+        time.sleep(0.01 * (5 - x))
+        return x * x
+
+    eq(list(prefetch_map(slow_square, range(5), workers=3)), [0, 1, 4, 9, 16])
+
+
+def test_prefetch_map_empty():
+    eq(list(prefetch_map(lambda x: x, [], workers=2)), [])
+
+
+def test_prefetch_map_max_in_flight():
+    lock = threading.Lock()
+    state = {"submitted": 0, "consumed": 0, "max_ahead": 0}
+
+    def items():
+        for i in range(20):
+            with lock:
+                state["submitted"] += 1
+                ahead = state["submitted"] - state["consumed"]
+                state["max_ahead"] = max(state["max_ahead"], ahead)
+            yield i
+
+    for result in prefetch_map(lambda x: x, items(), workers=2, max_in_flight=3):
+        with lock:
+            state["consumed"] += 1
+    eq(state["consumed"], 20)
+    assert state["max_ahead"] <= 3, state
+
+
+def test_prefetch_map_error():
+    def fail_on_two(x):
+        if x == 2:
+            raise ValueError(x)
+        return x
+
+    results = prefetch_map(fail_on_two, range(5), workers=2)
+    eq(next(results), 0)
+    eq(next(results), 1)
+    with assert_raises(ValueError):
+        next(results)
+
+
+def test_database_thread_pool_closes_connections_once_per_worker():
+    closed_by = []
+
+    def close_all():
+        closed_by.append(threading.current_thread().ident)
+
+    with patch('corehq.util.thread_pool.connections') as connections:
+        connections.close_all.side_effect = close_all
+        with DatabaseThreadPool(3) as pool:
+            eq(pool.map(lambda x: x * 2, range(10)), [x * 2 for x in range(10)])
+            eq(closed_by, [])
+    eq(len(closed_by), 3)
+    eq(len(set(closed_by)), 3)
+
+
+def test_database_thread_pool_skips_calls_after_shutdown():
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def call(x):
+        calls.append(x)
+        started.set()
+        release.wait()
+
+    pool = DatabaseThreadPool(1)
+    pool.apply_async(call, (1,))
+    pool.apply_async(call, (2,))
+    started.wait()
+    shutdown = threading.Thread(target=pool.shutdown)
+    shutdown.start()
+    pool._stopping.wait()
+    release.set()
+    shutdown.join()
+    eq(calls, [1])
@@ -0,0 +1,96 @@
+import threading
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from django.db import connections
+
+
+class DatabaseThreadPool(object):
+    """A pool of threads to run functions that may query the database
+
+    Worker threads keep their database connections open across calls,
+    and each worker closes its connections once, when the pool is shut
+    down with `shutdown()` (or on leaving a `with` block). Calls that
+    have not started when the pool is shut down are skipped.
+    """
+
+    def __init__(self, workers):
+        assert workers > 0, workers
+        self.workers = workers
+        self._pool = ThreadPool(workers)
+        self._stopping = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def apply_async(self, func, args=(), callback=None, error_callback=None):
+        return self._pool.apply_async(
+            self._call, (func, args), callback=callback, error_callback=error_callback)
+
+    def map(self, func, iterable):
+        """Call `func` with each item concurrently and return the results in order"""
+        results = [self.apply_async(func, (item,)) for item in iterable]
+        return [result.get() for result in results]
+
+    def _call(self, func, args):
+        if self._stopping.is_set():
+            return None  # skipped
+        return func(*args)
+
+    def shutdown(self):
+        self._stopping.set()
+        try:
+            self._close_worker_connections()
+        finally:
+            self._pool.terminate()
+            self._pool.join()
+
+    def _close_worker_connections(self):
+        # Each worker takes one of these calls and waits until every
+        # worker has taken one, so that no worker takes two.
+        arrived = [0]
+        all_arrived = threading.Condition()
+
+        def close_connections():
+            with all_arrived:
+                arrived[0] += 1
+                all_arrived.notify_all()
+                while arrived[0] < self.workers:
+                    all_arrived.wait()
+            connections.close_all()
+
+        results = [self._pool.apply_async(close_connections) for i in range(self.workers)]
+        for result in results:
+            result.get()
+
+
+def prefetch_map(func, iterable, workers, max_in_flight=None):
+    """Like `map(func, iterable)`, but evaluated ahead on a thread pool
+
+    Up to `max_in_flight` items are submitted to a pool of `workers`
+    threads ahead of the consumer. Results are yielded in input order.
+    Memory use is capped by `max_in_flight` since no more than that many
+    results are held at any time. Exceptions raised by `func` are
+    re-raised when the corresponding result is reached.
+
+    `iterable` is consumed in the calling thread. Database connections
+    opened by `func` in worker threads are closed when the results have
+    been consumed or the generator is closed (see `DatabaseThreadPool`).
+
+    :param max_in_flight: Maximum number of items submitted but not yet
+    yielded. Defaults to `workers`.
+    """
+    if max_in_flight is None:
+        max_in_flight = workers
+    assert workers > 0 and max_in_flight > 0, (workers, max_in_flight)
+    with DatabaseThreadPool(workers) as pool:
+        pending = deque()
+        for item in iterable:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
@@ -794,6 +794,11 @@ PL_PROXY_CLUSTER_NAME = 'commcarehq'
 
 USE_PARTITIONED_DATABASE = False
 
+# number of partitioned databases queried concurrently by
+# paginate_query_across_partitioned_databases and the bulk getters of
+# CaseAccessorSQL and FormAccessorSQL
+PARTITIONED_QUERY_WORKERS = 1
+
 # number of days since last access after which a saved export is considered unused
 SAVED_EXPORT_ACCESS_CUTOFF = 35
 
@@ -901,6 +906,11 @@ CUSTOM_LANDING_TEMPLATE = {
 
 ES_SETTINGS = None
 
+# Indexes (keys of corehq.elastic.ES_META) whose query results can be cached
+# with ESQuery.cached(). Writes to these indexes record a new generation of
+# the index in the cache, which discards the cached results.
+ES_QUERY_RESULT_CACHE_INDEXES = []
+
 try:
     # try to see if there's an environmental variable set for local_settings
     custom_settings = os.environ.get('CUSTOMSETTINGS', None)
@@ -3,9 +3,14 @@ import uuid
 from django.test import override_settings, TestCase
 from mock import MagicMock, patch
 
+from casexml.apps.case.mock import CaseFactory, CaseIndex, CaseStructure
+
 from corehq.apps.case_search.const import SPECIAL_CASE_PROPERTIES_MAP
 from corehq.apps.case_search.exceptions import CaseSearchNotEnabledException
-from corehq.apps.case_search.models import CaseSearchConfig
+from corehq.apps.case_search.models import (
+    CaseSearchConfig,
+    get_ancestor_paths_to_index,
+)
 from corehq.apps.change_feed import topics
 from corehq.apps.change_feed.consumer.feed import (
     change_meta_from_kafka_message,
@@ -16,12 +21,14 @@ from corehq.apps.change_feed.topics import get_multi_topic_offset
 from corehq.apps.es import CaseSearchES
 from corehq.apps.userreports.tests.utils import doc_to_change
 from corehq.elastic import get_es_new
+from corehq.form_processor.interfaces.dbaccessors import CaseAccessors
 from corehq.form_processor.tests.utils import FormProcessorTestUtils
 from corehq.pillows.case import get_case_pillow
 from corehq.pillows.case_search import (
     CaseSearchReindexerFactory,
     delete_case_search_cases,
     domains_needing_search_index,
+    get_case_search_processor,
 )
 from corehq.pillows.mappings.case_search_mapping import (
     CASE_SEARCH_INDEX,
@@ -183,3 +190,76 @@ class CaseSearchPillowTest(TestCase):
                    MagicMock(return_value=[domain])):
             CaseSearchReindexerFactory(domain=domain).build().reindex()
         return case
+
+
+class CaseSearchDescendantsTest(TestCase):
+
+    domain = 'dorne'
+
+    def setUp(self):
+        super(CaseSearchDescendantsTest, self).setUp()
+        ensure_index_deleted(CASE_SEARCH_INDEX)
+        initialize_index_and_mapping(get_es_new(), CASE_SEARCH_INDEX_INFO)
+        CaseSearchConfig.objects.create(pk=self.domain, enabled=True, indexed_ancestor_paths=['parent'])
+        domains_needing_search_index.clear()
+        get_ancestor_paths_to_index.clear(self.domain)
+        self.processor = get_case_search_processor()
+
+        parent = CaseStructure(
+            case_id='oberyn',
+            attrs={'create': True, 'case_type': 'parent', 'update': {'house': 'Martell'}},
+        )
+        child = CaseStructure(
+            case_id='obara',
+            attrs={'create': True, 'case_type': 'child'},
+            indices=[CaseIndex(parent)],
+        )
+        CaseFactory(self.domain).create_or_update_cases([child])
+        self._process_cases('oberyn', 'obara')
+
+    def tearDown(self):
+        FormProcessorTestUtils.delete_all_cases()
+        ensure_index_deleted(CASE_SEARCH_INDEX)
+        CaseSearchConfig.objects.all().delete()
+        domains_needing_search_index.clear()
+        get_ancestor_paths_to_index.clear(self.domain)
+        super(CaseSearchDescendantsTest, self).tearDown()
+
+    def _process_cases(self, *case_ids):
+        cases = CaseAccessors(self.domain).get_cases(list(case_ids))
+        with patch('corehq.apps.case_search.tasks.update_case_search_descendants.delay') as update_descendants:
+            retry, errors = self.processor.process_changes_chunk([doc_to_change(case.to_json()) for case in cases])
+        self.assertEqual((retry, errors), (set(), []))
+        return update_descendants
+
+    def _get_case_property(self, case_id, key):
+        doc = get_es_new().get(CASE_SEARCH_INDEX, case_id)['_source']
+        return {prop['key']: prop['value'] for prop in doc['case_properties']}.get(key)
+
+    def test_ancestor_properties_indexed(self):
+        self.assertEqual(self._get_case_property('obara', 'parent/house'), 'Martell')
+        self.assertIsNone(self._get_case_property('obara', 'parent/last_modified'))
+
+    def test_unchanged_properties(self):
+        # saving the case again changes its modification date only
+        CaseFactory(self.domain).update_case('oberyn')
+        update_descendants = self._process_cases('oberyn')
+        update_descendants.assert_not_called()
+
+    def test_changed_properties(self):
+        CaseFactory(self.domain).update_case('oberyn', update={'house': 'Nymeros Martell'})
+        update_descendants = self._process_cases('oberyn')
+        update_descendants.assert_called_once_with(self.domain, ['oberyn'])
+        self.assertEqual(self._get_case_property('obara', 'parent/house'), 'Martell')
+
+        self.processor.update_descendants(self.domain, ['oberyn'])
+        self.assertEqual(self._get_case_property('obara', 'parent/house'), 'Nymeros Martell')
+
+    def test_indexed_properties_fetched_once_per_chunk(self):
+        CaseFactory(self.domain).update_case('oberyn', update={'house': 'Nymeros Martell'})
+        elasticsearch = self.processor.elasticsearch
+        with patch.object(elasticsearch, 'mget', wraps=elasticsearch.mget) as mget:
+            update_descendants = self._process_cases('oberyn', 'obara')
+        self.assertEqual(mget.call_count, 1)
+        self.assertEqual(update_descendants.call_count, 1)
+        self.assertEqual(self._get_case_property('obara', 'parent/house'), 'Nymeros Martell')